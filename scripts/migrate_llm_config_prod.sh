@@ -1,2 +1,2 @@
 #!/bin/bash
-sudo docker-compose -f /opt/intent-test-framework/docker-compose.prod.yml exec -T new-agents-backend python -c "from app import app, init_db; init_db(app)"
+sudo docker-compose -f /opt/intent-test-framework/docker-compose.prod.yml exec -T -e NEW_AGENTS_SCHEMA_MIGRATION=1 new-agents-backend python -c "from app import app, init_db; init_db(app)"
@@ -222,6 +222,8 @@ def fixed_suites(context: PrePushContext) -> tuple[SuiteSpec, ...]:
                 "-m",
                 "pytest",
                 "tools/intent-tester/tests",
+                "-m",
+                "not slow",
                 "-q",
                 f"--cov={coverage_root / 'tools' / 'intent-tester' / 'backend'}",
                 f"--cov-config={coverage_root / 'scripts' / 'test' / 'intent_tester_pre_push.coveragerc'}",
@@ -83,7 +83,7 @@ run_api_tests() {
     if "$PROJECT_PYTHON" "$OUTCOME_TOOL" run \
         --suite-id "intent-tester-api" \
         --parser pytest \
-        -- python3 -m pytest tools/intent-tester/tests/ -v --cov=tools/intent-tester/backend --cov-report=term; then
+        -- python3 -m pytest tools/intent-tester/tests/ -v -m "not slow" --cov=tools/intent-tester/backend --cov-report=term; then
         log_info "✅ Intent Tester 测试通过"
     else
         log_error "❌ Intent Tester 测试失败"
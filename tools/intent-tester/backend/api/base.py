@@ -19,6 +19,7 @@ from backend.utils.error_handler import (
     NotFoundError,
     DatabaseError,
 )
+from backend.utils.logging_config import TruncatedValue
 
 # 导入数据模型
 from backend.models import db, TestCase, ExecutionHistory, StepExecution
@@ -103,12 +104,13 @@ def log_api_call(f):
 
     @wraps(f)
     def wrapper(*args, **kwargs):
-        logger.info(f"API调用: {request.method} {request.path}")
+        logger.info("API调用: %s %s", request.method, request.path)
         if request.is_json:
-            logger.debug(f"请求数据: {request.get_json()}")
+            # 格式错误的JSON在此处直接返回400；解析结果会被Flask缓存，值只在DEBUG下截断输出
+            logger.debug("请求数据: %s", TruncatedValue(request.get_json()))
         try:
             result = f(*args, **kwargs)
-            logger.info(f"API调用成功: {request.method} {request.path}")
+            logger.info("API调用成功: %s %s", request.method, request.path)
             return result
         except (ValidationError, NotFoundError, DatabaseError) as e:
             logger.error(
@@ -29,6 +29,7 @@ from backend.services.proxy_execution_client import (
     ProxyExecutionClient,
     ProxyExecutionClientError,
 )
+from backend.services.variable_resolver_service import release_execution_variables
 from backend.intent_security import (
     current_intent_principal,
     issue_proxy_ticket as create_proxy_ticket,
@@ -103,6 +104,14 @@ def _log_unexpected_execution_failure(action: str, execution_id: str) -> None:
     )
 
 
+def _release_variables_if_terminal(execution_id: str, update: Mapping[str, Any]) -> None:
+    """Drop the in-memory variable manager once an execution reaches a terminal state."""
+    if update.get("outcome") not in {"applied", "noop"}:
+        return
+    if update["execution"].get("status") in {"success", "failed", "stopped"}:
+        release_execution_variables(execution_id)
+
+
 def _build_dispatch_payload(
     execution: ExecutionHistory,
     testcase: TestCase,
@@ -333,6 +342,7 @@ def _reconcile_execution_from_proxy(
     result = DatabaseService.apply_execution_lifecycle(
         execution_id, "result", proxy_status, result_payload
     )
+    _release_variables_if_terminal(execution_id, result)
     if result["outcome"] == "invalid_transition":
         current = _get_durable_execution_details(execution_id)
         if current is None or current["status"] != proxy_status:
@@ -365,6 +375,7 @@ def record_execution_lifecycle(
         return standard_error_response("执行记录不存在", 404)
     if update["outcome"] == "invalid_transition":
         return standard_error_response("非法的执行生命周期状态迁移", 409)
+    _release_variables_if_terminal(execution_id, update)
 
     return format_success_response(
         message="执行生命周期已记录",
@@ -652,6 +663,7 @@ def stop_execution(execution_id: str) -> Response | tuple[Response, int]:
         )
         if stopped_update["outcome"] not in {"applied", "noop"}:
             return standard_error_response("停止执行时生命周期状态已变化", 409)
+        _release_variables_if_terminal(execution_id, stopped_update)
 
         return format_success_response(
             message="执行已停止", data=stopped_update["execution"]
@@ -7,11 +7,20 @@ AI步骤执行器 - 支持AI方法返回值捕获和变量管理
 import time
 import asyncio
 import logging
+from contextvars import ContextVar
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 
+from flask import current_app, has_app_context
+
+from backend.utils.logging_config import TruncatedValue
 from .variable_resolver_service import VariableManager, get_variable_manager
-from backend.models import db, StepExecution
+from .variable_template import CompiledParams, compile_params, compile_steps
+from .step_execution_recorder import (
+    StepExecutionRecorder,
+    build_step_execution_mapping,
+    write_step_executions,
+)
 from midscene_framework import (
     MidSceneDataExtractor,
     DataExtractionMethod,
@@ -20,6 +29,11 @@ from midscene_framework import (
 
 logger = logging.getLogger(__name__)
 
+# 当前测试用例执行使用的步骤记录器（按 asyncio 任务上下文隔离）
+_active_recorder: ContextVar[Optional[StepExecutionRecorder]] = ContextVar(
+    "active_step_recorder", default=None
+)
+
 
 @dataclass
 class StepExecutionResult:
@@ -74,6 +88,7 @@ class AIStepExecutor:
         step_index: int,
         execution_id: str,
         variable_manager: VariableManager,
+        compiled_params: Optional[CompiledParams] = None,
     ) -> StepExecutionResult:
         """
         执行单个步骤
@@ -83,6 +98,7 @@ class AIStepExecutor:
             step_index: 步骤索引
             execution_id: 执行ID
             variable_manager: 变量管理器
+            compiled_params: 预编译的步骤参数，未提供时现场编译
 
         Returns:
             步骤执行结果
@@ -92,11 +108,16 @@ class AIStepExecutor:
         description = step_config.get("description", action)
 
         try:
-            logger.info(f"执行步骤 {step_index}: {action} - {description}")
+            logger.info(
+                "执行步骤 %s: %s - %s", step_index, action, TruncatedValue(description)
+            )
 
             # 处理参数中的变量引用，支持深度递归解析
             params = self._process_variable_references(
-                step_config.get("params", {}), variable_manager, step_index
+                step_config.get("params", {}),
+                variable_manager,
+                step_index,
+                compiled_params,
             )
 
             # 路由到对应的执行方法
@@ -115,7 +136,7 @@ class AIStepExecutor:
             # 记录步骤执行到数据库
             await self._record_step_execution(result, execution_id, step_config)
 
-            logger.info(f"步骤 {step_index} 执行完成: success={result.success}")
+            logger.info("步骤 %s 执行完成: success=%s", step_index, result.success)
             return result
 
         except Exception as e:
@@ -199,7 +220,9 @@ class AIStepExecutor:
                 if success:
                     step_result.variable_assigned = output_variable
                     logger.info(
-                        f"变量存储成功: {output_variable} = {extraction_result.data}"
+                        "变量存储成功: %s = %s",
+                        output_variable,
+                        TruncatedValue(extraction_result.data),
                     )
                 else:
                     step_result.validation_warning = f"变量存储失败: {output_variable}"
@@ -433,18 +456,21 @@ class AIStepExecutor:
         params: Dict[str, Any],
         variable_manager: VariableManager,
         step_index: int = 0,
+        compiled_params: Optional[CompiledParams] = None,
     ) -> Dict[str, Any]:
         """
         处理参数中的变量引用
         基础变量解析功能，核心功能由执行引擎处理
         """
         try:
-            # 简化变量解析：核心功能已集成在执行引擎中
-            # 这里只进行基本的字符串替换
-            resolved_params = self._basic_variable_resolution(params, variable_manager)
+            compiled = compiled_params or compile_params(params)
+            if compiled.is_static:
+                return params
+
+            resolved_params = compiled.resolve(variable_manager)
 
             logger.debug(
-                f"变量引用解析完成 [步骤 {step_index}]: {params} -> {resolved_params}"
+                "变量引用解析完成 [步骤 %s]: %s", step_index, compiled.dependencies
             )
             return resolved_params
 
@@ -458,36 +484,7 @@ class AIStepExecutor:
         self, params: Dict[str, Any], variable_manager: VariableManager
     ) -> Dict[str, Any]:
         """基础变量解析，简单的字符串替换"""
-        import re
-
-        def resolve_value(value):
-            if isinstance(value, str):
-                # 查找${variable}模式
-                pattern = r"\$\{([^}]+)\}"
-                matches = re.findall(pattern, value)
-
-                resolved_value = value
-                for match in matches:
-                    try:
-                        # 尝试从变量管理器获取值
-                        var_value = variable_manager.get_variable(match)
-                        if var_value is not None:
-                            resolved_value = resolved_value.replace(
-                                f"${{{match}}}", str(var_value)
-                            )
-                    except:
-                        # 如果获取失败，保留原始引用
-                        pass
-
-                return resolved_value
-            elif isinstance(value, dict):
-                return {k: resolve_value(v) for k, v in value.items()}
-            elif isinstance(value, list):
-                return [resolve_value(item) for item in value]
-            else:
-                return value
-
-        return resolve_value(params)
+        return compile_params(params).resolve(variable_manager)
 
     async def _mock_evaluate_javascript(self, script: str) -> Any:
         """Mock JavaScript执行"""
@@ -563,49 +560,29 @@ class AIStepExecutor:
         execution_id: str,
         step_config: Dict[str, Any],
     ):
-        """记录步骤执行到数据库"""
+        """记录步骤执行到数据库（入队异步批量写入，不等待提交）"""
         # 在测试环境中跳过数据库记录
         if hasattr(self, "_skip_db_recording") and self._skip_db_recording:
             return
 
         try:
-            from datetime import datetime
-
-            start_time = datetime.utcnow()
-            end_time = datetime.utcnow()
-            duration = int(result.execution_time * 1000) if result.execution_time else 0
-
-            step_execution = StepExecution(
-                execution_id=execution_id,
-                step_index=result.step_index,
-                step_description=result.description,
-                status="success" if result.success else "failed",
-                start_time=start_time,
-                end_time=end_time,
-                duration=duration,
-                screenshot_path=result.screenshot_path,
-                ai_confidence=0.8,  # 默认置信度
-                ai_decision=str(
-                    {
-                        "action": result.action,
-                        "params": step_config.get("params", {}),
-                        "return_value": result.return_value,
-                        "variable_assigned": result.variable_assigned,
-                    }
-                ),
-                error_message=result.error_message,
-            )
+            mapping = build_step_execution_mapping(result, execution_id, step_config)
 
-            db.session.add(step_execution)
-            db.session.commit()
+            recorder = _active_recorder.get()
+            if recorder is not None and recorder.running:
+                await recorder.record(mapping)
+                return
+
+            # 单独调用 execute_step 时没有记录器，直接在线程池中写入
+            await asyncio.to_thread(write_step_executions, self._current_app(), [mapping])
 
         except Exception as e:
             logger.error(f"记录步骤执行失败: {e}")
-            if hasattr(db.session, "rollback"):
-                try:
-                    db.session.rollback()
-                except Exception:
-                    pass  # 忽略rollback失败
+
+    @staticmethod
+    def _current_app():
+        """获取当前 Flask 应用实例，供线程池中的数据库写入推送应用上下文"""
+        return current_app._get_current_object() if has_app_context() else None
 
     async def execute_test_case(
         self, test_case: Dict[str, Any], execution_id: str, mode: str = "headless"
@@ -628,6 +605,14 @@ class AIStepExecutor:
         # 获取变量管理器
         variable_manager = get_variable_manager(execution_id)
 
+        # 一次性编译全部步骤参数中的变量引用
+        compiled_steps = compile_steps(steps)
+
+        # 步骤记录入队后由后台协程批量写入
+        recorder = StepExecutionRecorder(app=self._current_app())
+        recorder.start()
+        recorder_token = _active_recorder.set(recorder)
+
         logger.info(
             f"开始执行测试用例: {test_case.get('name', '未命名')}, 共 {len(steps)} 个步骤"
         )
@@ -635,7 +620,7 @@ class AIStepExecutor:
         try:
             for i, step_config in enumerate(steps):
                 step_result = await self.execute_step(
-                    step_config, i, execution_id, variable_manager
+                    step_config, i, execution_id, variable_manager, compiled_steps[i]
                 )
                 results.append(step_result)
 
@@ -655,6 +640,10 @@ class AIStepExecutor:
                     error_message=str(e),
                 )
             )
+        finally:
+            # 刷新屏障：返回结果前确保所有步骤记录已写入
+            _active_recorder.reset(recorder_token)
+            await recorder.close()
 
         # 统计结果
         total_steps = len(results)
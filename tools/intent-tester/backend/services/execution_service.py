@@ -9,12 +9,16 @@ import threading
 import time
 import uuid
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 from backend.extensions import socketio
 from backend.models import db, TestCase, ExecutionHistory, StepExecution
 from .ai_service import get_ai_service
-from .variable_resolver_service import get_variable_manager
+from .variable_resolver_service import (
+    get_variable_manager,
+    release_execution_variables,
+)
+from .variable_template import CompiledParams, compile_params, compile_steps
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +89,9 @@ class ExecutionService:
             if not steps:
                 raise ValueError("测试用例没有定义执行步骤")
 
+            # 一次性编译全部步骤参数中的变量引用
+            compiled_steps = compile_steps(steps)
+
             # 更新步骤总数
             execution = ExecutionHistory.query.filter_by(
                 execution_id=execution_id
@@ -104,7 +111,9 @@ class ExecutionService:
                         continue
 
                     # 执行步骤
-                    result = self._execute_single_step(ai, step, mode, execution_id, i)
+                    result = self._execute_single_step(
+                        ai, step, mode, execution_id, i, compiled_steps[i]
+                    )
 
                     if result["success"]:
                         steps_passed += 1
@@ -172,11 +181,18 @@ class ExecutionService:
         except Exception as e:
             self._handle_execution_error(execution_id, str(e))
         finally:
+            release_execution_variables(execution_id)
             if ai:
                 ai.cleanup()
 
     def _execute_single_step(
-        self, ai, step: Dict, mode: str, execution_id: str, step_index: int
+        self,
+        ai,
+        step: Dict,
+        mode: str,
+        execution_id: str,
+        step_index: int,
+        compiled_params: Optional[CompiledParams] = None,
     ) -> Dict:
         """执行单个测试步骤"""
         try:
@@ -195,7 +211,9 @@ class ExecutionService:
             # 变量解析
             try:
                 variable_manager = get_variable_manager(execution_id)
-                resolved_params = self._resolve_variables(params, variable_manager)
+                resolved_params = self._resolve_variables(
+                    params, variable_manager, compiled_params
+                )
             except Exception as e:
                 logger.warning(f"变量解析失败，使用原始参数: {e}")
                 resolved_params = params
@@ -296,35 +314,15 @@ class ExecutionService:
                 "step_name": description,
             }
 
-    def _resolve_variables(self, params: Dict, variable_manager) -> Dict:
+    def _resolve_variables(
+        self,
+        params: Dict,
+        variable_manager,
+        compiled_params: Optional[CompiledParams] = None,
+    ) -> Dict:
         """基础变量解析"""
-        import re
-
-        def resolve_value(value):
-            if isinstance(value, str):
-                pattern = r"\$\{([^}]+)\}"
-                matches = re.findall(pattern, value)
-
-                resolved_value = value
-                for match in matches:
-                    try:
-                        var_value = variable_manager.get_variable(match)
-                        if var_value is not None:
-                            resolved_value = resolved_value.replace(
-                                f"${{{match}}}", str(var_value)
-                            )
-                    except:
-                        pass
-
-                return resolved_value
-            elif isinstance(value, dict):
-                return {k: resolve_value(v) for k, v in value.items()}
-            elif isinstance(value, list):
-                return [resolve_value(item) for item in value]
-            else:
-                return value
-
-        return resolve_value(params)
+        compiled = compiled_params or compile_params(params)
+        return compiled.resolve(variable_manager)
 
     def _handle_skipped_step(self, execution_id: str, step_index: int, step: Dict):
         """处理跳过的步骤"""
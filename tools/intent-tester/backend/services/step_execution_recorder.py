@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+步骤执行记录器 - 异步批量写入 StepExecution
+步骤结果先进入有界队列，由后台写入协程按批次在线程池中提交，事件循环不等待数据库提交
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from backend.models import db, StepExecution
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 刷新屏障标记：写入协程收到后立即提交当前批次
+_FLUSH = object()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """获取共享的数据库写入线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="step-recorder"
+            )
+        return _executor
+
+
+def encode_ai_decision(payload: Dict[str, Any]) -> str:
+    """将AI决策载荷编码为紧凑JSON，无法序列化的值转为字符串"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def build_step_execution_mapping(
+    result, execution_id: str, step_config: Dict[str, Any]
+) -> Dict[str, Any]:
+    """将步骤执行结果转换为 StepExecution 的插入映射"""
+    end_time = datetime.utcnow()
+    execution_time = result.execution_time or 0.0
+    return {
+        "execution_id": execution_id,
+        "step_index": result.step_index,
+        "step_description": result.description,
+        "status": "success" if result.success else "failed",
+        "start_time": end_time - timedelta(seconds=execution_time),
+        "end_time": end_time,
+        "duration": int(execution_time * 1000),
+        "screenshot_path": result.screenshot_path,
+        "ai_confidence": 0.8,  # 默认置信度
+        "ai_decision": encode_ai_decision(
+            {
+                "action": result.action,
+                "params": step_config.get("params", {}),
+                "return_value": result.return_value,
+                "variable_assigned": result.variable_assigned,
+            }
+        ),
+        "error_message": result.error_message,
+    }
+
+
+def write_step_executions(app, rows: List[Dict[str, Any]]) -> int:
+    """
+    批量写入步骤执行记录（在线程池中调用）
+
+    Returns:
+        成功写入的记录数
+    """
+    if not rows:
+        return 0
+
+    def _write():
+        try:
+            db.session.bulk_insert_mappings(StepExecution, rows)
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量记录步骤执行失败: {len(rows)} 条, 错误: {e}")
+            try:
+                db.session.rollback()
+            except Exception:
+                pass  # 忽略rollback失败
+            return 0
+        finally:
+            if app is not None:
+                db.session.remove()
+
+    if app is None:
+        return _write()
+
+    with app.app_context():
+        return _write()
+
+
+class StepExecutionRecorder:
+    """
+    异步批量步骤执行记录器
+
+    必须在事件循环内 start()；close() 是结束时的刷新屏障，返回前保证已入队的记录全部写入。
+    """
+
+    def __init__(
+        self,
+        app=None,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_queue_size: int = 1000,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size必须大于0")
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size必须大于0")
+
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+
+        self.recorded = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    def start(self):
+        """启动后台写入协程"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._writer = asyncio.get_running_loop().create_task(self._run_writer())
+
+    async def record(self, mapping: Dict[str, Any]):
+        """将一条步骤记录放入队列；队列满时等待写入协程腾出空间"""
+        if not self.running:
+            raise RuntimeError("StepExecutionRecorder未启动")
+        await self._queue.put(mapping)
+        self.recorded += 1
+
+    async def flush(self):
+        """等待当前已入队的记录全部写入"""
+        if self._queue is not None and self.running:
+            await self._queue.put(_FLUSH)
+            await self._queue.join()
+
+    async def close(self):
+        """刷新剩余记录并停止写入协程"""
+        if self._writer is None:
+            return
+        await self.flush()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    async def _run_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+
+            while items[-1] is not _FLUSH and len(items) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [item for item in items if item is not _FLUSH]
+            try:
+                if batch:
+                    written = await loop.run_in_executor(
+                        _get_executor(), write_step_executions, self.app, batch
+                    )
+                    self.written += written
+                    self.failed += len(batch) - written
+                    self.batches += 1
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取记录器统计信息"""
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "pending": self.recorded - self.written - self.failed,
+        }
@@ -6,16 +6,34 @@ VariableResolverService - 变量解析服务核心实现
 
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 from threading import Lock
 from collections import OrderedDict
 
 from backend.models import db, ExecutionVariable, VariableReference
+from backend.utils.logging_config import TruncatedValue
 
 logger = logging.getLogger(__name__)
 
 
+def estimate_value_size(value: Any, _depth: int = 0) -> int:
+    """估算Python对象占用的内存字节数（递归统计容器元素，限制递归深度）"""
+    size = sys.getsizeof(value)
+    if _depth >= 8:
+        return size
+    if isinstance(value, dict):
+        size += sum(
+            estimate_value_size(key, _depth + 1) + estimate_value_size(item, _depth + 1)
+            for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_value_size(item, _depth + 1) for item in value)
+    return size
+
+
 class VariableManager:
     """
     变量管理器 - 管理单个执行的变量数据
@@ -27,6 +45,9 @@ class VariableManager:
         self._cache_lock = Lock()
         self._max_cache_size = 1000
         self._cache_dirty = False
+        self._cache_sizes: Dict[str, int] = {}
+        self._cache_bytes = 0
+        self.last_access = time.monotonic()
         logger.info(f"初始化变量管理器: {execution_id}")
 
     def store_variable(
@@ -38,6 +59,7 @@ class VariableManager:
         source_api_params: Dict = None,
     ) -> bool:
         """存储变量到数据库和缓存"""
+        self.touch()
         try:
             with self._cache_lock:
                 # 检测数据类型
@@ -87,7 +109,10 @@ class VariableManager:
                 )
 
                 logger.info(
-                    f"变量存储成功: {variable_name} = {value} (类型: {data_type})"
+                    "变量存储成功: %s = %s (类型: %s)",
+                    variable_name,
+                    TruncatedValue(value),
+                    data_type,
                 )
                 return True
 
@@ -98,6 +123,7 @@ class VariableManager:
 
     def get_variable(self, variable_name: str) -> Optional[Any]:
         """获取变量值（优先从缓存）"""
+        self.touch()
         try:
             with self._cache_lock:
                 # 先检查缓存
@@ -114,29 +140,10 @@ class VariableManager:
                 ).first()
 
                 if var:
-                    value = var.get_typed_value()
+                    cached_data = self._cache_entry_from_row(var)
+                    value = cached_data["value"]
                     # 加入缓存
-                    self._update_cache(
-                        variable_name,
-                        {
-                            "value": value,
-                            "data_type": var.data_type,
-                            "source_step_index": var.source_step_index,
-                            "source_api_method": var.source_api_method,
-                            "metadata": {
-                                "created_at": (
-                                    var.created_at.isoformat()
-                                    if var.created_at
-                                    else None
-                                ),
-                                "source_api_params": (
-                                    json.loads(var.source_api_params)
-                                    if var.source_api_params
-                                    else {}
-                                ),
-                            },
-                        },
-                    )
+                    self._update_cache(variable_name, cached_data)
                     logger.debug(f"从数据库获取变量: {variable_name}")
                     return value
 
@@ -147,8 +154,47 @@ class VariableManager:
             logger.error(f"获取变量失败: {variable_name}, 错误: {str(e)}")
             return None
 
+    def get_variables(self, variable_names: Iterable[str]) -> Dict[str, Any]:
+        """批量获取变量值，缓存未命中的变量用一次查询加载；不存在的变量不出现在结果中"""
+        self.touch()
+        names = list(dict.fromkeys(variable_names))
+        if not names:
+            return {}
+
+        try:
+            with self._cache_lock:
+                values = {}
+                missing = []
+                for name in names:
+                    if name in self._cache:
+                        cached_data = self._cache.pop(name)
+                        self._cache[name] = cached_data
+                        values[name] = cached_data["value"]
+                    else:
+                        missing.append(name)
+
+                if missing:
+                    rows = ExecutionVariable.query.filter(
+                        ExecutionVariable.execution_id == self.execution_id,
+                        ExecutionVariable.variable_name.in_(missing),
+                    ).all()
+                    for var in rows:
+                        cached_data = self._cache_entry_from_row(var)
+                        self._update_cache(var.variable_name, cached_data)
+                        values[var.variable_name] = cached_data["value"]
+
+                logger.debug(
+                    f"批量获取变量: {len(values)}/{len(names)} 命中, 数据库查询 {len(missing)} 个"
+                )
+                return values
+
+        except Exception as e:
+            logger.error(f"批量获取变量失败: {names}, 错误: {str(e)}")
+            return {}
+
     def get_variable_metadata(self, variable_name: str) -> Optional[Dict]:
         """获取变量元数据"""
+        self.touch()
         try:
             with self._cache_lock:
                 # 先检查缓存
@@ -194,6 +240,7 @@ class VariableManager:
 
     def list_variables(self) -> List[Dict]:
         """列出所有变量（包含元数据）"""
+        self.touch()
         try:
             variables = (
                 ExecutionVariable.query.filter_by(execution_id=self.execution_id)
@@ -237,7 +284,7 @@ class VariableManager:
                 db.session.commit()
 
                 # 清理缓存
-                self._cache.clear()
+                self._clear_cache()
 
                 logger.info(
                     f"已清理执行 {self.execution_id} 的变量: {deleted_vars} 个变量, {deleted_refs} 个引用"
@@ -267,20 +314,64 @@ class VariableManager:
             logger.error(f"导出变量失败: {str(e)}")
             return {}
 
+    def _cache_entry_from_row(self, var: ExecutionVariable) -> Dict:
+        """将数据库变量记录转换为缓存条目"""
+        return {
+            "value": var.get_typed_value(),
+            "data_type": var.data_type,
+            "source_step_index": var.source_step_index,
+            "source_api_method": var.source_api_method,
+            "metadata": {
+                "created_at": (
+                    var.created_at.isoformat() if var.created_at else None
+                ),
+                "source_api_params": (
+                    json.loads(var.source_api_params)
+                    if var.source_api_params
+                    else {}
+                ),
+            },
+        }
+
     def _update_cache(self, variable_name: str, data: Dict):
         """更新缓存（LRU策略）"""
         # 如果变量已存在，先删除
         if variable_name in self._cache:
             del self._cache[variable_name]
+            self._cache_bytes -= self._cache_sizes.pop(variable_name, 0)
 
         # 添加到末尾
         self._cache[variable_name] = data
+        entry_size = estimate_value_size(data)
+        self._cache_sizes[variable_name] = entry_size
+        self._cache_bytes += entry_size
 
         # 如果超过最大缓存大小，删除最旧的
         while len(self._cache) > self._max_cache_size:
             oldest_key, _ = self._cache.popitem(last=False)
+            self._cache_bytes -= self._cache_sizes.pop(oldest_key, 0)
             logger.debug(f"LRU缓存清理: {oldest_key}")
 
+    def _clear_cache(self):
+        """清空缓存及其内存统计"""
+        self._cache.clear()
+        self._cache_sizes.clear()
+        self._cache_bytes = 0
+
+    def touch(self):
+        """刷新最近访问时间，读写变量时调用，避免仍在使用的管理器被当作空闲淘汰"""
+        self.last_access = time.monotonic()
+
+    def release_cache(self):
+        """释放内存缓存（不删除数据库中的变量）"""
+        with self._cache_lock:
+            self._clear_cache()
+
+    @property
+    def resident_bytes(self) -> int:
+        """缓存变量的估算内存占用"""
+        return self._cache_bytes
+
     def _detect_data_type(self, value: Any) -> str:
         """检测数据类型"""
         if isinstance(value, bool):
@@ -306,61 +397,210 @@ class VariableManager:
             return {
                 "cache_size": len(self._cache),
                 "max_cache_size": self._max_cache_size,
+                "resident_bytes": self._cache_bytes,
                 "cache_hit_rate": "N/A",  # 可以通过计数器实现
                 "execution_id": self.execution_id,
             }
 
 
+class _ManagerRegistry:
+    """
+    分片的变量管理器注册表
+    按执行ID哈希到固定数量的分片，每个分片独立加锁，避免所有执行争用同一把锁
+    """
+
+    def __init__(self, shard_count: int = 16):
+        self._shards: List[Dict[str, VariableManager]] = [
+            {} for _ in range(shard_count)
+        ]
+        self._locks = [Lock() for _ in range(shard_count)]
+
+    def _index(self, execution_id: str) -> int:
+        return hash(execution_id) % len(self._shards)
+
+    def get_or_create(self, execution_id: str) -> Tuple[VariableManager, bool]:
+        index = self._index(execution_id)
+        with self._locks[index]:
+            shard = self._shards[index]
+            manager = shard.get(execution_id)
+            if manager is not None:
+                return manager, False
+            manager = VariableManager(execution_id)
+            shard[execution_id] = manager
+            return manager, True
+
+    def pop(self, execution_id: str, expected: Optional[VariableManager] = None):
+        """移除管理器；指定 expected 时仅在仍为同一实例时移除"""
+        index = self._index(execution_id)
+        with self._locks[index]:
+            shard = self._shards[index]
+            manager = shard.get(execution_id)
+            if manager is None or (expected is not None and manager is not expected):
+                return None
+            return shard.pop(execution_id)
+
+    def snapshot(self) -> List[VariableManager]:
+        managers = []
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                managers.extend(shard.values())
+        return managers
+
+    def keys(self) -> List[str]:
+        return [manager.execution_id for manager in self.snapshot()]
+
+    def __contains__(self, execution_id: str) -> bool:
+        index = self._index(execution_id)
+        with self._locks[index]:
+            return execution_id in self._shards[index]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
 class VariableManagerFactory:
     """
     变量管理器工厂类
+    注册表有上限：空闲超时、管理器数量和缓存总内存超限时按最近访问时间淘汰。
+    淘汰只释放内存，变量仍保存在数据库中，再次获取时按需加载。
     """
 
-    _instances = {}
-    _lock = Lock()
+    max_managers = 512
+    idle_timeout = 1800.0  # 秒
+    max_resident_bytes = 64 * 1024 * 1024
+    sweep_interval = 30.0  # 两次空闲扫描的最小间隔（秒）
+
+    _instances = _ManagerRegistry()
+    _lock = Lock()  # 保护淘汰扫描与统计计数
+    _last_sweep = 0.0
+    _evictions = {"idle": 0, "capacity": 0, "memory": 0}
+    _releases = 0
 
     @classmethod
     def get_manager(cls, execution_id: str) -> VariableManager:
         """获取变量管理器实例（单例模式）"""
-        with cls._lock:
-            if execution_id not in cls._instances:
-                cls._instances[execution_id] = VariableManager(execution_id)
-                logger.info(f"创建新的变量管理器实例: {execution_id}")
+        manager, created = cls._instances.get_or_create(execution_id)
+        manager.touch()
+        if created:
+            logger.info(f"创建新的变量管理器实例: {execution_id}")
+
+        now = time.monotonic()
+        if created or now - cls._last_sweep >= cls.sweep_interval:
+            cls.evict(now=now, keep=execution_id)
+        return manager
+
+    @classmethod
+    def evict(cls, now: Optional[float] = None, keep: Optional[str] = None) -> int:
+        """
+        按空闲时间、数量上限和内存上限淘汰管理器
+
+        Args:
+            now: 当前单调时间，默认 time.monotonic()
+            keep: 本次不参与淘汰的执行ID（通常是刚刚获取的管理器）
+
+        Returns:
+            淘汰的管理器数量
+        """
+        now = time.monotonic() if now is None else now
+        if not cls._lock.acquire(blocking=False):
+            # 其他线程正在扫描
+            return 0
+        try:
+            cls._last_sweep = now
+            candidates = sorted(
+                (m for m in cls._instances.snapshot() if m.execution_id != keep),
+                key=lambda m: m.last_access,
+            )
+            kept = len(cls._instances) - len(candidates)
+            evicted = 0
+
+            remaining = []
+            for manager in candidates:
+                if now - manager.last_access >= cls.idle_timeout:
+                    evicted += cls._evict_one(manager, "idle")
+                else:
+                    remaining.append(manager)
+
+            resident = sum(m.resident_bytes for m in cls._instances.snapshot())
+            while remaining and (
+                len(remaining) + kept > cls.max_managers
+                or resident > cls.max_resident_bytes
+            ):
+                manager = remaining.pop(0)
+                reason = (
+                    "capacity"
+                    if len(remaining) + 1 + kept > cls.max_managers
+                    else "memory"
+                )
+                resident -= manager.resident_bytes
+                evicted += cls._evict_one(manager, reason)
 
-            return cls._instances[execution_id]
+            return evicted
+        finally:
+            cls._lock.release()
+
+    @classmethod
+    def _evict_one(cls, manager: VariableManager, reason: str) -> int:
+        """淘汰单个管理器（调用方需持有 cls._lock）"""
+        if cls._instances.pop(manager.execution_id, expected=manager) is None:
+            return 0
+        manager.release_cache()
+        cls._evictions[reason] += 1
+        logger.info(f"淘汰变量管理器: {manager.execution_id} (原因: {reason})")
+        return 1
+
+    @classmethod
+    def release_manager(cls, execution_id: str) -> bool:
+        """执行结束后释放管理器内存，不删除数据库中的变量"""
+        manager = cls._instances.pop(execution_id)
+        if manager is None:
+            return False
+        manager.release_cache()
+        with cls._lock:
+            cls._releases += 1
+        logger.info(f"已释放变量管理器: {execution_id}")
+        return True
 
     @classmethod
     def cleanup_manager(cls, execution_id: str):
         """清理指定的变量管理器"""
-        with cls._lock:
-            if execution_id in cls._instances:
-                manager = cls._instances[execution_id]
-                manager.clear_variables()
-                del cls._instances[execution_id]
-                logger.info(f"已清理变量管理器: {execution_id}")
+        manager = cls._instances.pop(execution_id)
+        if manager is not None:
+            manager.clear_variables()
+            logger.info(f"已清理变量管理器: {execution_id}")
 
     @classmethod
     def cleanup_all(cls):
         """清理所有变量管理器"""
-        with cls._lock:
-            for execution_id in list(cls._instances.keys()):
-                cls.cleanup_manager(execution_id)
-            logger.info("已清理所有变量管理器")
+        for execution_id in cls._instances.keys():
+            cls.cleanup_manager(execution_id)
+        logger.info("已清理所有变量管理器")
 
     @classmethod
     def get_active_managers(cls) -> List[str]:
         """获取所有活跃的管理器ID"""
-        with cls._lock:
-            return list(cls._instances.keys())
+        return cls._instances.keys()
 
     @classmethod
     def get_factory_stats(cls) -> Dict:
         """获取工厂统计信息"""
+        managers = cls._instances.snapshot()
         with cls._lock:
-            return {
-                "active_managers": len(cls._instances),
-                "manager_ids": list(cls._instances.keys()),
-            }
+            evictions = dict(cls._evictions)
+            releases = cls._releases
+        return {
+            "active_managers": len(managers),
+            "manager_ids": [manager.execution_id for manager in managers],
+            "resident_bytes": sum(manager.resident_bytes for manager in managers),
+            "evictions": evictions,
+            "total_evictions": sum(evictions.values()),
+            "releases": releases,
+            "limits": {
+                "max_managers": cls.max_managers,
+                "idle_timeout": cls.idle_timeout,
+                "max_resident_bytes": cls.max_resident_bytes,
+            },
+        }
 
 
 # 服务层接口函数
@@ -372,3 +612,8 @@ def get_variable_manager(execution_id: str) -> VariableManager:
 def cleanup_execution_variables(execution_id: str):
     """清理指定执行的变量数据"""
     VariableManagerFactory.cleanup_manager(execution_id)
+
+
+def release_execution_variables(execution_id: str) -> bool:
+    """执行进入终态后释放变量管理器的内存缓存"""
+    return VariableManagerFactory.release_manager(execution_id)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+变量模板编译器
+将步骤参数中的 ${variable} 引用预先编译为静态/变量槽位树，
+执行时一次批量获取依赖变量并复用不含变量的静态子树
+"""
+
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Tuple
+
+VARIABLE_PATTERN = re.compile(r"\$\{([^}]+)\}")
+
+
+class _StringSlot:
+    """含变量引用的字符串：按字面量与变量名交替存储"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: Tuple[Tuple[bool, str], ...]):
+        # (is_variable, text)
+        self.parts = parts
+
+    def resolve(self, values: Mapping[str, Any]) -> str:
+        chunks = []
+        for is_variable, text in self.parts:
+            if not is_variable:
+                chunks.append(text)
+                continue
+            value = values.get(text)
+            # 变量不存在时保留原始引用
+            chunks.append(f"${{{text}}}" if value is None else str(value))
+        return "".join(chunks)
+
+
+class _DictNode:
+    """含变量引用的字典：静态值直接复用，动态值按槽位解析"""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Tuple[Tuple[Any, Any, bool], ...]):
+        # (key, value_or_node, is_dynamic)
+        self.items = items
+
+    def resolve(self, values: Mapping[str, Any]) -> Dict:
+        return {
+            key: node.resolve(values) if is_dynamic else node
+            for key, node, is_dynamic in self.items
+        }
+
+
+class _ListNode:
+    """含变量引用的列表"""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Tuple[Tuple[Any, bool], ...]):
+        self.items = items
+
+    def resolve(self, values: Mapping[str, Any]) -> List:
+        return [node.resolve(values) if is_dynamic else node for node, is_dynamic in self.items]
+
+
+def _compile_value(value: Any, dependencies: set) -> Tuple[Any, bool]:
+    """
+    编译单个参数值
+
+    Returns:
+        (编译节点或原始值, 是否包含变量引用)
+    """
+    if isinstance(value, str):
+        if "${" not in value:
+            return value, False
+
+        parts = []
+        position = 0
+        for match in VARIABLE_PATTERN.finditer(value):
+            if match.start() > position:
+                parts.append((False, value[position : match.start()]))
+            parts.append((True, match.group(1)))
+            dependencies.add(match.group(1))
+            position = match.end()
+
+        if not parts:
+            return value, False
+        if position < len(value):
+            parts.append((False, value[position:]))
+        return _StringSlot(tuple(parts)), True
+
+    if isinstance(value, dict):
+        items = []
+        dynamic = False
+        for key, item in value.items():
+            node, is_dynamic = _compile_value(item, dependencies)
+            items.append((key, node, is_dynamic))
+            dynamic = dynamic or is_dynamic
+        return (_DictNode(tuple(items)), True) if dynamic else (value, False)
+
+    if isinstance(value, list):
+        items = []
+        dynamic = False
+        for item in value:
+            node, is_dynamic = _compile_value(item, dependencies)
+            items.append((node, is_dynamic))
+            dynamic = dynamic or is_dynamic
+        return (_ListNode(tuple(items)), True) if dynamic else (value, False)
+
+    return value, False
+
+
+class CompiledParams:
+    """
+    编译后的步骤参数
+
+    dependencies 记录该步骤引用的全部变量名；不含变量引用时 resolve 直接返回原始参数对象。
+    """
+
+    __slots__ = ("source", "dependencies", "_root", "_dynamic")
+
+    def __init__(self, params: Any):
+        dependencies: set = set()
+        self.source = params
+        self._root, self._dynamic = _compile_value(params, dependencies)
+        self.dependencies: FrozenSet[str] = frozenset(dependencies)
+
+    @property
+    def is_static(self) -> bool:
+        return not self._dynamic
+
+    def resolve_with_values(self, values: Mapping[str, Any]) -> Any:
+        """使用已获取的变量值解析参数"""
+        if not self._dynamic:
+            return self.source
+        return self._root.resolve(values)
+
+    def resolve(self, variable_manager) -> Any:
+        """批量获取依赖变量并解析参数"""
+        if not self._dynamic:
+            return self.source
+        return self._root.resolve(variable_manager.get_variables(self.dependencies))
+
+
+def compile_params(params: Any) -> CompiledParams:
+    """编译单个步骤的参数"""
+    return CompiledParams(params if params is not None else {})
+
+
+def compile_steps(steps: Iterable[Dict[str, Any]]) -> List[CompiledParams]:
+    """一次性编译测试用例全部步骤的参数"""
+    return [compile_params(step.get("params", {})) for step in steps]
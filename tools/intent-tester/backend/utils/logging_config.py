@@ -1,13 +1,60 @@
 """
 日志配置模块
 提供统一的日志配置和管理功能
+支持基于 QueueHandler/QueueListener 的异步日志管道、JSON 结构化输出、
+按日志器限流采样以及日志值截断
 """
 
+import atexit
+import json
 import os
 import logging
 import logging.handlers
+import queue
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 日志中单个值的默认最大长度
+DEFAULT_MAX_VALUE_LENGTH = 256
+
+# LogRecord 的标准属性，JSON 输出时其余属性视为 extra 字段
+_STANDARD_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None))
+) | {"message", "asctime", "levelname_colored", "name_colored"}
+
+# 请求上下文字段
+_REQUEST_CONTEXT_ATTRS = ("request_id", "method", "path", "remote_addr")
+
+
+def truncate_log_value(value: Any, max_length: int = DEFAULT_MAX_VALUE_LENGTH) -> str:
+    """将值转为字符串并截断到指定长度，超出部分以剩余字符数标注"""
+    text = value if isinstance(value, str) else str(value)
+    if max_length <= 0 or len(text) <= max_length:
+        return text
+    return f"{text[:max_length]}...(+{len(text) - max_length}字符)"
+
+
+class TruncatedValue:
+    """
+    延迟截断的日志参数
+
+    用作 logger.info("%s", TruncatedValue(value)) 的参数，
+    只有记录真正被输出时才会转换和截断，被级别或限流过滤时没有开销。
+    """
+
+    __slots__ = ("value", "max_length")
+
+    def __init__(self, value: Any, max_length: int = DEFAULT_MAX_VALUE_LENGTH):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        return truncate_log_value(self.value, self.max_length)
+
+    __repr__ = __str__
 
 
 class ColoredFormatter(logging.Formatter):
@@ -39,6 +86,10 @@ class RequestContextFilter(logging.Filter):
     """请求上下文过滤器，添加请求相关信息到日志"""
 
     def filter(self, record):
+        # 异步管道中上下文已在调用线程填充，监听线程内不再覆盖
+        if hasattr(record, "request_id"):
+            return True
+
         try:
             from flask import request, has_request_context
 
@@ -62,22 +113,173 @@ class RequestContextFilter(logging.Filter):
         return True
 
 
+class JsonFormatter(logging.Formatter):
+    """JSON 结构化日志格式化器，每条记录输出为一行紧凑 JSON"""
+
+    def __init__(self, max_message_length: int = 4000):
+        super().__init__()
+        self.max_message_length = max_message_length
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate_log_value(
+                record.getMessage(), self.max_message_length
+            ),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+
+        return json.dumps(
+            payload, ensure_ascii=False, separators=(",", ":"), default=str
+        )
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    按日志器限流与采样过滤器
+
+    每个日志器一个令牌桶，只作用于 max_level 及以下级别（默认 DEBUG/INFO）。
+    令牌耗尽后按 1/sample_every 采样放行，其余记录丢弃；
+    下一条放行的记录带上 suppressed 字段，标明期间被丢弃的条数。
+    同一实例可挂在多个处理器上：每条记录只消耗一次令牌，之后复用首次判定结果。
+    """
+
+    def __init__(
+        self,
+        rate: float = 100.0,
+        burst: int = 200,
+        sample_every: int = 50,
+        max_level: int = logging.INFO,
+        clock=time.monotonic,
+    ):
+        super().__init__()
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        if burst < 1:
+            raise ValueError("burst必须大于0")
+        if sample_every < 0:
+            raise ValueError("sample_every不能为负数")
+
+        self.rate = rate
+        self.burst = burst
+        self.sample_every = sample_every
+        self.max_level = max_level
+        self._clock = clock
+        self._lock = threading.Lock()
+        # logger名 -> [令牌数, 上次补充时间, 超限计数, 待报告的丢弃数]
+        self._buckets: Dict[str, List[float]] = {}
+        self._dropped: Dict[str, int] = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+
+        decision = getattr(record, "_rate_limit_decision", None)
+        if decision is not None and decision[0] == id(self):
+            return decision[1]
+        allowed = self._take(record)
+        record._rate_limit_decision = (id(self), allowed)
+        return allowed
+
+    def _take(self, record) -> bool:
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [float(self.burst), now, 0, 0]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                allowed = True
+            else:
+                bucket[2] += 1
+                allowed = self.sample_every > 0 and bucket[2] % self.sample_every == 0
+
+            if not allowed:
+                bucket[3] += 1
+                self._dropped[record.name] = self._dropped.get(record.name, 0) + 1
+                return False
+
+            if bucket[3]:
+                record.suppressed = int(bucket[3])
+                bucket[3] = 0
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计信息"""
+        with self._lock:
+            return {
+                "dropped": sum(self._dropped.values()),
+                "dropped_by_logger": dict(self._dropped),
+            }
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    异步日志入队处理器
+
+    调用线程只做过滤和消息合并后入队，格式化与文件写入由 QueueListener 线程完成。
+    队列满时丢弃 ERROR 以下的记录而不阻塞业务线程。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.ERROR:
+                try:
+                    self.queue.put(record, timeout=1.0)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
 class LoggingConfig:
     """日志配置管理器"""
 
-    def __init__(self, app=None):
+    def __init__(self, app=None, log_dir=None):
         self.app = app
-        self.log_dir = None
+        self.log_dir = Path(log_dir) if log_dir is not None else None
+        self.rate_limit_filter: Optional[RateLimitFilter] = None
+        self._listeners: List[logging.handlers.QueueListener] = []
+        self._queue_handlers: List[AsyncQueueHandler] = []
+        # 本配置添加的 (日志器, 处理器)，重新配置或关闭时移除
+        self._installed: List[Tuple[logging.Logger, logging.Handler]] = []
+        self._atexit_registered = False
         self.setup_log_directory()
 
     def setup_log_directory(self):
         """设置日志目录"""
-        # 获取项目根目录
-        project_root = Path(__file__).parent.parent.parent.parent
-        self.log_dir = project_root / "logs"
+        if self.log_dir is None:
+            # 获取项目根目录
+            project_root = Path(__file__).parent.parent.parent.parent
+            self.log_dir = project_root / "logs"
 
         # 创建日志目录
-        self.log_dir.mkdir(exist_ok=True)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
 
         # 创建子目录
         (self.log_dir / "api").mkdir(exist_ok=True)
@@ -85,8 +287,27 @@ class LoggingConfig:
         (self.log_dir / "error").mkdir(exist_ok=True)
         (self.log_dir / "performance").mkdir(exist_ok=True)
 
-    def configure_logging(self, level=logging.INFO, enable_file_logging=True):
-        """配置日志系统"""
+    def configure_logging(
+        self,
+        level=logging.INFO,
+        enable_file_logging=True,
+        async_logging=True,
+        json_format=True,
+        rate_limit: Optional[RateLimitFilter] = None,
+        queue_size: int = 10000,
+    ):
+        """
+        配置日志系统
+
+        Args:
+            level: 根日志级别
+            enable_file_logging: 是否写入日志文件
+            async_logging: 是否通过 QueueHandler/QueueListener 异步输出
+            json_format: 文件日志是否使用 JSON 结构化格式
+            rate_limit: DEBUG/INFO 限流采样过滤器，异步模式下默认启用
+            queue_size: 异步队列容量
+        """
+        self.shutdown()
 
         # 清理现有的handlers
         root_logger = logging.getLogger()
@@ -102,117 +323,179 @@ class LoggingConfig:
             datefmt="%H:%M:%S",
         )
 
-        file_formatter = logging.Formatter(
-            fmt="%(asctime)s [%(levelname)-8s] [%(request_id)s] %(name)s:%(lineno)d - %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-        )
+        if json_format:
+            file_formatter = JsonFormatter()
+        else:
+            file_formatter = logging.Formatter(
+                fmt="%(asctime)s [%(levelname)-8s] [%(request_id)s] %(name)s:%(lineno)d - %(message)s",
+                datefmt="%Y-%m-%d %H:%M:%S",
+            )
 
         # 控制台处理器
         console_handler = logging.StreamHandler()
         console_handler.setLevel(level)
         console_handler.setFormatter(console_formatter)
-        root_logger.addHandler(console_handler)
+
+        # 日志器名 -> 处理器列表
+        handler_groups: Dict[str, List[logging.Handler]] = {"": [console_handler]}
 
         if enable_file_logging:
             # 应用日志文件处理器
-            app_log_file = self.log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log"
-            app_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=app_log_file,
-                when="midnight",
-                interval=1,
-                backupCount=30,
-                encoding="utf-8",
+            app_handler = self._create_file_handler(
+                self.log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log",
+                level,
+                file_formatter,
+                backup_count=30,
             )
-            app_handler.setLevel(level)
-            app_handler.setFormatter(file_formatter)
-            app_handler.addFilter(RequestContextFilter())
-            root_logger.addHandler(app_handler)
-
-            # API访问日志处理器
-            api_log_file = (
-                self.log_dir / "api" / f"api_{datetime.now().strftime('%Y%m%d')}.log"
-            )
-            api_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=api_log_file,
-                when="midnight",
-                interval=1,
-                backupCount=30,
-                encoding="utf-8",
-            )
-            api_handler.setLevel(logging.INFO)
-            api_handler.setFormatter(file_formatter)
-            api_handler.addFilter(RequestContextFilter())
+            handler_groups[""].append(app_handler)
 
-            # 只有API相关的日志才写入API日志文件
-            api_logger = logging.getLogger("backend.api")
-            api_logger.addHandler(api_handler)
-            api_logger.propagate = True  # 仍然传播到根日志器
-
-            # 错误日志处理器
-            error_log_file = (
+            # 错误日志处理器，保留更长时间
+            error_handler = self._create_file_handler(
                 self.log_dir
                 / "error"
-                / f"error_{datetime.now().strftime('%Y%m%d')}.log"
-            )
-            error_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=error_log_file,
-                when="midnight",
-                interval=1,
-                backupCount=90,  # 错误日志保留更长时间
-                encoding="utf-8",
+                / f"error_{datetime.now().strftime('%Y%m%d')}.log",
+                logging.ERROR,
+                file_formatter,
+                backup_count=90,
             )
-            error_handler.setLevel(logging.ERROR)
-            error_handler.setFormatter(file_formatter)
-            error_handler.addFilter(RequestContextFilter())
-            root_logger.addHandler(error_handler)
+            handler_groups[""].append(error_handler)
+
+            # API访问日志处理器：只有API相关的日志才写入API日志文件
+            handler_groups["backend.api"] = [
+                self._create_file_handler(
+                    self.log_dir / "api" / f"api_{datetime.now().strftime('%Y%m%d')}.log",
+                    logging.INFO,
+                    file_formatter,
+                    backup_count=30,
+                )
+            ]
 
             # 执行日志处理器
-            execution_log_file = (
-                self.log_dir
-                / "execution"
-                / f"execution_{datetime.now().strftime('%Y%m%d')}.log"
-            )
-            execution_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=execution_log_file,
-                when="midnight",
-                interval=1,
-                backupCount=30,
-                encoding="utf-8",
-            )
-            execution_handler.setLevel(logging.INFO)
-            execution_handler.setFormatter(file_formatter)
-            execution_handler.addFilter(RequestContextFilter())
-
-            execution_logger = logging.getLogger("execution")
-            execution_logger.addHandler(execution_handler)
-            execution_logger.propagate = True
-
-            # 性能日志处理器
-            performance_log_file = (
-                self.log_dir
-                / "performance"
-                / f"performance_{datetime.now().strftime('%Y%m%d')}.log"
-            )
-            performance_handler = logging.handlers.TimedRotatingFileHandler(
-                filename=performance_log_file,
-                when="midnight",
-                interval=1,
-                backupCount=7,  # 性能日志保留时间较短
-                encoding="utf-8",
-            )
-            performance_handler.setLevel(logging.INFO)
-            performance_handler.setFormatter(file_formatter)
-
-            performance_logger = logging.getLogger("performance")
-            performance_logger.addHandler(performance_handler)
-            performance_logger.propagate = False  # 不传播到根日志器，避免重复
+            handler_groups["execution"] = [
+                self._create_file_handler(
+                    self.log_dir
+                    / "execution"
+                    / f"execution_{datetime.now().strftime('%Y%m%d')}.log",
+                    logging.INFO,
+                    file_formatter,
+                    backup_count=30,
+                )
+            ]
+
+            # 性能日志处理器，保留时间较短
+            handler_groups["performance"] = [
+                self._create_file_handler(
+                    self.log_dir
+                    / "performance"
+                    / f"performance_{datetime.now().strftime('%Y%m%d')}.log",
+                    logging.INFO,
+                    file_formatter,
+                    backup_count=7,
+                )
+            ]
+
+            logging.getLogger("backend.api").propagate = True  # 仍然传播到根日志器
+            logging.getLogger("execution").propagate = True
+            # 不传播到根日志器，避免重复
+            logging.getLogger("performance").propagate = False
+
+        if async_logging:
+            self.rate_limit_filter = rate_limit or RateLimitFilter()
+            for logger_name, handlers in handler_groups.items():
+                self._install_async(
+                    logging.getLogger(logger_name), handlers, queue_size
+                )
+        else:
+            self.rate_limit_filter = rate_limit
+            for logger_name, handlers in handler_groups.items():
+                target = logging.getLogger(logger_name)
+                for handler in handlers:
+                    if self.rate_limit_filter is not None:
+                        handler.addFilter(self.rate_limit_filter)
+                    target.addHandler(handler)
+                    self._installed.append((target, handler))
+
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
 
         # 设置第三方库的日志级别
         logging.getLogger("werkzeug").setLevel(logging.WARNING)  # Flask开发服务器日志
         logging.getLogger("urllib3").setLevel(logging.WARNING)  # HTTP请求库日志
         logging.getLogger("requests").setLevel(logging.WARNING)  # Requests库日志
 
-        logging.info("日志系统配置完成")
+        logging.info(
+            f"日志系统配置完成: async={async_logging}, json={json_format}"
+        )
+
+    def _create_file_handler(
+        self, filename: Path, level: int, formatter: logging.Formatter, backup_count: int
+    ) -> logging.Handler:
+        """创建按天轮转的文件处理器"""
+        handler = logging.handlers.TimedRotatingFileHandler(
+            filename=filename,
+            when="midnight",
+            interval=1,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+        handler.addFilter(RequestContextFilter())
+        return handler
+
+    def _install_async(
+        self, target: logging.Logger, handlers: List[logging.Handler], queue_size: int
+    ):
+        """为日志器安装入队处理器，并由监听线程分发到实际处理器"""
+        log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        queue_handler = AsyncQueueHandler(log_queue)
+        queue_handler.setLevel(min(handler.level for handler in handlers))
+        # 限流与请求上下文在调用线程完成
+        queue_handler.addFilter(self.rate_limit_filter)
+        queue_handler.addFilter(RequestContextFilter())
+
+        listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+
+        target.addHandler(queue_handler)
+        self._installed.append((target, queue_handler))
+        self._queue_handlers.append(queue_handler)
+        self._listeners.append(listener)
+
+    def shutdown(self):
+        """停止监听线程（写出队列中剩余记录）并移除本配置安装的处理器"""
+        for target, handler in self._installed:
+            target.removeHandler(handler)
+
+        for listener in self._listeners:
+            try:
+                listener.stop()
+            except Exception:
+                pass  # 监听线程已停止
+            for handler in listener.handlers:
+                handler.close()
+
+        for target, handler in self._installed:
+            if not isinstance(handler, AsyncQueueHandler):
+                handler.close()
+
+        self._installed = []
+        self._listeners = []
+        self._queue_handlers = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取异步日志管道统计信息"""
+        stats = {
+            "async": bool(self._listeners),
+            "queued": sum(handler.queue.qsize() for handler in self._queue_handlers),
+            "queue_dropped": sum(handler.dropped for handler in self._queue_handlers),
+        }
+        if self.rate_limit_filter is not None:
+            stats["rate_limited"] = self.rate_limit_filter.get_stats()
+        return stats
 
     def get_logger(self, name: str) -> logging.Logger:
         """获取指定名称的日志器"""
@@ -255,17 +538,31 @@ def get_logging_config():
     return _logging_config
 
 
-def setup_logging(level=None, enable_file_logging=True):
-    """设置日志配置"""
+def setup_logging(level=None, enable_file_logging=True, async_logging=None, json_format=None):
+    """
+    设置日志配置
+
+    async_logging / json_format 未指定时分别读取环境变量
+    LOG_ASYNC（默认开启）和 LOG_FORMAT（json/text，默认 json）
+    """
     if level is None:
         level = (
             logging.DEBUG
             if os.getenv("DEBUG", "").lower() in ("1", "true")
             else logging.INFO
         )
+    if async_logging is None:
+        async_logging = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true")
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "json").lower() == "json"
 
     config = get_logging_config()
-    config.configure_logging(level, enable_file_logging)
+    config.configure_logging(
+        level,
+        enable_file_logging,
+        async_logging=async_logging,
+        json_format=json_format,
+    )
     return config
 
 
@@ -9,7 +9,16 @@ from .data_extractor import (
     ExtractionRequest,
     ExtractionResult,
 )
-from .retry_handler import RetryHandler, RetryConfig
+from .retry_handler import (
+    RetryHandler,
+    RetryConfig,
+    RetryStats,
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitOpenError,
+    CircuitState,
+    circuit_breaker_registry,
+)
 from .config import MidSceneConfig, ConfigManager
 from .mock_service import MockMidSceneAPI
 from .validators import DataValidator
@@ -23,6 +32,12 @@ __all__ = [
     "ExtractionResult",
     "RetryHandler",
     "RetryConfig",
+    "RetryStats",
+    "CircuitBreaker",
+    "CircuitBreakerConfig",
+    "CircuitOpenError",
+    "CircuitState",
+    "circuit_breaker_registry",
     "MidSceneConfig",
     "ConfigManager",
     "MockMidSceneAPI",
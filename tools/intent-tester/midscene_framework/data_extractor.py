@@ -5,6 +5,7 @@ MidSceneJS数据提取器核心实现
 """
 
 import asyncio
+import functools
 import logging
 import time
 import math
@@ -14,6 +15,7 @@ from enum import Enum
 
 from .validators import DataValidator
 from .retry_handler import RetryHandler, RetryConfig
+from .config import get_config
 
 logger = logging.getLogger(__name__)
 
@@ -99,16 +101,23 @@ class MidSceneDataExtractor:
         },
     }
 
-    def __init__(self, midscene_client=None, mock_mode: bool = False):
+    def __init__(
+        self,
+        midscene_client=None,
+        mock_mode: bool = False,
+        provider: Optional[str] = None,
+    ):
         """
         初始化数据提取器
 
         Args:
             midscene_client: MidSceneJS客户端实例
             mock_mode: 是否使用Mock模式
+            provider: 视觉模型服务标识，用于共享熔断器；默认取配置中的模型服务地址
         """
         self.midscene_client = midscene_client
         self.mock_mode = mock_mode
+        self.provider = provider
         self.logger = logger
         self.data_validator = DataValidator()
 
@@ -145,9 +154,12 @@ class MidSceneDataExtractor:
             if self.mock_mode:
                 raw_data = await self._mock_extract(request)
             else:
-                # 使用重试机制执行真实的API调用
-                raw_data = await RetryHandler.retry_with_backoff(
-                    handler, retry_config, request.params
+                # 使用带熔断器的重试机制执行真实的API调用
+                raw_data = await RetryHandler.retry_with_circuit_breaker(
+                    functools.partial(handler, request.params),
+                    retry_config,
+                    provider=self._get_provider(),
+                    method=request.method.value,
                 )
 
             # 数据验证
@@ -177,7 +189,10 @@ class MidSceneDataExtractor:
             )
 
             logger.info(
-                f"数据提取成功 [{request.method.value}]: {data_type}, 耗时 {execution_time:.3f}s"
+                "数据提取成功 [%s]: %s, 耗时 %.3fs",
+                request.method.value,
+                data_type,
+                execution_time,
             )
             return result
 
@@ -185,8 +200,12 @@ class MidSceneDataExtractor:
             execution_time = time.time() - start_time
             error_msg = str(e)
 
+            # 错误信息可能包含完整的模型响应，日志中截断
             logger.error(
-                f"数据提取失败 [{request.method.value}]: {error_msg}, 耗时 {execution_time:.3f}s"
+                "数据提取失败 [%s]: %.500s, 耗时 %.3fs",
+                request.method.value,
+                error_msg,
+                execution_time,
             )
 
             return ExtractionResult(
@@ -234,6 +253,13 @@ class MidSceneDataExtractor:
 
         return getattr(self, handler_name)
 
+    def _get_provider(self) -> str:
+        """获取熔断器使用的模型服务标识"""
+        if self.provider is None:
+            config = get_config()
+            self.provider = config.openai_base_url or config.api_base_url
+        return self.provider
+
     def _get_retry_config(self, custom_config: Optional[Dict]) -> RetryConfig:
         """获取重试配置"""
         if custom_config:
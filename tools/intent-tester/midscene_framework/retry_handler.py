@@ -7,7 +7,12 @@
 import asyncio
 import random
 import logging
-from typing import Callable, Any, Union
+import re
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable, Any, Dict, Optional, Tuple, Union
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
@@ -34,6 +39,301 @@ class RetryConfig:
             raise ValueError("exponential_base必须大于1")
 
 
+class CircuitState(Enum):
+    """熔断器状态"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreakerConfig:
+    """熔断器与自适应并发配置"""
+
+    # 滑动窗口内至少出现多少次失败才允许熔断
+    failure_threshold: int = 5
+    # 滑动窗口内失败率达到该比例时熔断
+    failure_rate_threshold: float = 0.5
+    # 滑动窗口长度（秒）
+    window_seconds: float = 60.0
+    # 熔断后进入半开状态前的等待时间（秒）
+    recovery_timeout: float = 60.0
+    # 半开状态下允许同时放行的探测请求数
+    half_open_max_probes: int = 1
+    # 半开状态下连续成功多少次后关闭熔断器
+    half_open_success_threshold: int = 1
+
+    # AIMD 并发窗口
+    initial_concurrency: float = 4.0
+    min_concurrency: float = 1.0
+    max_concurrency: float = 16.0
+    additive_increase: float = 1.0
+    multiplicative_decrease: float = 0.5
+
+    def __post_init__(self):
+        """参数验证"""
+        if self.failure_threshold < 1:
+            raise ValueError("failure_threshold必须大于0")
+        if not 0 < self.failure_rate_threshold <= 1:
+            raise ValueError("failure_rate_threshold必须在(0, 1]之间")
+        if self.window_seconds <= 0:
+            raise ValueError("window_seconds必须大于0")
+        if self.recovery_timeout < 0:
+            raise ValueError("recovery_timeout不能小于0")
+        if self.half_open_max_probes < 1:
+            raise ValueError("half_open_max_probes必须大于0")
+        if self.half_open_success_threshold < 1:
+            raise ValueError("half_open_success_threshold必须大于0")
+        if self.min_concurrency < 1:
+            raise ValueError("min_concurrency必须大于等于1")
+        if self.max_concurrency < self.min_concurrency:
+            raise ValueError("max_concurrency不能小于min_concurrency")
+        if not self.min_concurrency <= self.initial_concurrency <= self.max_concurrency:
+            raise ValueError("initial_concurrency必须在min与max之间")
+        if self.additive_increase <= 0:
+            raise ValueError("additive_increase必须大于0")
+        if not 0 < self.multiplicative_decrease < 1:
+            raise ValueError("multiplicative_decrease必须在(0, 1)之间")
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开时快速失败抛出的异常"""
+
+    def __init__(self, key: str, retry_after: float):
+        self.key = key
+        self.retry_after = max(retry_after, 0.0)
+        super().__init__(f"熔断器已打开: {key}，{self.retry_after:.1f}秒后允许探测")
+
+
+class CircuitBreaker:
+    """
+    带自适应并发窗口的熔断器
+
+    每个 provider/method 对应一个实例，在多个执行线程（各自的事件循环）之间共享，
+    因此内部状态使用 threading.Lock 保护，而不是 asyncio 原语。
+    """
+
+    ACQUIRE_POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        key: str,
+        config: Optional[CircuitBreakerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.key = key
+        self.config = config or CircuitBreakerConfig()
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._state = CircuitState.CLOSED
+        self._window: deque = deque()
+        self._opened_at = 0.0
+        self._open_until = 0.0
+        self._half_open_probes = 0
+        self._half_open_successes = 0
+
+        self._concurrency_limit = self.config.initial_concurrency
+        self._in_flight = 0
+
+        self._rejected_calls = 0
+        self._rate_limited_calls = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._refresh_state(self._clock())
+            return self._state
+
+    def _refresh_state(self, now: float):
+        """打开状态超过恢复时间后转为半开（调用方需持有锁）"""
+        if self._state == CircuitState.OPEN and now >= self._open_until:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_probes = 0
+            self._half_open_successes = 0
+            logger.info(f"熔断器进入半开状态: {self.key}")
+
+    def _trim_window(self, now: float):
+        cutoff = now - self.config.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def _open(self, now: float, hold: float = 0.0):
+        self._state = CircuitState.OPEN
+        self._opened_at = now
+        self._open_until = now + max(self.config.recovery_timeout, hold)
+        self._half_open_probes = 0
+        self._half_open_successes = 0
+        self._times_opened += 1
+        logger.warning(
+            f"熔断器已打开: {self.key}，{self._open_until - now:.1f}秒后进入半开状态"
+        )
+
+    def try_acquire(self) -> bool:
+        """
+        尝试获取一个调用许可
+
+        Returns:
+            是否获得许可；并发窗口已满时返回False
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下探测名额已用完
+        """
+        with self._lock:
+            now = self._clock()
+            self._refresh_state(now)
+
+            if self._state == CircuitState.OPEN:
+                self._rejected_calls += 1
+                raise CircuitOpenError(self.key, self._open_until - now)
+
+            if self._state == CircuitState.HALF_OPEN:
+                if self._half_open_probes >= self.config.half_open_max_probes:
+                    self._rejected_calls += 1
+                    raise CircuitOpenError(self.key, 0.0)
+                self._half_open_probes += 1
+                self._in_flight += 1
+                return True
+
+            if self._in_flight >= int(self._concurrency_limit):
+                return False
+
+            self._in_flight += 1
+            return True
+
+    async def acquire(self):
+        """等待并发窗口空出许可；熔断器打开时立即失败"""
+        while not self.try_acquire():
+            await asyncio.sleep(self.ACQUIRE_POLL_INTERVAL)
+
+    def release(
+        self,
+        success: Optional[bool],
+        rate_limited: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        """
+        归还许可并记录调用结果
+
+        Args:
+            success: 调用是否成功；None表示与服务端健康无关的失败（如参数错误），不计入窗口
+            rate_limited: 是否为限流失败
+            retry_after: 服务端建议的等待时间（秒）
+        """
+        with self._lock:
+            now = self._clock()
+            self._in_flight = max(self._in_flight - 1, 0)
+            was_probe = self._state == CircuitState.HALF_OPEN
+            if was_probe:
+                self._half_open_probes = max(self._half_open_probes - 1, 0)
+
+            if success is None:
+                return
+
+            self._window.append((now, success))
+            self._trim_window(now)
+
+            if success:
+                self._concurrency_limit = min(
+                    self._concurrency_limit
+                    + self.config.additive_increase / max(self._concurrency_limit, 1.0),
+                    self.config.max_concurrency,
+                )
+                if was_probe:
+                    self._half_open_successes += 1
+                    if self._half_open_successes >= self.config.half_open_success_threshold:
+                        self._state = CircuitState.CLOSED
+                        self._window.clear()
+                        logger.info(f"熔断器已关闭: {self.key}")
+                return
+
+            if rate_limited:
+                self._rate_limited_calls += 1
+                self._concurrency_limit = max(
+                    self._concurrency_limit * self.config.multiplicative_decrease,
+                    self.config.min_concurrency,
+                )
+
+            if was_probe:
+                self._open(now, retry_after or 0.0)
+                return
+
+            if self._state != CircuitState.CLOSED:
+                return
+
+            failures = sum(1 for _, ok in self._window if not ok)
+            failure_rate = failures / len(self._window)
+            if (
+                failures >= self.config.failure_threshold
+                and failure_rate >= self.config.failure_rate_threshold
+            ):
+                self._open(now, retry_after or 0.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断器状态快照"""
+        with self._lock:
+            now = self._clock()
+            self._refresh_state(now)
+            self._trim_window(now)
+            failures = sum(1 for _, ok in self._window if not ok)
+            return {
+                "state": self._state.value,
+                "window_calls": len(self._window),
+                "window_failures": failures,
+                "failure_rate": failures / max(len(self._window), 1),
+                "concurrency_limit": round(self._concurrency_limit, 2),
+                "in_flight": self._in_flight,
+                "rejected_calls": self._rejected_calls,
+                "rate_limited_calls": self._rate_limited_calls,
+                "times_opened": self._times_opened,
+                "retry_after": (
+                    max(self._open_until - now, 0.0)
+                    if self._state == CircuitState.OPEN
+                    else 0.0
+                ),
+            }
+
+
+class CircuitBreakerRegistry:
+    """按 provider/method 共享熔断器实例的注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(
+        self,
+        provider: str,
+        method: str,
+        config: Optional[CircuitBreakerConfig] = None,
+    ) -> CircuitBreaker:
+        """获取（必要时创建）熔断器，首次创建时的配置生效"""
+        key = (provider, method)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(f"{provider}:{method}", config)
+                self._breakers[key] = breaker
+            return breaker
+
+    def reset(self):
+        """清空所有熔断器"""
+        with self._lock:
+            self._breakers.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取所有熔断器状态"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.key: breaker.get_stats() for breaker in breakers}
+
+
+# 全局熔断器注册表，在同一进程内的所有执行之间共享
+circuit_breaker_registry = CircuitBreakerRegistry()
+
+
 class RetryHandler:
     """重试处理器"""
 
@@ -54,6 +354,9 @@ class RetryHandler:
         "limit exceeded",
     ]
 
+    # 错误消息中的 Retry-After 提示，如 "retry after 30"
+    _RETRY_AFTER_PATTERN = re.compile(r"retry[- _]after[:\s]*(\d+(?:\.\d+)?)", re.I)
+
     @staticmethod
     async def retry_with_backoff(
         func: Callable, config: RetryConfig, *args, **kwargs
@@ -191,6 +494,44 @@ class RetryHandler:
 
         return delay
 
+    @staticmethod
+    def _is_rate_limited(exception: Exception) -> bool:
+        """判断异常是否为限流错误"""
+        if getattr(exception, "status_code", None) == 429:
+            return True
+        error_message = str(exception).lower()
+        return any(
+            keyword in error_message for keyword in RetryHandler.RATE_LIMIT_KEYWORDS
+        )
+
+    @staticmethod
+    def _extract_retry_after(exception: Exception) -> Optional[float]:
+        """
+        从异常中提取Retry-After（秒）
+
+        依次检查 retry_after 属性、headers / response.headers 中的 Retry-After 头，
+        以及异常消息中的 "retry after N" 文本。
+        """
+        value = getattr(exception, "retry_after", None)
+        if value is None:
+            headers = getattr(exception, "headers", None)
+            if headers is None:
+                headers = getattr(getattr(exception, "response", None), "headers", None)
+            if headers is not None:
+                try:
+                    value = headers.get("Retry-After") or headers.get("retry-after")
+                except AttributeError:
+                    value = None
+        if value is None:
+            match = RetryHandler._RETRY_AFTER_PATTERN.search(str(exception))
+            if match:
+                value = match.group(1)
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            return None
+        return seconds if seconds >= 0 else None
+
     @staticmethod
     async def retry_with_circuit_breaker(
         func: Callable,
@@ -198,28 +539,104 @@ class RetryHandler:
         failure_threshold: int = 5,
         recovery_timeout: float = 60.0,
         *args,
+        provider: str = "default",
+        method: Optional[str] = None,
+        registry: Optional[CircuitBreakerRegistry] = None,
         **kwargs,
     ) -> Any:
         """
-        带熔断器的重试机制
+        带熔断器和自适应并发控制的重试机制
+
+        同一 provider/method 的所有调用共享一个熔断器：滑动窗口内失败率过高时熔断，
+        熔断期间直接抛出 CircuitOpenError 而不是继续退避重试；限流信号会按 AIMD
+        收缩并发窗口，并在计算退避时间时遵循 Retry-After。
 
         Args:
             func: 要重试的函数
             config: 重试配置
-            failure_threshold: 熔断阈值
+            failure_threshold: 熔断阈值（滑动窗口内的最少失败次数）
             recovery_timeout: 恢复超时时间
             *args: 函数参数
+            provider: 模型服务提供方标识
+            method: 调用方法标识，默认使用函数名
+            registry: 熔断器注册表，默认使用全局注册表
             **kwargs: 函数关键字参数
 
         Returns:
             函数执行结果
+
+        Raises:
+            CircuitOpenError: 熔断器处于打开状态
         """
-        # 简单的熔断器实现（可以扩展为更完整的实现）
-        circuit_breaker_key = f"{func.__name__}"
+        breaker = (registry or circuit_breaker_registry).get(
+            provider,
+            method or getattr(func, "__name__", "call"),
+            CircuitBreakerConfig(
+                failure_threshold=failure_threshold,
+                recovery_timeout=recovery_timeout,
+            ),
+        )
+        last_exception = None
+
+        for attempt in range(config.max_attempts):
+            await breaker.acquire()
+            # 默认按中性结果归还许可：调用被取消时不能泄漏并发许可或半开探测名额
+            success: Optional[bool] = None
+            retryable = False
+            rate_limited = False
+            retry_after = None
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(*args, **kwargs)
+                else:
+                    result = func(*args, **kwargs)
+                success = True
+            except Exception as e:
+                last_exception = e
+                retryable = RetryHandler._should_retry(e)
+                rate_limited = retryable and RetryHandler._is_rate_limited(e)
+                retry_after = (
+                    RetryHandler._extract_retry_after(e) if rate_limited else None
+                )
+                success = False if retryable else None
+            finally:
+                breaker.release(
+                    success,
+                    rate_limited=rate_limited,
+                    retry_after=retry_after,
+                )
+
+            if success:
+                if attempt > 0:
+                    logger.info(f"重试成功，第 {attempt + 1} 次尝试")
+                return result
+
+            if attempt == config.max_attempts - 1:
+                logger.error(f"重试失败，已达到最大尝试次数 {config.max_attempts}")
+                break
 
-        # 这里可以实现更复杂的熔断器逻辑
-        # 目前直接使用基本重试
-        return await RetryHandler.retry_with_backoff(func, config, *args, **kwargs)
+            if not retryable:
+                logger.warning(
+                    f"异常不适合重试: {type(last_exception).__name__}: {str(last_exception)}"
+                )
+                break
+
+            if breaker.state == CircuitState.OPEN:
+                logger.warning(f"熔断器已打开，停止重试: {breaker.key}")
+                break
+
+            delay = RetryHandler._calculate_delay(attempt, config, last_exception)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, config.max_delay))
+
+            logger.warning(
+                f"尝试 {attempt + 1} 失败: {type(last_exception).__name__}: "
+                f"{str(last_exception)}, {delay:.2f}秒后重试"
+            )
+
+            await asyncio.sleep(delay)
+
+        raise last_exception
 
     @staticmethod
     def create_retry_config(
@@ -251,7 +668,8 @@ class RetryHandler:
 class RetryStats:
     """重试统计"""
 
-    def __init__(self):
+    def __init__(self, registry: Optional[CircuitBreakerRegistry] = None):
+        self.registry = registry or circuit_breaker_registry
         self.total_attempts = 0
         self.total_successes = 0
         self.total_failures = 0
@@ -279,4 +697,5 @@ class RetryStats:
             "total_failures": self.total_failures,
             "success_rate": self.total_successes / max(self.total_attempts, 1),
             "retry_counts": self.retry_counts,
+            "circuit_breakers": self.registry.get_stats(),
         }
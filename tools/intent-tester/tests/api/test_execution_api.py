@@ -2286,3 +2286,33 @@ class TestStopExecutionAPI:
             f"execution_id={execution.execution_id} "
             "error_code=unexpected_execution_error"
         ]
+
+
+class TestExecutionVariableRelease:
+    """Terminal lifecycle callbacks release the in-memory variable manager."""
+
+    def test_result_callback_releases_variable_manager(
+        self, proxy_api_client, create_execution_history, assert_api_response
+    ):
+        from backend.services.variable_resolver_service import (
+            VariableManagerFactory,
+            get_variable_manager,
+        )
+
+        execution = create_execution_history(status="running", end_time=None)
+        get_variable_manager(execution.execution_id).store_variable(
+            "token", "abc", source_step_index=0
+        )
+        lifecycle_url = f"/api/executions/{execution.execution_id}/lifecycle"
+
+        assert_api_response(
+            proxy_api_client.post(
+                lifecycle_url, json={"event": "result", "status": "success"}
+            ),
+            200,
+        )
+
+        assert execution.execution_id not in VariableManagerFactory._instances
+        assert (
+            get_variable_manager(execution.execution_id).get_variable("token") == "abc"
+        )
@@ -0,0 +1,255 @@
+import asyncio
+
+import pytest
+
+from midscene_framework.retry_handler import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    CircuitState,
+    RetryConfig,
+    RetryHandler,
+    RetryStats,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.headers = {"Retry-After": str(retry_after)} if retry_after else {}
+
+
+def make_breaker(clock, **overrides):
+    config = CircuitBreakerConfig(
+        failure_threshold=3,
+        recovery_timeout=30.0,
+        window_seconds=60.0,
+        **overrides,
+    )
+    return CircuitBreaker("provider:aiQuery", config, clock=clock)
+
+
+def call(breaker, success, **kwargs):
+    assert breaker.try_acquire() is True
+    breaker.release(success, **kwargs)
+
+
+class TestCircuitBreaker:
+    def test_opens_after_failure_rate_exceeded_and_fails_fast(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+
+        call(breaker, True)
+        for _ in range(3):
+            call(breaker, False)
+
+        assert breaker.state == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError) as exc_info:
+            breaker.try_acquire()
+        assert exc_info.value.retry_after == pytest.approx(30.0)
+        assert breaker.get_stats()["rejected_calls"] == 1
+
+    def test_old_failures_slide_out_of_window(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+
+        call(breaker, False)
+        call(breaker, False)
+        clock.now += 61
+        call(breaker, False)
+
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.get_stats()["window_failures"] == 1
+
+    def test_half_open_probe_closes_or_reopens(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(3):
+            call(breaker, False)
+
+        clock.now += 30
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.try_acquire() is True
+        with pytest.raises(CircuitOpenError):
+            breaker.try_acquire()
+        breaker.release(False)
+        assert breaker.state == CircuitState.OPEN
+
+        clock.now += 30
+        call(breaker, True)
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.get_stats()["times_opened"] == 2
+
+    def test_neutral_failures_do_not_count(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        for _ in range(5):
+            call(breaker, None)
+
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.get_stats()["window_calls"] == 0
+
+    def test_rate_limit_shrinks_and_success_grows_concurrency_window(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock, initial_concurrency=8.0, failure_rate_threshold=1.0)
+
+        call(breaker, False, rate_limited=True)
+        assert breaker.get_stats()["concurrency_limit"] == 4.0
+        call(breaker, False, rate_limited=True)
+        assert breaker.get_stats()["concurrency_limit"] == 2.0
+
+        call(breaker, True)
+        assert breaker.get_stats()["concurrency_limit"] == 2.5
+
+    def test_concurrency_window_limits_in_flight_calls(self):
+        breaker = make_breaker(FakeClock(), initial_concurrency=2.0)
+
+        assert breaker.try_acquire() is True
+        assert breaker.try_acquire() is True
+        assert breaker.try_acquire() is False
+        breaker.release(True)
+        assert breaker.try_acquire() is True
+
+    def test_retry_after_extends_open_period(self):
+        clock = FakeClock()
+        breaker = make_breaker(clock)
+        call(breaker, False)
+        call(breaker, False)
+        call(breaker, False, rate_limited=True, retry_after=120.0)
+
+        clock.now += 60
+        assert breaker.state == CircuitState.OPEN
+        clock.now += 60
+        assert breaker.state == CircuitState.HALF_OPEN
+
+
+class TestRetryWithCircuitBreaker:
+    def test_open_breaker_short_circuits_concurrent_executions(self, monkeypatch):
+        registry = CircuitBreakerRegistry()
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        calls = []
+
+        async def rate_limited():
+            calls.append(1)
+            raise RateLimitError("429 Too Many Requests")
+
+        config = RetryConfig(max_attempts=5, base_delay=0.01, max_delay=0.05)
+
+        async def run():
+            with pytest.raises(RateLimitError):
+                await RetryHandler.retry_with_circuit_breaker(
+                    rate_limited, config, 3, 60.0, provider="vl", registry=registry
+                )
+            with pytest.raises(CircuitOpenError):
+                await RetryHandler.retry_with_circuit_breaker(
+                    rate_limited, config, 3, 60.0, provider="vl", registry=registry
+                )
+
+        asyncio.run(run())
+
+        assert len(calls) == 3
+        assert len(sleeps) == 2
+        stats = registry.get_stats()["vl:rate_limited"]
+        assert stats["state"] == "open"
+        assert stats["rate_limited_calls"] == 3
+
+    def test_retry_after_header_overrides_backoff(self, monkeypatch):
+        registry = CircuitBreakerRegistry()
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RateLimitError("rate limit", retry_after=20)
+            return "ok"
+
+        config = RetryConfig(max_attempts=3, base_delay=0.01, max_delay=30.0)
+        result = asyncio.run(
+            RetryHandler.retry_with_circuit_breaker(
+                flaky, config, provider="vl", method="aiString", registry=registry
+            )
+        )
+
+        assert result == "ok"
+        assert sleeps[0] >= 20
+        assert registry.get_stats()["vl:aiString"]["state"] == "closed"
+
+    def test_non_retryable_errors_do_not_trip_breaker(self):
+        registry = CircuitBreakerRegistry()
+
+        def invalid():
+            raise ValueError("bad params")
+
+        config = RetryConfig(max_attempts=3)
+        for _ in range(10):
+            with pytest.raises(ValueError):
+                asyncio.run(
+                    RetryHandler.retry_with_circuit_breaker(
+                        invalid, config, 1, provider="vl", registry=registry
+                    )
+                )
+
+        assert registry.get_stats()["vl:invalid"]["state"] == "closed"
+
+    def test_cancelled_call_returns_half_open_probe_slot(self):
+        clock = FakeClock()
+        registry = CircuitBreakerRegistry()
+        breaker = make_breaker(clock)
+        registry._breakers[("vl", "hang")] = breaker
+        for _ in range(3):
+            call(breaker, False)
+        clock.now += 31
+        assert breaker.state == CircuitState.HALF_OPEN
+
+        async def hang():
+            await asyncio.Event().wait()
+
+        async def run():
+            task = asyncio.create_task(
+                RetryHandler.retry_with_circuit_breaker(
+                    hang, RetryConfig(max_attempts=3), provider="vl", registry=registry
+                )
+            )
+            await asyncio.sleep(0)
+            assert breaker.get_stats()["in_flight"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+
+        assert breaker.get_stats()["in_flight"] == 0
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.try_acquire() is True
+
+
+def test_retry_stats_exposes_circuit_breaker_state():
+    registry = CircuitBreakerRegistry()
+    breaker = registry.get("vl", "aiQuery")
+    breaker.try_acquire()
+    breaker.release(True)
+
+    stats = RetryStats(registry).get_stats()
+
+    assert stats["circuit_breakers"]["vl:aiQuery"]["state"] == "closed"
+    assert stats["circuit_breakers"]["vl:aiQuery"]["window_calls"] == 1
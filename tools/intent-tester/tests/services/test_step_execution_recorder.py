@@ -0,0 +1,155 @@
+"""
+StepExecutionRecorder 单元测试
+测试步骤记录的批量写入、刷新屏障以及 JSON 格式的 ai_decision
+"""
+
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.models import StepExecution
+from backend.services.ai_step_executor import AIStepExecutor
+from backend.services.step_execution_recorder import (
+    StepExecutionRecorder,
+    build_step_execution_mapping,
+)
+
+
+class FakeResult:
+    def __init__(self, step_index, success=True, return_value=None):
+        self.step_index = step_index
+        self.success = success
+        self.action = "set_variable"
+        self.description = f"步骤 {step_index}"
+        self.return_value = return_value
+        self.variable_assigned = None
+        self.execution_time = 0.25
+        self.screenshot_path = None
+        self.error_message = None if success else "boom"
+
+
+class TestBuildStepExecutionMapping:
+    """测试记录映射构建"""
+
+    def test_ai_decision_is_compact_json(self):
+        result = FakeResult(0, return_value={"title": "标题", "items": [1, 2]})
+
+        mapping = build_step_execution_mapping(
+            result, "exec-json-001", {"params": {"name": "title"}}
+        )
+
+        assert " " not in mapping["ai_decision"].replace("set_variable", "")
+        assert json.loads(mapping["ai_decision"]) == {
+            "action": "set_variable",
+            "params": {"name": "title"},
+            "return_value": {"title": "标题", "items": [1, 2]},
+            "variable_assigned": None,
+        }
+        assert mapping["duration"] == 250
+        assert mapping["start_time"] < mapping["end_time"]
+
+    def test_unserializable_values_fall_back_to_string(self):
+        result = FakeResult(0, return_value=object())
+
+        mapping = build_step_execution_mapping(result, "exec-json-002", {})
+
+        assert json.loads(mapping["ai_decision"])["return_value"].startswith("<object")
+
+
+class TestStepExecutionRecorder:
+    """测试异步批量写入"""
+
+    def test_records_are_flushed_in_batches(self, app, db_session):
+        recorder = StepExecutionRecorder(app=app, batch_size=4, flush_interval=5.0)
+
+        async def run():
+            recorder.start()
+            for i in range(10):
+                await recorder.record(
+                    build_step_execution_mapping(FakeResult(i), "exec-batch-001", {})
+                )
+            await recorder.close()
+
+        asyncio.run(run())
+
+        rows = StepExecution.query.filter_by(execution_id="exec-batch-001").all()
+        assert sorted(row.step_index for row in rows) == list(range(10))
+        assert recorder.get_stats() == {
+            "recorded": 10,
+            "written": 10,
+            "failed": 0,
+            "batches": 3,
+            "pending": 0,
+        }
+
+    def test_event_loop_is_not_blocked_by_commits(self, app, db_session):
+        recorder = StepExecutionRecorder(app=app, batch_size=1)
+        ticks = []
+
+        def slow_write(app, rows):
+            time.sleep(0.2)
+            return len(rows)
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(1)
+                await asyncio.sleep(0.02)
+
+        async def run():
+            recorder.start()
+            await recorder.record({"step_index": 0})
+            await ticker()
+            await recorder.close()
+
+        with patch(
+            "backend.services.step_execution_recorder.write_step_executions",
+            side_effect=slow_write,
+        ):
+            asyncio.run(run())
+
+        assert len(ticks) == 5
+        assert recorder.get_stats()["written"] == 1
+
+    def test_failed_batches_are_counted(self, app, db_session):
+        recorder = StepExecutionRecorder(app=app)
+
+        async def run():
+            recorder.start()
+            await recorder.record({"step_index": 0})
+            await recorder.close()
+
+        asyncio.run(run())
+
+        assert recorder.get_stats()["failed"] == 1
+
+    def test_record_requires_started_recorder(self):
+        recorder = StepExecutionRecorder()
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(recorder.record({}))
+
+
+@pytest.mark.asyncio
+async def test_execute_test_case_writes_json_step_records(app, db_session):
+    """execute_test_case 结束时所有步骤记录已写入"""
+    executor = AIStepExecutor(mock_mode=True)
+    test_case = {
+        "name": "recorder",
+        "steps": [
+            {"action": "set_variable", "params": {"name": "a", "value": 1}},
+            {"action": "set_variable", "params": {"name": "b", "value": "${a}"}},
+        ],
+    }
+
+    result = await executor.execute_test_case(test_case, "exec-recorder-001")
+
+    rows = (
+        StepExecution.query.filter_by(execution_id="exec-recorder-001")
+        .order_by(StepExecution.step_index)
+        .all()
+    )
+    assert result["successful_steps"] == 2
+    assert [json.loads(row.ai_decision)["return_value"] for row in rows] == [1, "1"]
@@ -555,4 +555,87 @@ class TestConvenienceFunctions:
         cleanup_execution_variables(execution_id)
 
         # Then: 管理器被清理
-        assert execution_id not in VariableManagerFactory._instances
\ No newline at end of file
+        assert execution_id not in VariableManagerFactory._instances
+
+class TestVariableManagerFactoryEviction:
+    """测试工厂的淘汰与释放策略"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_factory(self, monkeypatch):
+        from backend.services import variable_resolver_service as service
+
+        monkeypatch.setattr(VariableManagerFactory, "_instances", service._ManagerRegistry())
+        monkeypatch.setattr(
+            VariableManagerFactory, "_evictions", {"idle": 0, "capacity": 0, "memory": 0}
+        )
+        monkeypatch.setattr(VariableManagerFactory, "_releases", 0)
+        monkeypatch.setattr(VariableManagerFactory, "_last_sweep", 0.0)
+
+    def test_idle_managers_are_evicted(self, app, db_session, monkeypatch):
+        monkeypatch.setattr(VariableManagerFactory, "idle_timeout", 60.0)
+        stale = VariableManagerFactory.get_manager("idle-1")
+        stale.last_access -= 120
+
+        VariableManagerFactory.get_manager("idle-2")
+
+        stats = VariableManagerFactory.get_factory_stats()
+        assert stats["manager_ids"] == ["idle-2"]
+        assert stats["evictions"]["idle"] == 1
+
+    def test_capacity_evicts_least_recently_used(self, app, db_session, monkeypatch):
+        monkeypatch.setattr(VariableManagerFactory, "max_managers", 2)
+        first = VariableManagerFactory.get_manager("cap-1")
+        first.last_access -= 10
+        VariableManagerFactory.get_manager("cap-2")
+        VariableManagerFactory.get_manager("cap-3")
+
+        stats = VariableManagerFactory.get_factory_stats()
+        assert sorted(stats["manager_ids"]) == ["cap-2", "cap-3"]
+        assert stats["evictions"]["capacity"] == 1
+
+    def test_memory_budget_evicts_and_keeps_variables_in_database(
+        self, app, db_session, monkeypatch
+    ):
+        big = VariableManagerFactory.get_manager("mem-1")
+        big.store_variable("payload", "x" * 20000, source_step_index=0)
+        big.last_access -= 10
+        monkeypatch.setattr(VariableManagerFactory, "max_resident_bytes", 10000)
+
+        VariableManagerFactory.get_manager("mem-2")
+
+        stats = VariableManagerFactory.get_factory_stats()
+        assert stats["manager_ids"] == ["mem-2"]
+        assert stats["evictions"]["memory"] == 1
+        assert stats["resident_bytes"] == 0
+        reloaded = VariableManagerFactory.get_manager("mem-1")
+        assert reloaded is not big
+        assert reloaded.get_variable("payload") == "x" * 20000
+
+    def test_resident_bytes_track_cached_values(self, app, db_session):
+        manager = VariableManagerFactory.get_manager("bytes-1")
+        manager.store_variable("small", "a", source_step_index=0)
+        small = VariableManagerFactory.get_factory_stats()["resident_bytes"]
+        manager.store_variable("small", "a" * 5000, source_step_index=1)
+
+        assert VariableManagerFactory.get_factory_stats()["resident_bytes"] > small + 4000
+        manager.release_cache()
+        assert VariableManagerFactory.get_factory_stats()["resident_bytes"] == 0
+
+    def test_release_keeps_database_variables(self, app, db_session):
+        manager = VariableManagerFactory.get_manager("release-1")
+        manager.store_variable("kept", 42, source_step_index=0)
+
+        assert VariableManagerFactory.release_manager("release-1") is True
+        assert VariableManagerFactory.release_manager("release-1") is False
+
+        assert "release-1" not in VariableManagerFactory._instances
+        assert VariableManagerFactory.get_factory_stats()["releases"] == 1
+        assert VariableManagerFactory.get_manager("release-1").get_variable("kept") == 42
+
+    def test_cleanup_all_removes_every_manager(self, app, db_session):
+        VariableManagerFactory.get_manager("all-1")
+        VariableManagerFactory.get_manager("all-2")
+
+        VariableManagerFactory.cleanup_all()
+
+        assert VariableManagerFactory.get_active_managers() == []
@@ -0,0 +1,180 @@
+"""
+变量模板编译器单元测试
+测试参数树编译、依赖收集、批量解析以及 500 步用例的解析开销
+"""
+
+import re
+import time
+
+import pytest
+
+from backend.services.variable_resolver_service import VariableManager
+from backend.services.variable_template import compile_params, compile_steps
+
+
+class CountingVariableManager:
+    """记录调用次数的变量管理器替身"""
+
+    def __init__(self, values):
+        self.values = values
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    def get_variable(self, name):
+        self.single_calls += 1
+        return self.values.get(name)
+
+    def get_variables(self, names):
+        self.batch_calls += 1
+        return {name: self.values[name] for name in names if name in self.values}
+
+
+def legacy_resolve(params, variable_manager):
+    """编译器引入前的逐字符串正则解析实现，作为基准对照"""
+
+    def resolve_value(value):
+        if isinstance(value, str):
+            resolved_value = value
+            for match in re.findall(r"\$\{([^}]+)\}", value):
+                var_value = variable_manager.get_variable(match)
+                if var_value is not None:
+                    resolved_value = resolved_value.replace(
+                        f"${{{match}}}", str(var_value)
+                    )
+            return resolved_value
+        elif isinstance(value, dict):
+            return {k: resolve_value(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            return [resolve_value(item) for item in value]
+        return value
+
+    return resolve_value(params)
+
+
+def make_steps(count):
+    steps = []
+    for i in range(count):
+        if i % 5 == 0:
+            params = {
+                "text": "${user} searches ${keyword} #" + str(i),
+                "locate": "搜索框",
+                "options": {"timeout": 5000, "retries": [1, 2, "${retry}"]},
+            }
+        else:
+            params = {
+                "prompt": f"点击第 {i} 个按钮",
+                "options": {"timeout": 5000, "tags": ["a", "b", "c"]},
+            }
+        steps.append({"action": "ai_tap", "params": params})
+    return steps
+
+
+class TestCompileParams:
+    """测试参数编译"""
+
+    def test_static_params_are_returned_without_copy(self):
+        params = {"url": "https://static.com", "timeout": 5000, "tags": ["x"]}
+        compiled = compile_params(params)
+        manager = CountingVariableManager({})
+
+        assert compiled.is_static
+        assert compiled.dependencies == frozenset()
+        assert compiled.resolve(manager) is params
+        assert manager.batch_calls == 0
+
+    def test_records_dependencies_and_resolves_in_one_batch(self):
+        params = {
+            "text": "${first} ${second}!",
+            "nested": {"items": ["${first}", "static"], "flag": True},
+        }
+        compiled = compile_params(params)
+        manager = CountingVariableManager({"first": "Hello", "second": 42})
+
+        resolved = compiled.resolve(manager)
+
+        assert compiled.dependencies == frozenset({"first", "second"})
+        assert resolved == {
+            "text": "Hello 42!",
+            "nested": {"items": ["Hello", "static"], "flag": True},
+        }
+        assert list(resolved.keys()) == ["text", "nested"]
+        assert manager.batch_calls == 1
+        assert manager.single_calls == 0
+
+    def test_static_subtrees_are_shared(self):
+        static_options = {"timeout": 5000, "tags": ["a", "b"]}
+        params = {"text": "${name}", "options": static_options}
+
+        resolved = compile_params(params).resolve(CountingVariableManager({"name": "x"}))
+
+        assert resolved["options"] is static_options
+
+    def test_missing_variable_keeps_original_reference(self):
+        compiled = compile_params({"url": "${missing}/path", "name": "${known}"})
+
+        resolved = compiled.resolve(CountingVariableManager({"known": "ok"}))
+
+        assert resolved == {"url": "${missing}/path", "name": "ok"}
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"text": "${a}${a}-${b}"},
+            {"text": "prefix ${a} suffix", "list": [["${b}"], {"deep": "${c}"}]},
+            {"text": "${unclosed", "other": "$ {a}"},
+            {"value": None, "count": 3, "text": "${c}"},
+        ],
+    )
+    def test_matches_legacy_resolution(self, params):
+        values = {"a": "A", "b": 2, "c": {"k": "v"}}
+
+        compiled_result = compile_params(params).resolve(CountingVariableManager(values))
+
+        assert compiled_result == legacy_resolve(params, CountingVariableManager(values))
+
+    def test_compile_steps_handles_missing_params(self):
+        compiled = compile_steps([{"action": "goto"}, {"params": {"url": "${u}"}}])
+
+        assert compiled[0].is_static
+        assert compiled[1].dependencies == frozenset({"u"})
+
+
+class TestVariableManagerBatchFetch:
+    """测试 VariableManager.get_variables 批量获取"""
+
+    def test_get_variables_combines_cache_and_database(self, app, db_session):
+        manager = VariableManager("test-template-batch-001")
+        manager.store_variable("cached", "c", source_step_index=0)
+        manager.store_variable("stored", {"k": 1}, source_step_index=1)
+        manager._cache.pop("stored")
+
+        values = manager.get_variables(["cached", "stored", "missing", "cached"])
+
+        assert values == {"cached": "c", "stored": {"k": 1}}
+        assert "stored" in manager._cache
+
+
+@pytest.mark.slow
+def test_benchmark_500_step_resolution_overhead():
+    """对比 500 步用例下逐步正则解析与预编译模板的单步开销"""
+    steps = make_steps(500)
+    values = {"user": "alice", "keyword": "AI4SE", "retry": 3}
+    rounds = 20
+
+    legacy_manager = CountingVariableManager(values)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        legacy_results = [legacy_resolve(step["params"], legacy_manager) for step in steps]
+    legacy_per_step = (time.perf_counter() - started) / (rounds * len(steps))
+
+    compiled_manager = CountingVariableManager(values)
+    compiled_steps = compile_steps(steps)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        compiled_results = [compiled.resolve(compiled_manager) for compiled in compiled_steps]
+    compiled_per_step = (time.perf_counter() - started) / (rounds * len(steps))
+
+    assert compiled_results == legacy_results
+    assert compiled_manager.batch_calls // rounds == 100
+    assert legacy_manager.single_calls // rounds == 300
+    assert compiled_per_step < legacy_per_step
@@ -0,0 +1,310 @@
+"""
+日志配置单元测试
+测试异步日志管道、JSON 结构化输出、限流采样、值截断以及异步开关下的请求延迟对比
+"""
+
+import json
+import logging
+import queue
+import time
+
+import pytest
+
+from backend.utils.logging_config import (
+    AsyncQueueHandler,
+    JsonFormatter,
+    LoggingConfig,
+    RateLimitFilter,
+    TruncatedValue,
+    truncate_log_value,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_record(name="test.logger", level=logging.INFO, msg="hello", args=None):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def read_json_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.fixture
+def restore_logging():
+    """测试结束后恢复日志器状态"""
+    root = logging.getLogger()
+    saved_handlers = root.handlers[:]
+    saved_level = root.level
+    saved_propagate = logging.getLogger("performance").propagate
+    configs = []
+
+    yield configs
+
+    for config in configs:
+        config.shutdown()
+    root.handlers[:] = saved_handlers
+    root.setLevel(saved_level)
+    logging.getLogger("performance").propagate = saved_propagate
+
+
+class TestTruncation:
+    """测试日志值截断"""
+
+    def test_short_values_are_unchanged(self):
+        assert truncate_log_value({"a": 1}) == "{'a': 1}"
+
+    def test_long_values_are_truncated_with_remaining_count(self):
+        assert truncate_log_value("x" * 300, max_length=10) == "x" * 10 + "...(+290字符)"
+
+    def test_truncated_value_is_lazy(self):
+        class Expensive:
+            calls = 0
+
+            def __str__(self):
+                Expensive.calls += 1
+                return "y" * 1000
+
+        logger = logging.getLogger("test.logging.lazy")
+        logger.setLevel(logging.WARNING)
+        value = Expensive()
+
+        logger.info("值: %s", TruncatedValue(value))
+        assert Expensive.calls == 0
+
+        assert len(str(TruncatedValue(value, max_length=20))) < 40
+        assert Expensive.calls == 1
+
+
+class TestJsonFormatter:
+    """测试 JSON 结构化格式"""
+
+    def test_record_fields_and_extras(self):
+        record = make_record(msg="变量 %s", args=("a",))
+        record.request_id = "req-1"
+        record.suppressed = 3
+
+        payload = json.loads(JsonFormatter().format(record))
+
+        assert payload["message"] == "变量 a"
+        assert payload["level"] == "INFO"
+        assert payload["logger"] == "test.logger"
+        assert payload["request_id"] == "req-1"
+        assert payload["suppressed"] == 3
+
+    def test_message_is_truncated_and_exceptions_included(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            import sys
+
+            record = logging.LogRecord(
+                "test", logging.ERROR, __file__, 1, "z" * 50, None, sys.exc_info()
+            )
+
+        payload = json.loads(JsonFormatter(max_message_length=10).format(record))
+
+        assert payload["message"].startswith("z" * 10 + "...")
+        assert "ValueError: boom" in payload["exc_info"]
+
+
+class TestRateLimitFilter:
+    """测试按日志器限流与采样"""
+
+    def test_burst_then_sampling_then_suppressed_count(self):
+        clock = FakeClock()
+        limiter = RateLimitFilter(rate=1.0, burst=2, sample_every=3, clock=clock)
+
+        results = [limiter.filter(make_record()) for _ in range(6)]
+
+        # 2 个令牌，之后每 3 条超限记录放行 1 条
+        assert results == [True, True, False, False, True, False]
+        assert limiter.get_stats()["dropped"] == 3
+
+        clock.now = 1.0
+        record = make_record()
+        assert limiter.filter(record)
+        assert record.suppressed == 1
+
+    def test_buckets_are_per_logger(self):
+        limiter = RateLimitFilter(rate=1.0, burst=1, sample_every=0, clock=FakeClock())
+
+        assert limiter.filter(make_record(name="a"))
+        assert not limiter.filter(make_record(name="a"))
+        assert limiter.filter(make_record(name="b"))
+        assert limiter.get_stats()["dropped_by_logger"] == {"a": 1}
+
+    def test_record_seen_by_several_handlers_uses_one_token(self):
+        limiter = RateLimitFilter(rate=1.0, burst=2, sample_every=0, clock=FakeClock())
+        records = [make_record() for _ in range(3)]
+
+        results = [[limiter.filter(record) for _ in range(3)] for record in records]
+
+        assert results == [[True] * 3, [True] * 3, [False] * 3]
+        assert limiter.get_stats()["dropped"] == 1
+
+    def test_warnings_are_never_limited(self):
+        limiter = RateLimitFilter(rate=1.0, burst=1, sample_every=0, clock=FakeClock())
+
+        assert all(
+            limiter.filter(make_record(level=logging.WARNING)) for _ in range(10)
+        )
+
+    def test_invalid_settings_are_rejected(self):
+        with pytest.raises(ValueError):
+            RateLimitFilter(rate=0)
+
+
+class TestAsyncQueueHandler:
+    """测试入队处理器"""
+
+    def test_full_queue_drops_without_blocking(self):
+        handler = AsyncQueueHandler(queue.Queue(maxsize=1))
+
+        handler.handle(make_record())
+        started = time.perf_counter()
+        handler.handle(make_record())
+
+        assert handler.dropped == 1
+        assert time.perf_counter() - started < 0.5
+
+
+class TestAsyncLoggingPipeline:
+    """测试 LoggingConfig 异步管道"""
+
+    def test_records_are_written_as_json_by_listener(self, tmp_path, restore_logging):
+        config = LoggingConfig(log_dir=tmp_path)
+        restore_logging.append(config)
+        config.configure_logging(level=logging.INFO, async_logging=True)
+
+        logging.getLogger("backend.api.test").info("API调用: %s", "GET /x")
+        logging.getLogger("backend.services.test").info("服务日志")
+        config.shutdown()
+
+        app_lines = read_json_lines(next(tmp_path.glob("app_*.log")))
+        api_lines = read_json_lines(next((tmp_path / "api").glob("api_*.log")))
+        messages = [line["message"] for line in app_lines]
+
+        assert "API调用: GET /x" in messages
+        assert "服务日志" in messages
+        assert [line["message"] for line in api_lines] == ["API调用: GET /x"]
+        assert app_lines[-1]["request_id"] == "no-request"
+
+    def test_request_context_is_captured_in_caller_thread(
+        self, app, tmp_path, restore_logging
+    ):
+        config = LoggingConfig(log_dir=tmp_path)
+        restore_logging.append(config)
+        config.configure_logging(level=logging.INFO, async_logging=True)
+
+        with app.test_request_context("/api/executions", method="POST"):
+            logging.getLogger("backend.api.test").info("请求内日志")
+        config.shutdown()
+
+        line = read_json_lines(next((tmp_path / "api").glob("api_*.log")))[-1]
+        assert (line["method"], line["path"]) == ("POST", "/api/executions")
+
+    def test_rate_limited_records_are_reported(self, tmp_path, restore_logging):
+        config = LoggingConfig(log_dir=tmp_path)
+        restore_logging.append(config)
+        config.configure_logging(
+            level=logging.DEBUG,
+            async_logging=True,
+            rate_limit=RateLimitFilter(rate=0.001, burst=5, sample_every=0),
+        )
+
+        logger = logging.getLogger("backend.services.noisy")
+        for i in range(50):
+            logger.debug("高频日志 %s", i)
+        logger.warning("告警日志")
+        stats = config.get_stats()
+        config.shutdown()
+
+        messages = [
+            line["message"] for line in read_json_lines(next(tmp_path.glob("app_*.log")))
+        ]
+        assert [m for m in messages if m.startswith("高频日志")] == [
+            f"高频日志 {i}" for i in range(5)
+        ]
+        assert "告警日志" in messages
+        assert stats["rate_limited"]["dropped_by_logger"] == {
+            "backend.services.noisy": 45
+        }
+
+    def test_shared_filter_limits_propagated_records_once(
+        self, tmp_path, restore_logging
+    ):
+        config = LoggingConfig(log_dir=tmp_path)
+        restore_logging.append(config)
+        config.configure_logging(
+            level=logging.INFO,
+            async_logging=False,
+            rate_limit=RateLimitFilter(rate=0.001, burst=5, sample_every=0),
+        )
+
+        logger = logging.getLogger("backend.api.quota")
+        for i in range(5):
+            logger.info("API调用 %s", i)
+        stats = config.get_stats()
+        config.shutdown()
+
+        api_lines = read_json_lines(next((tmp_path / "api").glob("api_*.log")))
+        app_lines = read_json_lines(next(tmp_path.glob("app_*.log")))
+        expected = [f"API调用 {i}" for i in range(5)]
+        assert [line["message"] for line in api_lines] == expected
+        assert [
+            line["message"] for line in app_lines if line["logger"] == logger.name
+        ] == expected
+        assert stats["rate_limited"]["dropped"] == 0
+
+    def test_reconfigure_does_not_duplicate_handlers(self, tmp_path, restore_logging):
+        config = LoggingConfig(log_dir=tmp_path)
+        restore_logging.append(config)
+
+        config.configure_logging(async_logging=True)
+        config.configure_logging(async_logging=True)
+
+        assert len(logging.getLogger().handlers) == 1
+        assert len(logging.getLogger("backend.api").handlers) == 1
+        assert config.get_stats()["async"] is True
+
+
+@pytest.mark.slow
+def test_benchmark_request_latency_async_vs_sync_logging(
+    api_client, tmp_path, restore_logging
+):
+    """对比同步与异步日志管道下的 API 请求延迟"""
+    requests_per_mode = 300
+
+    def measure(async_logging):
+        config = LoggingConfig(log_dir=tmp_path / ("async" if async_logging else "sync"))
+        restore_logging.append(config)
+        config.configure_logging(level=logging.INFO, async_logging=async_logging)
+        # 控制台输出不计入对比
+        for handler in logging.getLogger().handlers + [
+            h for listener in config._listeners for h in listener.handlers
+        ]:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.CRITICAL + 1)
+
+        latencies = []
+        for _ in range(requests_per_mode):
+            started = time.perf_counter()
+            response = api_client.get("/api/executions")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        config.shutdown()
+        return sum(latencies) / len(latencies)
+
+    # 预热
+    measure(async_logging=False)
+    sync_mean = measure(async_logging=False)
+    async_mean = measure(async_logging=True)
+
+    assert async_mean < sync_mean * 1.5
@@ -512,7 +512,7 @@ def extract_mermaid_code_blocks(markdown: str) -> list[str]:
         stripped = line.lstrip()
         if not in_fence and (stripped.startswith("```") or stripped.startswith("~~~")):
             fence_marker = stripped[:3]
-            language = stripped[3:].strip().split(maxsplit=1)[0].lower()
+            language = next(iter(stripped[3:].split()), "").lower()
             in_fence = True
             is_mermaid = language == "mermaid"
             current_lines = []
@@ -555,7 +555,7 @@ def extract_structured_visual_blocks(markdown: str) -> list[dict[str, Any]]:
         stripped = line.lstrip()
         if not in_fence and (stripped.startswith("```") or stripped.startswith("~~~")):
             fence_marker = stripped[:3]
-            language = stripped[3:].strip().split(maxsplit=1)[0].lower()
+            language = next(iter(stripped[3:].split()), "").lower()
             in_fence = True
             is_structured_visual = language == "ai4se-visual"
             current_lines = []
@@ -592,7 +592,7 @@ def extract_structured_visual_block_sources(markdown: str) -> list[str]:
         stripped = line.lstrip()
         if not in_fence and (stripped.startswith("```") or stripped.startswith("~~~")):
             fence_marker = stripped[:3]
-            language = stripped[3:].strip().split(maxsplit=1)[0].lower()
+            language = next(iter(stripped[3:].split()), "").lower()
             in_fence = True
             is_structured_visual = language == "ai4se-visual"
             current_lines = []
@@ -1,7 +1,12 @@
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass
 import json
+import os
+import queue
 import re
+import sys
+import threading
+import time
 from typing import Any
 
 from pydantic import ValidationError
@@ -12,43 +17,46 @@ from agent_contracts import (
     build_stage_action_contract_prompt,
     validate_agent_turn,
 )
-from artifact_data_renderers import (
-    get_artifact_data_renderer_stage_keys,
-    render_agent_turn_from_artifact_data,
-    render_complete_artifact_data,
-    render_partial_artifact_data_markdown,
-)
 from artifact_data_instruction_registry import (
     ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTIONS,
     DOCUMENT_INFO_RUNTIME_IDENTITY_INSTRUCTION,
 )
-from llm_client import LlmClientError, stream_chat_completion_content
+from incremental_validation import IncrementalTurnValidator
+from llm_client import (
+    LlmClientError,
+    provider_error_types,
+    stream_chat_completion_content,
+)
+from provider_admission import ProviderBusyError, ProviderLimits
+from provider_routing import ProviderTarget, get_provider_router, stream_with_failover
 from safe_error_diagnostics import (
     SAFE_STREAM_TERMINATION_VALIDATORS,
     project_safe_schema_field_path,
 )
 from sse_schemas import AgentRetrySignal, AgentTurnDeltaOutput
+from token_counting import get_token_counter
 from workflow_manifest import format_visual_protocol_instruction
 
-try:
-    from pydantic_ai.exceptions import (
-        ModelAPIError,
-        ModelHTTPError,
-        UnexpectedModelBehavior,
+
+def _loaded_pydantic_ai_errors(*names: str) -> tuple[type[Exception], ...]:
+    # PydanticAI is imported when an agent is built; its errors cannot have
+    # been raised before that, so matching them never needs to import it.
+    exceptions = sys.modules.get("pydantic_ai.exceptions")
+    if exceptions is None:
+        return ()
+    return tuple(
+        error_type
+        for error_type in (getattr(exceptions, name, None) for name in names)
+        if error_type is not None
     )
-except ImportError:
-    ModelAPIError = None
-    ModelHTTPError = None
-    UnexpectedModelBehavior = None
 
-PYDANTIC_AI_SCHEMA_ERRORS = tuple(
-    error_type for error_type in (UnexpectedModelBehavior,) if error_type is not None
-)
-PYDANTIC_AI_MODEL_ERRORS = tuple(
-    error_type
-    for error_type in (ModelHTTPError, ModelAPIError)
-    if error_type is not None
-)
+
+def pydantic_ai_schema_errors() -> tuple[type[Exception], ...]:
+    return _loaded_pydantic_ai_errors("UnexpectedModelBehavior")
+
+
+def pydantic_ai_model_errors() -> tuple[type[Exception], ...]:
+    return _loaded_pydantic_ai_errors("ModelHTTPError", "ModelAPIError")
 
 
 class AgentRuntimeDependencyError(RuntimeError):
@@ -69,12 +77,50 @@ class AgentTurnValidationDeps:
     current_stage_id: str
 
 
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_seconds(name: str) -> float | None:
+    try:
+        seconds = float(os.environ.get(name, "").strip())
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+@dataclass(frozen=True)
+class RawJsonRetryPolicy:
+    """Opt-in speculative handling of raw JSON streaming attempts.
+
+    ``early_abort`` cancels an attempt as soon as incremental validation shows
+    it cannot pass, instead of waiting for the provider to finish it.
+    ``hedge_after_seconds`` starts a second attempt with the same prompt when
+    the running one has not finished by then; the first to validate is kept.
+    """
+
+    early_abort: bool = False
+    hedge_after_seconds: float | None = None
+
+    @classmethod
+    def from_env(cls) -> "RawJsonRetryPolicy":
+        return cls(
+            early_abort=_env_flag("RAW_JSON_EARLY_ABORT"),
+            hedge_after_seconds=_env_seconds("RAW_JSON_HEDGE_AFTER_SECONDS"),
+        )
+
+
 @dataclass(frozen=True)
 class RawStreamingConfig:
     api_key: str
     base_url: str | None
     model_name: str
     system_prompt: str
+    retry_policy: RawJsonRetryPolicy = RawJsonRetryPolicy()
+    limits: ProviderLimits | None = None
+    # Ranked configs of the model class; when set, each attempt fails over
+    # along them instead of calling the single target above.
+    targets: tuple[ProviderTarget, ...] = ()
 
 
 @dataclass(frozen=True)
@@ -447,6 +493,10 @@ def get_artifact_data_ready_stages() -> set[tuple[str, str]]:
 
 
 def supports_artifact_data_rendering(workflow_id: str, current_stage_id: str) -> bool:
+    # The renderer module defines every artifact_data model; it is loaded on
+    # the first structured turn instead of when the runtime is imported.
+    from artifact_data_renderers import get_artifact_data_renderer_stage_keys
+
     stage_key = (workflow_id, current_stage_id)
     return (
         stage_key in ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTIONS
@@ -623,6 +673,299 @@ def register_contract_output_validator(agent: Any) -> None:
             ) from None
 
 
+_RAW_JSON_ATTEMPT_ERRORS = (json.JSONDecodeError, ValidationError, ValueError)
+
+
+def _is_retryable_raw_json_failure(error: Exception) -> bool:
+    if isinstance(error, RawJsonStreamTerminationError):
+        return error.reason == "length"
+    return True
+
+
+def _close_stream(stream: Iterator[str]) -> None:
+    # Closing the provider generator releases its HTTP response right away.
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+class _RawJsonAttempt:
+    """Streamed text, projection state and provider signals of one attempt."""
+
+    def __init__(
+        self,
+        number: int,
+        prompt: str,
+        *,
+        workflow_id: str,
+        current_stage_id: str,
+        validator: IncrementalTurnValidator | None,
+    ) -> None:
+        self.number = number
+        self.prompt = prompt
+        self.workflow_id = workflow_id
+        self.current_stage_id = current_stage_id
+        self.accumulated = ""
+        self.latest_chat = ""
+        self.latest_markdown = ""
+        # Whether any partial delta of this attempt reached the consumer.
+        self.shown = False
+        self.cancelled = False
+        self.early_error: Exception | None = None
+        self.token_usage = 0
+        self.finish_reason: str | None = None
+        self.started_at = time.monotonic()
+        self._validator = validator
+
+    @property
+    def cut_short(self) -> bool:
+        return self.cancelled or self.early_error is not None
+
+    @property
+    def streamed_to_end(self) -> bool:
+        return self.finish_reason is not None and not self.cut_short
+
+    def record_usage(self, total_tokens: int) -> None:
+        self.token_usage = total_tokens
+
+    def record_finish_reason(self, reason: str) -> None:
+        self.finish_reason = reason
+
+    def feed(self, text_chunk: str) -> AgentTurnDeltaOutput | None:
+        """Append a chunk; return a partial delta worth emitting, if any."""
+        self.accumulated += text_chunk
+        if self._validator is not None:
+            self.early_error = self._validator.check(self.accumulated, text_chunk)
+            if self.early_error is not None:
+                return None
+        try:
+            delta = build_partial_agent_delta(
+                self.accumulated,
+                workflow_id=self.workflow_id,
+                current_stage_id=self.current_stage_id,
+            )
+        except ValueError:
+            # Partial projections are best effort. The complete payload is
+            # validated by finish, where renderer failures trigger a safe retry.
+            delta = None
+        if delta is None:
+            return None
+        next_chat = delta.chat or self.latest_chat
+        next_markdown = (
+            delta.artifact_update.markdown
+            if delta.artifact_update and delta.artifact_update.markdown
+            else self.latest_markdown
+        )
+        if not should_emit_partial_delta(
+            latest_chat=self.latest_chat,
+            next_chat=next_chat,
+            latest_markdown=self.latest_markdown,
+            next_markdown=next_markdown,
+        ):
+            return None
+        self.latest_chat = next_chat
+        self.latest_markdown = next_markdown
+        return delta
+
+    def current_delta(self) -> AgentTurnDeltaOutput | None:
+        """The latest projection, for an attempt that takes over the stream."""
+        if not self.latest_chat and not self.latest_markdown:
+            return None
+        return AgentTurnDeltaOutput(
+            chat=self.latest_chat or None,
+            artifact_update=(
+                {"type": "replace", "markdown": self.latest_markdown}
+                if self.latest_markdown
+                else None
+            ),
+        )
+
+    def finish(self) -> AgentTurnOutput:
+        """Validate the finished attempt; raise what made it fail."""
+        if self.early_error is not None:
+            raise self.early_error
+        if self.finish_reason != "stop":
+            raise RawJsonStreamTerminationError(self.finish_reason or "unknown")
+        final_output = parse_agent_turn_output_text(
+            self.accumulated,
+            workflow_id=self.workflow_id,
+            current_stage_id=self.current_stage_id,
+        )
+        return validate_agent_turn(
+            final_output,
+            workflow_id=self.workflow_id,
+            current_stage_id=self.current_stage_id,
+        )
+
+
+class _RawJsonTurn:
+    """Request settings shared by every raw JSON attempt of one turn."""
+
+    def __init__(
+        self,
+        config: RawStreamingConfig,
+        prompt: str,
+        *,
+        workflow_id: str,
+        current_stage_id: str,
+        on_queue_wait: Callable[[int], None] | None = None,
+        on_route: Callable[[ProviderTarget, int], None] | None = None,
+    ) -> None:
+        self.config = config
+        self.prompt = prompt
+        self.on_queue_wait = on_queue_wait
+        self.on_route = on_route
+        self.targets = config.targets
+        # Hedged attempts route from their worker threads.
+        self._targets_lock = threading.Lock()
+        self.workflow_id = workflow_id
+        self.current_stage_id = current_stage_id
+        self.system_content = (
+            config.system_prompt
+            + build_structured_output_instruction(workflow_id, current_stage_id)
+        )
+        model_settings = build_model_settings(config.model_name)
+        self.extra_body = model_settings.get("extra_body") if model_settings else None
+        self.capability = resolve_structured_output_capability(config.model_name)
+
+    def new_attempt(self, number: int, attempt_prompt: str) -> _RawJsonAttempt:
+        return _RawJsonAttempt(
+            number,
+            attempt_prompt,
+            workflow_id=self.workflow_id,
+            current_stage_id=self.current_stage_id,
+            validator=(
+                IncrementalTurnValidator(
+                    workflow_id=self.workflow_id,
+                    current_stage_id=self.current_stage_id,
+                )
+                if self.config.retry_policy.early_abort
+                else None
+            ),
+        )
+
+    def open_stream(self, attempt: _RawJsonAttempt) -> Iterator[str]:
+        with self._targets_lock:
+            targets = self.targets
+        if not targets:
+            return stream_chat_completion_content(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                model=self.config.model_name,
+                messages=self._messages(attempt),
+                temperature=0,
+                response_format=self.capability.response_format,
+                extra_body=self.extra_body,
+                max_tokens=self.capability.max_output_tokens,
+                on_usage=attempt.record_usage,
+                on_finish_reason=attempt.record_finish_reason,
+                limits=self.config.limits,
+                on_queue_wait=self.on_queue_wait,
+            )
+        return stream_with_failover(
+            targets,
+            lambda target: self._open_target(attempt, target),
+            router=get_provider_router(),
+            on_route=self._route,
+        )
+
+    def _open_target(
+        self,
+        attempt: _RawJsonAttempt,
+        target: ProviderTarget,
+    ) -> Iterator[str]:
+        capability = resolve_structured_output_capability(target.model_name)
+        model_settings = build_model_settings(target.model_name)
+        return stream_chat_completion_content(
+            api_key=target.api_key,
+            base_url=target.base_url,
+            model=target.model_name,
+            messages=self._messages(attempt),
+            temperature=0,
+            response_format=capability.response_format,
+            extra_body=model_settings.get("extra_body") if model_settings else None,
+            max_tokens=capability.max_output_tokens,
+            on_usage=attempt.record_usage,
+            on_finish_reason=attempt.record_finish_reason,
+            limits=target.limits,
+            on_queue_wait=self.on_queue_wait,
+        )
+
+    def _route(self, target: ProviderTarget, first_token_ms: int) -> None:
+        # Later attempts of the turn start on the target that answered.
+        with self._targets_lock:
+            self.targets = (target,) + tuple(t for t in self.targets if t != target)
+        if self.on_route is not None:
+            self.on_route(target, first_token_ms)
+
+    def _messages(self, attempt: _RawJsonAttempt) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system_content},
+            {"role": "user", "content": attempt.prompt},
+        ]
+
+    def retry_prompt(self, error: Exception) -> str:
+        return build_raw_json_retry_prompt(
+            self.prompt,
+            error,
+            workflow_id=self.workflow_id,
+            current_stage_id=self.current_stage_id,
+        )
+
+    def estimate_tokens(self, attempt: _RawJsonAttempt) -> int:
+        """Local count of what an attempt without reported usage consumed."""
+        counter = get_token_counter(self.config.model_name)
+        return (
+            counter.count(self.system_content)
+            + counter.count(attempt.prompt)
+            + counter.count(attempt.accumulated)
+        )
+
+
+class _AttemptStreamWorker:
+    """Drains one attempt's provider stream into a shared queue on a thread.
+
+    Events are ``(attempt, chunk)`` for text, ``(attempt, error)`` for a
+    provider failure and ``(attempt, None)`` once the stream has ended.
+    Cancellation takes effect at the next chunk the provider sends.
+    """
+
+    def __init__(
+        self,
+        attempt: _RawJsonAttempt,
+        stream: Iterator[str],
+        events: queue.Queue,
+    ) -> None:
+        self.attempt = attempt
+        self._stream = stream
+        self._events = events
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"raw-json-attempt-{attempt.number}",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self.attempt.cancelled = True
+        self._cancelled.set()
+
+    def _run(self) -> None:
+        try:
+            for text_chunk in self._stream:
+                if self._cancelled.is_set():
+                    break
+                self._events.put((self.attempt, text_chunk))
+        except (LlmClientError, ProviderBusyError, *provider_error_types()) as exc:
+            self._events.put((self.attempt, exc))
+        finally:
+            _close_stream(self._stream)
+            self._events.put((self.attempt, None))
+
+
 class PydanticAgentRuntime:
     def __init__(
         self,
@@ -632,6 +975,23 @@ class PydanticAgentRuntime:
         self.agent = agent
         self.raw_streaming_config = raw_streaming_config
         self.last_token_usage: int | None = None
+        # Tokens of attempts whose output was thrown away: failed, aborted
+        # early or lost a hedge race.
+        self.last_discarded_tokens = 0
+        self.last_early_aborts = 0
+        # Generation time early aborts saved, measured against the slowest
+        # attempt of the turn that streamed to its end.
+        self.last_early_abort_saved_ms = 0
+        self.last_hedged_attempts = 0
+        # Time attempts spent waiting for provider admission.
+        self.last_queue_wait_ms = 0
+        self._attempt_report_lock = threading.Lock()
+        # The routed target that first answered the turn, and its time to
+        # first token; only set when the turn is routed across targets.
+        self.last_provider_target: ProviderTarget | None = None
+        self.last_first_token_ms = 0
+        self._aborted_attempt_seconds: list[float] = []
+        self._full_attempt_seconds = 0.0
 
     @staticmethod
     def _coerce_output(output: Any) -> AgentTurnOutput:
@@ -662,9 +1022,9 @@ class PydanticAgentRuntime:
                     current_stage_id=current_stage_id,
                 ),
             )
-        except PYDANTIC_AI_SCHEMA_ERRORS as exc:
+        except pydantic_ai_schema_errors() as exc:
             raise AgentRuntimeSchemaError(str(exc)) from exc
-        except PYDANTIC_AI_MODEL_ERRORS as exc:
+        except pydantic_ai_model_errors() as exc:
             raise AgentRuntimeModelError(str(exc)) from exc
 
         output = result.output
@@ -730,9 +1090,9 @@ class PydanticAgentRuntime:
             if final_output is None and hasattr(result, "get_output"):
                 final_output = self._coerce_output(result.get_output())
                 yield final_output
-        except PYDANTIC_AI_SCHEMA_ERRORS as exc:
+        except pydantic_ai_schema_errors() as exc:
             raise AgentRuntimeSchemaError(str(exc)) from exc
-        except PYDANTIC_AI_MODEL_ERRORS as exc:
+        except pydantic_ai_model_errors() as exc:
             raise AgentRuntimeModelError(str(exc)) from exc
 
         if final_output is None:
@@ -751,147 +1111,105 @@ class PydanticAgentRuntime:
         current_stage_id: str,
     ) -> Iterator[AgentRetrySignal | AgentTurnDeltaOutput | AgentTurnOutput]:
         assert self.raw_streaming_config is not None
-        config = self.raw_streaming_config
         self.last_token_usage = None
-        extra_body = None
-        model_settings = build_model_settings(config.model_name)
-        if model_settings:
-            extra_body = model_settings.get("extra_body")
-        structured_output_capability = resolve_structured_output_capability(
-            config.model_name
+        self.last_discarded_tokens = 0
+        self.last_early_aborts = 0
+        self.last_early_abort_saved_ms = 0
+        self.last_hedged_attempts = 0
+        self.last_queue_wait_ms = 0
+        self.last_provider_target = None
+        self.last_first_token_ms = 0
+        self._aborted_attempt_seconds = []
+        self._full_attempt_seconds = 0.0
+        turn = _RawJsonTurn(
+            self.raw_streaming_config,
+            prompt,
+            workflow_id=workflow_id,
+            current_stage_id=current_stage_id,
+            on_queue_wait=self._record_queue_wait,
+            on_route=self._record_route,
         )
+        if self.raw_streaming_config.retry_policy.hedge_after_seconds is None:
+            yield from self._stream_serial_attempts(turn)
+        else:
+            yield from self._stream_hedged_attempts(turn)
 
-        attempt_prompt = prompt
-        for attempt_index in range(RAW_JSON_STREAMING_MAX_ATTEMPTS):
-            if attempt_index > 0:
-                yield AgentRetrySignal(attemptIndex=attempt_index + 1)
-            accumulated = ""
-            latest_chat = ""
-            latest_markdown = ""
-            emitted_any_delta = False
-            attempt_token_usage = 0
-            finish_reason: str | None = None
-
-            def record_attempt_usage(total_tokens: int) -> None:
-                nonlocal attempt_token_usage
-                attempt_token_usage = total_tokens
-
-            def record_finish_reason(reason: str) -> None:
-                nonlocal finish_reason
-                finish_reason = reason
-
-            for text_chunk in stream_chat_completion_content(
-                api_key=config.api_key,
-                base_url=config.base_url,
-                model=config.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            config.system_prompt
-                            + build_structured_output_instruction(
-                                workflow_id,
-                                current_stage_id,
-                            )
-                        ),
-                    },
-                    {"role": "user", "content": attempt_prompt},
-                ],
-                temperature=0,
-                response_format=structured_output_capability.response_format,
-                extra_body=extra_body,
-                max_tokens=structured_output_capability.max_output_tokens,
-                on_usage=record_attempt_usage,
-                on_finish_reason=record_finish_reason,
-            ):
-                accumulated += text_chunk
-                try:
-                    delta = build_partial_agent_delta(
-                        accumulated,
-                        workflow_id=workflow_id,
-                        current_stage_id=current_stage_id,
-                    )
-                except ValueError:
-                    # Partial projections are best effort. The complete payload is
-                    # validated below, where renderer failures trigger a safe retry.
-                    delta = None
-                if delta is None:
-                    continue
-                next_chat = delta.chat or latest_chat
-                next_markdown = (
-                    delta.artifact_update.markdown
-                    if delta.artifact_update and delta.artifact_update.markdown
-                    else latest_markdown
-                )
-                if not should_emit_partial_delta(
-                    latest_chat=latest_chat,
-                    next_chat=next_chat,
-                    latest_markdown=latest_markdown,
-                    next_markdown=next_markdown,
-                ):
-                    continue
-                latest_chat = next_chat
-                latest_markdown = next_markdown
-                emitted_any_delta = True
-                yield delta
-
-            if attempt_token_usage:
-                self.last_token_usage = (
-                    self.last_token_usage or 0
-                ) + attempt_token_usage
-
-            if finish_reason != "stop":
-                termination_error = RawJsonStreamTerminationError(
-                    finish_reason or "unknown"
+    def _record_queue_wait(self, wait_ms: int) -> None:
+        # Hedged attempts report from their worker threads.
+        with self._attempt_report_lock:
+            self.last_queue_wait_ms += wait_ms
+
+    def _record_route(self, target: ProviderTarget, first_token_ms: int) -> None:
+        with self._attempt_report_lock:
+            if self.last_provider_target is None:
+                self.last_provider_target = target
+                self.last_first_token_ms = first_token_ms
+
+    def _account_attempt(
+        self,
+        turn: _RawJsonTurn,
+        attempt: _RawJsonAttempt,
+        *,
+        kept: bool,
+    ) -> None:
+        spent = attempt.token_usage
+        if not spent and attempt.cut_short:
+            # A cancelled stream never reaches its usage chunk.
+            spent = turn.estimate_tokens(attempt)
+        if spent:
+            self.last_token_usage = (self.last_token_usage or 0) + spent
+        if not kept:
+            self.last_discarded_tokens += spent or turn.estimate_tokens(attempt)
+        elapsed = time.monotonic() - attempt.started_at
+        if attempt.early_error is not None:
+            self._aborted_attempt_seconds.append(elapsed)
+        elif attempt.streamed_to_end:
+            self._full_attempt_seconds = max(self._full_attempt_seconds, elapsed)
+        if self._full_attempt_seconds:
+            self.last_early_abort_saved_ms = int(
+                1000
+                * sum(
+                    max(0.0, self._full_attempt_seconds - aborted)
+                    for aborted in self._aborted_attempt_seconds
                 )
-                if (
-                    finish_reason == "length"
-                    and attempt_index < RAW_JSON_STREAMING_MAX_ATTEMPTS - 1
-                ):
-                    attempt_prompt = build_raw_json_retry_prompt(
-                        prompt,
-                        termination_error,
-                        workflow_id=workflow_id,
-                        current_stage_id=current_stage_id,
-                    )
-                    continue
-                raise termination_error
+            )
 
+    def _stream_serial_attempts(
+        self,
+        turn: _RawJsonTurn,
+    ) -> Iterator[AgentRetrySignal | AgentTurnDeltaOutput | AgentTurnOutput]:
+        attempt_prompt = turn.prompt
+        for number in range(1, RAW_JSON_STREAMING_MAX_ATTEMPTS + 1):
+            if number > 1:
+                yield AgentRetrySignal(attemptIndex=number)
+            attempt = turn.new_attempt(number, attempt_prompt)
+            stream = turn.open_stream(attempt)
             try:
-                final_output = parse_agent_turn_output_text(
-                    accumulated,
-                    workflow_id=workflow_id,
-                    current_stage_id=current_stage_id,
-                )
-            except (json.JSONDecodeError, ValidationError, ValueError) as exc:
-                if attempt_index >= RAW_JSON_STREAMING_MAX_ATTEMPTS - 1:
-                    raise
-                attempt_prompt = build_raw_json_retry_prompt(
-                    prompt,
-                    exc,
-                    workflow_id=workflow_id,
-                    current_stage_id=current_stage_id,
-                )
-                continue
+                for text_chunk in stream:
+                    delta = attempt.feed(text_chunk)
+                    if attempt.early_error is not None:
+                        self.last_early_aborts += 1
+                        break
+                    if delta is not None:
+                        attempt.shown = True
+                        yield delta
+            finally:
+                _close_stream(stream)
 
             try:
-                final_output = validate_agent_turn(
-                    final_output,
-                    workflow_id=workflow_id,
-                    current_stage_id=current_stage_id,
-                )
-            except (ContractValidationError, ValidationError) as exc:
-                if attempt_index >= RAW_JSON_STREAMING_MAX_ATTEMPTS - 1:
+                final_output = attempt.finish()
+            except _RAW_JSON_ATTEMPT_ERRORS as exc:
+                self._account_attempt(turn, attempt, kept=False)
+                if (
+                    not _is_retryable_raw_json_failure(exc)
+                    or number >= RAW_JSON_STREAMING_MAX_ATTEMPTS
+                ):
                     raise
-                attempt_prompt = build_raw_json_retry_prompt(
-                    prompt,
-                    exc,
-                    workflow_id=workflow_id,
-                    current_stage_id=current_stage_id,
-                )
+                attempt_prompt = turn.retry_prompt(exc)
                 continue
 
-            if not emitted_any_delta:
+            self._account_attempt(turn, attempt, kept=True)
+            if not attempt.shown:
                 yield AgentTurnDeltaOutput.model_validate(
                     final_output.model_dump(mode="json")
                 )
@@ -902,6 +1220,118 @@ class PydanticAgentRuntime:
             "Raw JSON streaming did not produce valid structured output"
         )
 
+    def _stream_hedged_attempts(
+        self,
+        turn: _RawJsonTurn,
+    ) -> Iterator[AgentRetrySignal | AgentTurnDeltaOutput | AgentTurnOutput]:
+        """Race a hedged attempt against a slow one; keep the first valid.
+
+        Only the lead attempt streams deltas. When the lead fails while a
+        hedge is running, the hedge takes over behind a retry signal; when
+        nothing is left running, the next attempt gets the retry prompt. The
+        attempt budget is shared, so hedges count toward
+        ``RAW_JSON_STREAMING_MAX_ATTEMPTS``.
+        """
+        hedge_after = turn.config.retry_policy.hedge_after_seconds
+        assert hedge_after is not None
+        events: queue.Queue = queue.Queue()
+        workers: dict[int, _AttemptStreamWorker] = {}
+        next_number = 1
+
+        def start(attempt_prompt: str) -> _RawJsonAttempt:
+            nonlocal next_number
+            attempt = turn.new_attempt(next_number, attempt_prompt)
+            next_number += 1
+            worker = _AttemptStreamWorker(attempt, turn.open_stream(attempt), events)
+            workers[attempt.number] = worker
+            worker.start()
+            return attempt
+
+        lead = start(turn.prompt)
+        hedge_at: float | None = time.monotonic() + hedge_after
+        try:
+            while True:
+                timeout = (
+                    None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                )
+                try:
+                    attempt, event = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_at = None
+                    if next_number <= RAW_JSON_STREAMING_MAX_ATTEMPTS:
+                        start(lead.prompt)
+                        self.last_hedged_attempts += 1
+                    continue
+                if attempt.number not in workers:
+                    # Trailing events of an attempt that already lost.
+                    continue
+
+                error: Exception | None
+                if isinstance(event, str):
+                    delta = attempt.feed(event)
+                    if attempt.early_error is None:
+                        if delta is not None and attempt is lead:
+                            attempt.shown = True
+                            yield delta
+                        continue
+                    workers.pop(attempt.number).cancel()
+                    self.last_early_aborts += 1
+                    error = attempt.early_error
+                elif isinstance(event, Exception):
+                    workers.pop(attempt.number)
+                    if not workers:
+                        self._account_attempt(turn, attempt, kept=False)
+                        raise event
+                    if isinstance(event, ProviderBusyError) and attempt is not lead:
+                        # The hedge never reached the provider.
+                        continue
+                    # Another attempt is still running; its outcome decides.
+                    error = None
+                else:
+                    workers.pop(attempt.number)
+                    try:
+                        final_output = attempt.finish()
+                    except _RAW_JSON_ATTEMPT_ERRORS as exc:
+                        error = exc
+                    else:
+                        self._account_attempt(turn, attempt, kept=True)
+                        for worker in workers.values():
+                            worker.cancel()
+                            self._account_attempt(turn, worker.attempt, kept=False)
+                        workers.clear()
+                        if attempt is not lead:
+                            yield AgentRetrySignal(attemptIndex=attempt.number)
+                        if attempt is not lead or not attempt.shown:
+                            yield AgentTurnDeltaOutput.model_validate(
+                                final_output.model_dump(mode="json")
+                            )
+                        yield final_output
+                        return
+
+                self._account_attempt(turn, attempt, kept=False)
+                if attempt is not lead:
+                    continue
+                if workers:
+                    lead = workers[min(workers)].attempt
+                    yield AgentRetrySignal(attemptIndex=lead.number)
+                    delta = lead.current_delta()
+                    if delta is not None:
+                        lead.shown = True
+                        yield delta
+                    continue
+                assert error is not None
+                if (
+                    not _is_retryable_raw_json_failure(error)
+                    or next_number > RAW_JSON_STREAMING_MAX_ATTEMPTS
+                ):
+                    raise error
+                yield AgentRetrySignal(attemptIndex=next_number)
+                lead = start(turn.retry_prompt(error))
+                hedge_at = time.monotonic() + hedge_after
+        finally:
+            for worker in workers.values():
+                worker.cancel()
+
 
 def build_model_settings(model_name: str) -> dict[str, Any] | None:
     if model_name.startswith("deepseek-v4-"):
@@ -960,6 +1390,8 @@ def parse_agent_turn_output_text(
             raise ValueError(
                 "workflow_id and current_stage_id are required for artifact_data"
             )
+        from artifact_data_renderers import render_agent_turn_from_artifact_data
+
         rendered = render_agent_turn_from_artifact_data(
             parsed,
             workflow_id=workflow_id,
@@ -1140,6 +1572,8 @@ def render_complete_streamed_artifact_data_markdown(
     artifact_data = extract_complete_json_value_after_key(text, "artifact_data")
     if artifact_data is None:
         return None
+    from artifact_data_renderers import render_complete_artifact_data
+
     try:
         rendered = render_complete_artifact_data(
             artifact_data,
@@ -1162,6 +1596,8 @@ def render_partial_streamed_artifact_data_markdown(
     artifact_data = extract_partial_json_object_after_key(text, "artifact_data")
     if artifact_data is None:
         return None
+    from artifact_data_renderers import render_partial_artifact_data_markdown
+
     return render_partial_artifact_data_markdown(
         artifact_data,
         workflow_id=workflow_id,
@@ -1199,6 +1635,8 @@ def build_pydantic_agent_runtime(
     base_url: str,
     model_name: str,
     system_prompt: str,
+    provider_limits: ProviderLimits | None = None,
+    provider_targets: tuple[ProviderTarget, ...] = (),
 ) -> PydanticAgentRuntime:
     try:
         from pydantic_ai import Agent
@@ -1230,5 +1668,8 @@ def build_pydantic_agent_runtime(
             base_url=base_url,
             model_name=model_name,
             system_prompt=system_prompt,
+            retry_policy=RawJsonRetryPolicy.from_env(),
+            limits=provider_limits,
+            targets=provider_targets,
         ),
     )
@@ -5,7 +5,6 @@ import time
 import uuid
 from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from sqlalchemy import inspect, text
 from models import db
 from config import Config
 from config_admin_auth import (
@@ -13,94 +12,25 @@ from config_admin_auth import (
     config_admin_keys_collide,
 )
 from config_service import upsert_default_llm_config_from_env
+from db_instrumentation import (
+    build_engine_options,
+    install_db_instrumentation,
+    start_request_db_usage,
+    stop_request_db_usage,
+)
 from routes import api_bp
+from schema_migrations import check_schema_version, upgrade_schema
+
+SCHEMA_MIGRATION_ENV = "NEW_AGENTS_SCHEMA_MIGRATION"
 
 
 def init_db(app):
-    """Create database tables and seed server-managed defaults."""
+    """Apply pending schema migrations and seed server-managed defaults."""
     with app.app_context():
-        db.create_all()
-        _ensure_agent_artifact_version_columns()
-        _ensure_agent_run_turn_metric_columns()
-        _ensure_artifact_comment_columns()
-        _ensure_artifact_section_lock_columns()
+        upgrade_schema()
         upsert_default_llm_config_from_env()
 
 
-def _ensure_agent_artifact_version_columns():
-    """Upgrade existing artifact version tables with structured data storage."""
-    inspector = inspect(db.engine)
-    if "agent_artifact_versions" not in inspector.get_table_names():
-        return
-
-    existing_columns = {
-        column["name"] for column in inspector.get_columns("agent_artifact_versions")
-    }
-    if "artifact_data_json" not in existing_columns:
-        db.session.execute(
-            text(
-                "ALTER TABLE agent_artifact_versions ADD COLUMN artifact_data_json TEXT"
-            )
-        )
-        db.session.commit()
-
-
-def _ensure_agent_run_turn_metric_columns():
-    """Upgrade existing turn metric tables with sanitized diagnostics storage."""
-    inspector = inspect(db.engine)
-    if "agent_run_turn_metrics" not in inspector.get_table_names():
-        return
-
-    existing_columns = {
-        column["name"] for column in inspector.get_columns("agent_run_turn_metrics")
-    }
-    if "diagnostic_json" not in existing_columns:
-        db.session.execute(
-            text("ALTER TABLE agent_run_turn_metrics ADD COLUMN diagnostic_json TEXT")
-        )
-        db.session.commit()
-
-
-def _ensure_artifact_comment_columns():
-    """Upgrade existing comment tables created before threaded comments."""
-    inspector = inspect(db.engine)
-    if "agent_artifact_comments" not in inspector.get_table_names():
-        return
-
-    existing_columns = {
-        column["name"] for column in inspector.get_columns("agent_artifact_comments")
-    }
-    column_migrations = {
-        "anchor_text": "ALTER TABLE agent_artifact_comments ADD COLUMN anchor_text TEXT",
-        "status": "ALTER TABLE agent_artifact_comments ADD COLUMN status VARCHAR(32) NOT NULL DEFAULT 'open'",
-        "resolved_at_ms": "ALTER TABLE agent_artifact_comments ADD COLUMN resolved_at_ms INTEGER",
-        "replies_json": "ALTER TABLE agent_artifact_comments ADD COLUMN replies_json TEXT NOT NULL DEFAULT '[]'",
-    }
-    for column_name, statement in column_migrations.items():
-        if column_name not in existing_columns:
-            db.session.execute(text(statement))
-    db.session.commit()
-
-
-def _ensure_artifact_section_lock_columns():
-    """Upgrade existing section lock tables created before section anchors."""
-    inspector = inspect(db.engine)
-    if "agent_artifact_section_locks" not in inspector.get_table_names():
-        return
-
-    existing_columns = {
-        column["name"]
-        for column in inspector.get_columns("agent_artifact_section_locks")
-    }
-    if "section_anchor" not in existing_columns:
-        db.session.execute(
-            text(
-                "ALTER TABLE agent_artifact_section_locks ADD COLUMN section_anchor TEXT"
-            )
-        )
-        db.session.commit()
-
-
 def create_app(test_config=None):
     """Application factory for Flask app."""
     app = Flask(__name__)
@@ -132,12 +62,24 @@ def create_app(test_config=None):
             "DATABASE_URL", Config.DATABASE_URL
         )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        build_engine_options(app.config["SQLALCHEMY_DATABASE_URI"]),
+    )
 
+    install_db_instrumentation()
     db.init_app(app)
 
-    # Create tables if not in testing mode (tests handle their own setup)
-    if not os.environ.get("FLASK_TESTING"):
-        init_db(app)
+    # Migrations run once per deploy (python -m schema_migrations upgrade);
+    # workers only verify the recorded version. Tests handle their own setup,
+    # and maintenance scripts that import the app to call init_db set
+    # SCHEMA_MIGRATION_ENV so the guard doesn't stop them before migrating.
+    if not os.environ.get("FLASK_TESTING") and not os.environ.get(
+        SCHEMA_MIGRATION_ENV
+    ):
+        with app.app_context():
+            check_schema_version()
+            upsert_default_llm_config_from_env()
 
     # Register routes
     init_routes(app)
@@ -153,6 +95,7 @@ def init_routes(app):
         """记录请求开始时间 + P0-2: API Key 认证"""
         g.request_id = str(uuid.uuid4())[:8]
         g.start_time = time.time()
+        g.db_usage = start_request_db_usage()
         app.logger.info(f"[{g.request_id}] {request.method} {request.path} - Started")
 
         # P0-2: API Key authentication for sensitive endpoints
@@ -164,6 +107,8 @@ def init_routes(app):
         config_admin_requests = {
             ("POST", "/api/config"),
             ("POST", "/api/config/check"),
+            ("GET", "/api/config/backups"),
+            ("POST", "/api/config/backups"),
         }
         gateway_protected_requests = {
             ("POST", "/api/agent/runs/stream"),
@@ -208,11 +153,17 @@ def init_routes(app):
         """记录请求耗时"""
         if hasattr(g, "start_time"):
             elapsed = time.time() - g.start_time
+            db_usage = g.get("db_usage")
+            db_fields = f" ({db_usage.log_fields()})" if db_usage is not None else ""
             app.logger.info(
-                f"[{g.request_id}] {request.method} {request.path} - Completed in {elapsed:.3f}s"
+                f"[{g.request_id}] {request.method} {request.path} - Completed in {elapsed:.3f}s{db_fields}"
             )
         return response
 
+    @app.teardown_request
+    def teardown_request(_error):
+        stop_request_db_usage()
+
     @app.errorhandler(Exception)
     def handle_exception(e):
         # 让 Flask 处理其自身的 HTTP 错误（如 415 UnsupportedMediaType）
@@ -0,0 +1,161 @@
+"""Process-wide cache of decoded and validated artifact_data.
+
+Artifact versions are immutable once written, so the JSON decode, the pydantic
+validation and the views derived from a version's ``artifact_data`` only need
+to run once per version per process. Run snapshots, story handoff packets and
+Lisa test asset export all read through this cache.
+
+Entries are keyed by ``(AgentArtifactVersion.id, kind)`` and carry a digest of
+``artifact_data_json``; a row whose JSON no longer matches (a recreated
+database reusing ids) is rebuilt instead of served. The cache is an LRU bounded
+by an estimated byte budget (``ARTIFACT_DATA_CACHE_MAX_BYTES``, default 64 MiB
+per worker process) so a few gunicorn workers stay well inside the 512 MB
+container limit.
+
+Cached values are shared between requests and must be treated as read-only.
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable
+import hashlib
+import json
+import os
+import threading
+from typing import Any, TypeVar
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Decoded dicts and pydantic models take several times the memory of the
+# JSON text they were built from; entries are charged at this multiple.
+DECODED_BYTES_PER_JSON_BYTE = 8
+# A single entry may use at most this share of the budget.
+MAX_ENTRY_SHARE = 0.25
+
+DECODED_KIND = "json"
+
+T = TypeVar("T")
+
+
+class ArtifactDataCache:
+    """Byte-bounded LRU of values built from one artifact version's JSON."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: OrderedDict[tuple[int, str], tuple[str, Any, int]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get_or_build(
+        self,
+        version,
+        kind: str,
+        build: Callable[[str], T],
+    ) -> T:
+        """Return ``build(version.artifact_data_json)``, cached per version and kind."""
+        raw = version.artifact_data_json
+        if version.id is None or not raw:
+            return build(raw)
+
+        key = (version.id, kind)
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = build(raw)
+        size = len(raw) * DECODED_BYTES_PER_JSON_BYTE
+        if size > self.max_bytes * MAX_ENTRY_SHARE:
+            return value
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (digest, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_cache: ArtifactDataCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_data_cache() -> ArtifactDataCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactDataCache(
+                int(os.environ.get("ARTIFACT_DATA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            )
+        return _cache
+
+
+def reset_artifact_data_cache() -> None:
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def decoded_artifact_data(version) -> dict | None:
+    """Return the version's decoded ``artifact_data`` dict, or None."""
+    return get_artifact_data_cache().get_or_build(
+        version,
+        DECODED_KIND,
+        _decode_artifact_data,
+    )
+
+
+def validated_artifact_data(version, model: type[T]) -> T:
+    """Return the version's ``artifact_data`` validated as ``model``."""
+    return get_artifact_data_cache().get_or_build(
+        version,
+        f"model:{model.__module__}.{model.__qualname__}",
+        lambda _raw: model.model_validate(decoded_artifact_data(version)),
+    )
+
+
+def artifact_data_view(
+    version,
+    kind: str,
+    build: Callable[[dict], T],
+) -> T:
+    """Return ``build(artifact_data)`` for a view derived from the version."""
+    return get_artifact_data_cache().get_or_build(
+        version,
+        f"view:{kind}",
+        lambda _raw: build(decoded_artifact_data(version)),
+    )
+
+
+def _decode_artifact_data(raw: str | None) -> dict | None:
+    if not raw:
+        return None
+    return json.loads(raw)
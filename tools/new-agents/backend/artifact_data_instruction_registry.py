@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+from collections.abc import Callable, Iterator, Mapping
+from functools import partial
+
 from workflow_manifest import format_artifact_data_contract_instruction
 
+ARTIFACT_DATA_CONTRACT_PLACEHOLDER = "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__"
+
+InstructionSource = str | Callable[[], str]
+
 DOCUMENT_INFO_RUNTIME_IDENTITY_INSTRUCTION = (
     "document_info.workflow 和 document_info.stage 由后端注入，模型不要输出这两个字段。"
 )
@@ -35,9 +42,7 @@ JSON 对象结构：
   "warnings": []
 }
 
-"""
-    + format_artifact_data_contract_instruction("TEST_DESIGN", "CLARIFY")
-    + """
+__ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
 """
@@ -72,9 +77,7 @@ JSON 对象结构：
   "warnings": []
 }
 
-"""
-    + format_artifact_data_contract_instruction("TEST_DESIGN", "STRATEGY")
-    + """
+__ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
 """
@@ -110,10 +113,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("TEST_DESIGN", "CASES"),
-)
+"""
 
 
 DELIVERY_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -149,10 +149,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("TEST_DESIGN", "DELIVERY"),
-)
+"""
 
 
 REQ_REVIEW_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -184,10 +181,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("REQ_REVIEW", "REVIEW"),
-)
+"""
 
 
 REQ_REVIEW_REPORT_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -218,10 +212,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("REQ_REVIEW", "REPORT"),
-)
+"""
 
 
 VALUE_ELEVATOR_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -300,9 +291,7 @@ JSON 对象结构：
   "warnings": []
 }
 
-"""
-    + format_artifact_data_contract_instruction("VALUE_DISCOVERY", "PERSONA")
-    + """
+__ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
 """
@@ -394,10 +383,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("VALUE_DISCOVERY", "BLUEPRINT"),
-)
+"""
 
 
 INCIDENT_TIMELINE_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -431,10 +417,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("INCIDENT_REVIEW", "TIMELINE"),
-)
+"""
 
 
 INCIDENT_ROOT_CAUSE_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -504,10 +487,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("INCIDENT_REVIEW", "IMPROVEMENT"),
-)
+"""
 
 
 IDEA_DEFINE_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -540,10 +520,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("IDEA_BRAINSTORM", "DEFINE"),
-)
+"""
 
 
 IDEA_DIVERGE_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = """
@@ -606,10 +583,7 @@ JSON 对象结构：
 __ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
-""".replace(
-    "__ARTIFACT_DATA_CONTRACT_INSTRUCTION__",
-    format_artifact_data_contract_instruction("IDEA_BRAINSTORM", "CONVERGE"),
-)
+"""
 
 
 IDEA_CONCEPT_ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTION = (
@@ -643,9 +617,7 @@ JSON 对象结构：
   "warnings": []
 }
 
-"""
-    + format_artifact_data_contract_instruction("IDEA_BRAINSTORM", "CONCEPT")
-    + """
+__ARTIFACT_DATA_CONTRACT_INSTRUCTION__
 chat 字段必须像一次自然的工作对话，不要只用一两句模板化提示；简单同步可以使用自然短段落，信息较多、存在风险或需要用户确认时可以适度使用短列表；不要每轮套用固定 bullet 数量、固定标签或固定栏目，让左侧对话有独立阅读价值。
 所有字符串内容必须使用合法 JSON 转义；最终 JSON 必须能被 json.loads 解析。
 """
@@ -738,7 +710,47 @@ chat 字段必须像一次自然的工作对话，不要只用一两句模板化
     )
 
 
-ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTIONS: dict[tuple[str, str], str] = {
+class LazyInstructionRegistry(Mapping[tuple[str, str], str]):
+    """Stage instructions formatted on first lookup instead of at import.
+
+    Sources are either a template containing the artifact_data contract
+    placeholder, formatted with the contract of their own stage, or a
+    zero-argument builder.
+    """
+
+    def __init__(self, sources: dict[tuple[str, str], InstructionSource]):
+        self._sources = sources
+        self._instructions: dict[tuple[str, str], str] = {}
+
+    def __getitem__(self, stage_key: tuple[str, str]) -> str:
+        instruction = self._instructions.get(stage_key)
+        if instruction is None:
+            instruction = self._build(stage_key, self._sources[stage_key])
+            self._instructions[stage_key] = instruction
+        return instruction
+
+    def __contains__(self, stage_key: object) -> bool:
+        return stage_key in self._sources
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        return iter(self._sources)
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    @staticmethod
+    def _build(stage_key: tuple[str, str], source: InstructionSource) -> str:
+        if callable(source):
+            return source()
+        if ARTIFACT_DATA_CONTRACT_PLACEHOLDER not in source:
+            return source
+        return source.replace(
+            ARTIFACT_DATA_CONTRACT_PLACEHOLDER,
+            format_artifact_data_contract_instruction(*stage_key),
+        )
+
+
+_ARTIFACT_DATA_INSTRUCTION_SOURCES: dict[tuple[str, str], InstructionSource] = {
     (
         "IDEA_BRAINSTORM",
         "DEFINE",
@@ -795,48 +807,58 @@ ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTIONS: dict[tuple[str, str], str] = {
     (
         "STORY_BREAKDOWN",
         "INPUT_ANALYSIS",
-    ): _story_breakdown_artifact_data_instruction(
+    ): partial(
+        _story_breakdown_artifact_data_instruction,
         "INPUT_ANALYSIS",
         '{"type": "request_next_stage", "target_stage_id": "EPIC_MAPPING"}',
     ),
     (
         "STORY_BREAKDOWN",
         "EPIC_MAPPING",
-    ): _story_breakdown_artifact_data_instruction(
+    ): partial(
+        _story_breakdown_artifact_data_instruction,
         "EPIC_MAPPING",
         '{"type": "request_next_stage", "target_stage_id": "STORY_BACKLOG"}',
     ),
     (
         "STORY_BREAKDOWN",
         "STORY_BACKLOG",
-    ): _story_breakdown_artifact_data_instruction(
+    ): partial(
+        _story_breakdown_artifact_data_instruction,
         "STORY_BACKLOG",
         '{"type": "request_next_stage", "target_stage_id": "SPRINT_PLAN"}',
     ),
     (
         "STORY_BREAKDOWN",
         "SPRINT_PLAN",
-    ): _story_breakdown_artifact_data_instruction("SPRINT_PLAN", "null"),
-    ("PRD_REVIEW", "INVENTORY"): _prd_review_artifact_data_instruction(
+    ): partial(_story_breakdown_artifact_data_instruction, "SPRINT_PLAN", "null"),
+    ("PRD_REVIEW", "INVENTORY"): partial(
+        _prd_review_artifact_data_instruction,
         "INVENTORY",
         '{"type": "request_next_stage", "target_stage_id": "QUALITY_AUDIT"}',
     ),
     (
         "PRD_REVIEW",
         "QUALITY_AUDIT",
-    ): _prd_review_artifact_data_instruction(
+    ): partial(
+        _prd_review_artifact_data_instruction,
         "QUALITY_AUDIT",
         '{"type": "request_next_stage", "target_stage_id": "COMPLETION_PLAN"}',
     ),
     (
         "PRD_REVIEW",
         "COMPLETION_PLAN",
-    ): _prd_review_artifact_data_instruction(
+    ): partial(
+        _prd_review_artifact_data_instruction,
         "COMPLETION_PLAN",
         '{"type": "request_next_stage", "target_stage_id": "REVISION_BLUEPRINT"}',
     ),
     (
         "PRD_REVIEW",
         "REVISION_BLUEPRINT",
-    ): _prd_review_artifact_data_instruction("REVISION_BLUEPRINT", "null"),
+    ): partial(_prd_review_artifact_data_instruction, "REVISION_BLUEPRINT", "null"),
 }
+
+ARTIFACT_DATA_STRUCTURED_OUTPUT_INSTRUCTIONS = LazyInstructionRegistry(
+    _ARTIFACT_DATA_INSTRUCTION_SOURCES
+)
@@ -16,6 +16,7 @@ from agent_contracts import AgentTurnOutput, WORKFLOW_STAGES
 from artifact_render_plan import (
     ArtifactRenderPlan,
     ArtifactSectionSpec,
+    ArtifactStreamValidator,
     RenderedArtifact,
 )
 
@@ -1637,6 +1638,25 @@ def render_available_artifact_data(
     return plan.render_available(normalized_artifact_data)
 
 
+def build_artifact_stream_validator(
+    *,
+    workflow_id: str,
+    current_stage_id: str,
+) -> ArtifactStreamValidator | None:
+    plan = ARTIFACT_DATA_RENDERERS.get((workflow_id, current_stage_id))
+    if plan is None:
+        return None
+    return ArtifactStreamValidator(
+        plan,
+        prepare=lambda artifact_data: _inject_runtime_document_info_identity(
+            dict(artifact_data),
+            plan=plan,
+            workflow_id=workflow_id,
+            current_stage_id=current_stage_id,
+        ),
+    )
+
+
 def render_partial_artifact_data_markdown(
     artifact_data: dict[str, Any],
     *,
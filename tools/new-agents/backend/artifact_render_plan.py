@@ -178,3 +178,134 @@ def validate_model_projection(
         validator(projection)
 
     return validate
+
+
+def _field_validation_error(
+    model: type[StrictArtifactDataModel],
+    field_name: str,
+    error: ValidationError | ValueError,
+    raw_value: Any,
+) -> ValidationError:
+    # Re-root a field's errors at the model, as model_validate reports them.
+    if isinstance(error, ValidationError):
+        line_errors = [
+            {
+                "type": detail["type"],
+                "loc": (field_name, *detail["loc"]),
+                "input": detail["input"],
+                **({"ctx": detail["ctx"]} if "ctx" in detail else {}),
+            }
+            for detail in error.errors()
+        ]
+    else:
+        line_errors = [
+            {
+                "type": "value_error",
+                "loc": (field_name,),
+                "input": raw_value,
+                "ctx": {"error": error},
+            }
+        ]
+    return ValidationError.from_exception_data(model.__name__, line_errors)
+
+
+class ArtifactStreamValidator:
+    """Finds certain failures in the closed fields of a streamed artifact_data.
+
+    Fields are validated against their model annotation as soon as they are
+    closed, and a section is validated and rendered once every field it
+    depends on is closed and valid. Each field and section is checked once.
+    Errors are raised in the shape the complete render raises them, so a
+    stream can be cancelled without changing the retry diagnostic.
+    """
+
+    def __init__(
+        self,
+        plan: ArtifactRenderPlan,
+        *,
+        prepare: Callable[[Mapping[str, Any]], Mapping[str, Any]] | None = None,
+    ) -> None:
+        self.plan = plan
+        self._prepare = prepare
+        self._valid_fields: set[str] = set()
+        self._checked_fields: set[str] = set()
+        self._checked_sections: set[str] = set()
+
+    def check(self, raw_artifact_data: Mapping[str, Any]) -> None:
+        if self._prepare is not None:
+            raw_artifact_data = self._prepare(raw_artifact_data)
+        model = self.plan.model
+        for field_name, raw_value in raw_artifact_data.items():
+            if field_name in self._checked_fields:
+                continue
+            self._checked_fields.add(field_name)
+            field = model.model_fields.get(field_name)
+            if field is None:
+                raise ValidationError.from_exception_data(
+                    model.__name__,
+                    [
+                        {
+                            "type": "extra_forbidden",
+                            "loc": (field_name,),
+                            "input": raw_value,
+                        }
+                    ],
+                )
+            try:
+                TypeAdapter(field.rebuild_annotation()).validate_python(
+                    model.reject_blank_strings(raw_value)
+                )
+            except (ValidationError, ValueError) as exc:
+                raise _field_validation_error(
+                    model,
+                    field_name,
+                    exc,
+                    raw_value,
+                ) from None
+            self._valid_fields.add(field_name)
+
+        for section in self.plan.canonical_sections:
+            if section.section_id in self._checked_sections or not (
+                set(section.dependencies) <= self._valid_fields
+            ):
+                continue
+            self._checked_sections.add(section.section_id)
+            self._check_section(section, raw_artifact_data)
+
+    def _check_section(
+        self,
+        section: ArtifactSectionSpec,
+        raw_artifact_data: Mapping[str, Any],
+    ) -> None:
+        values = self.plan._validate_dependencies(
+            raw_artifact_data,
+            section.dependencies,
+        )
+        if values is None:
+            return
+        projection = ArtifactProjection(**values)
+        if section.validate_projection is not None:
+            try:
+                section.validate_projection(projection)
+            except ValidationError:
+                raise
+            except ValueError as exc:
+                # The model validator runs the same check on the complete data.
+                raise ValidationError.from_exception_data(
+                    self.plan.model.__name__,
+                    [
+                        {
+                            "type": "value_error",
+                            "loc": (),
+                            "input": dict(raw_artifact_data),
+                            "ctx": {"error": exc},
+                        }
+                    ],
+                ) from None
+        markdown = section.render(projection)
+        if not markdown.strip():
+            raise ValueError(
+                f"artifact section renderer returned blank markdown: "
+                f"{section.section_id}"
+            )
+        validate_artifact_visual_blocks(markdown)
@@ -1,11 +1,29 @@
+import logging
 import os
 from typing import Any
 
-from config_admin_auth import ensure_provider_api_key_is_independent
-from llm_client import LlmClientError, stream_chat_completion_content
+from config_admin_auth import (
+    ServiceCredentialCollisionError,
+    ensure_provider_api_key_is_independent,
+)
+from llm_client import (
+    LlmClientError,
+    provider_error_types,
+    stream_chat_completion_content,
+)
 from models import LlmConfig, db
-from openai import APIError, AuthenticationError, RateLimitError
-from request_schemas import DefaultLlmConfigUpdateRequest
+from provider_admission import (
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_QUEUE_TIMEOUT_SECONDS,
+    ProviderLimits,
+)
+from provider_routing import ProviderTarget
+from request_schemas import (
+    BackupLlmConfigUpdateRequest,
+    DefaultLlmConfigUpdateRequest,
+)
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_LLM_CONFIG_KEY = "default"
 DEFAULT_LLM_CONFIG_KEY_ENV = "NEW_AGENTS_DEFAULT_LLM_CONFIG_KEY"
@@ -31,6 +49,76 @@ def _read_env_value(name: str) -> str:
     return os.environ.get(name, "").strip()
 
 
+def _read_env_limit(name: str) -> int | None:
+    value = _read_env_value(name)
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+def build_provider_limits(config: LlmConfig) -> ProviderLimits:
+    """Admission limits of the config's provider; queue settings are per process."""
+    queue_size = _read_env_value("LLM_ADMISSION_QUEUE_SIZE")
+    try:
+        queue_timeout_seconds = float(
+            _read_env_value("LLM_ADMISSION_QUEUE_TIMEOUT_SECONDS")
+            or DEFAULT_QUEUE_TIMEOUT_SECONDS
+        )
+    except ValueError:
+        queue_timeout_seconds = DEFAULT_QUEUE_TIMEOUT_SECONDS
+    return ProviderLimits(
+        max_concurrency=config.max_concurrency,
+        requests_per_minute=config.requests_per_minute,
+        tokens_per_minute=config.tokens_per_minute,
+        queue_size=int(queue_size) if queue_size.isdigit() else DEFAULT_QUEUE_SIZE,
+        queue_timeout_seconds=max(0.0, queue_timeout_seconds),
+    )
+
+
+def get_routing_llm_configs(config: LlmConfig) -> list[LlmConfig]:
+    """The default config and the active configs sharing its model class.
+
+    A backup whose API key collides with a service credential is skipped so
+    it cannot fail the turn the default config would have served.
+    """
+    if not config.model_class:
+        return [config]
+    backups = (
+        LlmConfig.query.filter(
+            LlmConfig.model_class == config.model_class,
+            LlmConfig.is_active.is_(True),
+            LlmConfig.id != config.id,
+        )
+        .order_by(LlmConfig.id)
+        .all()
+    )
+    routing_configs = [config]
+    for backup in backups:
+        try:
+            ensure_provider_api_key_is_independent(backup.api_key)
+        except ServiceCredentialCollisionError:
+            logger.error(
+                "Skipping backup LLM config %s: its API key collides with a "
+                "service credential",
+                backup.config_key,
+            )
+            continue
+        routing_configs.append(backup)
+    return routing_configs
+
+
+def build_provider_targets(configs: list[LlmConfig]) -> tuple[ProviderTarget, ...]:
+    return tuple(
+        ProviderTarget(
+            config_key=config.config_key,
+            api_key=config.api_key,
+            base_url=config.base_url,
+            model_name=config.model,
+            limits=build_provider_limits(config),
+            context_budget_tokens=config.context_budget_tokens,
+        )
+        for config in configs
+    )
+
+
 def upsert_default_llm_config_from_env() -> LlmConfig | None:
     api_key = _read_env_value("NEW_AGENTS_DEFAULT_LLM_API_KEY")
     model = _read_env_value("NEW_AGENTS_DEFAULT_LLM_MODEL")
@@ -55,6 +143,22 @@ def upsert_default_llm_config_from_env() -> LlmConfig | None:
     config.base_url = base_url
     config.model = model
     config.description = description
+    context_budget_tokens = _read_env_value(
+        "NEW_AGENTS_DEFAULT_LLM_CONTEXT_BUDGET_TOKENS"
+    )
+    config.context_budget_tokens = (
+        int(context_budget_tokens) if context_budget_tokens.isdigit() else None
+    )
+    config.max_concurrency = _read_env_limit("NEW_AGENTS_DEFAULT_LLM_MAX_CONCURRENCY")
+    config.requests_per_minute = _read_env_limit(
+        "NEW_AGENTS_DEFAULT_LLM_REQUESTS_PER_MINUTE"
+    )
+    config.tokens_per_minute = _read_env_limit(
+        "NEW_AGENTS_DEFAULT_LLM_TOKENS_PER_MINUTE"
+    )
+    config.model_class = (
+        _read_env_value("NEW_AGENTS_DEFAULT_LLM_MODEL_CLASS") or None
+    )
     config.is_active = True
 
     db.session.commit()
@@ -71,6 +175,11 @@ def build_default_llm_config_payload(
         "baseUrl": config.base_url,
         "model": config.model,
         "description": config.description,
+        "contextBudgetTokens": config.context_budget_tokens,
+        "maxConcurrency": config.max_concurrency,
+        "requestsPerMinute": config.requests_per_minute,
+        "tokensPerMinute": config.tokens_per_minute,
+        "modelClass": config.model_class,
     }
 
 
@@ -96,12 +205,65 @@ def upsert_default_llm_config(
     config.base_url = update.base_url
     config.model = update.model
     config.description = update.description or DEFAULT_LLM_DESCRIPTION
+    config.context_budget_tokens = update.context_budget_tokens
+    config.max_concurrency = update.max_concurrency
+    config.requests_per_minute = update.requests_per_minute
+    config.tokens_per_minute = update.tokens_per_minute
+    config.model_class = update.model_class
     config.is_active = True
 
     db.session.commit()
     return config
 
 
+def list_backup_llm_configs() -> list[LlmConfig]:
+    return (
+        LlmConfig.query.filter(LlmConfig.config_key != get_default_llm_config_key())
+        .order_by(LlmConfig.id)
+        .all()
+    )
+
+
+def build_backup_llm_config_payload(config: LlmConfig) -> dict[str, Any]:
+    payload = build_default_llm_config_payload(config)
+    payload.pop("hasDefault")
+    return {
+        "configKey": config.config_key,
+        **payload,
+        "isActive": bool(config.is_active),
+    }
+
+
+def upsert_backup_llm_config(
+    update: BackupLlmConfigUpdateRequest,
+) -> LlmConfig:
+    """Create or update a config that backs up the default within its model class."""
+    if update.config_key == get_default_llm_config_key():
+        raise ValueError("configKey 不能是默认配置，请通过 /api/config 维护")
+    config = LlmConfig.query.filter_by(config_key=update.config_key).first()
+    if config is None:
+        if not update.api_key:
+            raise ValueError("apiKey 不能为空")
+        config = LlmConfig(config_key=update.config_key)
+        db.session.add(config)
+    ensure_provider_api_key_is_independent(update.api_key or config.api_key)
+    if update.api_key:
+        config.api_key = update.api_key
+
+    config.base_url = update.base_url
+    config.model = update.model
+    config.description = update.description
+    config.context_budget_tokens = update.context_budget_tokens
+    config.max_concurrency = update.max_concurrency
+    config.requests_per_minute = update.requests_per_minute
+    config.tokens_per_minute = update.tokens_per_minute
+    config.model_class = update.model_class
+    config.is_active = update.is_active
+
+    db.session.commit()
+    return config
+
+
 def build_llm_config_check_candidate(
     update: DefaultLlmConfigUpdateRequest,
     saved_config: LlmConfig | None = None,
@@ -118,6 +280,11 @@ def build_llm_config_check_candidate(
         base_url=update.base_url,
         model=update.model,
         description=update.description or DEFAULT_LLM_DESCRIPTION,
+        context_budget_tokens=update.context_budget_tokens,
+        max_concurrency=update.max_concurrency,
+        requests_per_minute=update.requests_per_minute,
+        tokens_per_minute=update.tokens_per_minute,
+        model_class=update.model_class,
         is_active=True,
     )
 
@@ -151,7 +318,7 @@ def check_default_llm_config(config: LlmConfig) -> dict[str, Any]:
                 temperature=0,
             )
         ).strip()
-    except (LlmClientError, AuthenticationError, RateLimitError, APIError):
+    except (LlmClientError, *provider_error_types()):
         return {
             "ok": False,
             "baseUrl": config.base_url,
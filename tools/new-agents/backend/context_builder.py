@@ -4,15 +4,27 @@ from dataclasses import dataclass
 from context_summary_format import (
     CURRENT_ARTIFACT_SUMMARY_TYPE,
     DECISION_SUMMARY_TYPE,
+    MESSAGE_RANGE_SUMMARY_TYPE,
     STAGE_CONCLUSION_SUMMARY_TYPE,
+    SUMMARY_SOURCE_MESSAGE_HISTORY,
     USER_SUPPLEMENT_SUMMARY_TYPE,
     build_artifact_summary_content,
+    format_context_message,
+    parse_message_range_key,
 )
+from history_retrieval import get_history_index
 from run_persistence import get_run_snapshot
+from token_counting import TokenCounter, get_token_counter
 
-DEFAULT_CONTEXT_MAX_CHARS = 12000
+DEFAULT_CONTEXT_MAX_TOKENS = 8000
+# Blocks are joined with a blank line, which BPE vocabularies encode as one
+# token.
+BLOCK_SEPARATOR_TOKENS = 1
+# Prior message blocks kept newest-first before older history is ranked by
+# relevance to the current prompt.
+RECENT_HISTORY_BLOCKS = 4
 CONTEXT_TRUNCATED_WARNING = "context_truncated"
-TRUNCATION_NOTICE = "⚠️ [上下文因长度限制已截断，仅保留最近的可用对话。]"
+TRUNCATION_NOTICE = "⚠️ [上下文因长度限制已截断，仅保留最近及与当前输入相关的对话。]"
 ARTIFACT_SUMMARY_HEADING = "[已保存阶段产物摘要]"
 SUMMARY_SOURCE_ARTIFACT = "artifact"
 SUMMARY_SOURCE_USER_INPUT = "user_input"
@@ -26,25 +38,54 @@ LOCKED_ARTIFACT_SECTIONS_HEADING = "[已锁定产物章节]"
 class RunContext:
     prompt: str
     warnings: list[str]
+    token_count: int = 0
 
 
-def _is_assistant_control_feedback(role: str, content: str) -> bool:
-    return role == "assistant" and (
-        content.lstrip().startswith("**Error:**")
-        or content.lstrip().startswith("*(已停止生成)*")
-        or content.lstrip().startswith("⚠️ **模型配置或供应商异常**")
-        or content.lstrip().startswith("⚠️ **模型额度或限流异常**")
-        or content.lstrip().startswith("⚠️ **模型调用未完成**")
-        or content.lstrip().startswith("⚠️ **本轮生成失败**")
-        or content.lstrip().startswith("⚠️ **结构化输出生成失败**")
-    )
+def _message_range_summaries_from_snapshot(
+    snapshot: dict,
+) -> list[tuple[int, int, str]]:
+    ranges = []
+    for summary in snapshot.get("contextSummaries", []):
+        if (
+            summary["sourceType"] != SUMMARY_SOURCE_MESSAGE_HISTORY
+            or summary["summaryType"] != MESSAGE_RANGE_SUMMARY_TYPE
+            or not summary["content"].strip()
+        ):
+            continue
+        message_range = parse_message_range_key(summary["sourceStageId"])
+        if message_range is None:
+            continue
+        first, last = message_range
+        ranges.append(
+            (first, last, f"[历史对话摘要: 消息 {first}-{last}]\n{summary['content']}")
+        )
+    return sorted(ranges)
 
 
-def _format_message(role: str, content: str) -> str | None:
-    if _is_assistant_control_feedback(role, content):
-        return None
-    role_label = "用户" if role == "user" else "助手"
-    return f"[{role_label}]\n{content}"
+def _prior_message_blocks(
+    snapshot: dict,
+    excluded_message_sequences: set[int],
+) -> list[str]:
+    """Format prior messages, replacing compacted ranges with their summary."""
+    ranges = iter(_message_range_summaries_from_snapshot(snapshot))
+    current_range = next(ranges, None)
+    emitted_range = None
+    blocks = []
+    for message in snapshot["messages"]:
+        sequence = message["sequenceIndex"]
+        while current_range is not None and current_range[1] < sequence:
+            current_range = next(ranges, None)
+        if current_range is not None and current_range[0] <= sequence:
+            if emitted_range is not current_range:
+                blocks.append(current_range[2])
+                emitted_range = current_range
+            continue
+        if sequence in excluded_message_sequences:
+            continue
+        formatted = format_context_message(message["role"], message["content"])
+        if formatted is not None:
+            blocks.append(formatted)
+    return blocks
 
 
 def _format_artifact_summary(stage_id: str, content: str) -> str | None:
@@ -132,11 +173,14 @@ def build_run_context(
     run_id: str,
     current_prompt: str,
     *,
-    max_chars: int = DEFAULT_CONTEXT_MAX_CHARS,
+    max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS,
+    token_counter: TokenCounter | None = None,
     exclude_message_sequence: int | None = None,
     exclude_message_sequences: Iterable[int] = (),
 ) -> RunContext:
     snapshot = get_run_snapshot(run_id)
+    if token_counter is None:
+        token_counter = get_token_counter(snapshot["run"]["model"] or "")
     excluded_message_sequences = set(exclude_message_sequences)
     if exclude_message_sequence is not None:
         excluded_message_sequences.add(exclude_message_sequence)
@@ -183,44 +227,85 @@ def build_run_context(
         context_blocks.append(
             "\n\n".join([LOCKED_ARTIFACT_SECTIONS_HEADING, *locked_sections])
         )
-    prior_messages = [
-        formatted
-        for message in snapshot["messages"]
-        if message["sequenceIndex"] not in excluded_message_sequences
-        if (formatted := _format_message(message["role"], message["content"]))
-        is not None
-    ]
+    prior_messages = _prior_message_blocks(snapshot, excluded_message_sequences)
     current_message = f"[用户]\n{current_prompt}"
     if not context_blocks and not prior_messages:
-        return RunContext(prompt=current_prompt, warnings=[])
+        return RunContext(
+            prompt=current_prompt,
+            warnings=[],
+            token_count=token_counter.count(current_prompt),
+        )
 
     blocks = [*context_blocks, *prior_messages, current_message]
-    prompt = "\n\n".join(blocks)
-    if len(prompt) <= max_chars:
-        return RunContext(prompt=prompt, warnings=[])
+    total_tokens = sum(token_counter.count(block) for block in blocks) + (
+        BLOCK_SEPARATOR_TOKENS * (len(blocks) - 1)
+    )
+    if total_tokens <= max_tokens:
+        return RunContext(
+            prompt="\n\n".join(blocks),
+            warnings=[],
+            token_count=total_tokens,
+        )
+
+    history_blocks = [*context_blocks, *prior_messages]
+    selected: set[int] = set()
+    used_tokens = (
+        token_counter.count(current_message)
+        + token_counter.count(TRUNCATION_NOTICE)
+        + BLOCK_SEPARATOR_TOKENS
+    )
+
+    def select(index: int) -> bool:
+        nonlocal used_tokens
+        next_used_tokens = (
+            used_tokens
+            + token_counter.count(history_blocks[index])
+            + BLOCK_SEPARATOR_TOKENS
+        )
+        if next_used_tokens > max_tokens:
+            return False
+        selected.add(index)
+        used_tokens = next_used_tokens
+        return True
 
-    kept = [current_message]
-    used_chars = len(current_message) + len(TRUNCATION_NOTICE) + 4
     for block in priority_context_blocks:
-        next_used_chars = used_chars + len(block) + 2
-        if next_used_chars <= max_chars:
-            kept.insert(0, block)
-            used_chars = next_used_chars
-    remaining_blocks = [
-        block
-        for block in [*context_blocks, *prior_messages]
-        if block not in priority_context_blocks
-    ]
-    for block in reversed(remaining_blocks):
-        next_used_chars = used_chars + len(block) + 2
-        if next_used_chars > max_chars:
+        select(history_blocks.index(block))
+    recent_start = max(
+        len(context_blocks),
+        len(history_blocks) - RECENT_HISTORY_BLOCKS,
+    )
+    for index in reversed(range(recent_start, len(history_blocks))):
+        if not select(index):
             break
-        kept.insert(0, block)
-        used_chars = next_used_chars
+    older_indexes = [
+        index for index in range(recent_start) if index not in selected
+    ]
+    if older_indexes:
+        history_index = get_history_index(run_id)
+        history_index.sync(history_blocks)
+        scores = history_index.scores(
+            current_prompt,
+            [history_blocks[index] for index in older_indexes],
+        )
+        # Most relevant first; blocks that do not match the prompt keep the
+        # newest-first order.
+        ranked = sorted(
+            zip(scores, older_indexes),
+            key=lambda item: (-item[0], -item[1]),
+        )
+        for _, index in ranked:
+            select(index)
 
     return RunContext(
-        prompt="\n\n".join([TRUNCATION_NOTICE, *kept]),
+        prompt="\n\n".join(
+            [
+                TRUNCATION_NOTICE,
+                *(history_blocks[index] for index in sorted(selected)),
+                current_message,
+            ]
+        ),
         warnings=[CONTEXT_TRUNCATED_WARNING],
+        token_count=used_tokens,
     )
 
 
@@ -228,14 +313,16 @@ def build_run_context_prompt(
     run_id: str,
     current_prompt: str,
     *,
-    max_chars: int = DEFAULT_CONTEXT_MAX_CHARS,
+    max_tokens: int = DEFAULT_CONTEXT_MAX_TOKENS,
+    token_counter: TokenCounter | None = None,
     exclude_message_sequence: int | None = None,
     exclude_message_sequences: Iterable[int] = (),
 ) -> str:
     return build_run_context(
         run_id,
         current_prompt,
-        max_chars=max_chars,
+        max_tokens=max_tokens,
+        token_counter=token_counter,
         exclude_message_sequence=exclude_message_sequence,
         exclude_message_sequences=exclude_message_sequences,
     ).prompt
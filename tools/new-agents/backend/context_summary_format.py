@@ -4,6 +4,10 @@ CURRENT_ARTIFACT_SUMMARY_TYPE = "current_artifact"
 USER_SUPPLEMENT_SUMMARY_TYPE = "user_supplement"
 STAGE_CONCLUSION_SUMMARY_TYPE = "stage_conclusion"
 DECISION_SUMMARY_TYPE = "decision"
+# Message range summaries keep the range key ("<first>-<last>" message
+# sequence) in source_stage_id, so each range has exactly one row.
+SUMMARY_SOURCE_MESSAGE_HISTORY = "message_history"
+MESSAGE_RANGE_SUMMARY_TYPE = "message_range"
 SUMMARY_TRUNCATION_NOTICE = "\n[该结构化摘要已截断]"
 
 
@@ -93,3 +97,37 @@ def build_decision_summary_content(content: str) -> str | None:
         ("关键决策", "决策", "决定", "取舍", "约定"),
         include_heading=False,
     )
+
+
+def is_assistant_control_feedback(role: str, content: str) -> bool:
+    return role == "assistant" and (
+        content.lstrip().startswith("**Error:**")
+        or content.lstrip().startswith("*(已停止生成)*")
+        or content.lstrip().startswith("⚠️ **模型配置或供应商异常**")
+        or content.lstrip().startswith("⚠️ **模型额度或限流异常**")
+        or content.lstrip().startswith("⚠️ **模型调用未完成**")
+        or content.lstrip().startswith("⚠️ **本轮生成失败**")
+        or content.lstrip().startswith("⚠️ **结构化输出生成失败**")
+    )
+
+
+def format_context_message(role: str, content: str) -> str | None:
+    if is_assistant_control_feedback(role, content):
+        return None
+    role_label = "用户" if role == "user" else "助手"
+    return f"[{role_label}]\n{content}"
+
+
+def message_range_key(first_sequence: int, last_sequence: int) -> str:
+    return f"{first_sequence}-{last_sequence}"
+
+
+def parse_message_range_key(key: str) -> tuple[int, int] | None:
+    first, separator, last = key.partition("-")
+    if not separator or not first.isdigit() or not last.isdigit():
+        return None
+    return int(first), int(last)
+
+
+def build_message_range_summary_content(content: str) -> str | None:
+    return _truncate_summary(content)
@@ -0,0 +1,173 @@
+"""Connection pool sizing and per-request database usage accounting.
+
+Each gunicorn worker runs ``GUNICORN_THREADS`` request threads plus one
+background producer thread per in-flight agent turn. The pool keeps one
+connection per request thread and lets turn producers borrow overflow
+connections for their short claim and completion phases.
+
+Query count and DB time come from cursor execution events. Pool wait comes
+from timing ``QueuePool.connect``. Usage is accumulated into every active
+``DbUsage`` of the current context, so a turn's usage can be attributed to
+its metric while the enclosing HTTP request still sees its own totals.
+"""
+
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import os
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_GUNICORN_THREADS = 4
+DEFAULT_POOL_RECYCLE_SECONDS = 1800
+DEFAULT_POOL_TIMEOUT_SECONDS = 10
+
+_QUERY_STARTED_KEY = "db_usage_query_started"
+
+_active_usages: ContextVar[tuple["DbUsage", ...]] = ContextVar(
+    "db_usage",
+    default=(),
+)
+
+
+@dataclass(eq=False)
+class DbUsage:
+    query_count: int = 0
+    db_time_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+    pool_checkouts: int = 0
+
+    def log_fields(self) -> str:
+        return (
+            f"db_queries={self.query_count} db_ms={self.db_time_ms:.1f} "
+            f"pool_wait_ms={self.pool_wait_ms:.1f}"
+        )
+
+    def metric_fields(self) -> dict[str, int]:
+        return {
+            "db_query_count": self.query_count,
+            "db_time_ms": round(self.db_time_ms),
+            "pool_wait_ms": round(self.pool_wait_ms),
+        }
+
+
+@contextmanager
+def track_db_usage(usage: DbUsage | None = None) -> Iterator[DbUsage]:
+    """Accumulate database usage of the enclosed block into ``usage``."""
+    usage = usage or DbUsage()
+    active = _active_usages.get()
+    if any(candidate is usage for candidate in active):
+        yield usage
+        return
+    token = _active_usages.set(active + (usage,))
+    try:
+        yield usage
+    finally:
+        _active_usages.reset(token)
+
+
+def start_request_db_usage() -> DbUsage:
+    """Start a fresh root usage for a request served by a reused thread."""
+    usage = DbUsage()
+    _active_usages.set((usage,))
+    return usage
+
+
+def stop_request_db_usage() -> None:
+    _active_usages.set(())
+
+
+def current_db_usage() -> DbUsage | None:
+    active = _active_usages.get()
+    return active[-1] if active else None
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited."""
+
+    def connect(self):
+        started = perf_counter()
+        connection = super().connect()
+        waited_ms = (perf_counter() - started) * 1000
+        for usage in _active_usages.get():
+            usage.pool_wait_ms += waited_ms
+            usage.pool_checkouts += 1
+        return connection
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_STARTED_KEY, []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_stack = conn.info.get(_QUERY_STARTED_KEY)
+    if not started_stack:
+        return
+    elapsed_ms = (perf_counter() - started_stack.pop()) * 1000
+    for usage in _active_usages.get():
+        usage.query_count += 1
+        usage.db_time_ms += elapsed_ms
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is None:
+        return
+    started_stack = connection.info.get(_QUERY_STARTED_KEY)
+    if started_stack:
+        started_stack.pop()
+
+
+def install_db_instrumentation() -> None:
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+def _env_int(environ: Mapping[str, str], name: str, default: int) -> int:
+    value = (environ.get(name) or "").strip()
+    if not value:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+    if parsed < 0:
+        raise ValueError(f"{name} must not be negative")
+    return parsed
+
+
+def build_engine_options(
+    database_uri: str,
+    environ: Mapping[str, str] | None = None,
+) -> dict:
+    """Size the connection pool of one worker process from its thread count."""
+    environ = os.environ if environ is None else environ
+    if database_uri.startswith("sqlite") and (
+        database_uri in {"sqlite://", "sqlite:///"} or ":memory:" in database_uri
+    ):
+        return {}
+
+    threads = max(1, _env_int(environ, "GUNICORN_THREADS", DEFAULT_GUNICORN_THREADS))
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": max(1, _env_int(environ, "DB_POOL_SIZE", threads)),
+        "max_overflow": _env_int(environ, "DB_MAX_OVERFLOW", threads),
+        "pool_timeout": _env_int(
+            environ,
+            "DB_POOL_TIMEOUT_SECONDS",
+            DEFAULT_POOL_TIMEOUT_SECONDS,
+        ),
+        "pool_recycle": _env_int(
+            environ,
+            "DB_POOL_RECYCLE_SECONDS",
+            DEFAULT_POOL_RECYCLE_SECONDS,
+        ),
+        "pool_pre_ping": True,
+    }
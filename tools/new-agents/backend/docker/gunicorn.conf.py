@@ -1,9 +1,12 @@
+import os
+
 bind = "0.0.0.0:5002"
-workers = 2
+# The app sizes its DB pool from GUNICORN_THREADS, so both read the same value.
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
 timeout = 300
 keepalive = 5
 worker_class = "gthread"
-threads = 4
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
 accesslog = "-"
 errorlog = "-"
 loglevel = "info"
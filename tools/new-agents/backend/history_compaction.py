@@ -0,0 +1,449 @@
+"""Background compaction of old run history into message range summaries.
+
+Long runs re-send their whole transcript every turn until the context builder
+has to drop it. After a turn completes, its run is queued here and a
+background thread summarizes every complete block of ``range_messages``
+messages that is older than the newest ``keep_recent_messages`` into an
+``AgentContextSummary`` row; the context builder then sends that summary in
+place of the raw messages of the range.
+
+Ranges are aligned on message sequence numbers (1-20, 21-40, ...) and stored
+under their range key, so compacting a run twice, or from two workers, writes
+each range at most once. A range whose transcript exceeds
+``MAX_TRANSCRIPT_CHARS`` is stored as several consecutive chunks, each
+summarized whole. Chunks with nothing to summarize (every message filtered
+out, or one message longer than the limit) are stored with empty content: they
+are not queried again and the context builder sends their messages as is. Only the LLM call runs on the worker thread and no
+database connection is held while it waits. The queue holds at most one entry
+per run and is bounded; when it is full new runs are dropped and counted, and
+they are picked up again after their next turn.
+
+Compaction spends extra LLM calls on the default config, so it is off unless
+``HISTORY_COMPACTION_ENABLED`` is set to a true value.
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from config_admin_auth import ServiceCredentialCollisionError
+from context_summary_format import (
+    MESSAGE_RANGE_SUMMARY_TYPE,
+    SUMMARY_SOURCE_MESSAGE_HISTORY,
+    build_message_range_summary_content,
+    format_context_message,
+    message_range_key,
+    parse_message_range_key,
+)
+from llm_client import (
+    LlmClientError,
+    provider_error_types,
+    stream_chat_completion_content,
+)
+from models import AgentContextSummary, AgentMessage, AgentRun, db
+from prompts.history_compaction import (
+    HISTORY_COMPACTION_SYSTEM_PROMPT,
+    build_history_compaction_user_prompt,
+)
+from provider_admission import ProviderBusyError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEP_RECENT_MESSAGES = 12
+DEFAULT_RANGE_MESSAGES = 20
+DEFAULT_QUEUE_SIZE = 256
+SUMMARY_MAX_TOKENS = 1024
+MAX_TRANSCRIPT_CHARS = 24_000
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+Summarizer = Callable[[int, int, str], str]
+
+
+class HistoryCompactionError(RuntimeError):
+    pass
+
+
+def compactable_message_ranges(
+    last_sequence: int,
+    *,
+    keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES,
+    range_messages: int = DEFAULT_RANGE_MESSAGES,
+) -> list[tuple[int, int]]:
+    """Complete aligned ranges that lie entirely before the recent window."""
+    newest_compactable = last_sequence - keep_recent_messages
+    return [
+        (first, first + range_messages - 1)
+        for first in range(1, newest_compactable - range_messages + 2, range_messages)
+    ]
+
+
+def summarize_message_range(
+    first_sequence: int,
+    last_sequence: int,
+    transcript: str,
+) -> str:
+    """Summarize a transcript with the active default LLM config."""
+    from config_service import build_provider_limits, get_active_default_llm_config
+
+    try:
+        config = get_active_default_llm_config()
+        if config is None:
+            raise HistoryCompactionError("No default LLM config for history compaction")
+        summary = "".join(
+            stream_chat_completion_content(
+                api_key=config.api_key,
+                base_url=config.base_url,
+                model=config.model,
+                messages=[
+                    {"role": "system", "content": HISTORY_COMPACTION_SYSTEM_PROMPT},
+                    {
+                        "role": "user",
+                        "content": build_history_compaction_user_prompt(
+                            first_sequence=first_sequence,
+                            last_sequence=last_sequence,
+                            transcript=transcript,
+                        ),
+                    },
+                ],
+                temperature=0.2,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                limits=build_provider_limits(config),
+            )
+        ).strip()
+    except (
+        LlmClientError,
+        ProviderBusyError,
+        ServiceCredentialCollisionError,
+        *provider_error_types(),
+    ) as e:
+        raise HistoryCompactionError(str(e)) from e
+    if not summary:
+        raise HistoryCompactionError("History compaction returned an empty summary")
+    return summary
+
+
+def compact_run_history(
+    run_id: str,
+    *,
+    summarize: Summarizer = summarize_message_range,
+    keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES,
+    range_messages: int = DEFAULT_RANGE_MESSAGES,
+) -> int:
+    """Summarize the run's uncompacted old ranges; return how many were stored."""
+    from run_persistence import (
+        TurnPersistenceError,
+        context_omitted_message_sequences,
+    )
+
+    run = db.session.get(AgentRun, run_id)
+    if run is None:
+        return 0
+    ranges = compactable_message_ranges(
+        run.last_message_sequence or 0,
+        keep_recent_messages=keep_recent_messages,
+        range_messages=range_messages,
+    )
+    stored_ranges: dict[int, int] = {}
+    for key in db.session.execute(
+        select(AgentContextSummary.source_stage_id).where(
+            AgentContextSummary.run_id == run_id,
+            AgentContextSummary.source_type == SUMMARY_SOURCE_MESSAGE_HISTORY,
+            AgentContextSummary.summary_type == MESSAGE_RANGE_SUMMARY_TYPE,
+        )
+    ).scalars():
+        stored = parse_message_range_key(key)
+        if stored is not None:
+            start, end = stored
+            stored_ranges[start] = max(end, stored_ranges.get(start, 0))
+    pending_ranges = []
+    for first, last in ranges:
+        # A range may be stored as several consecutive chunks.
+        while first in stored_ranges and first <= last:
+            first = stored_ranges[first] + 1
+        if first <= last:
+            pending_ranges.append((first, last))
+    if not pending_ranges:
+        db.session.rollback()
+        return 0
+
+    try:
+        excluded_sequences = context_omitted_message_sequences(run_id)
+    except TurnPersistenceError as e:
+        raise HistoryCompactionError(str(e)) from e
+    messages = db.session.execute(
+        select(
+            AgentMessage.sequence_index,
+            AgentMessage.role,
+            AgentMessage.content,
+        )
+        .where(
+            AgentMessage.run_id == run_id,
+            AgentMessage.sequence_index.between(
+                pending_ranges[0][0],
+                pending_ranges[-1][1],
+            ),
+        )
+        .order_by(AgentMessage.sequence_index)
+    ).all()
+    chunks = []
+    for first, last in pending_ranges:
+        blocks = [
+            (message.sequence_index, formatted)
+            for message in messages
+            if first <= message.sequence_index <= last
+            and message.sequence_index not in excluded_sequences
+            and (formatted := format_context_message(message.role, message.content))
+            is not None
+        ]
+        chunks.extend(_transcript_chunks(first, last, blocks))
+    # No connection is held while the model summarizes.
+    db.session.close()
+
+    compacted = 0
+    for first, last, transcript in chunks:
+        # Chunks without a transcript are stored empty so they are not queried
+        # again; the context builder sends their messages unchanged.
+        content = ""
+        if transcript:
+            content = build_message_range_summary_content(
+                summarize(first, last, transcript)
+            ) or ""
+        db.session.add(
+            AgentContextSummary(
+                run_id=run_id,
+                source_type=SUMMARY_SOURCE_MESSAGE_HISTORY,
+                source_stage_id=message_range_key(first, last),
+                summary_type=MESSAGE_RANGE_SUMMARY_TYPE,
+                content=content,
+            )
+        )
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker stored this range first.
+            db.session.rollback()
+            continue
+        compacted += int(bool(content))
+    return compacted
+
+
+def _transcript_chunks(
+    first: int,
+    last: int,
+    blocks: list[tuple[int, str]],
+) -> list[tuple[int, int, str]]:
+    """Split a range into consecutive chunks whose transcripts fit the limit.
+
+    A message that alone exceeds ``MAX_TRANSCRIPT_CHARS`` gets a chunk with an
+    empty transcript, which is never summarized.
+    """
+    chunks = []
+    start = first
+    chunk_blocks: list[str] = []
+    chunk_chars = 0
+    for sequence, block in blocks:
+        added_chars = len(block) + (2 if chunk_blocks else 0)
+        if chunk_blocks and chunk_chars + added_chars > MAX_TRANSCRIPT_CHARS:
+            chunks.append((start, sequence - 1, "\n\n".join(chunk_blocks)))
+            start = sequence
+            chunk_blocks, chunk_chars = [], 0
+            added_chars = len(block)
+        if added_chars > MAX_TRANSCRIPT_CHARS:
+            chunks.append((start, sequence, ""))
+            start = sequence + 1
+            continue
+        chunk_blocks.append(block)
+        chunk_chars += added_chars
+    if start <= last:
+        chunks.append((start, last, "\n\n".join(chunk_blocks)))
+    return chunks
+
+
+class HistoryCompactor:
+    """Bounded per-run job queue drained by one background thread."""
+
+    def __init__(
+        self,
+        *,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+        keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES,
+        range_messages: int = DEFAULT_RANGE_MESSAGES,
+        summarize: Summarizer = summarize_message_range,
+    ) -> None:
+        self.max_queue = max(1, max_queue)
+        self.keep_recent_messages = max(0, keep_recent_messages)
+        self.range_messages = max(1, range_messages)
+        self.summarize = summarize
+        self.queued = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.compacted_ranges = 0
+        # (app, run_id) in enqueue order; a run already queued is not added
+        # again because one job compacts everything that is due.
+        self._pending: OrderedDict = OrderedDict()
+        self._condition = threading.Condition()
+        self._process_lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self._closed = False
+
+    def enqueue(self, run_id: str) -> bool:
+        """Queue compaction of the run; return False when it was dropped."""
+        key = (current_app._get_current_object(), run_id)
+        with self._condition:
+            if key in self._pending:
+                return True
+            if self._closed or len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self._pending[key] = None
+                self.queued += 1
+                self._ensure_worker_locked()
+                self._condition.notify()
+                return True
+        if dropped == 1 or dropped % 100 == 0:
+            logger.warning(
+                "History compaction queue is full; dropped %d jobs so far",
+                dropped,
+            )
+        return False
+
+    def flush(self) -> int:
+        """Run every queued job now; return the number of ranges compacted."""
+        compacted = 0
+        while True:
+            with self._condition:
+                if not self._pending:
+                    break
+                (app, run_id), _ = self._pending.popitem(last=False)
+            compacted += self._process(app, run_id)
+        # Wait for a job the worker may have taken before the queue emptied.
+        with self._process_lock:
+            pass
+        return compacted
+
+    def close(self, *, timeout: float = CLOSE_TIMEOUT_SECONDS) -> None:
+        """Stop the worker and discard queued jobs."""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+            worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "queued": self.queued,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "failed": self.failed,
+                "compactedRanges": self.compacted_ranges,
+                "keepRecentMessages": self.keep_recent_messages,
+                "rangeMessages": self.range_messages,
+            }
+
+    def _ensure_worker_locked(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(
+            target=self._run,
+            name="history-compaction",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                (app, run_id), _ = self._pending.popitem(last=False)
+            self._process(app, run_id)
+
+    def _process(self, app, run_id: str) -> int:
+        with self._process_lock:
+            compacted = 0
+            failed = False
+            with app.app_context():
+                try:
+                    compacted = compact_run_history(
+                        run_id,
+                        summarize=self.summarize,
+                        keep_recent_messages=self.keep_recent_messages,
+                        range_messages=self.range_messages,
+                    )
+                except HistoryCompactionError as e:
+                    db.session.rollback()
+                    logger.warning("History compaction of run %s failed: %s", run_id, e)
+                    failed = True
+                except (SQLAlchemyError, LookupError, ValueError):
+                    db.session.rollback()
+                    logger.exception("History compaction of run %s failed", run_id)
+                    failed = True
+                finally:
+                    db.session.remove()
+            with self._condition:
+                self.completed += 1
+                self.failed += int(failed)
+                self.compacted_ranges += compacted
+            return compacted
+
+
+def _history_compaction_enabled() -> bool:
+    return os.environ.get("HISTORY_COMPACTION_ENABLED", "").strip().lower() in {
+        "1",
+        "true",
+        "yes",
+        "on",
+    }
+
+
+_compactor: HistoryCompactor | None = None
+_compactor_lock = threading.Lock()
+
+
+def get_history_compactor() -> HistoryCompactor | None:
+    """Return the process compactor, or None when compaction is disabled."""
+    global _compactor
+    if not _history_compaction_enabled():
+        return None
+    with _compactor_lock:
+        if _compactor is None:
+            _compactor = HistoryCompactor(
+                max_queue=int(
+                    os.environ.get("HISTORY_COMPACTION_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)
+                ),
+                keep_recent_messages=int(
+                    os.environ.get(
+                        "HISTORY_COMPACTION_KEEP_RECENT_MESSAGES",
+                        DEFAULT_KEEP_RECENT_MESSAGES,
+                    )
+                ),
+                range_messages=int(
+                    os.environ.get(
+                        "HISTORY_COMPACTION_RANGE_MESSAGES",
+                        DEFAULT_RANGE_MESSAGES,
+                    )
+                ),
+            )
+        return _compactor
+
+
+def reset_history_compactor() -> None:
+    global _compactor
+    with _compactor_lock:
+        compactor, _compactor = _compactor, None
+    if compactor is not None:
+        compactor.close()
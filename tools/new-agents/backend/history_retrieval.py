@@ -0,0 +1,191 @@
+"""BM25 ranking of older history blocks for truncated run contexts.
+
+When a run outgrows its context budget, the context builder keeps the most
+recent turns and the priority summaries, then fills what is left of the budget
+with the older blocks that score highest against the current prompt instead of
+simply the next-newest ones.
+
+Each run has an in-process index of its history blocks, keyed by a digest of
+the block text. ``sync`` tokenizes only blocks it has not seen before and drops
+blocks that are gone, so a turn costs one tokenization of the messages written
+since the previous turn. The index is rebuilt from the run snapshot, which
+keeps every worker consistent with the database without any shared state.
+
+Tokenization is offline and dependency-free: lowercase ASCII words plus
+character bigrams of CJK runs, which is what makes BM25 usable on Chinese
+text without a segmenter.
+"""
+
+from collections import Counter, OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+import hashlib
+import math
+import os
+import re
+import threading
+
+DEFAULT_MAX_RUNS = 256
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERM_PATTERN = re.compile(
+    r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+"
+)
+
+
+def tokenize_for_retrieval(text: str) -> list[str]:
+    """Split text into lowercase ASCII words and CJK character bigrams."""
+    terms = []
+    for match in _TERM_PATTERN.finditer(text.lower()):
+        term = match.group()
+        if term.isascii() or len(term) == 1:
+            terms.append(term)
+        else:
+            terms.extend(term[index : index + 2] for index in range(len(term) - 1))
+    return terms
+
+
+def _block_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+@dataclass(frozen=True)
+class _Document:
+    term_counts: Counter
+    length: int
+
+
+class HistoryIndex:
+    """Incrementally maintained BM25 index over one run's history blocks."""
+
+    def __init__(self) -> None:
+        self.tokenized_blocks = 0
+        self._documents: dict[bytes, _Document] = {}
+        self._document_frequency: Counter = Counter()
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def sync(self, blocks: Iterable[str]) -> None:
+        """Make the indexed blocks exactly ``blocks``, tokenizing only new ones."""
+        wanted = {_block_key(block): block for block in blocks}
+        with self._lock:
+            for key in self._documents.keys() - wanted.keys():
+                self._remove(key)
+            for key, block in wanted.items():
+                if key not in self._documents:
+                    self._add(key, block)
+
+    def scores(self, query: str, blocks: list[str]) -> list[float]:
+        """BM25 score of each block for ``query``; unindexed blocks score 0."""
+        query_terms = set(tokenize_for_retrieval(query))
+        with self._lock:
+            document_count = len(self._documents)
+            if not query_terms or document_count == 0:
+                return [0.0] * len(blocks)
+            average_length = self._total_length / document_count or 1.0
+            idf = {
+                term: math.log(
+                    1
+                    + (document_count - frequency + 0.5) / (frequency + 0.5)
+                )
+                for term in query_terms
+                if (frequency := self._document_frequency.get(term, 0))
+            }
+            scores = []
+            for block in blocks:
+                document = self._documents.get(_block_key(block))
+                if document is None:
+                    scores.append(0.0)
+                    continue
+                length_norm = BM25_K1 * (
+                    1 - BM25_B + BM25_B * document.length / average_length
+                )
+                score = 0.0
+                for term, term_idf in idf.items():
+                    frequency = document.term_counts.get(term)
+                    if frequency:
+                        score += (
+                            term_idf
+                            * frequency
+                            * (BM25_K1 + 1)
+                            / (frequency + length_norm)
+                        )
+                scores.append(score)
+            return scores
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "tokenizedBlocks": self.tokenized_blocks,
+            }
+
+    def _add(self, key: bytes, block: str) -> None:
+        terms = tokenize_for_retrieval(block)
+        document = _Document(term_counts=Counter(terms), length=len(terms))
+        self._documents[key] = document
+        self._document_frequency.update(document.term_counts.keys())
+        self._total_length += document.length
+        self.tokenized_blocks += 1
+
+    def _remove(self, key: bytes) -> None:
+        document = self._documents.pop(key)
+        for term in document.term_counts:
+            self._document_frequency[term] -= 1
+            if not self._document_frequency[term]:
+                del self._document_frequency[term]
+        self._total_length -= document.length
+
+
+class HistoryIndexRegistry:
+    """LRU of per-run history indexes."""
+
+    def __init__(self, max_runs: int = DEFAULT_MAX_RUNS) -> None:
+        self.max_runs = max(1, max_runs)
+        self._indexes: OrderedDict[str, HistoryIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, run_id: str) -> HistoryIndex:
+        with self._lock:
+            index = self._indexes.get(run_id)
+            if index is None:
+                index = self._indexes[run_id] = HistoryIndex()
+                if len(self._indexes) > self.max_runs:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(run_id)
+            return index
+
+    def stats(self) -> dict:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        return {
+            "runs": len(indexes),
+            "maxRuns": self.max_runs,
+            "documents": sum(index.stats()["documents"] for index in indexes),
+        }
+
+
+_registry: HistoryIndexRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_history_index_registry() -> HistoryIndexRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = HistoryIndexRegistry(
+                int(os.environ.get("HISTORY_INDEX_MAX_RUNS", DEFAULT_MAX_RUNS))
+            )
+        return _registry
+
+
+def get_history_index(run_id: str) -> HistoryIndex:
+    return get_history_index_registry().get(run_id)
+
+
+def reset_history_indexes() -> None:
+    global _registry
+    with _registry_lock:
+        _registry = None
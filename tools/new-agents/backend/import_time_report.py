@@ -0,0 +1,149 @@
+"""Import-time report for backend entry modules.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter and
+parses the timings CPython writes to stderr. Usage::
+
+    python -m import_time_report routes --top 20
+
+Workers import ``app`` before they can answer ``/health``, so the OpenAI SDK,
+PydanticAI, tiktoken and the artifact_data renderer models are imported on
+first use and must not appear in the report of an entry module.
+"""
+
+import argparse
+from dataclasses import dataclass
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFERRED_MODULES = ("openai", "pydantic_ai", "artifact_data_renderers", "tiktoken")
+IMPORT_TIME_BUDGET_MS = 1500
+
+_IMPORTTIME_LINE = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent> *)(?P<module>\S+)$"
+)
+
+
+@dataclass(frozen=True)
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass(frozen=True)
+class ImportTimeReport:
+    target: str
+    timings: tuple[ImportTiming, ...]
+
+    @property
+    def total_ms(self) -> float:
+        for timing in self.timings:
+            if timing.module == self.target and timing.depth == 0:
+                return timing.cumulative_us / 1000
+        return sum(t.self_us for t in self.timings) / 1000
+
+    @property
+    def modules(self) -> frozenset[str]:
+        return frozenset(timing.module for timing in self.timings)
+
+    def loaded(self, package: str) -> bool:
+        prefix = f"{package}."
+        return any(
+            module == package or module.startswith(prefix) for module in self.modules
+        )
+
+    def slowest(self, count: int) -> list[ImportTiming]:
+        return sorted(self.timings, key=lambda t: t.self_us, reverse=True)[:count]
+
+    def top_level(self, count: int) -> list[ImportTiming]:
+        top_level = [timing for timing in self.timings if timing.depth <= 1]
+        return sorted(top_level, key=lambda t: t.cumulative_us, reverse=True)[:count]
+
+    def format(self, count: int = 15) -> str:
+        lines = [f"import {self.target}: {self.total_ms:.1f}ms"]
+        lines.append("largest direct imports (cumulative ms):")
+        lines.extend(
+            f"  {timing.cumulative_us / 1000:8.1f}  {timing.module}"
+            for timing in self.top_level(count)
+        )
+        lines.append("slowest modules (self ms):")
+        lines.extend(
+            f"  {timing.self_us / 1000:8.1f}  {timing.module}"
+            for timing in self.slowest(count)
+        )
+        return "\n".join(lines)
+
+
+def parse_importtime(output: str) -> tuple[ImportTiming, ...]:
+    """Parse ``-X importtime`` stderr, ignoring any other output lines."""
+    timings = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        timings.append(
+            ImportTiming(
+                module=match.group("module"),
+                self_us=int(match.group("self")),
+                cumulative_us=int(match.group("cumulative")),
+                depth=(len(match.group("indent")) - 1) // 2,
+            )
+        )
+    return tuple(timings)
+
+
+def measure_import_time(
+    module: str,
+    *,
+    python: str = sys.executable,
+    cwd: str = BACKEND_DIR,
+    env: dict[str, str] | None = None,
+) -> ImportTimeReport:
+    """Import ``module`` in a fresh interpreter and return its timings."""
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"import {module} failed with exit code {completed.returncode}:\n"
+            f"{completed.stderr[-2000:]}"
+        )
+    return ImportTimeReport(target=module, timings=parse_importtime(completed.stderr))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="backend import-time report")
+    parser.add_argument("module", nargs="?", default="routes")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    report = measure_import_time(args.module, env={"FLASK_TESTING": "1"})
+    print(report.format(args.top))
+
+    failures = [
+        f"{package} is imported eagerly"
+        for package in DEFERRED_MODULES
+        if report.loaded(package)
+    ]
+    if report.total_ms > args.budget_ms:
+        failures.append(
+            f"import took {report.total_ms:.1f}ms, budget {args.budget_ms:.0f}ms"
+        )
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
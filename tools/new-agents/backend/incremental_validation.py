@@ -0,0 +1,112 @@
+"""Validation of a raw JSON turn while the provider is still streaming it.
+
+The complete payload is validated once the provider finishes. Many failures
+are certain long before that. ``IncrementalTurnValidator`` reports such a
+failure as soon as it is certain, so the runtime can cancel the attempt and
+retry instead of paying for the rest of the generation:
+
+- each top-level ``artifact_data`` field is validated against its model
+  annotation as soon as the field is closed in the stream;
+- each artifact section is validated and rendered, including its visual
+  blocks, once every field it depends on is closed;
+- the closed ``artifact_data`` value is rendered as a whole, which adds the
+  missing-field and cross-field checks;
+- for Markdown artifacts, every closed ``ai4se-visual`` block is validated.
+
+Only failures that make the final validation fail for certain are reported,
+and they are raised in the shape the final validation raises them, so the
+retry prompt carries the same kind of diagnostic.
+"""
+
+from typing import Any
+
+from pydantic import ValidationError
+
+# A field, section or fenced block can only have closed in a chunk that
+# contains one of these characters.
+_ARTIFACT_DATA_CLOSING_MARKS = frozenset(',}]')
+_MARKDOWN_FENCE_MARKS = frozenset("`~")
+
+
+class IncrementalTurnValidator:
+    """Checks the accumulated text of one streamed attempt."""
+
+    def __init__(self, *, workflow_id: str, current_stage_id: str) -> None:
+        from agent_runtime import supports_artifact_data_rendering
+        from artifact_data_renderers import build_artifact_stream_validator
+
+        self.workflow_id = workflow_id
+        self.current_stage_id = current_stage_id
+        self._stream_validator = (
+            build_artifact_stream_validator(
+                workflow_id=workflow_id,
+                current_stage_id=current_stage_id,
+            )
+            if supports_artifact_data_rendering(workflow_id, current_stage_id)
+            else None
+        )
+        self._artifact_data_checked = False
+
+    def check(self, text: str, text_chunk: str) -> Exception | None:
+        """Return the error the attempt is certain to fail with, if known yet."""
+        if self._stream_validator is None:
+            if _MARKDOWN_FENCE_MARKS.isdisjoint(text_chunk):
+                return None
+            return self._markdown_error(text)
+        if self._artifact_data_checked or _ARTIFACT_DATA_CLOSING_MARKS.isdisjoint(
+            text_chunk
+        ):
+            return None
+        return self._artifact_data_error(text)
+
+    def _artifact_data_error(self, text: str) -> Exception | None:
+        from agent_runtime import (
+            extract_complete_json_value_after_key,
+            extract_partial_json_object_after_key,
+        )
+
+        artifact_data = extract_complete_json_value_after_key(text, "artifact_data")
+        if artifact_data is not None:
+            self._artifact_data_checked = True
+            return self._render_error(artifact_data)
+        closed_fields = extract_partial_json_object_after_key(text, "artifact_data")
+        if not closed_fields:
+            return None
+        try:
+            self._stream_validator.check(closed_fields)
+        except (ValidationError, ValueError) as exc:
+            return exc
+        return None
+
+    def _render_error(self, artifact_data: Any) -> Exception | None:
+        from artifact_data_renderers import render_complete_artifact_data
+
+        if not isinstance(artifact_data, dict):
+            # The final parse rejects this too, but with a different error.
+            return None
+        try:
+            render_complete_artifact_data(
+                artifact_data,
+                workflow_id=self.workflow_id,
+                current_stage_id=self.current_stage_id,
+            )
+        except (ValidationError, ValueError) as exc:
+            return exc
+        return None
+
+    def _markdown_error(self, text: str) -> Exception | None:
+        from agent_contracts import (
+            ContractValidationError,
+            validate_artifact_visual_blocks,
+        )
+        from agent_runtime import extract_json_string_prefix
+
+        markdown = extract_json_string_prefix(text, "markdown")
+        if not markdown:
+            return None
+        try:
+            # Only closed fences are extracted, so an open block never fails.
+            validate_artifact_visual_blocks(markdown)
+        except ContractValidationError as exc:
+            return exc
+        return None
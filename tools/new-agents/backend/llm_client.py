@@ -1,7 +1,13 @@
 from collections.abc import Callable, Iterator, Sequence
+import sys
 from typing import Any, Protocol, TypeGuard
 
-from openai import APIError, AuthenticationError, OpenAI, OpenAIError, RateLimitError
+from provider_admission import (
+    ProviderBusyError,
+    ProviderLimits,
+    get_provider_admission,
+)
+from token_counting import get_token_counter
 
 
 class ChatDelta(Protocol):
@@ -39,6 +45,19 @@ SAFE_FINISH_REASONS = frozenset(
 )
 
 
+def provider_error_types() -> tuple[type[Exception], ...]:
+    """Return the OpenAI SDK errors that callers map to provider failures.
+
+    The SDK is imported on the first completion call. Until then no provider
+    error can have been raised, so ``except`` clauses can match against an
+    empty tuple instead of importing the SDK at module import time.
+    """
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return ()
+    return (openai.AuthenticationError, openai.RateLimitError, openai.APIError)
+
+
 def is_chat_stream_chunk(value: object) -> TypeGuard[ChatStreamChunk]:
     return hasattr(value, "choices")
 
@@ -86,6 +105,17 @@ def extract_finish_reason(chunk: object) -> str | None:
     return finish_reason if finish_reason in SAFE_FINISH_REASONS else "unknown"
 
 
+def _estimate_tokens(
+    model: str,
+    messages: list[ChatMessage],
+    streamed: list[str],
+) -> int:
+    counter = get_token_counter(model)
+    return sum(
+        counter.count(message.get("content") or "") for message in messages
+    ) + counter.count("".join(streamed))
+
+
 def stream_chat_completion_content(
     *,
     api_key: str,
@@ -98,7 +128,31 @@ def stream_chat_completion_content(
     max_tokens: int | None = None,
     on_usage: Callable[[int], None] | None = None,
     on_finish_reason: Callable[[str], None] | None = None,
+    limits: ProviderLimits | None = None,
+    on_queue_wait: Callable[[int], None] | None = None,
 ) -> Iterator[str]:
+    """Stream the content of a chat completion.
+
+    With enabled ``limits`` the request first waits for admission to its
+    provider and reports the wait through ``on_queue_wait``. A request that
+    is not admitted raises ``ProviderBusyError`` without reaching the
+    provider. A stream that ends without reporting usage charges the
+    provider's token bucket with a local estimate.
+    """
+    from openai import OpenAI, OpenAIError
+
+    slot = None
+    stream = None
+    streamed: list[str] = []
+    if limits is not None and limits.enabled:
+        try:
+            slot = get_provider_admission().acquire(base_url, limits, api_key)
+        except ProviderBusyError as e:
+            if on_queue_wait is not None:
+                on_queue_wait(e.wait_ms)
+            raise
+        if on_queue_wait is not None:
+            on_queue_wait(slot.wait_ms)
     try:
         client = OpenAI(api_key=api_key, base_url=base_url)
         request_kwargs: dict[str, Any] = {
@@ -113,21 +167,37 @@ def stream_chat_completion_content(
             request_kwargs["extra_body"] = extra_body
         if max_tokens is not None:
             request_kwargs["max_tokens"] = max_tokens
-        if on_usage is not None:
+        if on_usage is not None or slot is not None:
             request_kwargs["stream_options"] = {"include_usage": True}
         stream = client.chat.completions.create(**request_kwargs)
 
-        for chunk in stream:
-            finish_reason = extract_finish_reason(chunk)
-            if finish_reason is not None and on_finish_reason is not None:
-                on_finish_reason(finish_reason)
-            total_tokens = extract_total_tokens(chunk)
-            if total_tokens is not None and on_usage is not None:
-                on_usage(total_tokens)
-            content = extract_delta_content(chunk)
-            if content:
-                yield content
-    except (AuthenticationError, RateLimitError, APIError):
+        try:
+            for chunk in stream:
+                finish_reason = extract_finish_reason(chunk)
+                if finish_reason is not None and on_finish_reason is not None:
+                    on_finish_reason(finish_reason)
+                total_tokens = extract_total_tokens(chunk)
+                if total_tokens is not None and slot is not None:
+                    slot.charge_tokens(total_tokens)
+                if total_tokens is not None and on_usage is not None:
+                    on_usage(total_tokens)
+                content = extract_delta_content(chunk)
+                if content:
+                    if slot is not None:
+                        streamed.append(content)
+                    yield content
+        finally:
+            # A caller that stops iterating early cancels the provider
+            # request instead of leaving the response open.
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+    except provider_error_types():
         raise
     except OpenAIError as e:
         raise LlmClientError(str(e)) from e
+    finally:
+        if slot is not None:
+            if stream is not None and not slot.charged:
+                slot.charge_tokens(_estimate_tokens(model, messages, streamed))
+            slot.release()
@@ -0,0 +1,318 @@
+"""Content-addressed cache for Mermaid repair results.
+
+The frontend asks for a repair of the same broken block on every re-render or
+reload, and runs built from the same prompt templates tend to produce the same
+broken diagrams. Repairs are therefore stored in the database under a digest
+of the normalized broken code, the validator error message, the block index
+and the model name, and served from there until they expire.
+
+Rows expire after ``MERMAID_REPAIR_CACHE_TTL_SECONDS`` (default seven days) and
+the table is trimmed to the ``MERMAID_REPAIR_CACHE_MAX_ENTRIES`` most recently
+used rows whenever a repair is stored. Identical repairs that arrive while one
+is already waiting on the LLM share that call instead of starting their own;
+this single-flight coalescing is per worker process.
+
+The cache only holds the repaired Mermaid code. The artifact contract check
+depends on the caller's current artifact, so ``validate`` runs on every
+request, hit or miss, and a repair is only stored once it has passed.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+import os
+import threading
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from mermaid_repair_service import MermaidRepairError
+from models import AgentMermaidRepairCacheEntry, db
+from request_schemas import MermaidRepairRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+# Repairs longer than this are returned but not stored.
+MAX_CACHED_CODE_CHARS = 20_000
+# How long a coalesced request waits for the shared LLM call.
+SINGLE_FLIGHT_WAIT_SECONDS = 300.0
+
+
+def normalize_mermaid_code(code: str) -> str:
+    """Drop line-ending and trailing-whitespace differences that do not change a diagram."""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def mermaid_repair_cache_key(
+    broken_code: str,
+    error_message: str,
+    model_name: str,
+    block_index: int | None = None,
+) -> str:
+    digest = hashlib.sha256()
+    for part in (
+        normalize_mermaid_code(broken_code),
+        error_message.strip(),
+        "" if block_index is None else str(block_index),
+        model_name,
+    ):
+        encoded = part.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+@dataclass
+class _Flight:
+    done: threading.Event = field(default_factory=threading.Event)
+    repaired_code: str | None = None
+    error: MermaidRepairError | None = None
+
+
+class MermaidRepairCache:
+    """Database-backed repair cache with in-process single-flight."""
+
+    def __init__(
+        self,
+        *,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        self.ttl = timedelta(seconds=max(0.0, ttl_seconds))
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.evictions = 0
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get_or_repair(
+        self,
+        repair_request: MermaidRepairRequest,
+        *,
+        model_name: str,
+        repair: Callable[[], str],
+        validate: Callable[[str], None] | None = None,
+    ) -> str:
+        """Return the cached repair for the request, calling ``repair`` on a miss.
+
+        ``validate`` raises ``MermaidRepairError`` when a repair does not fit the
+        caller's artifact. A fresh repair that fails it is not stored.
+        """
+        key = mermaid_repair_cache_key(
+            repair_request.broken_code,
+            repair_request.error_message,
+            model_name,
+            repair_request.block_index,
+        )
+        cached = self._load(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            if validate is not None:
+                validate(cached)
+            return cached
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            repaired_code = self._wait_for(flight)
+            if validate is not None:
+                validate(repaired_code)
+            return repaired_code
+
+        try:
+            try:
+                repaired_code = repair()
+            except MermaidRepairError as e:
+                flight.error = e
+                raise
+            # Followers check the shared repair against their own artifact.
+            flight.repaired_code = repaired_code
+            if validate is not None:
+                validate(repaired_code)
+            # Store before the flight ends so a request arriving right after
+            # finds the row instead of starting another LLM call.
+            self._store(key, model_name, repaired_code)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return repaired_code
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hitRate": (
+                    round((self.hits + self.coalesced) / lookups, 4)
+                    if lookups
+                    else 0.0
+                ),
+                "inFlight": len(self._flights),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": int(self.ttl.total_seconds()),
+            }
+        try:
+            stats["entries"] = db.session.execute(
+                select(func.count()).select_from(AgentMermaidRepairCacheEntry)
+            ).scalar_one()
+        except SQLAlchemyError:
+            db.session.rollback()
+            stats["entries"] = None
+        return stats
+
+    def _wait_for(self, flight: _Flight) -> str:
+        if not flight.done.wait(SINGLE_FLIGHT_WAIT_SECONDS):
+            raise MermaidRepairError("Mermaid repair timed out waiting for a shared request")
+        if flight.error is not None:
+            raise flight.error
+        if flight.repaired_code is None:
+            raise MermaidRepairError("Mermaid repair failed in a shared request")
+        return flight.repaired_code
+
+    def _load(self, key: str) -> str | None:
+        now = _utcnow_naive()
+        try:
+            entry = db.session.execute(
+                select(
+                    AgentMermaidRepairCacheEntry.id,
+                    AgentMermaidRepairCacheEntry.repaired_code,
+                ).where(
+                    AgentMermaidRepairCacheEntry.cache_key == key,
+                    AgentMermaidRepairCacheEntry.expires_at > now,
+                )
+            ).first()
+            if entry is None:
+                return None
+            db.session.execute(
+                update(AgentMermaidRepairCacheEntry)
+                .where(AgentMermaidRepairCacheEntry.id == entry.id)
+                .values(
+                    hit_count=AgentMermaidRepairCacheEntry.hit_count + 1,
+                    last_hit_at=now,
+                )
+            )
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception("Mermaid repair cache lookup failed")
+            return None
+        return entry.repaired_code
+
+    def _store(self, key: str, model_name: str, repaired_code: str) -> None:
+        if len(repaired_code) > MAX_CACHED_CODE_CHARS:
+            return
+        now = _utcnow_naive()
+        try:
+            db.session.execute(
+                delete(AgentMermaidRepairCacheEntry).where(
+                    AgentMermaidRepairCacheEntry.cache_key == key
+                )
+            )
+            db.session.execute(
+                insert(AgentMermaidRepairCacheEntry).values(
+                    cache_key=key,
+                    model_name=model_name,
+                    repaired_code=repaired_code,
+                    hit_count=0,
+                    created_at=now,
+                    last_hit_at=now,
+                    expires_at=now + self.ttl,
+                )
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Another worker stored the same repair first.
+            db.session.rollback()
+            return
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception("Mermaid repair cache store failed")
+            return
+        evicted = self._trim(now)
+        with self._lock:
+            self.stores += 1
+            self.evictions += evicted
+
+    def _trim(self, now: datetime) -> int:
+        """Delete expired rows and the least recently used rows beyond the cap."""
+        try:
+            evicted = db.session.execute(
+                delete(AgentMermaidRepairCacheEntry).where(
+                    AgentMermaidRepairCacheEntry.expires_at <= now
+                )
+            ).rowcount
+            keep_ids = (
+                select(AgentMermaidRepairCacheEntry.id)
+                .order_by(
+                    AgentMermaidRepairCacheEntry.last_hit_at.desc(),
+                    AgentMermaidRepairCacheEntry.id.desc(),
+                )
+                .limit(self.max_entries)
+            )
+            evicted += db.session.execute(
+                delete(AgentMermaidRepairCacheEntry).where(
+                    AgentMermaidRepairCacheEntry.id.not_in(keep_ids.scalar_subquery())
+                )
+            ).rowcount
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception("Mermaid repair cache trim failed")
+            return 0
+        return evicted
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+_cache: MermaidRepairCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_mermaid_repair_cache() -> MermaidRepairCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MermaidRepairCache(
+                ttl_seconds=float(
+                    os.environ.get(
+                        "MERMAID_REPAIR_CACHE_TTL_SECONDS",
+                        DEFAULT_TTL_SECONDS,
+                    )
+                ),
+                max_entries=int(
+                    os.environ.get(
+                        "MERMAID_REPAIR_CACHE_MAX_ENTRIES",
+                        DEFAULT_MAX_ENTRIES,
+                    )
+                ),
+            )
+        return _cache
+
+
+def reset_mermaid_repair_cache() -> None:
+    global _cache
+    with _cache_lock:
+        _cache = None
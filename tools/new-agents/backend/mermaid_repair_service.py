@@ -1,11 +1,15 @@
 import re
 
-from llm_client import LlmClientError, stream_chat_completion_content
-from openai import APIError, AuthenticationError, RateLimitError
+from llm_client import (
+    LlmClientError,
+    provider_error_types,
+    stream_chat_completion_content,
+)
 from prompts.mermaid_repair import (
     MERMAID_REPAIR_SYSTEM_PROMPT,
     build_mermaid_repair_user_prompt,
 )
+from provider_admission import ProviderBusyError, ProviderLimits
 from request_schemas import MermaidRepairRequest
 
 
@@ -46,6 +50,7 @@ def repair_mermaid_code(
     api_key: str,
     base_url: str | None,
     model_name: str,
+    limits: ProviderLimits | None = None,
 ) -> str:
     messages = [
         {
@@ -70,8 +75,9 @@ def repair_mermaid_code(
                 model=model_name,
                 messages=messages,
                 temperature=0.2,
+                limits=limits,
             )
         )
-    except (LlmClientError, AuthenticationError, RateLimitError, APIError) as e:
+    except (LlmClientError, ProviderBusyError, *provider_error_types()) as e:
         raise MermaidRepairError(str(e)) from e
     return clean_mermaid_repair_output(raw_response)
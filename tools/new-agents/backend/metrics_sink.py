@@ -0,0 +1,221 @@
+"""Write-coalescing sink for turn metrics and runtime config issues.
+
+Failure paths record a turn metric right before the user-visible error event
+is yielded, and a missing default LLM config records an issue before the 503
+is returned. Neither row is needed by the request itself, so instead of
+committing one transaction each on the request thread they are appended to an
+in-process buffer and written by a background thread in batched INSERTs once
+``flush_size`` rows are pending or ``flush_interval`` seconds have passed.
+
+The buffer is bounded: when the database falls behind, new rows are dropped
+and counted rather than growing memory or blocking requests. Pending rows are
+drained on interpreter shutdown and before the observability summary is read.
+The success-path metric is still committed atomically with the completed turn
+and does not go through this sink.
+"""
+
+import atexit
+from collections import deque
+import logging
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 10_000
+DEFAULT_FLUSH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+
+class MetricsSink:
+    """Bounded buffer of observability rows flushed in batches."""
+
+    def __init__(
+        self,
+        *,
+        max_buffer: int = DEFAULT_BUFFER_SIZE,
+        flush_size: int = DEFAULT_FLUSH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    ) -> None:
+        self.max_buffer = max(1, max_buffer)
+        self.flush_size = max(1, min(flush_size, self.max_buffer))
+        self.flush_interval = max(0.0, flush_interval)
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        # (app, model, row) in enqueue order; rows are grouped per app on
+        # write because each app may be bound to a different database.
+        self._pending: deque = deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+        self._closed = False
+
+    def enqueue(self, model, row: dict) -> bool:
+        """Buffer one row for ``model``; return False when it was dropped."""
+        app = current_app._get_current_object()
+        with self._condition:
+            if self._closed or len(self._pending) >= self.max_buffer:
+                self.dropped += 1
+                dropped = self.dropped
+            else:
+                self._pending.append((app, model, row))
+                self._ensure_worker_locked()
+                # Wake the worker to start the interval timer on the first
+                # row, and to write immediately once a full batch is pending.
+                if len(self._pending) in (1, self.flush_size):
+                    self._condition.notify()
+                return True
+        if dropped == 1 or dropped % 1000 == 0:
+            logger.warning(
+                "Metrics sink buffer is full; dropped %d %s rows so far",
+                dropped,
+                model.__tablename__,
+            )
+        return False
+
+    def flush(self) -> int:
+        """Write every pending row now, waiting for any in-flight batch."""
+        return self._write_pending()
+
+    def close(
+        self,
+        *,
+        drain: bool = True,
+        timeout: float = CLOSE_TIMEOUT_SECONDS,
+    ) -> None:
+        """Stop the worker and write, or with ``drain=False`` discard, what is left."""
+        with self._condition:
+            self._closed = True
+            if not drain:
+                self._pending.clear()
+            self._condition.notify_all()
+            worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+        self._write_pending()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def _ensure_worker_locked(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(
+            target=self._run,
+            name="metrics-sink",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if not self._pending and not self._closed:
+                    self._condition.wait()
+                if (
+                    self._pending
+                    and len(self._pending) < self.flush_size
+                    and not self._closed
+                ):
+                    self._condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self._write_pending()
+
+    def _write_pending(self) -> int:
+        with self._write_lock:
+            with self._condition:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            grouped: dict = {}
+            for app, model, row in batch:
+                grouped.setdefault(app, {}).setdefault(model, []).append(row)
+
+            written = 0
+            failed = 0
+            for app, rows_by_model in grouped.items():
+                try:
+                    with app.app_context():
+                        for model, rows in rows_by_model.items():
+                            inserted = _insert_rows(model, rows)
+                            written += inserted
+                            failed += len(rows) - inserted
+                except SQLAlchemyError:
+                    logger.exception("Metrics sink could not write a batch")
+                    failed += sum(len(rows) for rows in rows_by_model.values())
+
+            with self._condition:
+                self.written += written
+                self.failed += failed
+            return written
+
+
+def _insert_rows(model, rows: list[dict]) -> int:
+    """Insert ``rows`` in one statement, isolating bad rows on failure."""
+    try:
+        db.session.execute(insert(model), rows)
+        db.session.commit()
+        return len(rows)
+    except SQLAlchemyError:
+        db.session.rollback()
+        if len(rows) == 1:
+            logger.warning("Metrics sink dropped an invalid %s row", model.__tablename__)
+            return 0
+    inserted = 0
+    for row in rows:
+        inserted += _insert_rows(model, [row])
+    return inserted
+
+
+_sink: MetricsSink | None = None
+_sink_lock = threading.Lock()
+
+
+def get_metrics_sink() -> MetricsSink:
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = MetricsSink(
+                max_buffer=int(
+                    os.environ.get("METRICS_SINK_BUFFER_SIZE", DEFAULT_BUFFER_SIZE)
+                ),
+                flush_size=int(
+                    os.environ.get("METRICS_SINK_FLUSH_SIZE", DEFAULT_FLUSH_SIZE)
+                ),
+                flush_interval=float(
+                    os.environ.get(
+                        "METRICS_SINK_FLUSH_INTERVAL_SECONDS",
+                        DEFAULT_FLUSH_INTERVAL_SECONDS,
+                    )
+                ),
+            )
+        return _sink
+
+
+def reset_metrics_sink(*, drain: bool = True) -> None:
+    """Close the process sink, writing pending rows unless ``drain`` is False."""
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        sink.close(drain=drain)
+
+
+atexit.register(reset_metrics_sink)
@@ -14,6 +14,15 @@ class LlmConfig(db.Model):
     base_url = db.Column(db.Text, nullable=False)
     model = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text)
+    # Prompt context budget in tokens; None uses the context builder default.
+    context_budget_tokens = db.Column(db.Integer)
+    # Provider admission limits; None leaves that dimension unlimited.
+    max_concurrency = db.Column(db.Integer)
+    requests_per_minute = db.Column(db.Integer)
+    tokens_per_minute = db.Column(db.Integer)
+    # Active configs sharing a model class back each other up; None keeps the
+    # config on its own.
+    model_class = db.Column(db.String(64))
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
@@ -38,6 +47,21 @@ class AgentRun(db.Model):
     current_stage_id = db.Column(db.String(64), nullable=False)
     status = db.Column(db.String(32), nullable=False, default="active")
     model = db.Column(db.String(128))
+    # Config key of the provider target that served the run's last turn.
+    llm_config_key = db.Column(db.String(64))
+    # Maintained counters so turn claims and completions never aggregate
+    # over the run's messages while the run row is locked.
+    last_message_sequence = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    last_assistant_sequence = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    # Bumped on every collaboration state save that changes a row; clients
+    # may send it back as a precondition.
+    collaboration_revision = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(
         db.DateTime,
@@ -155,6 +179,9 @@ class AgentArtifact(db.Model):
     )
     stage_id = db.Column(db.String(64), nullable=False)
     current_version_id = db.Column(db.Integer)
+    current_version_number = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(
         db.DateTime,
@@ -257,13 +284,41 @@ class AgentRunTurnMetric(db.Model):
     stage_id = db.Column(db.String(64), nullable=False, index=True)
     model = db.Column(db.String(128), nullable=False)
     provider = db.Column(db.String(128), nullable=False, default="unknown", index=True)
+    # LlmConfig the turn was routed to; provider routing health is keyed by it.
+    llm_config_key = db.Column(db.String(64))
     status = db.Column(db.String(32), nullable=False, index=True)
     error_code = db.Column(db.String(64))
     duration_ms = db.Column(db.Integer, nullable=False)
     input_chars = db.Column(db.Integer, nullable=False, default=0)
     output_chars = db.Column(db.Integer, nullable=False, default=0)
     estimated_tokens = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Name of the counter behind prompt_tokens: a BPE encoding, or "estimate".
+    prompt_token_counter = db.Column(db.String(32))
+    discarded_tokens = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+    early_abort_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+    early_abort_saved_ms = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
+    queue_wait_ms = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    first_token_ms = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     contract_retry_count = db.Column(db.Integer, nullable=False, default=0)
+    db_query_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    db_time_ms = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    pool_wait_ms = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     diagnostic_json = db.Column(db.Text)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
@@ -453,6 +508,33 @@ class AgentTestAssetCollection(db.Model):
     workflow_id = db.Column(db.String(64), nullable=False, index=True)
     source_stage_id = db.Column(db.String(64), nullable=False)
     source_artifact_version = db.Column(db.Integer, nullable=False)
+    # Quality counters kept in step with issue, test point and risk statuses
+    # so the quality summary never has to scan the collection.
+    pending_issue_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    confirmed_issue_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    ignored_issue_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    uncovered_test_point_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    partial_test_point_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    open_risk_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    mitigating_risk_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    accepted_risk_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    closed_risk_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(
         db.DateTime,
@@ -676,3 +758,16 @@ class AgentTestAssetIntentTesterMapping(db.Model):
         "AgentTestAssetCollection",
         back_populates="intent_tester_mappings",
     )
+
+
+class AgentMermaidRepairCacheEntry(db.Model):
+    __tablename__ = "agent_mermaid_repair_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), nullable=False, unique=True)
+    model_name = db.Column(db.String(100), nullable=False)
+    repaired_code = db.Column(db.Text, nullable=False)
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_hit_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
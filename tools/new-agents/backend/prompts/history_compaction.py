@@ -0,0 +1,18 @@
+HISTORY_COMPACTION_SYSTEM_PROMPT = """你是对话历史压缩助手。用户给你一段智能体会话的早期对话记录，请将其压缩为供后续轮次使用的上下文摘要。
+必须遵循以下原则：
+1. 保留用户提出的需求、约束、确认过的结论和关键决策，以及仍未解决的问题。
+2. 保留具体的名称、数值、接口、字段和业务规则，不要泛化。
+3. 删除寒暄、重复内容和已被后续对话推翻的中间方案。
+4. 使用简洁的中文要点列表输出，不超过 600 字，不要附带任何解释文字。"""
+
+
+def build_history_compaction_user_prompt(
+    *,
+    first_sequence: int,
+    last_sequence: int,
+    transcript: str,
+) -> str:
+    return f"""【消息范围】：第 {first_sequence} 至第 {last_sequence} 条消息
+
+【对话记录】：
+{transcript}"""
@@ -0,0 +1,311 @@
+"""Per-provider admission control in front of chat completion calls.
+
+Nothing else limits how many completions one process sends to a provider, so
+a burst of turns ends in provider 429s. Providers meter each API key, so
+every ``base_url`` and API key pair gets one ``ProviderScheduler`` with an
+optional concurrency cap, request bucket and token bucket, configured per
+``LlmConfig``. Changed limits resize the buckets without refilling them.
+Callers that cannot start right away wait in a FIFO queue, and only the caller
+at the head of the queue can be admitted, so a run of small requests never
+overtakes an earlier one. A full queue, or a wait longer than the queue
+timeout, raises ``ProviderBusyError`` instead of sending a request the
+provider would reject.
+
+The size of a completion is not known before it runs. The token bucket is
+charged with the usage the completion reports when it ends and may go into
+debt; a provider in debt admits nothing until its bucket has refilled. A
+completion closed before its usage arrives, such as a cancelled turn or a
+losing hedged attempt, is charged a local estimate instead.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+import hashlib
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 30.0
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    """Limits of one provider; ``None`` leaves that dimension unlimited."""
+
+    max_concurrency: int | None = None
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    queue_timeout_seconds: float = DEFAULT_QUEUE_TIMEOUT_SECONDS
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self.max_concurrency is not None
+            or self.requests_per_minute is not None
+            or self.tokens_per_minute is not None
+        )
+
+
+class ProviderBusyError(RuntimeError):
+    """Raised when a completion cannot be admitted to its provider."""
+
+    def __init__(self, provider_key: str, reason: str, wait_ms: int) -> None:
+        super().__init__(f"Provider {provider_key} is busy: {reason}")
+        self.provider_key = provider_key
+        self.reason = reason
+        self.wait_ms = wait_ms
+
+
+class _TokenBucket:
+    """Refills ``per_minute`` units a minute, up to one minute's worth."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity,
+            self.level + (now - self.updated_at) * self.rate,
+        )
+        self.updated_at = now
+
+    def resize(self, per_minute: int, now: float) -> None:
+        """Change the rate, keeping the current level within the new capacity."""
+        self.refill(now)
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.level = min(self.level, self.capacity)
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class ProviderSlot:
+    """One admitted completion; release it when the completion ends."""
+
+    def __init__(self, scheduler: "ProviderScheduler", wait_ms: int) -> None:
+        self.wait_ms = wait_ms
+        self.charged = False
+        self._scheduler = scheduler
+        self._released = False
+
+    def charge_tokens(self, tokens: int) -> None:
+        self.charged = True
+        self._scheduler._charge_tokens(tokens)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release()
+
+
+class ProviderScheduler:
+    """Fair FIFO admission to one provider."""
+
+    def __init__(
+        self,
+        provider_key: str,
+        limits: ProviderLimits,
+        credential: str = "",
+    ) -> None:
+        self.provider_key = provider_key
+        self.credential = credential
+        self.limits = limits
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.queue_wait_ms = 0
+        self._condition = threading.Condition()
+        self._waiting: deque[object] = deque()
+        self._requests = _bucket(limits.requests_per_minute)
+        self._tokens = _bucket(limits.tokens_per_minute)
+
+    def configure(self, limits: ProviderLimits) -> None:
+        """Apply changed limits; a resized bucket keeps its level."""
+        with self._condition:
+            if limits == self.limits:
+                return
+            now = time.monotonic()
+            self._requests = _resized(self._requests, limits.requests_per_minute, now)
+            self._tokens = _resized(self._tokens, limits.tokens_per_minute, now)
+            self.limits = limits
+            self._condition.notify_all()
+
+    def acquire(self) -> ProviderSlot:
+        """Wait for this caller's turn; raise ProviderBusyError if it never comes."""
+        started_at = time.monotonic()
+        ticket = object()
+        with self._condition:
+            if len(self._waiting) >= self.limits.queue_size and (
+                self._waiting or self._admission_delay(started_at) != 0.0
+            ):
+                self.rejected += 1
+                raise ProviderBusyError(self.provider_key, "queue_full", 0)
+            deadline = started_at + self.limits.queue_timeout_seconds
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = (
+                        self._admission_delay(now)
+                        if self._waiting[0] is ticket
+                        else None
+                    )
+                    if delay == 0.0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise ProviderBusyError(
+                            self.provider_key,
+                            "queue_timeout",
+                            _elapsed_ms(started_at),
+                        )
+                    self._condition.wait(
+                        remaining if delay is None else min(delay, remaining)
+                    )
+            finally:
+                self._waiting.remove(ticket)
+                # The next caller in line may be admissible now.
+                self._condition.notify_all()
+            if self._requests is not None:
+                self._requests.level -= 1
+            self.active += 1
+            self.admitted += 1
+            wait_ms = _elapsed_ms(started_at)
+            self.queue_wait_ms += wait_ms
+        return ProviderSlot(self, wait_ms)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "provider": self.provider_key,
+                "credential": self.credential,
+                "active": self.active,
+                "queued": len(self._waiting),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timedOut": self.timed_out,
+                "queueWaitMs": self.queue_wait_ms,
+                "maxConcurrency": self.limits.max_concurrency,
+                "requestsPerMinute": self.limits.requests_per_minute,
+                "tokensPerMinute": self.limits.tokens_per_minute,
+            }
+
+    def _admission_delay(self, now: float) -> float | None:
+        """Seconds until a caller can start; None while the cap is reached."""
+        max_concurrency = self.limits.max_concurrency
+        if max_concurrency is not None and self.active >= max_concurrency:
+            return None
+        delay = 0.0
+        for bucket in (self._requests, self._tokens):
+            if bucket is not None:
+                bucket.refill(now)
+                delay = max(delay, bucket.seconds_until(1))
+        return delay
+
+    def _charge_tokens(self, tokens: int) -> None:
+        with self._condition:
+            if self._tokens is not None and tokens > 0:
+                self._tokens.refill(time.monotonic())
+                self._tokens.level -= tokens
+
+    def _release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+
+def _bucket(per_minute: int | None) -> _TokenBucket | None:
+    return _TokenBucket(per_minute) if per_minute is not None else None
+
+
+def _resized(
+    bucket: _TokenBucket | None,
+    per_minute: int | None,
+    now: float,
+) -> _TokenBucket | None:
+    if bucket is None or per_minute is None:
+        return _bucket(per_minute)
+    bucket.resize(per_minute, now)
+    return bucket
+
+
+def _elapsed_ms(started_at: float) -> int:
+    return max(0, int((time.monotonic() - started_at) * 1000))
+
+
+def provider_admission_key(base_url: str | None) -> str:
+    return (base_url or "").strip().rstrip("/") or "default"
+
+
+def provider_credential_fingerprint(api_key: str | None) -> str:
+    """A short, non-reversible label telling API keys of one provider apart."""
+    if not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+class ProviderAdmission:
+    """The schedulers of every provider this process talks to."""
+
+    def __init__(self) -> None:
+        self._schedulers: dict[tuple[str, str], ProviderScheduler] = {}
+        self._lock = threading.Lock()
+
+    def scheduler(
+        self,
+        base_url: str | None,
+        limits: ProviderLimits,
+        api_key: str | None = None,
+    ) -> ProviderScheduler:
+        provider_key = provider_admission_key(base_url)
+        credential = provider_credential_fingerprint(api_key)
+        key = (provider_key, credential)
+        with self._lock:
+            scheduler = self._schedulers.get(key)
+            if scheduler is None:
+                scheduler = self._schedulers[key] = ProviderScheduler(
+                    provider_key,
+                    limits,
+                    credential,
+                )
+                return scheduler
+        scheduler.configure(limits)
+        return scheduler
+
+    def acquire(
+        self,
+        base_url: str | None,
+        limits: ProviderLimits,
+        api_key: str | None = None,
+    ) -> ProviderSlot:
+        return self.scheduler(base_url, limits, api_key).acquire()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            schedulers = sorted(self._schedulers.items())
+        return [scheduler.stats() for _, scheduler in schedulers]
+
+
+_admission: ProviderAdmission | None = None
+_admission_lock = threading.Lock()
+
+
+def get_provider_admission() -> ProviderAdmission:
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = ProviderAdmission()
+        return _admission
+
+
+def reset_provider_admission() -> None:
+    global _admission
+    with _admission_lock:
+        _admission = None
@@ -0,0 +1,275 @@
+"""Latency-aware routing and failover across the configs of one model class.
+
+Every active ``LlmConfig`` that shares the default config's ``model_class``
+can serve an agent turn. ``ProviderRouter`` keeps the health of each config:
+an average time to first token and an error rate, both exponentially
+weighted, seeded from recent turn metrics when the process first routes and
+updated by every routed stream afterwards. Health is keyed by config key, not
+by provider host, so configs that share a host with different credentials,
+models or rate limits are judged separately. Targets are ranked by the
+expected time until a successful first token; a config that failed several
+times in a row cools down and is ranked last.
+
+``stream_with_failover`` tries the ranked targets in turn until one emits its
+first token. Nothing has reached the caller before that, so a failing or
+busy provider costs the turn only the time it took to fail. Once a token has
+been emitted the turn stays on that target. A run keeps the target of its
+last successful turn while that target is healthy.
+"""
+
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from llm_client import LlmClientError, provider_error_types
+from provider_admission import ProviderBusyError, ProviderLimits
+
+logger = logging.getLogger(__name__)
+
+HEALTH_EWMA_ALPHA = 0.3
+COOLDOWN_AFTER_FAILURES = 3
+COOLDOWN_SECONDS = 30.0
+# Error rate above which a config is never ranked ahead of a healthier one,
+# however fast its first tokens are.
+MAX_ERROR_RATE = 0.9
+
+
+def infer_provider_name(base_url: str | None) -> str:
+    if not base_url:
+        return "openai"
+    hostname = urlparse(base_url).hostname
+    if not hostname:
+        return "unknown"
+    hostname = hostname.lower()
+    if hostname == "api.openai.com":
+        return "openai"
+    if hostname.endswith(".deepseek.com") or hostname == "api.deepseek.com":
+        return "deepseek"
+    if "dashscope" in hostname or hostname.endswith(".aliyuncs.com"):
+        return "dashscope"
+    if hostname.endswith(".siliconflow.cn"):
+        return "siliconflow"
+    return hostname
+
+
+@dataclass(frozen=True)
+class ProviderTarget:
+    """One config a turn can be routed to."""
+
+    config_key: str
+    api_key: str
+    base_url: str | None
+    model_name: str
+    limits: ProviderLimits | None = None
+    context_budget_tokens: int | None = None
+
+    @property
+    def provider(self) -> str:
+        return infer_provider_name(self.base_url)
+
+
+class _ProviderHealth:
+    def __init__(self) -> None:
+        self.first_token_ms: float | None = None
+        self.error_rate = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_first_token(self, first_token_ms: int | None) -> None:
+        if first_token_ms is not None:
+            self.first_token_ms = (
+                float(first_token_ms)
+                if self.first_token_ms is None
+                else _ewma(self.first_token_ms, first_token_ms)
+            )
+        self.error_rate = _ewma(self.error_rate, 0.0)
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, now: float | None) -> None:
+        self.error_rate = _ewma(self.error_rate, 1.0)
+        self.failures += 1
+        self.consecutive_failures += 1
+        if now is not None and self.consecutive_failures >= COOLDOWN_AFTER_FAILURES:
+            self.cooldown_until = now + COOLDOWN_SECONDS
+
+    def cooling_down(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def expected_first_token_ms(self) -> float:
+        """Time until a successful first token; 0 for an unobserved config."""
+        if self.first_token_ms is None:
+            # Unobserved configs are tried once so they get a sample.
+            return 0.0 if self.failures == 0 else float("inf")
+        return self.first_token_ms / (1.0 - min(self.error_rate, MAX_ERROR_RATE))
+
+
+def _ewma(current: float, sample: float) -> float:
+    return current + HEALTH_EWMA_ALPHA * (sample - current)
+
+
+class ProviderRouter:
+    """Health of every config this process routes turns to, by config key."""
+
+    def __init__(self) -> None:
+        self._health: dict[str, _ProviderHealth] = {}
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    @property
+    def seeded(self) -> bool:
+        return self._seeded
+
+    def seed(self, samples: Iterable[tuple[str, bool, int | None]]) -> None:
+        """Feed ``(config_key, succeeded, first_token_ms)`` samples, oldest first, once.
+
+        A success without a measured first token counts toward the error rate
+        only. Seeded failures never start a cooldown; only live failures do.
+        """
+        with self._lock:
+            if self._seeded:
+                return
+            self._seeded = True
+            for config_key, succeeded, first_token_ms in samples:
+                health = self._health.setdefault(config_key, _ProviderHealth())
+                if succeeded:
+                    health.record_first_token(first_token_ms)
+                else:
+                    health.record_failure(None)
+
+    def record_first_token(self, config_key: str, first_token_ms: int) -> None:
+        with self._lock:
+            self._health.setdefault(config_key, _ProviderHealth()).record_first_token(
+                first_token_ms
+            )
+
+    def record_failure(self, config_key: str) -> None:
+        with self._lock:
+            self._health.setdefault(config_key, _ProviderHealth()).record_failure(
+                time.monotonic()
+            )
+
+    def rank(
+        self,
+        targets: Sequence[ProviderTarget],
+        *,
+        pinned_key: str | None = None,
+    ) -> tuple[ProviderTarget, ...]:
+        """Order targets for a turn; a healthy pinned target goes first."""
+        now = time.monotonic()
+        with self._lock:
+
+            def sort_key(indexed: tuple[int, ProviderTarget]) -> tuple:
+                index, target = indexed
+                health = self._health.get(target.config_key) or _ProviderHealth()
+                cooling_down = health.cooling_down(now)
+                return (
+                    cooling_down,
+                    not (target.config_key == pinned_key and not cooling_down),
+                    health.expected_first_token_ms(),
+                    index,
+                )
+
+            ranked = sorted(enumerate(targets), key=sort_key)
+        return tuple(target for _, target in ranked)
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "configKey": config_key,
+                    "firstTokenMs": (
+                        round(health.first_token_ms)
+                        if health.first_token_ms is not None
+                        else None
+                    ),
+                    "errorRate": round(health.error_rate, 3),
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "coolingDown": health.cooling_down(now),
+                }
+                for config_key, health in sorted(self._health.items())
+            ]
+
+
+def stream_with_failover(
+    targets: Sequence[ProviderTarget],
+    open_target: Callable[[ProviderTarget], Iterator[str]],
+    *,
+    router: ProviderRouter,
+    on_route: Callable[[ProviderTarget, int], None] | None = None,
+) -> Iterator[str]:
+    """Stream from the first target that emits a token.
+
+    ``on_route`` receives the target and its time to first token once the
+    first token arrives. When every target fails before its first token, the
+    last error is raised.
+    """
+    failover_errors = (LlmClientError, ProviderBusyError, *provider_error_types())
+    last_error: Exception | None = None
+    for target in targets:
+        started_at = time.monotonic()
+        stream = open_target(target)
+        try:
+            first_chunk = next(stream, None)
+        except failover_errors as exc:
+            _close(stream)
+            # Admission is local back pressure, not provider health.
+            if not isinstance(exc, ProviderBusyError):
+                router.record_failure(target.config_key)
+            logger.warning(
+                "Config %s (%s) failed before its first token; failing over",
+                target.config_key,
+                target.provider,
+            )
+            last_error = exc
+            continue
+        first_token_ms = max(0, int((time.monotonic() - started_at) * 1000))
+        router.record_first_token(target.config_key, first_token_ms)
+        if on_route is not None:
+            on_route(target, first_token_ms)
+        try:
+            if first_chunk is None:
+                return
+            yield first_chunk
+            yield from stream
+        except failover_errors:
+            router.record_failure(target.config_key)
+            raise
+        finally:
+            _close(stream)
+        return
+    if last_error is None:
+        raise LlmClientError("No provider target to route the turn to")
+    raise last_error
+
+
+def _close(stream: Iterator[str]) -> None:
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+_router: ProviderRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router() -> ProviderRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+        return _router
+
+
+def reset_provider_router() -> None:
+    global _router
+    with _router_lock:
+        _router = None
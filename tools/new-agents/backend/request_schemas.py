@@ -2,8 +2,12 @@ from collections.abc import Callable
 from typing import Any
 
 from pydantic import BaseModel, ConfigDict, Field
+from sse_delta_protocol import DELTA_PROTOCOL_FULL, DELTA_PROTOCOLS
 from workflow_contract_registry import get_workflow_stages
 
+MIN_CONTEXT_BUDGET_TOKENS = 1000
+MAX_CONTEXT_BUDGET_TOKENS = 1_000_000
+
 
 class RequestValidationError(ValueError):
     pass
@@ -22,6 +26,7 @@ class AgentRunStreamRequest(BaseModel):
         min_length=1,
         max_length=64,
     )
+    delta_protocol: str = Field(default=DELTA_PROTOCOL_FULL, alias="deltaProtocol")
 
 
 class MermaidRepairRequest(BaseModel):
@@ -46,6 +51,23 @@ class DefaultLlmConfigUpdateRequest(BaseModel):
     base_url: str = Field(alias="baseUrl", min_length=1)
     model: str = Field(min_length=1)
     description: str | None = None
+    context_budget_tokens: int | None = Field(
+        default=None,
+        alias="contextBudgetTokens",
+    )
+    max_concurrency: int | None = Field(default=None, alias="maxConcurrency")
+    requests_per_minute: int | None = Field(
+        default=None,
+        alias="requestsPerMinute",
+    )
+    tokens_per_minute: int | None = Field(default=None, alias="tokensPerMinute")
+    model_class: str | None = Field(default=None, alias="modelClass")
+
+
+class BackupLlmConfigUpdateRequest(DefaultLlmConfigUpdateRequest):
+    config_key: str = Field(alias="configKey", min_length=1, max_length=64)
+    model_class: str = Field(alias="modelClass", min_length=1)
+    is_active: bool = Field(default=True, alias="isActive")
 
 
 def _is_blank(value: Any) -> bool:
@@ -100,6 +122,7 @@ def parse_agent_run_stream_request(
     if _is_blank(request_id):
         raise RequestValidationError("requestId 不能为空")
     request_id = request_id.strip()
+    delta_protocol = parse_delta_protocol(data.get("deltaProtocol"))
     workflow_stages = get_workflow_stages().get(workflow_id)
     if workflow_stages is None:
         raise RequestValidationError(f"未知 workflowId: {workflow_id}")
@@ -113,10 +136,28 @@ def parse_agent_run_stream_request(
         "stageId": stage_id,
         "runId": run_id,
         "requestId": request_id,
+        "deltaProtocol": delta_protocol,
     }
     return AgentRunStreamRequest.model_validate(normalized_data)
 
 
+def parse_last_event_id(value: str | None) -> int | None:
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    if not value.isdigit():
+        raise RequestValidationError("Last-Event-ID 必须为非负整数")
+    return int(value)
+
+
+def parse_delta_protocol(value: str | None) -> str:
+    if value is None:
+        return DELTA_PROTOCOL_FULL
+    if value not in DELTA_PROTOCOLS:
+        raise RequestValidationError("deltaProtocol 必须为 full 或 compact")
+    return value
+
+
 def parse_mermaid_repair_request(
     data: dict[str, Any] | None,
 ) -> MermaidRepairRequest:
@@ -174,11 +215,60 @@ def parse_default_llm_config_update_request(
     description = data.get("description")
     if description is not None and not isinstance(description, str):
         raise RequestValidationError("description 必须是字符串")
+    context_budget_tokens = data.get("contextBudgetTokens")
+    if context_budget_tokens is not None and (
+        not isinstance(context_budget_tokens, int)
+        or isinstance(context_budget_tokens, bool)
+        or not MIN_CONTEXT_BUDGET_TOKENS
+        <= context_budget_tokens
+        <= MAX_CONTEXT_BUDGET_TOKENS
+    ):
+        raise RequestValidationError(
+            f"contextBudgetTokens 必须是 {MIN_CONTEXT_BUDGET_TOKENS} 到 "
+            f"{MAX_CONTEXT_BUDGET_TOKENS} 之间的整数"
+        )
+    for limit_key in ("maxConcurrency", "requestsPerMinute", "tokensPerMinute"):
+        limit = data.get(limit_key)
+        if limit is not None and (
+            not isinstance(limit, int) or isinstance(limit, bool) or limit < 1
+        ):
+            raise RequestValidationError(f"{limit_key} 必须是正整数")
+    model_class = data.get("modelClass")
+    if model_class is not None and (
+        not isinstance(model_class, str) or len(model_class.strip()) > 64
+    ):
+        raise RequestValidationError("modelClass 必须是不超过 64 个字符的字符串")
     normalized_data = {
         **data,
         "apiKey": api_key.strip() if isinstance(api_key, str) and api_key.strip() else None,
         "baseUrl": data["baseUrl"].strip(),
         "model": data["model"].strip(),
         "description": description.strip() if isinstance(description, str) else None,
+        "modelClass": (
+            model_class.strip()
+            if isinstance(model_class, str) and model_class.strip()
+            else None
+        ),
     }
     return DefaultLlmConfigUpdateRequest.model_validate(normalized_data)
+
+
+def parse_backup_llm_config_update_request(
+    data: dict[str, Any] | None,
+) -> BackupLlmConfigUpdateRequest:
+    update = parse_default_llm_config_update_request(data)
+    config_key = data.get("configKey")
+    if _is_blank(config_key) or len(config_key.strip()) > 64:
+        raise RequestValidationError("configKey 必须是不超过 64 个字符的非空字符串")
+    if update.model_class is None:
+        raise RequestValidationError("备用配置必须指定 modelClass")
+    is_active = data.get("isActive", True)
+    if not isinstance(is_active, bool):
+        raise RequestValidationError("isActive 必须是布尔值")
+    return BackupLlmConfigUpdateRequest.model_validate(
+        {
+            **update.model_dump(by_alias=True),
+            "configKey": config_key.strip(),
+            "isActive": is_active,
+        }
+    )
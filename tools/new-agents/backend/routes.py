@@ -12,24 +12,32 @@ from config_admin_auth import (
     browser_config_admin_available,
 )
 from config_service import (
+    build_backup_llm_config_payload,
     build_default_llm_config_payload,
     build_default_llm_config_check_candidate,
+    build_provider_limits,
+    build_provider_targets,
     check_default_llm_config,
     get_default_llm_config_payload,
+    get_routing_llm_configs,
+    list_backup_llm_configs,
+    upsert_backup_llm_config,
     upsert_default_llm_config,
 )
+from mermaid_repair_cache import get_mermaid_repair_cache
 from mermaid_repair_service import MermaidRepairError, repair_mermaid_code
 from models import db
 from route_guards import require_default_llm_config
 from run_persistence import (
     AgentRunPersistence,
     ArtifactVersionConflictError,
+    CollaborationRevisionConflictError,
     UnresolvedTurnHistoryError,
     clone_agent_run,
+    enqueue_runtime_config_issue,
     get_run_snapshot,
     get_runtime_observability_summary,
     list_agent_runs,
-    record_runtime_config_issue,
     replace_artifact_collaboration_state,
     update_context_summary,
     update_run_artifact,
@@ -38,12 +46,20 @@ from run_persistence import (
 from request_schemas import (
     RequestValidationError,
     map_json_request_error,
+    parse_backup_llm_config_update_request,
     parse_default_llm_config_update_request,
     parse_agent_run_stream_request,
+    parse_delta_protocol,
+    parse_last_event_id,
     parse_mermaid_repair_request,
     read_json_request_body,
 )
-from sse_response import build_sse_response
+from sse_replay import agent_request_replay_identity, get_sse_stream_registry
+from sse_response import (
+    STREAM_TOKEN_HEADER,
+    build_sse_replay_response,
+    build_sse_response,
+)
 from sse_schemas import RunStartedEvent
 from stream_services import stream_agent_run_events
 from routes_test_assets import register_test_asset_routes
@@ -216,6 +232,39 @@ def update_default_config():
         return json_error_response("更新配置失败", 500)
 
 
+@api_bp.route("/config/backups", methods=["GET"])
+def get_backup_configs():
+    """List the configs that back up the default config (no API keys)."""
+    try:
+        configs = list_backup_llm_configs()
+        return jsonify(
+            {"backups": [build_backup_llm_config_payload(config) for config in configs]}
+        ), 200
+    except SQLAlchemyError as e:
+        current_app.logger.error(
+            f"[{g.request_id}] Error listing backup configs: {str(e)}"
+        )
+        return json_error_response("获取备用配置失败", 500)
+
+
+@api_bp.route("/config/backups", methods=["POST"])
+def update_backup_config():
+    """Create, update or deactivate a backup config keyed by configKey."""
+    try:
+        update = parse_backup_llm_config_update_request(_read_json_body())
+        config = upsert_backup_llm_config(update)
+        return jsonify(build_backup_llm_config_payload(config)), 200
+    except RequestValidationError as e:
+        return json_error_response(str(e), 400)
+    except ValueError as e:
+        return json_error_response(str(e), 400)
+    except SQLAlchemyError as e:
+        current_app.logger.error(
+            f"[{g.request_id}] Error updating backup config: {str(e)}"
+        )
+        return json_error_response("更新备用配置失败", 500)
+
+
 @api_bp.route("/config/check", methods=["POST"])
 def check_default_config():
     """Check whether the default LLM config can reach the configured model."""
@@ -273,37 +322,109 @@ def agent_runs_stream():
     request_id = g.request_id
     try:
         agent_request = parse_agent_run_stream_request(_read_json_body())
+        last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
     except RequestValidationError as e:
         return json_error_response(str(e), 400)
 
+    # A reconnect for an in-flight or recently finished turn attaches to its
+    # replay buffer instead of asking the provider for the turn again.
+    stream_registry = get_sse_stream_registry()
+    replay_identity = agent_request_replay_identity(agent_request)
+    replay = stream_registry.open(
+        agent_request.request_id,
+        last_event_id=last_event_id,
+        identity=replay_identity,
+    )
+    if replay is not None:
+        return build_sse_replay_response(
+            replay,
+            delta_protocol=agent_request.delta_protocol,
+            stream_token=stream_registry.stream_token(agent_request.request_id),
+        )
+
     config, error_response = require_default_llm_config(
         request_id,
         context="agent runtime",
     )
     if error_response:
-        try:
-            record_runtime_config_issue(
-                workflow_id=agent_request.workflow_id,
-                stage_id=agent_request.stage_id,
-                error_code=DEFAULT_LLM_CONFIG_MISSING_CODE,
-                issue_scope="default_llm_config",
-                route="/api/agent/runs/stream",
-                request_id=request_id,
-            )
-        except SQLAlchemyError as e:
-            current_app.logger.error(
-                f"[{request_id}] Error recording runtime config issue: {str(e)}"
-            )
+        enqueue_runtime_config_issue(
+            workflow_id=agent_request.workflow_id,
+            stage_id=agent_request.stage_id,
+            error_code=DEFAULT_LLM_CONFIG_MISSING_CODE,
+            issue_scope="default_llm_config",
+            route="/api/agent/runs/stream",
+            request_id=request_id,
+        )
         return error_response
 
-    return build_sse_response(
-        stream_agent_run_events(
-            agent_request,
-            api_key=config.api_key,
-            base_url=config.base_url,
+    events = stream_agent_run_events(
+        agent_request,
+        api_key=config.api_key,
+        base_url=config.base_url,
+        model_name=config.model,
+        persistence=AgentRunPersistence(
+            context_budget_tokens=config.context_budget_tokens,
             model_name=config.model,
-            persistence=AgentRunPersistence(),
+        ),
+        provider_limits=build_provider_limits(config),
+        provider_targets=build_provider_targets(get_routing_llm_configs(config)),
+    )
+    # The response outlives this handler; the producer thread has its own
+    # session, so return the request's pooled connection now instead of
+    # holding it until the stream closes.
+    db.session.close()
+
+    stream, created = stream_registry.start(
+        agent_request.request_id,
+        events,
+        identity=replay_identity,
+        app=current_app._get_current_object(),
+    )
+    if not created and stream.identity != replay_identity:
+        return json_error_response("requestId 已被其他进行中的智能体流占用", 409)
+    # Event IDs restart with each stream, so a Last-Event-ID sent for a
+    # stream this process no longer holds must not filter the new one.
+    return build_sse_replay_response(
+        stream.entries_after(None if created else last_event_id),
+        delta_protocol=agent_request.delta_protocol,
+        stream_token=stream.token,
+    )
+
+
+@api_bp.route("/agent/runs/streams/<stream_request_id>", methods=["GET"])
+def agent_runs_stream_resume(stream_request_id: str):
+    """Resume a turn stream by requestId after Last-Event-ID.
+
+    The caller must present the stream token returned with the original
+    response; streams of other requests are reported as not found.
+    """
+    try:
+        last_event_id = parse_last_event_id(
+            request.headers.get("Last-Event-ID")
+            or request.args.get("lastEventId")
         )
+        delta_protocol = parse_delta_protocol(request.args.get("deltaProtocol"))
+    except RequestValidationError as e:
+        return json_error_response(str(e), 400)
+    stream_token = (
+        request.headers.get(STREAM_TOKEN_HEADER)
+        or request.args.get("streamToken")
+        or ""
+    ).strip()
+    if not stream_token:
+        return json_error_response("恢复智能体流需要 streamToken", 400)
+
+    replay = get_sse_stream_registry().open(
+        stream_request_id,
+        last_event_id=last_event_id,
+        token=stream_token,
+    )
+    if replay is None:
+        return json_error_response("未找到可恢复的智能体流", 404)
+    return build_sse_replay_response(
+        replay,
+        delta_protocol=delta_protocol,
+        stream_token=stream_token,
     )
 
 
@@ -433,12 +554,22 @@ def agent_run_artifact_update(run_id: str):
 
 @api_bp.route("/agent/runs/<run_id>/artifact-collaboration", methods=["PUT"])
 def agent_run_artifact_collaboration_update(run_id: str):
-    """Replace artifact collaboration metadata for a persisted run."""
+    """Save artifact collaboration metadata for a persisted run."""
     try:
         patch = _read_json_body()
         return jsonify(replace_artifact_collaboration_state(run_id, patch)), 200
     except RequestValidationError as e:
         return json_error_response(str(e), 400)
+    except CollaborationRevisionConflictError as e:
+        return (
+            jsonify(
+                {
+                    "error": str(e),
+                    "collaborationRevision": e.current_revision,
+                }
+            ),
+            409,
+        )
     except ValueError as e:
         message = str(e)
         status_code = 404 if message.startswith("未知 runId:") else 400
@@ -570,15 +701,20 @@ def mermaid_repair():
         return error_response
 
     try:
-        repaired_code = repair_mermaid_code(
+        repaired_code = get_mermaid_repair_cache().get_or_repair(
             repair_request,
-            api_key=config.api_key,
-            base_url=config.base_url,
             model_name=config.model,
-        )
-        _validate_mermaid_repair_artifact_contract(
-            repair_request,
-            repaired_code,
+            repair=lambda: repair_mermaid_code(
+                repair_request,
+                api_key=config.api_key,
+                base_url=config.base_url,
+                model_name=config.model,
+                limits=build_provider_limits(config),
+            ),
+            validate=lambda code: _validate_mermaid_repair_artifact_contract(
+                repair_request,
+                code,
+            ),
         )
     except MermaidRepairError as e:
         current_app.logger.warning(
@@ -15,7 +15,9 @@ from test_assets import (
     materialize_lisa_test_assets,
     record_lisa_test_asset_intent_tester_case,
     record_lisa_test_asset_intent_tester_execution,
+    record_lisa_test_asset_intent_tester_executions,
     record_lisa_test_asset_intent_tester_result,
+    record_lisa_test_asset_intent_tester_results,
     update_lisa_test_asset_issue_status,
     update_lisa_test_asset_risk,
     update_lisa_test_asset_risk_by_id,
@@ -189,6 +191,46 @@ def register_test_asset_routes(api_bp: Blueprint) -> None:
                 _test_asset_intent_tester_error_status(message),
             )
 
+    @api_bp.route(
+        "/agent/test-assets/<int:collection_id>/intent-tester/executions",
+        methods=["POST"],
+    )
+    def agent_test_assets_intent_tester_executions_record(collection_id: int):
+        """Persist many intent-tester execution summaries and report per-case outcomes."""
+        try:
+            payload = _read_json_body()
+            return jsonify(
+                record_lisa_test_asset_intent_tester_executions(collection_id, payload)
+            ), 200
+        except RequestValidationError as e:
+            return json_error_response(str(e), 400)
+        except ValueError as e:
+            message = str(e)
+            return json_error_response(
+                message,
+                _test_asset_intent_tester_error_status(message),
+            )
+
+    @api_bp.route(
+        "/agent/test-assets/<int:collection_id>/intent-tester/results",
+        methods=["POST"],
+    )
+    def agent_test_assets_intent_tester_results_record(collection_id: int):
+        """Persist many intent-tester result snapshots and report per-case outcomes."""
+        try:
+            payload = _read_json_body()
+            return jsonify(
+                record_lisa_test_asset_intent_tester_results(collection_id, payload)
+            ), 200
+        except RequestValidationError as e:
+            return json_error_response(str(e), 400)
+        except ValueError as e:
+            message = str(e)
+            return json_error_response(
+                message,
+                _test_asset_intent_tester_error_status(message),
+            )
+
     @api_bp.route(
         "/agent/test-assets/<int:collection_id>/test-points/<path:test_point>",
         methods=["PATCH"],
@@ -1,5 +1,5 @@
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from agent_contracts import WORKFLOW_STAGES
 from models import (
@@ -10,13 +10,51 @@ from models import (
 
 
 COMMENT_STATUSES = {"open", "resolved"}
+COMMENT_FIELDS = (
+    "stage_id",
+    "content",
+    "artifact_excerpt",
+    "anchor_text",
+    "created_at_ms",
+    "status",
+    "resolved_at_ms",
+    "replies_json",
+)
+SECTION_LOCK_FIELDS = (
+    "stage_id",
+    "heading",
+    "section_anchor",
+    "content",
+    "created_at_ms",
+)
 
 
 @dataclass
 class CollaborationStateModels:
     comments: list[AgentArtifactComment]
     section_locks: list[AgentArtifactSectionLock]
-    audit_event: AgentArtifactAuditEvent
+    expected_revision: int | None = None
+
+
+@dataclass
+class CollaborationRowDelta:
+    added: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    deleted_ids: list[int] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.updated or self.deleted_ids)
+
+
+@dataclass
+class CollaborationStateDelta:
+    comments: CollaborationRowDelta
+    section_locks: CollaborationRowDelta
+
+    @property
+    def has_changes(self) -> bool:
+        return self.comments.has_changes or self.section_locks.has_changes
 
 
 def _validate_workflow_stage(workflow_id: str, stage_id: str) -> None:
@@ -100,24 +138,24 @@ def build_collaboration_state_models(
     *,
     run_id: str,
     workflow_id: str,
-    current_stage_id: str,
     patch: dict,
-    created_at_ms: int,
 ) -> CollaborationStateModels:
     if not isinstance(patch, dict):
         raise ValueError("请求体必须是对象")
 
-    allowed_fields = {"comments", "sectionLocks"}
+    required_fields = {"comments", "sectionLocks"}
+    allowed_fields = required_fields | {"expectedRevision"}
     unexpected_fields = set(patch.keys()) - allowed_fields
     if unexpected_fields:
         raise ValueError(f"不支持的字段: {', '.join(sorted(unexpected_fields))}")
 
-    missing_fields = allowed_fields - set(patch.keys())
+    missing_fields = required_fields - set(patch.keys())
     if missing_fields:
         raise ValueError(f"缺少字段: {', '.join(sorted(missing_fields))}")
 
     comments_payload = _read_collaboration_list(patch, "comments")
     locks_payload = _read_collaboration_list(patch, "sectionLocks")
+    expected_revision = _read_expected_revision(patch)
 
     comments: list[AgentArtifactComment] = []
     for item in comments_payload:
@@ -159,21 +197,116 @@ def build_collaboration_state_models(
             )
         )
 
-    audit_event = AgentArtifactAuditEvent(
+    _reject_duplicate_client_ids(comments, "comments")
+    _reject_duplicate_client_ids(section_locks, "sectionLocks")
+    return CollaborationStateModels(
+        comments=comments,
+        section_locks=section_locks,
+        expected_revision=expected_revision,
+    )
+
+
+def _read_expected_revision(patch: dict) -> int | None:
+    value = patch.get("expectedRevision")
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError("expectedRevision 必须是非负整数")
+    return value
+
+
+def _reject_duplicate_client_ids(rows: list, field_name: str) -> None:
+    seen: set[str] = set()
+    for row in rows:
+        if row.client_id in seen:
+            raise ValueError(f"{field_name} 中 id 重复: {row.client_id}")
+        seen.add(row.client_id)
+
+
+def _diff_collaboration_rows(
+    existing_rows: list,
+    desired_rows: list,
+    fields: tuple[str, ...],
+) -> CollaborationRowDelta:
+    delta = CollaborationRowDelta()
+    existing_by_client_id = {}
+    for row in existing_rows:
+        if row.client_id in existing_by_client_id:
+            # Rows saved before ids were checked for duplicates.
+            delta.deleted_ids.append(row.id)
+        else:
+            existing_by_client_id[row.client_id] = row
+
+    for desired in desired_rows:
+        current = existing_by_client_id.pop(desired.client_id, None)
+        if current is None:
+            delta.added.append(desired)
+            continue
+        changed = False
+        for field_name in fields:
+            value = getattr(desired, field_name)
+            if getattr(current, field_name) != value:
+                setattr(current, field_name, value)
+                changed = True
+        if changed:
+            delta.updated.append(current)
+
+    delta.deleted_ids.extend(row.id for row in existing_by_client_id.values())
+    return delta
+
+
+def diff_collaboration_state(
+    *,
+    existing_comments: list[AgentArtifactComment],
+    existing_section_locks: list[AgentArtifactSectionLock],
+    desired: CollaborationStateModels,
+) -> CollaborationStateDelta:
+    """Match desired rows to stored rows by client id.
+
+    Stored rows whose fields differ are updated in place, so only changed
+    columns are written; unmatched desired rows are returned as additions and
+    unmatched stored rows as deletions.
+    """
+    return CollaborationStateDelta(
+        comments=_diff_collaboration_rows(
+            existing_comments,
+            desired.comments,
+            COMMENT_FIELDS,
+        ),
+        section_locks=_diff_collaboration_rows(
+            existing_section_locks,
+            desired.section_locks,
+            SECTION_LOCK_FIELDS,
+        ),
+    )
+
+
+def build_collaboration_audit_event(
+    *,
+    run_id: str,
+    current_stage_id: str,
+    delta: CollaborationStateDelta,
+    created_at_ms: int,
+) -> AgentArtifactAuditEvent:
+    changes = []
+    for row_delta, unit in (
+        (delta.comments, "条批注"),
+        (delta.section_locks, "个章节锁"),
+    ):
+        for verb, count in (
+            ("新增", len(row_delta.added)),
+            ("修改", len(row_delta.updated)),
+            ("删除", len(row_delta.deleted_ids)),
+        ):
+            if count:
+                changes.append(f"{verb} {count} {unit}")
+    return AgentArtifactAuditEvent(
         run_id=run_id,
         stage_id=current_stage_id,
         event_type="collaboration_updated",
-        summary=(
-            f"更新了 {current_stage_id} 阶段协作状态："
-            f"{len(comments_payload)} 条批注，{len(locks_payload)} 个章节锁"
-        ),
+        summary=f"更新了 {current_stage_id} 阶段协作状态：{'，'.join(changes)}",
         created_at_ms=created_at_ms,
     )
-    return CollaborationStateModels(
-        comments=comments,
-        section_locks=section_locks,
-        audit_event=audit_event,
-    )
 
 
 def comment_snapshot(comment: AgentArtifactComment) -> dict:
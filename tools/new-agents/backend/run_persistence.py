@@ -4,13 +4,15 @@ import json
 import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import wraps
 from uuid import uuid4
 
-from sqlalchemy import or_
+from sqlalchemy import delete, or_, update
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from api_responses import DEFAULT_LLM_CONFIG_MISSING_CODE
 from agent_contracts import WORKFLOW_STAGES
+from artifact_data_cache import decoded_artifact_data, get_artifact_data_cache
 from context_summary_format import (
     CURRENT_ARTIFACT_SUMMARY_TYPE,
     DECISION_SUMMARY_TYPE,
@@ -23,10 +25,19 @@ from context_summary_format import (
 )
 from run_collaboration_state import (
     audit_event_snapshot,
+    build_collaboration_audit_event,
     build_collaboration_state_models,
     comment_snapshot,
+    diff_collaboration_state,
     section_lock_snapshot,
 )
+from db_instrumentation import DbUsage, current_db_usage, track_db_usage
+from history_compaction import get_history_compactor
+from history_retrieval import get_history_index_registry
+from mermaid_repair_cache import get_mermaid_repair_cache
+from metrics_sink import get_metrics_sink
+from provider_admission import get_provider_admission
+from provider_routing import ProviderTarget, get_provider_router
 from safe_error_diagnostics import (
     SAFE_RESPONSE_SCHEMA_VALIDATORS,
     project_safe_schema_field_path,
@@ -45,6 +56,7 @@ from models import (
     AgentRuntimeConfigIssue,
     db,
 )
+from token_counting import get_token_counter, token_counter_stats
 from workflow_manifest import get_workflow_agent_id
 
 MESSAGE_ROLES = {"user", "assistant"}
@@ -54,7 +66,15 @@ SUMMARY_SOURCE_ARTIFACT = "artifact"
 SUMMARY_SOURCE_USER_INPUT = "user_input"
 DEFAULT_RUN_LIST_LIMIT = 20
 MAX_RUN_LIST_LIMIT = 100
-PROVIDER_ISSUE_ERROR_CODES = {"LLM_ERROR", DEFAULT_LLM_CONFIG_MISSING_CODE}
+PROVIDER_ISSUE_ERROR_CODES = {
+    "LLM_ERROR",
+    "PROVIDER_BUSY",
+    DEFAULT_LLM_CONFIG_MISSING_CODE,
+}
+# Of the provider issues, only provider errors say anything about a
+# provider's health; busy and missing-config turns never reached it.
+ROUTING_FAILURE_ERROR_CODES = frozenset({"LLM_ERROR"})
+PROVIDER_ROUTING_SAMPLE_LIMIT = 200
 LOW_OBSERVABILITY_SUCCESS_RATE_THRESHOLD = 80.0
 CONTRACT_RETRY_REASON = "STRUCTURED_OUTPUT_CONTRACT_RETRY"
 TURN_REQUEST_IDENTITY_KEY = "_requestIdentity"
@@ -71,6 +91,7 @@ ERROR_PUBLIC_REASONS = {
     "PERSISTENCE_FAILED": (
         "本轮结果未能安全保存，右侧产出物和历史版本均未作为成功结果提交。"
     ),
+    "PROVIDER_BUSY": "模型服务当前繁忙，本轮生成未开始，请稍后重试。",
     "REQUEST_IN_PROGRESS": "相同请求仍在运行中，请等待其完成或恢复同一请求。",
     "REQUEST_IDENTITY_CONFLICT": "requestId 已绑定到另一个阶段或输入，请使用新的 requestId。",
     "REQUEST_VALIDATION_FAILED": "请求参数未通过校验，本轮生成未开始。",
@@ -170,6 +191,12 @@ class ArtifactVersionConflictError(ValueError):
         self.current_artifact = current_artifact
 
 
+class CollaborationRevisionConflictError(ValueError):
+    def __init__(self, current_revision: int):
+        super().__init__("协作状态已被更新，请刷新后再保存")
+        self.current_revision = current_revision
+
+
 class TurnPersistenceError(RuntimeError):
     """A completed turn could not be committed as one durable outcome."""
 
@@ -210,46 +237,72 @@ def _get_run(run_id: str) -> AgentRun:
     return run
 
 
-def _next_message_sequence(run_id: str) -> int:
-    current_max = (
-        db.session.query(db.func.max(AgentMessage.sequence_index))
-        .filter_by(run_id=run_id)
-        .scalar()
-    )
-    return (current_max or 0) + 1
+def _allocate_message_sequence(
+    run_id: str,
+    role: str,
+    *,
+    expected_last_assistant_sequence: int | None = None,
+) -> int:
+    """Advance the run's message counters in one statement and return the slot.
+
+    With ``expected_last_assistant_sequence`` the update is a compare-and-set
+    against the turn baseline, so a superseded completion cannot allocate.
+    """
+    values = {AgentRun.last_message_sequence: AgentRun.last_message_sequence + 1}
+    if role == "assistant":
+        values[AgentRun.last_assistant_sequence] = AgentRun.last_message_sequence + 1
+    statement = update(AgentRun).where(AgentRun.id == run_id)
+    if expected_last_assistant_sequence is not None:
+        statement = statement.where(
+            AgentRun.last_assistant_sequence == expected_last_assistant_sequence
+        )
+    sequence = db.session.execute(
+        statement.values(values).returning(AgentRun.last_message_sequence),
+        execution_options={"synchronize_session": "fetch"},
+    ).scalar_one_or_none()
+    if sequence is None:
+        raise TurnPersistenceConflictError("Turn request baseline was superseded.")
+    return sequence
 
 
 def _last_assistant_sequence(run_id: str) -> int:
-    current_max = (
-        db.session.query(db.func.max(AgentMessage.sequence_index))
-        .filter_by(run_id=run_id, role="assistant")
+    current = (
+        db.session.query(AgentRun.last_assistant_sequence)
+        .filter_by(id=run_id)
         .scalar()
     )
-    return current_max or 0
+    return current or 0
 
 
 def _current_stage_artifact_version(run_id: str, stage_id: str) -> int:
-    artifact = AgentArtifact.query.filter_by(
-        run_id=run_id,
-        stage_id=stage_id,
-    ).one_or_none()
-    if artifact is None or artifact.current_version_id is None:
-        return 0
-    version = db.session.get(AgentArtifactVersion, artifact.current_version_id)
-    if version is None:
-        raise TurnPersistenceConflictError(
-            "Current artifact version could not be resolved."
-        )
-    return version.version_number
-
-
-def _next_artifact_version(artifact_id: int) -> int:
-    current_max = (
-        db.session.query(db.func.max(AgentArtifactVersion.version_number))
-        .filter_by(artifact_id=artifact_id)
+    current = (
+        db.session.query(AgentArtifact.current_version_number)
+        .filter_by(run_id=run_id, stage_id=stage_id)
         .scalar()
     )
-    return (current_max or 0) + 1
+    return current or 0
+
+
+def _allocate_artifact_version(
+    artifact_id: int,
+    *,
+    expected_version_number: int | None = None,
+) -> int:
+    """Advance the artifact's version counter in one statement and return it."""
+    statement = update(AgentArtifact).where(AgentArtifact.id == artifact_id)
+    if expected_version_number is not None:
+        statement = statement.where(
+            AgentArtifact.current_version_number == expected_version_number
+        )
+    version_number = db.session.execute(
+        statement.values(
+            {AgentArtifact.current_version_number: AgentArtifact.current_version_number + 1}
+        ).returning(AgentArtifact.current_version_number),
+        execution_options={"synchronize_session": "fetch"},
+    ).scalar_one_or_none()
+    if version_number is None:
+        raise TurnPersistenceConflictError("Turn request baseline was superseded.")
+    return version_number
 
 
 def create_agent_run(
@@ -490,6 +543,18 @@ def clone_agent_run(source_run_id: str) -> AgentRun:
                         sequence_index=message.sequence_index,
                     )
                 )
+            cloned.last_message_sequence = max(
+                (message.sequence_index for message in source_messages),
+                default=0,
+            )
+            cloned.last_assistant_sequence = max(
+                (
+                    message.sequence_index
+                    for message in source_messages
+                    if message.role == "assistant"
+                ),
+                default=0,
+            )
 
             source_artifacts = (
                 AgentArtifact.query.filter_by(run_id=source.id)
@@ -542,7 +607,44 @@ def clone_agent_run(source_run_id: str) -> AgentRun:
         raise TurnPersistenceError("Unable to clone the agent run.")
 
 
+def context_omitted_message_sequences(run_id: str) -> set[int]:
+    """Return user message sequences of turns that must not reach the model."""
+    excluded_sequences = set()
+    context_omitted_requests = AgentRunTurnRequest.query.filter(
+        AgentRunTurnRequest.run_id == run_id,
+        AgentRunTurnRequest.status.in_(("active", "abandoned", "failed")),
+    ).all()
+    for turn_request in context_omitted_requests:
+        identity = _stored_turn_request_identity(turn_request)
+        if identity is None:
+            raise TurnPersistenceError("Unable to resolve durable runtime context.")
+        excluded_sequences.add(identity["userMessageSequence"])
+    return excluded_sequences
+
+
+def _tracks_db_usage(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with track_db_usage(self.db_usage):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class AgentRunPersistence:
+    """Stream persistence adapter that attributes DB usage to one turn."""
+
+    def __init__(
+        self,
+        *,
+        context_budget_tokens: int | None = None,
+        model_name: str = "",
+    ) -> None:
+        self.db_usage = DbUsage()
+        self.context_budget_tokens = context_budget_tokens
+        self.model_name = model_name
+
+    @_tracks_db_usage
     def ensure_run(self, agent_request, *, model_name: str) -> str:
         try:
             agent_id = get_workflow_agent_id(agent_request.workflow_id)
@@ -558,6 +660,26 @@ class AgentRunPersistence:
             db.session.rollback()
         raise TurnPersistenceError("Unable to ensure the agent run.") from None
 
+    @_tracks_db_usage
+    def route_provider_targets(
+        self,
+        run_id: str,
+        targets: tuple[ProviderTarget, ...],
+    ) -> tuple[ProviderTarget, ...]:
+        router = get_provider_router()
+        try:
+            if not router.seeded:
+                router.seed(load_provider_routing_samples())
+            run = db.session.get(AgentRun, run_id)
+            return router.rank(
+                targets,
+                pinned_key=run.llm_config_key if run is not None else None,
+            )
+        except SQLAlchemyError:
+            db.session.rollback()
+        raise TurnPersistenceError("Unable to route the agent turn.") from None
+
+    @_tracks_db_usage
     def claim_turn_request(
         self,
         run_id: str,
@@ -578,6 +700,7 @@ class AgentRunPersistence:
             db.session.rollback()
         raise TurnPersistenceError("Unable to claim the agent turn request.") from None
 
+    @_tracks_db_usage
     def fail_turn_request(
         self,
         run_id: str,
@@ -593,6 +716,7 @@ class AgentRunPersistence:
             terminal_event=terminal_event,
         )
 
+    @_tracks_db_usage
     def abandon_turn_request(
         self,
         run_id: str,
@@ -606,32 +730,32 @@ class AgentRunPersistence:
             owner_token=owner_token,
         )
 
+    @_tracks_db_usage
     def build_runtime_context(
         self,
         run_id: str,
         current_prompt: str,
         *,
         request_id: str,
+        target: ProviderTarget | None = None,
     ):
-        from context_builder import build_run_context
-
+        """Build the turn context for ``target``, or the configured model."""
+        from context_builder import DEFAULT_CONTEXT_MAX_TOKENS, build_run_context
+
+        if target is not None:
+            model_name = target.model_name
+            context_budget_tokens = target.context_budget_tokens
+        else:
+            model_name = self.model_name
+            context_budget_tokens = self.context_budget_tokens
         storage_failed = False
         try:
-            excluded_sequences = set()
-            context_omitted_requests = AgentRunTurnRequest.query.filter(
-                AgentRunTurnRequest.run_id == run_id,
-                AgentRunTurnRequest.status.in_(("active", "abandoned", "failed")),
-            ).all()
-            for turn_request in context_omitted_requests:
-                identity = _stored_turn_request_identity(turn_request)
-                if identity is None:
-                    raise TurnPersistenceError(
-                        "Unable to resolve durable runtime context."
-                    )
-                excluded_sequences.add(identity["userMessageSequence"])
+            excluded_sequences = context_omitted_message_sequences(run_id)
             context = build_run_context(
                 run_id,
                 current_prompt,
+                max_tokens=context_budget_tokens or DEFAULT_CONTEXT_MAX_TOKENS,
+                token_counter=get_token_counter(model_name) if model_name else None,
                 exclude_message_sequences=excluded_sequences,
             )
             warnings = list(context.warnings)
@@ -644,6 +768,7 @@ class AgentRunPersistence:
         if storage_failed:
             raise TurnPersistenceError("Unable to build durable runtime context.")
 
+    @_tracks_db_usage
     def complete_agent_run_turn(
         self,
         run_id: str,
@@ -656,6 +781,7 @@ class AgentRunPersistence:
         owner_token: str | None,
         terminal_event: dict | None,
         metric: dict,
+        llm_config_key: str | None = None,
     ) -> None:
         complete_agent_run_turn(
             run_id,
@@ -667,10 +793,21 @@ class AgentRunPersistence:
             owner_token=owner_token,
             terminal_event=terminal_event,
             metric=metric,
+            llm_config_key=llm_config_key,
         )
+        compactor = get_history_compactor()
+        if compactor is not None:
+            compactor.enqueue(run_id)
 
+    @_tracks_db_usage
     def record_turn_metric(self, **kwargs) -> None:
-        record_turn_metric(**kwargs)
+        # Failure-path metrics are buffered so a slow database does not delay
+        # the error event; the success metric commits with the turn itself.
+        get_metrics_sink().enqueue(AgentRunTurnMetric, build_turn_metric_row(**kwargs))
+
+    def release_connection(self) -> None:
+        """Return the session's connection to the pool before the model call."""
+        db.session.close()
 
 
 def append_run_message(
@@ -680,6 +817,7 @@ def append_run_message(
     *,
     _commit: bool = True,
     _summarize_user: bool = True,
+    _expected_last_assistant_sequence: int | None = None,
 ) -> AgentMessage:
     run = _get_run(run_id)
     if role not in MESSAGE_ROLES:
@@ -689,7 +827,11 @@ def append_run_message(
         run_id=run_id,
         role=role,
         content=content,
-        sequence_index=_next_message_sequence(run_id),
+        sequence_index=_allocate_message_sequence(
+            run_id,
+            role,
+            expected_last_assistant_sequence=_expected_last_assistant_sequence,
+        ),
     )
     db.session.add(message)
     if role == "user" and _summarize_user:
@@ -1233,6 +1375,12 @@ def _sanitize_failed_terminal_event(
                 "atomic_commit",
                 True,
             ),
+            "PROVIDER_BUSY": (
+                "provider",
+                "provider",
+                "provider_admission",
+                True,
+            ),
             "REQUEST_IN_PROGRESS": (
                 "persistence",
                 "request_id",
@@ -1312,6 +1460,9 @@ def _failed_turn_message_projection(terminal_event: dict) -> tuple[str, dict]:
     if code == "LLM_ERROR":
         kind = "provider"
         summary = "模型调用未完成"
+    elif code == "PROVIDER_BUSY":
+        kind = "provider"
+        summary = "模型服务繁忙"
     elif code in {
         "CONTRACT_VALIDATION_FAILED",
         "SCHEMA_VALIDATION_FAILED",
@@ -1673,6 +1824,7 @@ def record_artifact_version(
     *,
     artifact_data: dict | None = None,
     _commit: bool = True,
+    _expected_version_number: int | None = None,
 ) -> AgentArtifactVersion:
     run = _get_run(run_id)
     _validate_workflow_stage(run.workflow_id, stage_id)
@@ -1688,7 +1840,10 @@ def record_artifact_version(
 
     version = AgentArtifactVersion(
         artifact_id=artifact.id,
-        version_number=_next_artifact_version(artifact.id),
+        version_number=_allocate_artifact_version(
+            artifact.id,
+            expected_version_number=_expected_version_number,
+        ),
         content=content,
         artifact_data_json=(
             json.dumps(artifact_data, ensure_ascii=False)
@@ -1720,32 +1875,110 @@ def _stage_turn_metric(
     estimated_tokens: int,
     contract_retry_count: int,
     diagnostic: dict | None = None,
+    prompt_tokens: int = 0,
+    prompt_token_counter: str | None = None,
+    llm_config_key: str | None = None,
+    discarded_tokens: int = 0,
+    early_abort_count: int = 0,
+    early_abort_saved_ms: int = 0,
+    queue_wait_ms: int = 0,
+    first_token_ms: int = 0,
 ) -> AgentRunTurnMetric:
     _get_run(run_id)
     metric = AgentRunTurnMetric(
-        run_id=run_id,
-        workflow_id=workflow_id,
-        stage_id=stage_id,
-        model=model_name,
-        provider=provider or "unknown",
-        status=status,
-        error_code=error_code,
-        duration_ms=max(0, duration_ms),
-        input_chars=max(0, input_chars),
-        output_chars=max(0, output_chars),
-        estimated_tokens=max(0, estimated_tokens),
-        contract_retry_count=max(0, contract_retry_count),
-        diagnostic=_sanitize_error_diagnostic(
-            diagnostic,
-            error_code=error_code,
+        **build_turn_metric_row(
+            run_id=run_id,
             workflow_id=workflow_id,
             stage_id=stage_id,
-        ),
+            model_name=model_name,
+            provider=provider,
+            status=status,
+            error_code=error_code,
+            duration_ms=duration_ms,
+            input_chars=input_chars,
+            output_chars=output_chars,
+            estimated_tokens=estimated_tokens,
+            contract_retry_count=contract_retry_count,
+            diagnostic=diagnostic,
+            prompt_tokens=prompt_tokens,
+            prompt_token_counter=prompt_token_counter,
+            llm_config_key=llm_config_key,
+            discarded_tokens=discarded_tokens,
+            early_abort_count=early_abort_count,
+            early_abort_saved_ms=early_abort_saved_ms,
+            queue_wait_ms=queue_wait_ms,
+            first_token_ms=first_token_ms,
+        )
     )
     db.session.add(metric)
     return metric
 
 
+def build_turn_metric_row(
+    *,
+    run_id: str,
+    workflow_id: str,
+    stage_id: str,
+    model_name: str,
+    provider: str,
+    status: str,
+    error_code: str | None,
+    duration_ms: int,
+    input_chars: int,
+    output_chars: int,
+    estimated_tokens: int,
+    contract_retry_count: int,
+    diagnostic: dict | None = None,
+    prompt_tokens: int = 0,
+    prompt_token_counter: str | None = None,
+    llm_config_key: str | None = None,
+    discarded_tokens: int = 0,
+    early_abort_count: int = 0,
+    early_abort_saved_ms: int = 0,
+    queue_wait_ms: int = 0,
+    first_token_ms: int = 0,
+) -> dict:
+    """Return the column values of a turn metric without touching the DB."""
+    sanitized_diagnostic = _sanitize_error_diagnostic(
+        diagnostic,
+        error_code=error_code,
+        workflow_id=workflow_id,
+        stage_id=stage_id,
+    )
+    row = {
+        "run_id": run_id,
+        "workflow_id": workflow_id,
+        "stage_id": stage_id,
+        "model": model_name,
+        "provider": provider or "unknown",
+        "status": status,
+        "error_code": error_code,
+        "duration_ms": max(0, duration_ms),
+        "input_chars": max(0, input_chars),
+        "output_chars": max(0, output_chars),
+        "estimated_tokens": max(0, estimated_tokens),
+        "prompt_tokens": max(0, prompt_tokens),
+        "prompt_token_counter": prompt_token_counter,
+        "llm_config_key": llm_config_key,
+        "discarded_tokens": max(0, discarded_tokens),
+        "early_abort_count": max(0, early_abort_count),
+        "early_abort_saved_ms": max(0, early_abort_saved_ms),
+        "queue_wait_ms": max(0, queue_wait_ms),
+        "first_token_ms": max(0, first_token_ms),
+        "contract_retry_count": max(0, contract_retry_count),
+        "diagnostic_json": (
+            json.dumps(sanitized_diagnostic, ensure_ascii=False)
+            if sanitized_diagnostic is not None
+            else None
+        ),
+        "created_at": _utcnow_naive(),
+    }
+    db_usage = current_db_usage()
+    if db_usage is not None:
+        row.update(db_usage.metric_fields())
+    return row
+
+
 def complete_agent_run_turn(
     run_id: str,
     *,
@@ -1757,8 +1990,12 @@ def complete_agent_run_turn(
     artifact_data: dict | None,
     terminal_event: dict | None = None,
     metric: dict,
+    llm_config_key: str | None = None,
 ) -> None:
-    """Persist a successful assistant turn as one atomic outcome."""
+    """Persist a successful assistant turn as one atomic outcome.
+
+    ``llm_config_key`` pins the run to the provider target that served it.
+    """
     try:
         transaction = (
             db.session.begin_nested()
@@ -1784,11 +2021,12 @@ def complete_agent_run_turn(
                     raise TurnRequestIdentityConflictError(
                         "requestId identity conflict"
                     )
+                expected_assistant_sequence = identity["baselineAssistantSequence"]
+                expected_artifact_version = identity["baselineArtifactVersion"]
                 if (
-                    _last_assistant_sequence(run_id)
-                    != identity["baselineAssistantSequence"]
-                    or _current_stage_artifact_version(run_id, stage_id)
-                    != identity["baselineArtifactVersion"]
+                    artifact_content is None
+                    and _current_stage_artifact_version(run_id, stage_id)
+                    != expected_artifact_version
                 ):
                     raise TurnPersistenceConflictError(
                         "Turn request baseline was superseded."
@@ -1800,11 +2038,17 @@ def complete_agent_run_turn(
                     terminal_event=terminal_event,
                 )
                 _append_turn_request_user_supplement(turn_request)
+            else:
+                expected_assistant_sequence = None
+                expected_artifact_version = None
+            # The baseline checks ride on the counter updates that allocate
+            # the assistant sequence and artifact version.
             append_run_message(
                 run_id,
                 "assistant",
                 assistant_content,
                 _commit=False,
+                _expected_last_assistant_sequence=expected_assistant_sequence,
             )
             if artifact_content is not None:
                 record_artifact_version(
@@ -1813,8 +2057,15 @@ def complete_agent_run_turn(
                     artifact_content,
                     artifact_data=artifact_data,
                     _commit=False,
+                    _expected_version_number=expected_artifact_version,
+                )
+            _stage_turn_metric(run_id=run_id, llm_config_key=llm_config_key, **metric)
+            if llm_config_key is not None:
+                db.session.execute(
+                    update(AgentRun)
+                    .where(AgentRun.id == run_id)
+                    .values(llm_config_key=llm_config_key)
                 )
-            _stage_turn_metric(run_id=run_id, **metric)
         if db.session().in_transaction():
             db.session.commit()
     except IntegrityError as error:
@@ -2077,21 +2328,71 @@ def _record_artifact_audit_event(
 
 
 def replace_artifact_collaboration_state(run_id: str, patch: dict) -> dict:
+    """Make the run's comments and section locks match ``patch``.
+
+    Rows are matched by client id and only added, changed or removed rows are
+    written; a save that changes nothing writes nothing. An optional
+    ``expectedRevision`` rejects the save when another writer got there first.
+    """
     run = _get_run(run_id)
     collaboration_state = build_collaboration_state_models(
         run_id=run_id,
         workflow_id=run.workflow_id,
-        current_stage_id=run.current_stage_id,
         patch=patch,
-        created_at_ms=int(time.time() * 1000),
     )
+    expected_revision = collaboration_state.expected_revision
+    if (
+        expected_revision is not None
+        and run.collaboration_revision != expected_revision
+    ):
+        raise CollaborationRevisionConflictError(run.collaboration_revision)
+
+    delta = diff_collaboration_state(
+        existing_comments=AgentArtifactComment.query.filter_by(run_id=run_id).all(),
+        existing_section_locks=AgentArtifactSectionLock.query.filter_by(
+            run_id=run_id
+        ).all(),
+        desired=collaboration_state,
+    )
+    if delta.has_changes:
+        revision_update = update(AgentRun).where(AgentRun.id == run_id)
+        if expected_revision is not None:
+            revision_update = revision_update.where(
+                AgentRun.collaboration_revision == expected_revision
+            )
+        bumped = db.session.execute(
+            revision_update.values(
+                collaboration_revision=AgentRun.collaboration_revision + 1
+            ).execution_options(synchronize_session=False)
+        ).rowcount
+        if not bumped:
+            db.session.rollback()
+            raise CollaborationRevisionConflictError(
+                _get_run(run_id).collaboration_revision
+            )
+
+        for model, row_delta in (
+            (AgentArtifactComment, delta.comments),
+            (AgentArtifactSectionLock, delta.section_locks),
+        ):
+            if row_delta.deleted_ids:
+                db.session.execute(
+                    delete(model)
+                    .where(model.id.in_(row_delta.deleted_ids))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.add_all(row_delta.added)
+        db.session.add(
+            build_collaboration_audit_event(
+                run_id=run_id,
+                current_stage_id=run.current_stage_id,
+                delta=delta,
+                created_at_ms=int(time.time() * 1000),
+            )
+        )
+        db.session.commit()
+        db.session.refresh(run)
 
-    AgentArtifactComment.query.filter_by(run_id=run_id).delete()
-    AgentArtifactSectionLock.query.filter_by(run_id=run_id).delete()
-    db.session.add_all(collaboration_state.comments)
-    db.session.add_all(collaboration_state.section_locks)
-    db.session.add(collaboration_state.audit_event)
-    db.session.commit()
     return {
         "artifactComments": [
             comment_snapshot(comment) for comment in collaboration_state.comments
@@ -2099,6 +2400,7 @@ def replace_artifact_collaboration_state(run_id: str, patch: dict) -> dict:
         "artifactSectionLocks": [
             section_lock_snapshot(lock) for lock in collaboration_state.section_locks
         ],
+        "collaborationRevision": run.collaboration_revision,
     }
 
 
@@ -2228,6 +2530,8 @@ def get_run_snapshot(run_id: str) -> dict:
                 "content": summary.content,
             }
             for summary in context_summaries
+            # Empty message range rows only mark ranges compaction skipped.
+            if summary.content
         ],
         "artifactComments": [
             comment_snapshot(comment) for comment in artifact_comments
@@ -2235,6 +2539,7 @@ def get_run_snapshot(run_id: str) -> dict:
         "artifactSectionLocks": [
             section_lock_snapshot(lock) for lock in artifact_section_locks
         ],
+        "collaborationRevision": run.collaboration_revision,
         "artifactAuditEvents": [
             audit_event_snapshot(event) for event in artifact_audit_events
         ],
@@ -2256,6 +2561,14 @@ def record_turn_metric(
     estimated_tokens: int,
     contract_retry_count: int,
     diagnostic: dict | None = None,
+    prompt_tokens: int = 0,
+    prompt_token_counter: str | None = None,
+    llm_config_key: str | None = None,
+    discarded_tokens: int = 0,
+    early_abort_count: int = 0,
+    early_abort_saved_ms: int = 0,
+    queue_wait_ms: int = 0,
+    first_token_ms: int = 0,
 ) -> AgentRunTurnMetric:
     try:
         metric = _stage_turn_metric(
@@ -2272,6 +2585,14 @@ def record_turn_metric(
             estimated_tokens=estimated_tokens,
             contract_retry_count=contract_retry_count,
             diagnostic=diagnostic,
+            prompt_tokens=prompt_tokens,
+            prompt_token_counter=prompt_token_counter,
+            llm_config_key=llm_config_key,
+            discarded_tokens=discarded_tokens,
+            early_abort_count=early_abort_count,
+            early_abort_saved_ms=early_abort_saved_ms,
+            queue_wait_ms=queue_wait_ms,
+            first_token_ms=first_token_ms,
         )
         db.session.commit()
     except SQLAlchemyError:
@@ -2304,6 +2625,61 @@ def record_runtime_config_issue(
     return issue
 
 
+def enqueue_runtime_config_issue(
+    *,
+    workflow_id: str,
+    stage_id: str,
+    error_code: str,
+    issue_scope: str,
+    route: str,
+    request_id: str,
+) -> bool:
+    """Buffer a runtime config issue for a batched write; False if dropped."""
+    _validate_workflow_stage(workflow_id, stage_id)
+    return get_metrics_sink().enqueue(
+        AgentRuntimeConfigIssue,
+        {
+            "workflow_id": workflow_id,
+            "stage_id": stage_id,
+            "error_code": error_code,
+            "issue_scope": issue_scope,
+            "route": route,
+            "request_id": request_id,
+            "created_at": _utcnow_naive(),
+        },
+    )
+
+
+def load_provider_routing_samples(
+    limit: int = PROVIDER_ROUTING_SAMPLE_LIMIT,
+) -> list[tuple[str, bool, int | None]]:
+    """Recent turns as ``(config_key, succeeded, first_token_ms)`` router samples.
+
+    Samples are oldest first. A turn recorded before first tokens were
+    measured has no latency sample; its whole-turn duration is not one.
+    Turns recorded without a config key are skipped.
+    """
+    rows = (
+        db.session.query(
+            AgentRunTurnMetric.llm_config_key,
+            AgentRunTurnMetric.status,
+            AgentRunTurnMetric.error_code,
+            AgentRunTurnMetric.first_token_ms,
+        )
+        .filter(AgentRunTurnMetric.llm_config_key.isnot(None))
+        .order_by(AgentRunTurnMetric.created_at.desc(), AgentRunTurnMetric.id.desc())
+        .limit(limit)
+        .all()
+    )
+    samples: list[tuple[str, bool, int | None]] = []
+    for config_key, status, error_code, first_token_ms in reversed(rows):
+        if error_code in ROUTING_FAILURE_ERROR_CODES:
+            samples.append((config_key, False, None))
+        elif status == "success":
+            samples.append((config_key, True, first_token_ms or None))
+    return samples
+
+
 def get_runtime_observability_summary(
     *,
     limit: int = 20,
@@ -2322,6 +2698,8 @@ def get_runtime_observability_summary(
         if stage_id is not None:
             _validate_workflow_stage(workflow_id, stage_id)
 
+    metrics_sink = get_metrics_sink()
+    metrics_sink.flush()
     query = AgentRunTurnMetric.query
     if workflow_id is not None:
         query = query.filter(AgentRunTurnMetric.workflow_id == workflow_id)
@@ -2400,6 +2778,15 @@ def get_runtime_observability_summary(
                 zero_duration_count=len(config_issues),
             ),
             "estimatedTokens": sum(metric.estimated_tokens for metric in metrics),
+            "promptTokens": sum(metric.prompt_tokens or 0 for metric in metrics),
+            "discardedTokens": sum(
+                metric.discarded_tokens or 0 for metric in metrics
+            ),
+            "earlyAborts": sum(metric.early_abort_count or 0 for metric in metrics),
+            "earlyAbortSavedMs": sum(
+                metric.early_abort_saved_ms or 0 for metric in metrics
+            ),
+            "queueWaitMs": sum(metric.queue_wait_ms or 0 for metric in metrics),
             "providerIssueCount": sum(provider_issue_codes.values()),
             "providerIssueCodes": provider_issue_codes,
         },
@@ -2419,6 +2806,18 @@ def get_runtime_observability_summary(
         "recentTurns": [_turn_metric_snapshot(metric) for metric in metrics[:limit]],
         "contractRetryReasons": contract_retry_reasons,
         "diagnostics": diagnostics,
+        "metricsSink": metrics_sink.stats(),
+        "artifactDataCache": get_artifact_data_cache().stats(),
+        "mermaidRepairCache": get_mermaid_repair_cache().stats(),
+        "tokenCounters": token_counter_stats(),
+        "historyIndex": get_history_index_registry().stats(),
+        "historyCompaction": (
+            compactor.stats()
+            if (compactor := get_history_compactor()) is not None
+            else None
+        ),
+        "providerAdmission": get_provider_admission().stats(),
+        "providerRouting": get_provider_router().stats(),
     }
 
 
@@ -2657,6 +3056,7 @@ def _provider_observability_item(
         "failedTurns": failed_turns,
         "successRate": _success_rate(len(metrics), failed_turns),
         "avgDurationMs": _avg_duration(metrics),
+        "avgFirstTokenMs": _avg_first_token(metrics),
         "estimatedTokens": sum(metric.estimated_tokens for metric in metrics),
         "errorCodes": dict(sorted(error_codes.items())),
         "providerIssueCount": sum(provider_issue_codes.values()),
@@ -2664,6 +3064,13 @@ def _provider_observability_item(
     }
 
 
+def _avg_first_token(metrics: list[AgentRunTurnMetric]) -> float:
+    first_token_ms = [metric.first_token_ms for metric in metrics if metric.first_token_ms]
+    if not first_token_ms:
+        return 0.0
+    return round(sum(first_token_ms) / len(first_token_ms), 2)
+
+
 def _turn_metric_snapshot(metric: AgentRunTurnMetric) -> dict:
     error_code = _project_observability_error_code(metric.error_code)
     snapshot = {
@@ -2679,7 +3086,18 @@ def _turn_metric_snapshot(metric: AgentRunTurnMetric) -> dict:
         "inputChars": metric.input_chars,
         "outputChars": metric.output_chars,
         "estimatedTokens": metric.estimated_tokens,
+        "promptTokens": metric.prompt_tokens or 0,
+        "promptTokenCounter": metric.prompt_token_counter,
+        "llmConfigKey": metric.llm_config_key,
+        "discardedTokens": metric.discarded_tokens or 0,
+        "earlyAborts": metric.early_abort_count or 0,
+        "earlyAbortSavedMs": metric.early_abort_saved_ms or 0,
+        "queueWaitMs": metric.queue_wait_ms or 0,
+        "firstTokenMs": metric.first_token_ms or 0,
         "contractRetryCount": metric.contract_retry_count,
+        "dbQueryCount": metric.db_query_count or 0,
+        "dbTimeMs": metric.db_time_ms or 0,
+        "poolWaitMs": metric.pool_wait_ms or 0,
         "createdAt": _format_datetime(metric.created_at),
     }
     diagnostic = _sanitize_error_diagnostic(
@@ -2919,9 +3337,5 @@ def _artifact_snapshot(artifact: AgentArtifact) -> dict:
         "stageId": artifact.stage_id,
         "content": version.content,
         "versionNumber": version.version_number,
-        "artifactData": (
-            json.loads(version.artifact_data_json)
-            if version.artifact_data_json
-            else None
-        ),
+        "artifactData": decoded_artifact_data(version),
     }
@@ -0,0 +1,495 @@
+"""Versioned schema migrations for the new-agents database.
+
+Migrations run once per deploy with ``python -m schema_migrations upgrade``;
+the container command runs it before gunicorn forks its workers. A worker
+only reads the recorded version at boot, one SELECT instead of reflecting
+every upgraded table.
+
+Migration 1 runs ``create_all`` from the current models, so on a fresh
+database later column steps find their columns already present. Every step
+must therefore be idempotent. Append new steps; never renumber shipped ones.
+"""
+
+import argparse
+from collections.abc import Callable
+from dataclasses import dataclass
+import logging
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models import AgentMermaidRepairCacheEntry, db
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_TABLE = "agent_schema_version"
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema is older than the running code expects."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[], None]
+
+
+def _add_missing_columns(table_name: str, column_statements: dict[str, str]) -> None:
+    inspector = inspect(db.engine)
+    if table_name not in inspector.get_table_names():
+        return
+    existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+    for column_name, statement in column_statements.items():
+        if column_name not in existing_columns:
+            db.session.execute(text(statement))
+
+
+def _create_tables() -> None:
+    db.create_all()
+
+
+def _add_artifact_version_data_column() -> None:
+    _add_missing_columns(
+        "agent_artifact_versions",
+        {
+            "artifact_data_json": (
+                "ALTER TABLE agent_artifact_versions ADD COLUMN artifact_data_json TEXT"
+            ),
+        },
+    )
+
+
+def _add_turn_metric_diagnostic_column() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "diagnostic_json": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN diagnostic_json TEXT"
+            ),
+        },
+    )
+
+
+def _add_artifact_comment_thread_columns() -> None:
+    _add_missing_columns(
+        "agent_artifact_comments",
+        {
+            "anchor_text": "ALTER TABLE agent_artifact_comments ADD COLUMN anchor_text TEXT",
+            "status": "ALTER TABLE agent_artifact_comments ADD COLUMN status VARCHAR(32) NOT NULL DEFAULT 'open'",
+            "resolved_at_ms": "ALTER TABLE agent_artifact_comments ADD COLUMN resolved_at_ms INTEGER",
+            "replies_json": "ALTER TABLE agent_artifact_comments ADD COLUMN replies_json TEXT NOT NULL DEFAULT '[]'",
+        },
+    )
+
+
+def _add_section_lock_anchor_column() -> None:
+    _add_missing_columns(
+        "agent_artifact_section_locks",
+        {
+            "section_anchor": (
+                "ALTER TABLE agent_artifact_section_locks ADD COLUMN section_anchor TEXT"
+            ),
+        },
+    )
+
+
+def _add_run_counter_columns() -> None:
+    inspector = inspect(db.engine)
+    table_names = set(inspector.get_table_names())
+
+    if "agent_runs" in table_names:
+        existing_columns = {
+            column["name"] for column in inspector.get_columns("agent_runs")
+        }
+        counter_backfills = {
+            "last_message_sequence": (
+                "SELECT MAX(sequence_index) FROM agent_messages"
+                " WHERE agent_messages.run_id = agent_runs.id"
+            ),
+            "last_assistant_sequence": (
+                "SELECT MAX(sequence_index) FROM agent_messages"
+                " WHERE agent_messages.run_id = agent_runs.id"
+                " AND agent_messages.role = 'assistant'"
+            ),
+        }
+        for column_name, backfill in counter_backfills.items():
+            if column_name in existing_columns:
+                continue
+            db.session.execute(
+                text(
+                    f"ALTER TABLE agent_runs ADD COLUMN {column_name} "
+                    "INTEGER NOT NULL DEFAULT 0"
+                )
+            )
+            if "agent_messages" in table_names:
+                db.session.execute(
+                    text(
+                        f"UPDATE agent_runs SET {column_name} = "
+                        f"COALESCE(({backfill}), 0)"
+                    )
+                )
+
+    if "agent_artifacts" in table_names:
+        existing_columns = {
+            column["name"] for column in inspector.get_columns("agent_artifacts")
+        }
+        if "current_version_number" not in existing_columns:
+            db.session.execute(
+                text(
+                    "ALTER TABLE agent_artifacts ADD COLUMN current_version_number "
+                    "INTEGER NOT NULL DEFAULT 0"
+                )
+            )
+            if "agent_artifact_versions" in table_names:
+                db.session.execute(
+                    text(
+                        "UPDATE agent_artifacts SET current_version_number = "
+                        "COALESCE((SELECT MAX(version_number) "
+                        "FROM agent_artifact_versions "
+                        "WHERE agent_artifact_versions.artifact_id = "
+                        "agent_artifacts.id), 0)"
+                    )
+                )
+
+
+def _add_turn_metric_db_usage_columns() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "db_query_count": "ALTER TABLE agent_run_turn_metrics ADD COLUMN db_query_count INTEGER NOT NULL DEFAULT 0",
+            "db_time_ms": "ALTER TABLE agent_run_turn_metrics ADD COLUMN db_time_ms INTEGER NOT NULL DEFAULT 0",
+            "pool_wait_ms": "ALTER TABLE agent_run_turn_metrics ADD COLUMN pool_wait_ms INTEGER NOT NULL DEFAULT 0",
+        },
+    )
+
+
+def _add_test_asset_quality_counter_columns() -> None:
+    inspector = inspect(db.engine)
+    table_names = set(inspector.get_table_names())
+    if "agent_test_asset_collections" not in table_names:
+        return
+    existing_columns = {
+        column["name"]
+        for column in inspector.get_columns("agent_test_asset_collections")
+    }
+    counter_sources = [
+        ("agent_test_asset_issues", "pending_issue_count", "pending"),
+        ("agent_test_asset_issues", "confirmed_issue_count", "confirmed"),
+        ("agent_test_asset_issues", "ignored_issue_count", "ignored"),
+        ("agent_test_point_assets", "uncovered_test_point_count", "未覆盖"),
+        ("agent_test_point_assets", "partial_test_point_count", "部分覆盖"),
+        ("agent_risk_matrix_assets", "open_risk_count", "open"),
+        ("agent_risk_matrix_assets", "mitigating_risk_count", "mitigating"),
+        ("agent_risk_matrix_assets", "accepted_risk_count", "accepted"),
+        ("agent_risk_matrix_assets", "closed_risk_count", "closed"),
+    ]
+    for source_table, column_name, status in counter_sources:
+        if column_name in existing_columns:
+            continue
+        db.session.execute(
+            text(
+                f"ALTER TABLE agent_test_asset_collections ADD COLUMN {column_name} "
+                "INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+        if source_table in table_names:
+            db.session.execute(
+                text(
+                    f"UPDATE agent_test_asset_collections SET {column_name} = "
+                    f"(SELECT COUNT(*) FROM {source_table} "
+                    f"WHERE {source_table}.collection_id = "
+                    "agent_test_asset_collections.id "
+                    f"AND {source_table}.status = :status)"
+                ),
+                {"status": status},
+            )
+
+
+def _create_mermaid_repair_cache_table() -> None:
+    AgentMermaidRepairCacheEntry.__table__.create(db.engine, checkfirst=True)
+
+
+def _add_run_collaboration_revision_column() -> None:
+    _add_missing_columns(
+        "agent_runs",
+        {
+            "collaboration_revision": (
+                "ALTER TABLE agent_runs ADD COLUMN collaboration_revision "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_token_budget_columns() -> None:
+    _add_missing_columns(
+        "llm_config",
+        {
+            "context_budget_tokens": (
+                "ALTER TABLE llm_config ADD COLUMN context_budget_tokens INTEGER"
+            ),
+        },
+    )
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "prompt_tokens": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN prompt_tokens "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_turn_metric_discarded_tokens_column() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "discarded_tokens": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN discarded_tokens "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_turn_metric_early_abort_columns() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "early_abort_count": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN early_abort_count "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+            "early_abort_saved_ms": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN early_abort_saved_ms "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_provider_admission_columns() -> None:
+    _add_missing_columns(
+        "llm_config",
+        {
+            "max_concurrency": (
+                "ALTER TABLE llm_config ADD COLUMN max_concurrency INTEGER"
+            ),
+            "requests_per_minute": (
+                "ALTER TABLE llm_config ADD COLUMN requests_per_minute INTEGER"
+            ),
+            "tokens_per_minute": (
+                "ALTER TABLE llm_config ADD COLUMN tokens_per_minute INTEGER"
+            ),
+        },
+    )
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "queue_wait_ms": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN queue_wait_ms "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_provider_routing_columns() -> None:
+    _add_missing_columns(
+        "llm_config",
+        {
+            "model_class": "ALTER TABLE llm_config ADD COLUMN model_class VARCHAR(64)",
+        },
+    )
+    _add_missing_columns(
+        "agent_runs",
+        {
+            "llm_config_key": (
+                "ALTER TABLE agent_runs ADD COLUMN llm_config_key VARCHAR(64)"
+            ),
+        },
+    )
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "first_token_ms": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN first_token_ms "
+                "INTEGER NOT NULL DEFAULT 0"
+            ),
+        },
+    )
+
+
+def _add_turn_metric_prompt_token_counter_column() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "prompt_token_counter": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN prompt_token_counter "
+                "VARCHAR(32)"
+            ),
+        },
+    )
+
+
+def _add_turn_metric_config_key_column() -> None:
+    _add_missing_columns(
+        "agent_run_turn_metrics",
+        {
+            "llm_config_key": (
+                "ALTER TABLE agent_run_turn_metrics ADD COLUMN llm_config_key "
+                "VARCHAR(64)"
+            ),
+        },
+    )
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "create tables", _create_tables),
+    Migration(2, "artifact version structured data", _add_artifact_version_data_column),
+    Migration(3, "turn metric diagnostics", _add_turn_metric_diagnostic_column),
+    Migration(4, "threaded artifact comments", _add_artifact_comment_thread_columns),
+    Migration(5, "section lock anchors", _add_section_lock_anchor_column),
+    Migration(6, "run and artifact counters", _add_run_counter_columns),
+    Migration(7, "turn metric DB usage", _add_turn_metric_db_usage_columns),
+    Migration(
+        8,
+        "test asset quality counters",
+        _add_test_asset_quality_counter_columns,
+    ),
+    Migration(9, "mermaid repair cache", _create_mermaid_repair_cache_table),
+    Migration(
+        10,
+        "run collaboration revision",
+        _add_run_collaboration_revision_column,
+    ),
+    Migration(11, "token budgeting", _add_token_budget_columns),
+    Migration(
+        12,
+        "turn metric discarded tokens",
+        _add_turn_metric_discarded_tokens_column,
+    ),
+    Migration(13, "turn metric early aborts", _add_turn_metric_early_abort_columns),
+    Migration(14, "provider admission", _add_provider_admission_columns),
+    Migration(15, "provider routing", _add_provider_routing_columns),
+    Migration(
+        16,
+        "turn metric prompt token counter",
+        _add_turn_metric_prompt_token_counter_column,
+    ),
+    Migration(17, "turn metric config key", _add_turn_metric_config_key_column),
+)
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version() -> int | None:
+    """Return the recorded schema version, or None before the first upgrade."""
+    try:
+        version = db.session.execute(
+            text(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")
+        ).scalar()
+    except (OperationalError, ProgrammingError):
+        db.session.rollback()
+        return None
+    db.session.rollback()
+    return version
+
+
+def _record_schema_version(version: int) -> None:
+    updated = db.session.execute(
+        text(f"UPDATE {SCHEMA_VERSION_TABLE} SET version = :version"),
+        {"version": version},
+    ).rowcount
+    if updated == 0:
+        db.session.execute(
+            text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version) VALUES (:version)"),
+            {"version": version},
+        )
+
+
+def upgrade_schema() -> list[int]:
+    """Apply pending migrations in order and return the applied versions."""
+    db.session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} "
+            "(version INTEGER NOT NULL)"
+        )
+    )
+    db.session.commit()
+    current_version = get_schema_version() or 0
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+        logger.info(
+            "Applying schema migration %s: %s",
+            migration.version,
+            migration.description,
+        )
+        migration.upgrade()
+        _record_schema_version(migration.version)
+        db.session.commit()
+        applied.append(migration.version)
+    return applied
+
+
+def check_schema_version() -> int:
+    """Fail fast when the database has not been migrated for this code."""
+    version = get_schema_version()
+    if version is None or version < LATEST_SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema version {version or 0} is older than "
+            f"{LATEST_SCHEMA_VERSION}; run `python -m schema_migrations upgrade`."
+        )
+    if version > LATEST_SCHEMA_VERSION:
+        logger.warning(
+            "Database schema version %s is newer than this code (%s)",
+            version,
+            LATEST_SCHEMA_VERSION,
+        )
+    return version
+
+
+def _create_migration_app(database_uri: str | None = None):
+    from flask import Flask
+
+    from config import Config
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_uri or Config.DATABASE_URL
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="new-agents schema migrations")
+    parser.add_argument("command", choices=("upgrade", "current"))
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    app = _create_migration_app(args.database_url)
+    with app.app_context():
+        if args.command == "upgrade":
+            applied = upgrade_schema()
+            logger.info(
+                "Schema at version %s (applied: %s)",
+                LATEST_SCHEMA_VERSION,
+                applied or "none",
+            )
+        else:
+            print(get_schema_version() or 0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
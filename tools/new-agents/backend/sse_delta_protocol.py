@@ -0,0 +1,301 @@
+"""Compact append-only wire format for agent_delta SSE events.
+
+Clients opt in per request with ``deltaProtocol: "compact"``. Instead of the
+cumulative chat and artifact markdown, each ``agent_delta_compact`` event then
+carries only the change against the previous delta:
+
+* ``chat_append`` extends the previous chat, ``chat`` replaces it.
+* ``artifact_delta`` moves the artifact from ``baseRevision`` to ``revision``
+  through an appended suffix, a list of replaced sections (sections are split
+  at markdown headings outside code fences, ``sectionCount`` truncates or
+  extends the list) or a full ``markdown`` replacement.
+
+Every artifact change, full or compact, advances the revision by one, and
+a full ``agent_delta`` that changes the artifact carries the resulting
+``artifactRevision``. Clients adopt it, so a stream resumed on a new connection,
+whose revisions restart, stays consistent with the client's baseline. An
+explicit ``artifact_update`` of type ``none`` is kept as is in compact deltas;
+it clears the artifact baseline, so the next artifact is sent in full.
+``run_started`` and ``agent_retry`` reset both sides to an empty chat and
+revision 0. A delta whose every channel lacks a baseline, such as the first
+delta of a turn or a replayed terminal turn, is sent as a regular full
+``agent_delta``. ``agent_turn`` and ``error`` events are never compacted.
+"""
+
+from collections.abc import Iterable, Iterator
+import re
+
+from agent_contracts import ArtifactUpdate
+from sse_schemas import (
+    AgentRetryEvent,
+    AgentTurnCompactDeltaEvent,
+    AgentTurnCompactDeltaOutput,
+    AgentTurnDeltaEvent,
+    AgentTurnDeltaOutput,
+    ArtifactDelta,
+    ArtifactSectionReplacement,
+    RunStartedEvent,
+    SseEvent,
+)
+
+DELTA_PROTOCOL_FULL = "full"
+DELTA_PROTOCOL_COMPACT = "compact"
+DELTA_PROTOCOLS = (DELTA_PROTOCOL_FULL, DELTA_PROTOCOL_COMPACT)
+
+_HEADING_PATTERN = re.compile(r"#{1,6}[ \t]")
+_FENCE_PATTERN = re.compile(r"(`{3,}|~{3,})")
+
+
+def split_artifact_sections(markdown: str) -> list[str]:
+    """Split markdown before each heading line that is not inside a code fence.
+
+    The sections concatenate back to the original markdown exactly.
+    """
+    sections: list[str] = []
+    start = 0
+    position = 0
+    fence: str | None = None
+    for line in markdown.splitlines(keepends=True):
+        stripped = line.lstrip(" ")
+        fence_match = _FENCE_PATTERN.match(stripped)
+        if fence_match:
+            marker = fence_match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence):
+                fence = None
+        elif fence is None and position > start and _HEADING_PATTERN.match(line):
+            sections.append(markdown[start:position])
+            start = position
+        position += len(line)
+    if position > start or not sections:
+        sections.append(markdown[start:])
+    return sections
+
+
+class AgentDeltaCompactor:
+    """Turn cumulative agent deltas into compact deltas for one stream."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._chat: str | None = None
+        self._markdown: str | None = None
+        self._sections: list[str] | None = None
+        self._revision = 0
+
+    def rewrite(self, event: SseEvent) -> SseEvent:
+        """Rewrite one stream event, resetting baselines at stream boundaries."""
+        if isinstance(event, AgentTurnDeltaEvent):
+            revision = self._revision
+            output = self.compact(event.output)
+            if isinstance(output, AgentTurnCompactDeltaOutput):
+                return AgentTurnCompactDeltaEvent(output=output)
+            if self._revision != revision:
+                return event.model_copy(update={"artifact_revision": self._revision})
+            return event
+        if isinstance(event, (RunStartedEvent, AgentRetryEvent)):
+            self.reset()
+        return event
+
+    def compact(
+        self,
+        output: AgentTurnDeltaOutput,
+    ) -> AgentTurnDeltaOutput | AgentTurnCompactDeltaOutput:
+        """Return the full output unchanged when nothing in it can be diffed."""
+        markdown = (
+            output.artifact_update.markdown
+            if output.artifact_update is not None
+            and output.artifact_update.type == "replace"
+            else None
+        )
+        clears_artifact = (
+            output.artifact_update is not None
+            and output.artifact_update.type == "none"
+        )
+        has_chat_baseline = output.chat is not None and self._chat is not None
+        has_artifact_baseline = markdown is not None and self._markdown is not None
+
+        if not has_chat_baseline and not has_artifact_baseline:
+            if output.chat is not None:
+                self._chat = output.chat
+            if markdown is not None:
+                self._set_markdown(markdown)
+            if clears_artifact:
+                self._clear_markdown()
+            return output
+
+        chat = None
+        chat_append = None
+        if output.chat is not None:
+            if self._chat is not None and output.chat.startswith(self._chat):
+                chat_append = output.chat[len(self._chat):]
+            else:
+                chat = output.chat
+            self._chat = output.chat
+
+        artifact_delta = None
+        if markdown is not None:
+            artifact_delta = self._artifact_delta(markdown)
+        if clears_artifact:
+            self._clear_markdown()
+
+        return AgentTurnCompactDeltaOutput(
+            chat=chat,
+            chat_append=chat_append,
+            artifact_update=output.artifact_update if clears_artifact else None,
+            artifact_delta=artifact_delta,
+            artifact_patch=output.artifact_patch,
+            stage_action=output.stage_action,
+            warnings=output.warnings or None,
+        )
+
+    def _set_markdown(self, markdown: str) -> None:
+        self._markdown = markdown
+        # Sections are only needed for non-append changes, split lazily.
+        self._sections = None
+        self._revision += 1
+
+    def _clear_markdown(self) -> None:
+        self._markdown = None
+        self._sections = None
+        self._revision += 1
+
+    def _current_sections(self) -> list[str]:
+        if self._sections is None:
+            self._sections = split_artifact_sections(self._markdown or "")
+        return self._sections
+
+    def _artifact_delta(self, markdown: str) -> ArtifactDelta:
+        base_revision = self._revision
+        previous = self._markdown
+        previous_sections = None
+        if previous is not None and not markdown.startswith(previous):
+            previous_sections = self._current_sections()
+        self._set_markdown(markdown)
+
+        if previous is None:
+            return ArtifactDelta(
+                base_revision=base_revision,
+                revision=self._revision,
+                markdown=markdown,
+            )
+        if markdown.startswith(previous):
+            return ArtifactDelta(
+                base_revision=base_revision,
+                revision=self._revision,
+                append=markdown[len(previous):],
+            )
+
+        sections = self._current_sections()
+        changed = [
+            ArtifactSectionReplacement(index=index, markdown=section)
+            for index, section in enumerate(sections)
+            if index >= len(previous_sections) or previous_sections[index] != section
+        ]
+        if sum(len(item.markdown) for item in changed) >= len(markdown):
+            return ArtifactDelta(
+                base_revision=base_revision,
+                revision=self._revision,
+                markdown=markdown,
+            )
+        return ArtifactDelta(
+            base_revision=base_revision,
+            revision=self._revision,
+            sections=changed,
+            section_count=len(sections),
+        )
+
+
+class AgentDeltaReassembler:
+    """Rebuild full agent delta outputs from a full or compact event stream."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.chat: str | None = None
+        self.markdown: str | None = None
+        self.revision = 0
+
+    def apply(
+        self,
+        event: AgentTurnDeltaEvent | AgentTurnCompactDeltaEvent,
+    ) -> AgentTurnDeltaOutput:
+        if isinstance(event, AgentTurnDeltaEvent):
+            output = event.output
+            if output.chat is not None:
+                self.chat = output.chat
+            if output.artifact_update is not None:
+                self.markdown = (
+                    output.artifact_update.markdown
+                    if output.artifact_update.type == "replace"
+                    else None
+                )
+                if event.artifact_revision is not None:
+                    self.revision = event.artifact_revision
+                else:
+                    self.revision += 1
+            return output
+
+        output = event.output
+        chat = None
+        if output.chat is not None:
+            chat = output.chat
+        elif output.chat_append is not None:
+            if self.chat is None:
+                raise ValueError("chat_append requires a chat baseline")
+            chat = self.chat + output.chat_append
+        if chat is not None:
+            self.chat = chat
+
+        artifact_update = None
+        if output.artifact_delta is not None:
+            self.markdown = self._apply_artifact_delta(output.artifact_delta)
+            self.revision = output.artifact_delta.revision
+            artifact_update = ArtifactUpdate(type="replace", markdown=self.markdown)
+        elif output.artifact_update is not None:
+            self.markdown = None
+            self.revision += 1
+            artifact_update = output.artifact_update
+
+        return AgentTurnDeltaOutput(
+            chat=chat,
+            artifact_update=artifact_update,
+            artifact_patch=output.artifact_patch,
+            stage_action=output.stage_action,
+            warnings=output.warnings or [],
+        )
+
+    def _apply_artifact_delta(self, delta: ArtifactDelta) -> str:
+        if delta.base_revision != self.revision:
+            raise ValueError(
+                f"artifact delta base revision {delta.base_revision} "
+                f"does not match revision {self.revision}"
+            )
+        if delta.markdown is not None:
+            return delta.markdown
+        if self.markdown is None:
+            raise ValueError("artifact delta requires an artifact baseline")
+        if delta.append is not None:
+            return self.markdown + delta.append
+
+        sections = split_artifact_sections(self.markdown)[: delta.section_count]
+        sections.extend([""] * (delta.section_count - len(sections)))
+        for replacement in delta.sections:
+            sections[replacement.index] = replacement.markdown
+        return "".join(sections)
+
+
+def compact_agent_delta_events(events: Iterable[SseEvent]) -> Iterator[SseEvent]:
+    """Rewrite agent_delta events of one stream into the compact protocol."""
+    compactor = AgentDeltaCompactor()
+    event_iterator = iter(events)
+    try:
+        for event in event_iterator:
+            yield compactor.rewrite(event)
+    finally:
+        close = getattr(event_iterator, "close", None)
+        if close is not None:
+            close()
@@ -3,9 +3,12 @@ import json
 from sse_schemas import SseEvent
 
 
-def encode_sse_event(event: SseEvent) -> str:
+def encode_sse_event(event: SseEvent, *, event_id: int | None = None) -> str:
     payload = event.model_dump(mode="json", exclude_none=True, by_alias=True)
-    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    data = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    if event_id is None:
+        return data
+    return f"id: {event_id}\n{data}"
 
 
 def encode_sse_done() -> str:
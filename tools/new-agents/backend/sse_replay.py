@@ -0,0 +1,450 @@
+"""Resumable agent turn streams.
+
+A turn's SSE events are produced by a background thread into a per-request
+replay buffer instead of being pulled by the HTTP connection. Connections are
+only consumers: when a browser drops mid-turn the model stream keeps running
+to completion, and a reconnect with the same ``requestId`` (or the resume
+endpoint with ``Last-Event-ID``) replays what it missed and follows the live
+tail, so the provider is never asked for the same turn twice. A reconnect by
+``requestId`` must repeat the request fields (its replay identity); the resume
+endpoint only attaches when it presents the random stream token returned with
+the original response.
+
+Buffers are bounded rings. Evicted ``agent_delta`` events are superseded by
+later cumulative deltas; every other evicted event is pinned so a replay still
+starts with ``run_started`` and keeps retry boundaries. Finished buffers are
+retained for a while for late reconnects.
+
+With ``SSE_REPLAY_DIR`` set, events are also appended to a JSONL file per
+request so another worker process on the same host can replay and tail them.
+"""
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import nullcontext
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import secrets
+import threading
+import time
+from typing import Annotated
+
+from pydantic import Field, TypeAdapter
+
+from sse_schemas import AgentTurnDeltaEvent, SseEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 2048
+DEFAULT_RETENTION_SECONDS = 300.0
+DEFAULT_MAX_STREAMS = 256
+FILE_STORE_POLL_SECONDS = 0.05
+FILE_STORE_IDLE_TIMEOUT_SECONDS = 120.0
+
+ReplayEntry = tuple[int, SseEvent]
+
+_SSE_EVENT_ADAPTER = TypeAdapter(Annotated[SseEvent, Field(discriminator="type")])
+
+
+def agent_request_replay_identity(agent_request) -> str:
+    """Fingerprint the request fields a reconnect must repeat to attach."""
+    payload = json.dumps(
+        [
+            agent_request.workflow_id,
+            agent_request.stage_id,
+            agent_request.run_id,
+            agent_request.prompt,
+            agent_request.system_prompt,
+        ],
+        ensure_ascii=False,
+    )
+    return "sha256-" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _matches(stored: str | None, presented: str | None) -> bool:
+    if presented is None:
+        return True
+    return stored is not None and secrets.compare_digest(
+        stored.encode("utf-8"),
+        presented.encode("utf-8"),
+    )
+
+
+class FileReplayStore:
+    """Append-only JSONL event log per request shared by local processes."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        *,
+        poll_interval: float = FILE_STORE_POLL_SECONDS,
+        idle_timeout: float = FILE_STORE_IDLE_TIMEOUT_SECONDS,
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+
+    def path_for(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{digest}.jsonl"
+
+    def open_writer(self, key: str, identity: str | None, token: str):
+        handle = self.path_for(key).open("w", encoding="utf-8")
+        handle.write(json.dumps({"identity": identity, "token": token}) + "\n")
+        handle.flush()
+        return handle
+
+    def read_header(self, key: str) -> dict | None:
+        try:
+            with self.path_for(key).open("r", encoding="utf-8") as handle:
+                header = handle.readline()
+        except FileNotFoundError:
+            return None
+        return json.loads(header) if header.endswith("\n") else None
+
+    @staticmethod
+    def write_event(handle, event_id: int, event: SseEvent) -> None:
+        payload = event.model_dump(mode="json", exclude_none=True, by_alias=True)
+        handle.write(
+            json.dumps({"id": event_id, "event": payload}, ensure_ascii=False) + "\n"
+        )
+        handle.flush()
+
+    @staticmethod
+    def write_done(handle) -> None:
+        handle.write(json.dumps({"done": True}) + "\n")
+        handle.close()
+
+    def entries_after(
+        self,
+        key: str,
+        last_event_id: int | None,
+        *,
+        identity: str | None = None,
+        token: str | None = None,
+    ) -> Iterator[ReplayEntry] | None:
+        path = self.path_for(key)
+        try:
+            handle = path.open("r", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        header = handle.readline()
+        if not header.endswith("\n"):
+            handle.close()
+            return None
+        stored = json.loads(header)
+        if not _matches(stored.get("identity"), identity) or not _matches(
+            stored.get("token"), token
+        ):
+            handle.close()
+            return None
+        return self._tail(handle, last_event_id or 0)
+
+    def _tail(self, handle, cursor: int) -> Iterator[ReplayEntry]:
+        pending = ""
+        idle_since = time.monotonic()
+        with handle:
+            while True:
+                chunk = handle.readline()
+                if not chunk:
+                    if time.monotonic() - idle_since > self.idle_timeout:
+                        logger.warning("SSE replay file stopped growing before completion")
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                idle_since = time.monotonic()
+                pending += chunk
+                if not pending.endswith("\n"):
+                    continue
+                record = json.loads(pending)
+                pending = ""
+                if record.get("done"):
+                    return
+                if record["id"] > cursor:
+                    cursor = record["id"]
+                    yield cursor, _SSE_EVENT_ADAPTER.validate_python(record["event"])
+
+    def sweep(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for path in self.directory.glob("*.jsonl"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+class SseReplayBuffer:
+    """Bounded, thread-safe event log for one turn request."""
+
+    def __init__(
+        self,
+        key: str,
+        *,
+        identity: str | None = None,
+        max_events: int = DEFAULT_BUFFER_SIZE,
+        store: FileReplayStore | None = None,
+    ) -> None:
+        if max_events < 1:
+            raise ValueError("max_events must be positive")
+        self.key = key
+        self.identity = identity
+        self.token = secrets.token_urlsafe(32)
+        self.max_events = max_events
+        self.closed_at: float | None = None
+        self._entries: deque[ReplayEntry] = deque()
+        self._pinned: list[ReplayEntry] = []
+        self._last_event_id = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._store_handle = (
+            store.open_writer(key, identity, self.token)
+            if store is not None
+            else None
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    def append(self, event: SseEvent) -> int:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("replay buffer is closed")
+            self._last_event_id += 1
+            event_id = self._last_event_id
+            if len(self._entries) >= self.max_events:
+                evicted = self._entries.popleft()
+                if not isinstance(evicted[1], AgentTurnDeltaEvent):
+                    self._pinned.append(evicted)
+            self._entries.append((event_id, event))
+            if self._store_handle is not None:
+                FileReplayStore.write_event(self._store_handle, event_id, event)
+            self._condition.notify_all()
+        return event_id
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self.closed_at = time.monotonic()
+            if self._store_handle is not None:
+                FileReplayStore.write_done(self._store_handle)
+                self._store_handle = None
+            self._condition.notify_all()
+
+    def entries_after(self, last_event_id: int | None) -> Iterator[ReplayEntry]:
+        """Replay retained events after the given ID, then follow the live tail."""
+        cursor = last_event_id or 0
+        while True:
+            with self._condition:
+                while not self._closed and self._last_event_id <= cursor:
+                    self._condition.wait()
+                pending = self._snapshot_after(cursor)
+                finished = self._closed and (
+                    not pending or pending[-1][0] >= self._last_event_id
+                )
+            for entry in pending:
+                cursor = entry[0]
+                yield entry
+            if finished:
+                return
+
+    def _snapshot_after(self, cursor: int) -> list[ReplayEntry]:
+        pinned = [entry for entry in self._pinned if entry[0] > cursor]
+        if not self._entries:
+            return pinned
+        offset = max(0, cursor - self._entries[0][0] + 1)
+        return pinned + [
+            self._entries[index] for index in range(offset, len(self._entries))
+        ]
+
+
+class SseStreamRegistry:
+    """Process-wide registry of in-flight and recently finished turn streams."""
+
+    def __init__(
+        self,
+        *,
+        max_events: int = DEFAULT_BUFFER_SIZE,
+        retention_seconds: float = DEFAULT_RETENTION_SECONDS,
+        max_streams: int = DEFAULT_MAX_STREAMS,
+        store: FileReplayStore | None = None,
+        clock=time.monotonic,
+    ) -> None:
+        self.max_events = max_events
+        self.retention_seconds = retention_seconds
+        self.max_streams = max_streams
+        self.store = store
+        self._clock = clock
+        self._buffers: dict[str, SseReplayBuffer] = {}
+        self._lock = threading.Lock()
+        self._last_store_sweep = 0.0
+
+    def start(
+        self,
+        key: str,
+        events: Iterable[SseEvent],
+        *,
+        identity: str | None = None,
+        app=None,
+    ) -> tuple[SseReplayBuffer, bool]:
+        """Produce ``events`` in a background thread, or join the live stream.
+
+        Returns the buffer and whether this call created it. Event IDs are
+        scoped to one buffer, so a Last-Event-ID only applies to a joined one.
+        """
+        with self._lock:
+            self._sweep_locked()
+            existing = self._buffers.get(key)
+            if existing is not None and not existing.closed:
+                return existing, False
+            buffer = SseReplayBuffer(
+                key,
+                identity=identity,
+                max_events=self.max_events,
+                store=self.store,
+            )
+            self._buffers[key] = buffer
+
+        thread = threading.Thread(
+            target=self._produce,
+            args=(buffer, events, app),
+            name=f"sse-replay-{key[:16]}",
+            daemon=True,
+        )
+        thread.start()
+        return buffer, True
+
+    @staticmethod
+    def _produce(buffer: SseReplayBuffer, events: Iterable[SseEvent], app) -> None:
+        context = app.app_context() if app is not None else nullcontext()
+        event_iterator = iter(events)
+        try:
+            with context:
+                for event in event_iterator:
+                    buffer.append(event)
+        finally:
+            buffer.close()
+            close = getattr(event_iterator, "close", None)
+            if close is not None:
+                close()
+
+    def get(self, key: str) -> SseReplayBuffer | None:
+        with self._lock:
+            self._sweep_locked()
+            return self._buffers.get(key)
+
+    def open(
+        self,
+        key: str,
+        *,
+        last_event_id: int | None = None,
+        identity: str | None = None,
+        token: str | None = None,
+    ) -> Iterator[ReplayEntry] | None:
+        """Attach to a stream held by this process or by the local store.
+
+        ``identity`` and ``token``, when given, must match the stream's.
+        """
+        buffer = self.get(key)
+        if buffer is not None:
+            if not _matches(buffer.identity, identity) or not _matches(
+                buffer.token, token
+            ):
+                return None
+            return buffer.entries_after(last_event_id)
+        if self.store is not None:
+            return self.store.entries_after(
+                key,
+                last_event_id,
+                identity=identity,
+                token=token,
+            )
+        return None
+
+    def stream_token(self, key: str) -> str | None:
+        """Return the resume token of a stream held here or in the store."""
+        buffer = self.get(key)
+        if buffer is not None:
+            return buffer.token
+        if self.store is not None:
+            header = self.store.read_header(key)
+            if header is not None:
+                return header.get("token")
+        return None
+
+    def _sweep_locked(self) -> None:
+        now = self._clock()
+        expired = [
+            key
+            for key, buffer in self._buffers.items()
+            if buffer.closed_at is not None
+            and now - buffer.closed_at > self.retention_seconds
+        ]
+        for key in expired:
+            del self._buffers[key]
+
+        if len(self._buffers) > self.max_streams:
+            finished = sorted(
+                (
+                    (buffer.closed_at, key)
+                    for key, buffer in self._buffers.items()
+                    if buffer.closed_at is not None
+                ),
+            )
+            for _, key in finished[: len(self._buffers) - self.max_streams]:
+                del self._buffers[key]
+
+        if self.store is not None and now - self._last_store_sweep > 60:
+            self._last_store_sweep = now
+            self.store.sweep(self.retention_seconds)
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            active = sum(1 for buffer in self._buffers.values() if not buffer.closed)
+            return {
+                "active": active,
+                "retained": len(self._buffers) - active,
+            }
+
+
+_registry: SseStreamRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_sse_stream_registry() -> SseStreamRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            replay_dir = (os.environ.get("SSE_REPLAY_DIR") or "").strip()
+            _registry = SseStreamRegistry(
+                max_events=int(
+                    os.environ.get("SSE_REPLAY_BUFFER_SIZE", DEFAULT_BUFFER_SIZE)
+                ),
+                retention_seconds=float(
+                    os.environ.get(
+                        "SSE_REPLAY_RETENTION_SECONDS", DEFAULT_RETENTION_SECONDS
+                    )
+                ),
+                store=FileReplayStore(replay_dir) if replay_dir else None,
+            )
+        return _registry
+
+
+def reset_sse_stream_registry() -> None:
+    global _registry
+    with _registry_lock:
+        _registry = None
@@ -1,20 +1,54 @@
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 
 from flask import Response, has_request_context, stream_with_context
 
+from sse_delta_protocol import DELTA_PROTOCOL_COMPACT, AgentDeltaCompactor
 from sse_encoder import encode_sse_done, encode_sse_event
 from sse_schemas import SseEvent
 
+STREAM_TOKEN_HEADER = "X-Agent-Stream-Token"
+
+
+def build_sse_response(
+    events: Iterable[SseEvent],
+    *,
+    delta_protocol: str | None = None,
+) -> Response:
+    """Stream events with sequential SSE event IDs starting at 1."""
+    return build_sse_replay_response(
+        _number_events(events),
+        delta_protocol=delta_protocol,
+    )
+
+
+def build_sse_replay_response(
+    entries: Iterable[tuple[int, SseEvent]],
+    *,
+    delta_protocol: str | None = None,
+    stream_token: str | None = None,
+) -> Response:
+    """Stream ``(event_id, event)`` pairs, e.g. from an SseReplayBuffer."""
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    }
+    if stream_token is not None:
+        headers[STREAM_TOKEN_HEADER] = stream_token
+    compactor = None
+    if delta_protocol == DELTA_PROTOCOL_COMPACT:
+        compactor = AgentDeltaCompactor()
+        headers["X-Agent-Delta-Protocol"] = DELTA_PROTOCOL_COMPACT
 
-def build_sse_response(events: Iterable[SseEvent]) -> Response:
     def generate():
-        event_iterator = iter(events)
+        entry_iterator = iter(entries)
         try:
-            for event in event_iterator:
-                yield encode_sse_event(event)
+            for event_id, event in entry_iterator:
+                if compactor is not None:
+                    event = compactor.rewrite(event)
+                yield encode_sse_event(event, event_id=event_id)
             yield encode_sse_done()
         finally:
-            close = getattr(event_iterator, "close", None)
+            close = getattr(entry_iterator, "close", None)
             if close is not None:
                 close()
 
@@ -25,8 +59,16 @@ def build_sse_response(events: Iterable[SseEvent]) -> Response:
     return Response(
         stream,
         mimetype="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "X-Accel-Buffering": "no",
-        },
+        headers=headers,
     )
+
+
+def _number_events(events: Iterable[SseEvent]) -> Iterator[tuple[int, SseEvent]]:
+    event_iterator = iter(events)
+    try:
+        for event_id, event in enumerate(event_iterator, start=1):
+            yield event_id, event
+    finally:
+        close = getattr(event_iterator, "close", None)
+        if close is not None:
+            close()
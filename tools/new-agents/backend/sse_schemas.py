@@ -39,10 +39,85 @@ class AgentTurnDeltaOutput(BaseModel):
 
 
 class AgentTurnDeltaEvent(BaseModel):
-    model_config = ConfigDict(extra="forbid")
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
 
     type: Literal["agent_delta"] = "agent_delta"
     output: AgentTurnDeltaOutput
+    # Set on compact streams when the delta changes the artifact, so a client
+    # resuming mid-turn adopts the new stream's revision numbering.
+    artifact_revision: int | None = Field(default=None, ge=1, alias="artifactRevision")
+
+
+class ArtifactSectionReplacement(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    index: int = Field(ge=0)
+    markdown: str
+
+
+class ArtifactDelta(BaseModel):
+    """Artifact change relative to the client's base revision."""
+
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    base_revision: int = Field(ge=0, alias="baseRevision")
+    revision: int = Field(ge=1)
+    append: str | None = None
+    sections: list[ArtifactSectionReplacement] | None = None
+    section_count: int | None = Field(default=None, ge=1, alias="sectionCount")
+    markdown: str | None = None
+
+    @model_validator(mode="after")
+    def validate_single_change_kind(self) -> "ArtifactDelta":
+        kinds = [
+            value
+            for value in (self.append, self.sections, self.markdown)
+            if value is not None
+        ]
+        if len(kinds) != 1:
+            raise ValueError(
+                "artifact delta requires exactly one of append, sections or markdown"
+            )
+        if (self.sections is None) != (self.section_count is None):
+            raise ValueError("artifact delta sections require sectionCount")
+        if self.revision <= self.base_revision:
+            raise ValueError("artifact delta revision must advance")
+        return self
+
+
+class AgentTurnCompactDeltaOutput(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    chat: str | None = None
+    chat_append: str | None = None
+    artifact_update: ArtifactUpdate | None = None
+    artifact_delta: ArtifactDelta | None = None
+    artifact_patch: ArtifactPatch | None = None
+    stage_action: StageAction | None = None
+    warnings: list[str] | None = None
+
+    @model_validator(mode="after")
+    def validate_compact_fields(self) -> "AgentTurnCompactDeltaOutput":
+        if self.chat is not None and self.chat_append is not None:
+            raise ValueError("compact delta cannot carry both chat and chat_append")
+        if self.artifact_patch is not None and self.artifact_delta is None:
+            raise ValueError("artifact_patch requires artifact_delta")
+        if self.artifact_update is not None and (
+            self.artifact_update.type != "none" or self.artifact_delta is not None
+        ):
+            raise ValueError(
+                "compact delta artifact_update only carries an explicit none clear"
+            )
+        return self
+
+
+class AgentTurnCompactDeltaEvent(BaseModel):
+    """Opt-in append-only form of agent_delta, see sse_delta_protocol."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    type: Literal["agent_delta_compact"] = "agent_delta_compact"
+    output: AgentTurnCompactDeltaOutput
 
 
 class AgentRetrySignal(BaseModel):
@@ -108,6 +183,7 @@ SseEvent = Union[
     RunStartedEvent,
     AgentRetryEvent,
     AgentTurnDeltaEvent,
+    AgentTurnCompactDeltaEvent,
     AgentTurnEvent,
     ErrorEvent,
 ]
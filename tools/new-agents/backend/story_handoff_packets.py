@@ -1,8 +1,10 @@
+from __future__ import annotations
+
 import hashlib
 import time
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from artifact_data_renderers import StoryBreakdownArtifactData
+from artifact_data_cache import decoded_artifact_data, validated_artifact_data
 from models import (
     AgentArtifact,
     AgentArtifactVersion,
@@ -11,6 +13,9 @@ from models import (
     db,
 )
 
+if TYPE_CHECKING:
+    from artifact_data_renderers import StoryBreakdownArtifactData
+
 
 STORY_BREAKDOWN_WORKFLOW_ID = "STORY_BREAKDOWN"
 STORY_BREAKDOWN_PACKET_STAGE_ID = "SPRINT_PLAN"
@@ -201,9 +206,11 @@ def _get_current_handoff_source(run_id: str, stage_id: str) -> dict[str, Any]:
 def _validated_handoff_artifact_data(
     version: AgentArtifactVersion,
 ) -> StoryBreakdownArtifactData:
-    if version.artifact_data is None:
+    if decoded_artifact_data(version) is None:
         raise ValueError("缺少结构化 artifact_data，无法生成单故事需求包")
-    return StoryBreakdownArtifactData.model_validate(version.artifact_data)
+    from artifact_data_renderers import StoryBreakdownArtifactData
+
+    return validated_artifact_data(version, StoryBreakdownArtifactData)
 
 
 def _acceptance_criteria_by_story(
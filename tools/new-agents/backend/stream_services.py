@@ -4,10 +4,8 @@ import logging
 from math import ceil
 import re
 from time import perf_counter
-from typing import Protocol
-from urllib.parse import urlparse
+from typing import Any, Protocol
 
-from openai import APIError, AuthenticationError, RateLimitError
 from pydantic import ValidationError
 
 from agent_contracts import (
@@ -21,13 +19,16 @@ from agent_runtime import (
     AgentRuntimeDependencyError,
     AgentRuntimeModelError,
     AgentRuntimeSchemaError,
-    PYDANTIC_AI_SCHEMA_ERRORS,
     RawJsonStreamTerminationError,
     build_agent_retries,
     build_pydantic_agent_runtime,
     project_safe_value_error_field_path,
     project_safe_value_error_validator,
+    pydantic_ai_schema_errors,
 )
+from llm_client import provider_error_types
+from provider_admission import ProviderBusyError, ProviderLimits
+from provider_routing import ProviderTarget, get_provider_router, infer_provider_name
 from request_schemas import (
     AgentRunStreamRequest,
     RequestValidationError,
@@ -53,6 +54,7 @@ from sse_schemas import (
     SseEvent,
 )
 from stream_ordering import NaturalChatFirstDeltaSequencer
+from token_counting import get_token_counter
 
 logger = logging.getLogger(__name__)
 
@@ -93,6 +95,7 @@ REQUEST_IDENTITY_CONFLICT_PUBLIC_REASON = (
 PERSISTENCE_CONFLICT_PUBLIC_REASON = (
     "另一项并发更新已占用当前产出物版本，请重新发起本轮生成。"
 )
+PROVIDER_BUSY_PUBLIC_REASON = "模型服务当前繁忙，本轮生成未开始，请稍后重试。"
 REPLAYABLE_ERROR_CODES = frozenset(
     {
         "AGENT_RUNTIME_UNAVAILABLE",
@@ -100,6 +103,7 @@ REPLAYABLE_ERROR_CODES = frozenset(
         "LLM_ERROR",
         "PERSISTENCE_CONFLICT",
         "PERSISTENCE_FAILED",
+        "PROVIDER_BUSY",
         "REQUEST_VALIDATION_FAILED",
         "SCHEMA_VALIDATION_FAILED",
         "VISUAL_VALIDATION_FAILED",
@@ -152,6 +156,7 @@ class StreamPersistence(Protocol):
         current_prompt: str,
         *,
         request_id: str,
+        target: ProviderTarget | None = None,
     ) -> tuple[str, list[str]]: ...
 
     def complete_agent_run_turn(
@@ -166,10 +171,13 @@ class StreamPersistence(Protocol):
         owner_token: str | None,
         terminal_event: dict | None,
         metric: dict,
+        llm_config_key: str | None = None,
     ) -> None: ...
 
     def record_turn_metric(self, **kwargs) -> None: ...
 
+    def release_connection(self) -> None: ...
+
 
 def build_runtime_system_prompt(agent_request: AgentRunStreamRequest) -> str:
     artifact_contract = build_artifact_contract_prompt(
@@ -186,9 +194,9 @@ _PYDANTIC_AI_RETRY_EXHAUSTION_PATTERN = re.compile(
 
 def _trusted_pydantic_ai_retry_match(error: Exception) -> re.Match[str] | None:
     candidate: Exception | None = None
-    if isinstance(error, PYDANTIC_AI_SCHEMA_ERRORS):
+    if isinstance(error, pydantic_ai_schema_errors()):
         candidate = error
-    elif isinstance(error.__cause__, PYDANTIC_AI_SCHEMA_ERRORS):
+    elif isinstance(error.__cause__, pydantic_ai_schema_errors()):
         candidate = error.__cause__
     if candidate is None:
         return None
@@ -416,6 +424,17 @@ def _build_error_diagnostic(
             publicReason=REQUEST_IDENTITY_CONFLICT_PUBLIC_REASON,
         )
 
+    if code == "PROVIDER_BUSY":
+        return ErrorDiagnostic(
+            phase="provider",
+            workflowId=workflow_id,
+            stageId=stage_id,
+            fieldPath="provider",
+            validator="provider_admission",
+            retryable=True,
+            publicReason=PROVIDER_BUSY_PUBLIC_REASON,
+        )
+
     if code == "PERSISTENCE_CONFLICT":
         return ErrorDiagnostic(
             phase="persistence",
@@ -552,24 +571,6 @@ def _estimated_tokens(input_chars: int, output_chars: int) -> int:
     return max(1, ceil(total_chars / 4))
 
 
-def infer_provider_name(base_url: str | None) -> str:
-    if not base_url:
-        return "openai"
-    hostname = urlparse(base_url).hostname
-    if not hostname:
-        return "unknown"
-    hostname = hostname.lower()
-    if hostname == "api.openai.com":
-        return "openai"
-    if hostname.endswith(".deepseek.com") or hostname == "api.deepseek.com":
-        return "deepseek"
-    if "dashscope" in hostname or hostname.endswith(".aliyuncs.com"):
-        return "dashscope"
-    if hostname.endswith(".siliconflow.cn"):
-        return "siliconflow"
-    return hostname
-
-
 def _record_turn_metric(
     persistence: StreamPersistence | None,
     *,
@@ -585,6 +586,14 @@ def _record_turn_metric(
     output_chars: int,
     contract_retry_count: int = 0,
     actual_token_count: int | None = None,
+    prompt_tokens: int = 0,
+    prompt_token_counter: str | None = None,
+    llm_config_key: str | None = None,
+    discarded_tokens: int = 0,
+    early_abort_count: int = 0,
+    early_abort_saved_ms: int = 0,
+    queue_wait_ms: int = 0,
+    first_token_ms: int = 0,
     diagnostic: ErrorDiagnostic | None = None,
 ) -> None:
     if persistence is None or run_id is None:
@@ -610,9 +619,27 @@ def _record_turn_metric(
         ),
         contract_retry_count=contract_retry_count,
         diagnostic=_error_diagnostic_payload(diagnostic),
+        prompt_tokens=prompt_tokens,
+        prompt_token_counter=prompt_token_counter,
+        llm_config_key=llm_config_key,
+        discarded_tokens=discarded_tokens,
+        early_abort_count=early_abort_count,
+        early_abort_saved_ms=early_abort_saved_ms,
+        queue_wait_ms=queue_wait_ms,
+        first_token_ms=first_token_ms,
     )
 
 
+def _runtime_counter(runtime: Any, name: str) -> int:
+    value = getattr(runtime, name, 0)
+    return value if isinstance(value, int) else 0
+
+
+def _routed_target(runtime: Any) -> ProviderTarget | None:
+    target = getattr(runtime, "last_provider_target", None)
+    return target if isinstance(target, ProviderTarget) else None
+
+
 def stream_agent_run_events(
     agent_request: AgentRunStreamRequest,
     *,
@@ -620,11 +647,24 @@ def stream_agent_run_events(
     base_url: str | None,
     model_name: str,
     persistence: StreamPersistence | None = None,
+    provider_limits: ProviderLimits | None = None,
+    provider_targets: tuple[ProviderTarget, ...] = (),
 ) -> Iterator[SseEvent]:
+    """Stream one agent turn.
+
+    With ``provider_targets`` the turn is routed across them and fails over
+    before the first token; ``api_key``, ``base_url`` and ``model_name`` then
+    describe the default target.
+    """
     started_at = perf_counter()
     run_id = None
     input_chars = len(agent_request.prompt)
     output_chars = 0
+    # Tokens of the system prompt and the context-built user prompt, counted
+    # with the model's tokenizer once the context is known.
+    prompt_tokens = 0
+    prompt_token_counter: str | None = None
+    runtime = None
     observed_contract_retry_count = 0
     provider = infer_provider_name(base_url)
     sequencer = NaturalChatFirstDeltaSequencer()
@@ -645,14 +685,17 @@ def stream_agent_run_events(
         diagnostic: ErrorDiagnostic | None = None,
     ) -> None:
         nonlocal metric_persistence_failed
+        routed_target = _routed_target(runtime)
         try:
             _record_turn_metric(
                 persistence,
                 run_id=run_id,
                 workflow_id=agent_request.workflow_id,
                 stage_id=agent_request.stage_id,
-                model_name=model_name,
-                provider=provider,
+                model_name=(
+                    routed_target.model_name if routed_target else model_name
+                ),
+                provider=routed_target.provider if routed_target else provider,
                 status=status,
                 error_code=error_code,
                 duration_ms=duration_ms(),
@@ -664,6 +707,25 @@ def stream_agent_run_events(
                     else contract_retry_count
                 ),
                 actual_token_count=actual_token_count,
+                prompt_tokens=prompt_tokens,
+                prompt_token_counter=prompt_token_counter,
+                # A turn that failed before any first token is charged to the
+                # target it was routed to first.
+                llm_config_key=(
+                    routed_target.config_key
+                    if routed_target
+                    else provider_targets[0].config_key
+                    if provider_targets
+                    else None
+                ),
+                discarded_tokens=_runtime_counter(runtime, "last_discarded_tokens"),
+                early_abort_count=_runtime_counter(runtime, "last_early_aborts"),
+                early_abort_saved_ms=_runtime_counter(
+                    runtime,
+                    "last_early_abort_saved_ms",
+                ),
+                queue_wait_ms=_runtime_counter(runtime, "last_queue_wait_ms"),
+                first_token_ms=_runtime_counter(runtime, "last_first_token_ms"),
                 diagnostic=diagnostic,
             )
         except TurnPersistenceError:
@@ -781,16 +843,43 @@ def stream_agent_run_events(
                     "Turn request ownership token was not established."
                 )
             request_owned = True
+            route_provider_targets = getattr(
+                persistence,
+                "route_provider_targets",
+                None,
+            )
+            if len(provider_targets) > 1 and route_provider_targets is not None:
+                provider_targets = route_provider_targets(run_id, provider_targets)
+            # The context budget and tokenizer follow the target the turn is
+            # routed to first, not the default config.
             runtime_prompt, context_warnings = persistence.build_runtime_context(
                 run_id,
                 agent_request.prompt,
                 request_id=agent_request.request_id,
+                target=provider_targets[0] if provider_targets else None,
             )
+            # No connection is held while the model streams; completion
+            # checks out a fresh one.
+            release_connection = getattr(persistence, "release_connection", None)
+            if release_connection is not None:
+                release_connection()
+        if len(provider_targets) > 1 and persistence is None:
+            provider_targets = get_provider_router().rank(provider_targets)
+        system_prompt = build_runtime_system_prompt(agent_request)
+        token_counter = get_token_counter(
+            provider_targets[0].model_name if provider_targets else model_name
+        )
+        prompt_token_counter = token_counter.name
+        prompt_tokens = token_counter.count(system_prompt) + token_counter.count(
+            runtime_prompt
+        )
         runtime = build_pydantic_agent_runtime(
             api_key=api_key,
             base_url=base_url,
             model_name=model_name,
-            system_prompt=build_runtime_system_prompt(agent_request),
+            system_prompt=system_prompt,
+            provider_limits=provider_limits,
+            provider_targets=provider_targets,
         )
         yield RunStartedEvent(
             run_id=run_id,
@@ -875,6 +964,7 @@ def stream_agent_run_events(
                 else:
                     output_chars = len(final_output.chat)
                 runtime_token_usage = getattr(runtime, "last_token_usage", None)
+                routed_target = _routed_target(runtime)
                 persistence.complete_agent_run_turn(
                     run_id,
                     stage_id=agent_request.stage_id,
@@ -894,8 +984,12 @@ def stream_agent_run_events(
                     metric={
                         "workflow_id": agent_request.workflow_id,
                         "stage_id": agent_request.stage_id,
-                        "model_name": model_name,
-                        "provider": provider,
+                        "model_name": (
+                            routed_target.model_name if routed_target else model_name
+                        ),
+                        "provider": (
+                            routed_target.provider if routed_target else provider
+                        ),
                         "status": "success",
                         "error_code": None,
                         "duration_ms": duration_ms(),
@@ -907,8 +1001,33 @@ def stream_agent_run_events(
                             and runtime_token_usage >= 0
                             else _estimated_tokens(input_chars, output_chars)
                         ),
+                        "prompt_tokens": prompt_tokens,
+                        "prompt_token_counter": prompt_token_counter,
+                        "discarded_tokens": _runtime_counter(
+                            runtime,
+                            "last_discarded_tokens",
+                        ),
+                        "early_abort_count": _runtime_counter(
+                            runtime,
+                            "last_early_aborts",
+                        ),
+                        "early_abort_saved_ms": _runtime_counter(
+                            runtime,
+                            "last_early_abort_saved_ms",
+                        ),
+                        "queue_wait_ms": _runtime_counter(
+                            runtime,
+                            "last_queue_wait_ms",
+                        ),
+                        "first_token_ms": _runtime_counter(
+                            runtime,
+                            "last_first_token_ms",
+                        ),
                         "contract_retry_count": observed_contract_retry_count,
                     },
+                    llm_config_key=(
+                        routed_target.config_key if routed_target else None
+                    ),
                 )
                 request_terminalized = True
             for sequenced_output in pending_final_deltas:
@@ -1025,7 +1144,7 @@ def stream_agent_run_events(
                 diagnostic=diagnostic,
             )
         )
-    except PYDANTIC_AI_SCHEMA_ERRORS as e:
+    except pydantic_ai_schema_errors() as e:
         diagnostic = _build_error_diagnostic(
             code="SCHEMA_VALIDATION_FAILED",
             error=e,
@@ -1119,6 +1238,21 @@ def stream_agent_run_events(
                 diagnostic=diagnostic,
             )
         )
+    except ProviderBusyError as e:
+        diagnostic = _build_error_diagnostic(
+            code="PROVIDER_BUSY",
+            error=e,
+            workflow_id=agent_request.workflow_id,
+            stage_id=agent_request.stage_id,
+        )
+        record_metric("error", "PROVIDER_BUSY", diagnostic=diagnostic)
+        yield persist_terminal_error(
+            ErrorEvent(
+                code="PROVIDER_BUSY",
+                message=diagnostic.public_reason,
+                diagnostic=diagnostic,
+            )
+        )
     except AgentRuntimeModelError as e:
         diagnostic = _build_error_diagnostic(
             code="LLM_ERROR",
@@ -1134,7 +1268,7 @@ def stream_agent_run_events(
                 diagnostic=diagnostic,
             )
         )
-    except (AuthenticationError, RateLimitError, APIError) as e:
+    except provider_error_types() as e:
         diagnostic = _build_error_diagnostic(
             code="LLM_ERROR",
             error=e,
@@ -17,24 +17,24 @@ OPTIONAL_TEST_CASE_HEADERS = {
     "状态": "status",
 }
 COVERAGE_HEADERS = ["测试点", "优先级", "关联风险", "覆盖用例", "覆盖状态"]
+COVERAGE_STATUSES = ("已覆盖", "部分覆盖", "未覆盖")
 
 
 def parse_lisa_test_asset_markdown(markdown: str) -> dict:
-    case_rows = _parse_tables_with_headers(markdown, TEST_CASE_HEADERS)
-    coverage_rows = _parse_tables_with_headers(markdown, COVERAGE_HEADERS)
-    if not case_rows:
+    tables = _parse_recognized_tables(
+        markdown,
+        {"cases": TEST_CASE_HEADERS, "coverage": COVERAGE_HEADERS},
+    )
+    if not tables["cases"]:
         raise ValueError("测试用例集缺少可解析的用例清单表格")
 
-    test_cases = [_map_test_case(row) for row in case_rows]
-    coverage_trace = [_map_coverage(row) for row in coverage_rows]
+    test_cases = [_map_test_case(row) for row in tables["cases"]]
+    coverage_trace = [_map_coverage(row) for row in tables["coverage"]]
 
     return {
         "testCases": test_cases,
         "coverageTrace": coverage_trace,
-        "coverageSummary": build_coverage_summary(test_cases, coverage_trace),
-        "assetIssues": _build_asset_issues(test_cases, coverage_trace),
-        "riskMatrix": build_risk_matrix(test_cases, coverage_trace),
-        "intentTesterDrafts": build_intent_tester_drafts(test_cases),
+        **build_test_asset_views(test_cases, coverage_trace),
     }
 
 
@@ -75,68 +75,75 @@ def build_lisa_test_assets_from_artifact_data(artifact_data: dict) -> dict:
     return {
         "testCases": test_cases,
         "coverageTrace": coverage_trace,
-        "coverageSummary": build_coverage_summary(test_cases, coverage_trace),
-        "assetIssues": _build_asset_issues(test_cases, coverage_trace),
-        "riskMatrix": build_risk_matrix(test_cases, coverage_trace),
-        "intentTesterDrafts": build_intent_tester_drafts(test_cases),
+        **build_test_asset_views(test_cases, coverage_trace),
     }
 
 
-def build_coverage_summary(
+def build_test_asset_views(
     test_cases: list[dict],
     coverage_trace: list[dict],
 ) -> dict:
-    total_points = len(coverage_trace)
-    covered = sum(1 for row in coverage_trace if row["status"] == "已覆盖")
-    partial = sum(1 for row in coverage_trace if row["status"] == "部分覆盖")
-    uncovered = sum(1 for row in coverage_trace if row["status"] == "未覆盖")
+    """Build coverage summary, issues, risk matrix and drafts together.
+
+    Walks the case list and the coverage trace once each, indexing by case
+    ID, priority and risk as it goes, instead of once per derived view.
+    """
+    risk_index: dict[str, dict[str, set[str]]] = {}
+    known_case_ids = set()
+    drafts = []
+    for test_case in test_cases:
+        known_case_ids.add(test_case["id"])
+        _index_test_case_risk(risk_index, test_case)
+        drafts.append(_build_intent_tester_draft(test_case))
+
+    status_counts: dict[str, dict[str, int]] = {}
+    referenced_case_ids = set()
+    issues = []
+    for trace in coverage_trace:
+        _count_coverage_status(status_counts, trace)
+        _index_coverage_risk(risk_index, trace)
+        for case_id in trace["testCases"]:
+            referenced_case_ids.add(case_id)
+            if case_id not in known_case_ids:
+                issues.append(_unknown_coverage_case_issue(trace, case_id))
+    issues.extend(
+        _orphan_test_case_issue(case_id)
+        for case_id in sorted(known_case_ids - referenced_case_ids)
+    )
 
     return {
-        "totalTestCases": len(test_cases),
-        "totalTestPoints": total_points,
-        "coveredTestPoints": covered,
-        "partiallyCoveredTestPoints": partial,
-        "uncoveredTestPoints": uncovered,
-        "coverageRate": _coverage_rate(covered, total_points),
-        "byPriority": _build_priority_coverage(coverage_trace),
+        "coverageSummary": _serialize_coverage_summary(
+            len(test_cases),
+            len(coverage_trace),
+            status_counts,
+        ),
+        "assetIssues": issues,
+        "riskMatrix": _serialize_risk_index(risk_index),
+        "intentTesterDrafts": drafts,
     }
 
 
+def build_coverage_summary(
+    test_cases: list[dict],
+    coverage_trace: list[dict],
+) -> dict:
+    status_counts: dict[str, dict[str, int]] = {}
+    for trace in coverage_trace:
+        _count_coverage_status(status_counts, trace)
+    return _serialize_coverage_summary(
+        len(test_cases),
+        len(coverage_trace),
+        status_counts,
+    )
+
+
 def build_risk_matrix(test_cases: list[dict], coverage_trace: list[dict]) -> list[dict]:
     risk_index: dict[str, dict[str, set[str]]] = {}
-
     for test_case in test_cases:
-        risk = _normalize_risk(test_case["risk"])
-        if risk is None:
-            continue
-        entry = _risk_entry(risk_index, risk)
-        entry["testCases"].add(test_case["id"])
-        entry["testPoints"].add(test_case["testPoint"])
-        entry["priorities"].add(test_case["priority"])
-        entry["dimensions"].add(test_case["dimension"])
-
+        _index_test_case_risk(risk_index, test_case)
     for trace in coverage_trace:
-        risk = _normalize_risk(trace["risk"])
-        if risk is None:
-            continue
-        entry = _risk_entry(risk_index, risk)
-        entry["testPoints"].add(trace["testPoint"])
-        entry["priorities"].add(trace["priority"])
-        entry["coverageStatuses"].add(trace["status"])
-        for case_id in trace["testCases"]:
-            entry["testCases"].add(case_id)
-
-    return [
-        {
-            "risk": risk,
-            "testCases": sorted(entry["testCases"]),
-            "testPoints": sorted(entry["testPoints"]),
-            "priorities": sorted(entry["priorities"]),
-            "dimensions": sorted(entry["dimensions"]),
-            "coverageStatuses": sorted(entry["coverageStatuses"]),
-        }
-        for risk, entry in sorted(risk_index.items())
-    ]
+        _index_coverage_risk(risk_index, trace)
+    return _serialize_risk_index(risk_index)
 
 
 def build_intent_tester_drafts(test_cases: list[dict]) -> list[dict]:
@@ -150,33 +157,62 @@ def normalize_risk(risk: str) -> str | None:
     return normalized
 
 
-def _parse_tables_with_headers(markdown: str, required_headers: list[str]) -> list[dict]:
-    rows = []
-    lines = markdown.splitlines()
-    index = 0
-    while index < len(lines):
-        if not _is_table_row(lines[index]):
-            index += 1
-            continue
-
-        headers = _split_table_row(lines[index])
-        if not all(header in headers for header in required_headers):
-            index += 1
-            continue
-        if index + 1 >= len(lines) or not _is_separator_row(lines[index + 1]):
-            raise ValueError(f"Markdown 表格缺少分隔行: {', '.join(required_headers)}")
-
-        index += 2
-        while index < len(lines) and _is_table_row(lines[index]):
-            values = _split_table_row(lines[index])
-            if len(values) != len(headers):
-                raise ValueError("Markdown 表格列数与表头不一致")
-            rows.append(dict(zip(headers, values, strict=True)))
-            index += 1
-        continue
+def _parse_recognized_tables(
+    markdown: str,
+    table_headers: dict[str, list[str]],
+) -> dict[str, list[dict]]:
+    """Collect the rows of every table kind in ``table_headers`` in one pass.
+
+    Each line is split at most once and fed to one small state machine per
+    table kind: waiting for a header row that contains all required headers,
+    expecting its separator row, or reading body rows until the table ends.
+    A kind stops at its first error; errors are raised in ``table_headers``
+    order, as if each kind had been scanned separately.
+    """
+    rows: dict[str, list[dict]] = {kind: [] for kind in table_headers}
+    required = {kind: set(headers) for kind, headers in table_headers.items()}
+    # kind -> (headers, separator_seen) while inside a recognized table.
+    open_tables: dict[str, tuple[list[str], bool]] = {}
+    errors: dict[str, str] = {}
+
+    for line in markdown.splitlines():
+        cells = _split_table_row(line) if _is_table_row(line) else None
+        cell_set = set(cells) if cells is not None else None
+        for kind in table_headers:
+            if kind in errors:
+                continue
+            open_table = open_tables.get(kind)
+            if open_table is not None:
+                headers, separator_seen = open_table
+                if not separator_seen:
+                    if not _is_separator_row(line):
+                        errors[kind] = _missing_separator_message(table_headers[kind])
+                        continue
+                    open_tables[kind] = (headers, True)
+                    continue
+                if cells is not None:
+                    if len(cells) != len(headers):
+                        errors[kind] = "Markdown 表格列数与表头不一致"
+                        continue
+                    rows[kind].append(dict(zip(headers, cells, strict=True)))
+                    continue
+                del open_tables[kind]
+            if cell_set is not None and required[kind] <= cell_set:
+                open_tables[kind] = (cells, False)
+
+    for kind, (_, separator_seen) in open_tables.items():
+        if not separator_seen and kind not in errors:
+            errors[kind] = _missing_separator_message(table_headers[kind])
+    for kind in table_headers:
+        if kind in errors:
+            raise ValueError(errors[kind])
     return rows
 
 
+def _missing_separator_message(required_headers: list[str]) -> str:
+    return f"Markdown 表格缺少分隔行: {', '.join(required_headers)}"
+
+
 def _is_table_row(line: str) -> bool:
     stripped = line.strip()
     return stripped.startswith("|") and stripped.endswith("|")
@@ -307,25 +343,46 @@ def _artifact_data_string_list(value: dict, field_name: str, path: str) -> list[
     return result
 
 
-def _build_priority_coverage(coverage_trace: list[dict]) -> list[dict]:
-    priorities = sorted({row["priority"] for row in coverage_trace})
-    summary = []
-    for priority in priorities:
-        rows = [row for row in coverage_trace if row["priority"] == priority]
-        covered = sum(1 for row in rows if row["status"] == "已覆盖")
-        partial = sum(1 for row in rows if row["status"] == "部分覆盖")
-        uncovered = sum(1 for row in rows if row["status"] == "未覆盖")
-        summary.append(
+def _count_coverage_status(
+    status_counts: dict[str, dict[str, int]],
+    trace: dict,
+) -> None:
+    counts = status_counts.setdefault(trace["priority"], {"total": 0})
+    counts["total"] += 1
+    counts[trace["status"]] = counts.get(trace["status"], 0) + 1
+
+
+def _serialize_coverage_summary(
+    total_cases: int,
+    total_points: int,
+    status_counts: dict[str, dict[str, int]],
+) -> dict:
+    covered, partial, uncovered = (
+        sum(counts.get(status, 0) for counts in status_counts.values())
+        for status in COVERAGE_STATUSES
+    )
+    return {
+        "totalTestCases": total_cases,
+        "totalTestPoints": total_points,
+        "coveredTestPoints": covered,
+        "partiallyCoveredTestPoints": partial,
+        "uncoveredTestPoints": uncovered,
+        "coverageRate": _coverage_rate(covered, total_points),
+        "byPriority": [
             {
                 "priority": priority,
-                "total": len(rows),
-                "covered": covered,
-                "partial": partial,
-                "uncovered": uncovered,
-                "coverageRate": _coverage_rate(covered, len(rows)),
+                "total": counts["total"],
+                "covered": counts.get("已覆盖", 0),
+                "partial": counts.get("部分覆盖", 0),
+                "uncovered": counts.get("未覆盖", 0),
+                "coverageRate": _coverage_rate(
+                    counts.get("已覆盖", 0),
+                    counts["total"],
+                ),
             }
-        )
-    return summary
+            for priority, counts in sorted(status_counts.items())
+        ],
+    }
 
 
 def _coverage_rate(covered: int, total: int) -> float:
@@ -334,34 +391,63 @@ def _coverage_rate(covered: int, total: int) -> float:
     return round((covered / total) * 100, 2)
 
 
-def _build_asset_issues(test_cases: list[dict], coverage_trace: list[dict]) -> list[dict]:
-    issues = []
-    known_case_ids = {test_case["id"] for test_case in test_cases}
-    referenced_case_ids = set()
+def _unknown_coverage_case_issue(trace: dict, case_id: str) -> dict:
+    return {
+        "type": "unknown_coverage_case",
+        "testPoint": trace["testPoint"],
+        "caseId": case_id,
+        "message": f"覆盖追溯引用了不存在的测试用例 {case_id}",
+    }
 
-    for trace in coverage_trace:
-        for case_id in trace["testCases"]:
-            referenced_case_ids.add(case_id)
-            if case_id not in known_case_ids:
-                issues.append(
-                    {
-                        "type": "unknown_coverage_case",
-                        "testPoint": trace["testPoint"],
-                        "caseId": case_id,
-                        "message": f"覆盖追溯引用了不存在的测试用例 {case_id}",
-                    }
-                )
 
-    for case_id in sorted(known_case_ids - referenced_case_ids):
-        issues.append(
-            {
-                "type": "orphan_test_case",
-                "caseId": case_id,
-                "message": f"测试用例 {case_id} 未被任何测试点覆盖追溯引用",
-            }
-        )
+def _orphan_test_case_issue(case_id: str) -> dict:
+    return {
+        "type": "orphan_test_case",
+        "caseId": case_id,
+        "message": f"测试用例 {case_id} 未被任何测试点覆盖追溯引用",
+    }
+
 
-    return issues
+def _index_test_case_risk(
+    risk_index: dict[str, dict[str, set[str]]],
+    test_case: dict,
+) -> None:
+    risk = _normalize_risk(test_case["risk"])
+    if risk is None:
+        return
+    entry = _risk_entry(risk_index, risk)
+    entry["testCases"].add(test_case["id"])
+    entry["testPoints"].add(test_case["testPoint"])
+    entry["priorities"].add(test_case["priority"])
+    entry["dimensions"].add(test_case["dimension"])
+
+
+def _index_coverage_risk(
+    risk_index: dict[str, dict[str, set[str]]],
+    trace: dict,
+) -> None:
+    risk = _normalize_risk(trace["risk"])
+    if risk is None:
+        return
+    entry = _risk_entry(risk_index, risk)
+    entry["testPoints"].add(trace["testPoint"])
+    entry["priorities"].add(trace["priority"])
+    entry["coverageStatuses"].add(trace["status"])
+    entry["testCases"].update(trace["testCases"])
+
+
+def _serialize_risk_index(risk_index: dict[str, dict[str, set[str]]]) -> list[dict]:
+    return [
+        {
+            "risk": risk,
+            "testCases": sorted(entry["testCases"]),
+            "testPoints": sorted(entry["testPoints"]),
+            "priorities": sorted(entry["priorities"]),
+            "dimensions": sorted(entry["dimensions"]),
+            "coverageStatuses": sorted(entry["coverageStatuses"]),
+        }
+        for risk, entry in sorted(risk_index.items())
+    ]
 
 
 def _risk_entry(risk_index: dict[str, dict[str, set[str]]], risk: str) -> dict[str, set[str]]:
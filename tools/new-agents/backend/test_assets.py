@@ -1,6 +1,13 @@
+from collections import Counter
 import json
 
+from sqlalchemy import func, update
+
+from artifact_data_cache import artifact_data_view, decoded_artifact_data
 from models import (
+    AgentArtifact,
+    AgentArtifactVersion,
+    AgentRun,
     AgentTestAssetIntentTesterMapping,
     AgentRiskMatrixAsset,
     AgentTestAssetCollection,
@@ -10,7 +17,6 @@ from models import (
     AgentTestPointAsset,
     db,
 )
-from run_persistence import get_run_snapshot
 from test_asset_parsing import (
     build_lisa_test_assets_from_artifact_data,
     build_coverage_summary,
@@ -62,6 +68,11 @@ INTENT_TESTER_RESULT_FIELDS = {
     "errorMessage",
     "steps",
 }
+INTENT_TESTER_RESULT_BATCH_FIELDS = {"results"}
+INTENT_TESTER_RESULT_BATCH_ENTRY_FIELDS = {"caseId", "result"}
+INTENT_TESTER_EXECUTION_BATCH_FIELDS = {"executions"}
+INTENT_TESTER_EXECUTION_BATCH_ENTRY_FIELDS = {"caseId", "execution"}
+INTENT_TESTER_BATCH_LIMIT = 1000
 INTENT_TESTER_RESULT_STEP_FIELDS = {
     "stepIndex",
     "description",
@@ -70,37 +81,60 @@ INTENT_TESTER_RESULT_STEP_FIELDS = {
     "screenshotPath",
     "action",
 }
+ISSUE_STATUS_COUNTERS = {
+    "pending": "pending_issue_count",
+    "confirmed": "confirmed_issue_count",
+    "ignored": "ignored_issue_count",
+}
+TEST_POINT_STATUS_COUNTERS = {
+    "未覆盖": "uncovered_test_point_count",
+    "部分覆盖": "partial_test_point_count",
+}
+RISK_STATUS_COUNTERS = {
+    "open": "open_risk_count",
+    "mitigating": "mitigating_risk_count",
+    "accepted": "accepted_risk_count",
+    "closed": "closed_risk_count",
+}
 
 
 def export_lisa_test_assets(run_id: str) -> dict:
-    snapshot = get_run_snapshot(run_id)
-    if snapshot["run"]["workflowId"] != "TEST_DESIGN":
+    run = db.session.get(AgentRun, run_id)
+    if run is None:
+        raise ValueError(f"未知 runId: {run_id}")
+    if run.workflow_id != "TEST_DESIGN":
         raise ValueError("仅支持 TEST_DESIGN workflow 导出 Lisa 测试资产")
 
-    cases_artifact = next(
-        (
-            artifact
-            for artifact in snapshot["artifacts"]
-            if artifact["stageId"] == CASE_STAGE_ID
-        ),
-        None,
+    artifact = AgentArtifact.query.filter_by(
+        run_id=run_id,
+        stage_id=CASE_STAGE_ID,
+    ).first()
+    version = (
+        db.session.get(AgentArtifactVersion, artifact.current_version_id)
+        if artifact is not None and artifact.current_version_id is not None
+        else None
     )
-    if cases_artifact is None:
+    if version is None:
         raise ValueError("缺少 TEST_DESIGN/CASES 测试用例集")
 
-    artifact_data = cases_artifact.get("artifactData")
-    if artifact_data is None:
-        parsed_assets = parse_lisa_test_asset_markdown(cases_artifact["content"])
+    if decoded_artifact_data(version) is None:
+        parsed_assets = parse_lisa_test_asset_markdown(version.content)
         source_format = "legacy_markdown"
     else:
-        parsed_assets = build_lisa_test_assets_from_artifact_data(artifact_data)
+        # Versions are immutable, so the derived assets are built once per
+        # version and shared; materialize only reads them.
+        parsed_assets = artifact_data_view(
+            version,
+            "lisa_test_assets",
+            build_lisa_test_assets_from_artifact_data,
+        )
         source_format = "artifact_data"
 
     return {
-        "runId": snapshot["run"]["id"],
-        "workflowId": snapshot["run"]["workflowId"],
+        "runId": run.id,
+        "workflowId": run.workflow_id,
         "sourceStageId": CASE_STAGE_ID,
-        "sourceArtifactVersion": cases_artifact["versionNumber"],
+        "sourceArtifactVersion": version.version_number,
         "sourceFormat": source_format,
         **parsed_assets,
     }
@@ -153,7 +187,7 @@ def materialize_lisa_test_assets(run_id: str) -> dict:
             )
         )
 
-    _sync_risk_matrix(collection, exported["riskMatrix"])
+    _sync_risk_matrix(collection, exported["riskMatrix"], Counter())
 
     for issue in exported["assetIssues"]:
         db.session.add(
@@ -171,6 +205,7 @@ def materialize_lisa_test_assets(run_id: str) -> dict:
         collection,
         {test_case["id"] for test_case in exported["testCases"]},
     )
+    _recount_quality_counters(collection)
 
     db.session.commit()
     return get_lisa_test_asset_collection(collection.id)
@@ -232,7 +267,10 @@ def update_lisa_test_case_asset(
     db.session.flush()
     test_case.current_version_id = version.id
     db.session.commit()
-    return _serialize_test_case(test_case)
+    return {
+        **_serialize_test_case(test_case),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def update_lisa_test_asset_issue_status(
@@ -256,9 +294,15 @@ def update_lisa_test_asset_issue_status(
     if issue is None:
         raise ValueError(f"未知资产问题: {issue_id}")
 
+    deltas = Counter()
+    _count_status_change(deltas, ISSUE_STATUS_COUNTERS, issue.status, status)
     issue.status = status
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return _serialize_asset_issue(issue)
+    return {
+        **_serialize_asset_issue(issue),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def update_lisa_test_point_asset(
@@ -280,17 +324,26 @@ def update_lisa_test_point_asset(
     if point_asset is None:
         raise ValueError(f"未知测试点: {test_point}")
 
+    deltas = Counter()
+    affected_risks = {point_asset.risk}
     for field in ["priority", "risk"]:
         if field in patch:
             value = patch[field]
             if not isinstance(value, str) or not value.strip():
                 raise ValueError(f"{field} 不能为空")
             setattr(point_asset, field if field != "risk" else "risk", value.strip())
+    affected_risks.add(point_asset.risk)
 
     if "status" in patch:
         status = patch["status"]
         if status not in TEST_POINT_STATUSES:
             raise ValueError(f"未知测试点覆盖状态: {status}")
+        _count_status_change(
+            deltas,
+            TEST_POINT_STATUS_COUNTERS,
+            point_asset.status,
+            status,
+        )
         point_asset.status = status
 
     if "testCases" in patch:
@@ -304,9 +357,14 @@ def update_lisa_test_point_asset(
             normalized_cases.append(case_id.strip())
         point_asset.test_cases_json = json.dumps(normalized_cases, ensure_ascii=False)
 
-    _rebuild_risk_matrix(collection)
+    risk_changes = _rebuild_risk_matrix(collection, affected_risks, deltas)
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return _serialize_test_point(point_asset)
+    return {
+        **_serialize_test_point(point_asset),
+        **_serialize_risk_changes(risk_changes),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def update_lisa_test_asset_risk(
@@ -328,9 +386,14 @@ def update_lisa_test_asset_risk(
     if risk_asset is None:
         raise ValueError(f"未知风险: {risk}")
 
-    _apply_risk_lifecycle_patch(risk_asset, patch)
+    deltas = Counter()
+    _apply_risk_lifecycle_patch(risk_asset, patch, deltas)
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return _serialize_risk_matrix_item(risk_asset)
+    return {
+        **_serialize_risk_matrix_item(risk_asset),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def create_lisa_test_asset_risk(collection_id: int, patch: dict) -> dict:
@@ -362,10 +425,16 @@ def create_lisa_test_asset_risk(collection_id: int, patch: dict) -> dict:
         owner=DEFAULT_RISK_LIFECYCLE["owner"],
         note=DEFAULT_RISK_LIFECYCLE["note"],
     )
-    _apply_risk_lifecycle_patch(risk_asset, patch)
+    deltas = Counter()
+    _count_status_change(deltas, RISK_STATUS_COUNTERS, None, risk_asset.status)
+    _apply_risk_lifecycle_patch(risk_asset, patch, deltas)
     db.session.add(risk_asset)
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return _serialize_risk_matrix_item(risk_asset)
+    return {
+        **_serialize_risk_matrix_item(risk_asset),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def update_lisa_test_asset_risk_by_id(
@@ -387,6 +456,8 @@ def update_lisa_test_asset_risk_by_id(
     if risk_asset is None:
         raise ValueError(f"未知风险: {risk_id}")
 
+    deltas = Counter()
+    affected_risks = {risk_asset.risk}
     if "risk" in patch:
         new_risk = _require_risk_name(patch["risk"])
         duplicate = AgentRiskMatrixAsset.query.filter_by(
@@ -398,12 +469,18 @@ def update_lisa_test_asset_risk_by_id(
         old_risk = risk_asset.risk
         if new_risk != old_risk:
             risk_asset.risk = new_risk
+            affected_risks.add(new_risk)
             _rename_risk_sources(collection, old_risk, new_risk)
 
-    _apply_risk_lifecycle_patch(risk_asset, patch)
-    _rebuild_risk_matrix(collection)
+    _apply_risk_lifecycle_patch(risk_asset, patch, deltas)
+    risk_changes = _rebuild_risk_matrix(collection, affected_risks, deltas)
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return _serialize_risk_matrix_item(risk_asset)
+    return {
+        **_serialize_risk_matrix_item(risk_asset),
+        **_serialize_risk_changes(risk_changes),
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def delete_lisa_test_asset_risk(collection_id: int, risk_id: int) -> dict:
@@ -420,9 +497,16 @@ def delete_lisa_test_asset_risk(collection_id: int, risk_id: int) -> dict:
     if json.loads(risk_asset.test_cases_json) or json.loads(risk_asset.test_points_json):
         raise ValueError(f"风险仍有关联资产，无法删除: {risk_asset.risk}")
 
+    deltas = Counter()
+    _count_status_change(deltas, RISK_STATUS_COUNTERS, risk_asset.status, None)
     db.session.delete(risk_asset)
+    _apply_quality_counter_deltas(collection, deltas)
     db.session.commit()
-    return {"id": risk_id, "deleted": True}
+    return {
+        "id": risk_id,
+        "deleted": True,
+        "qualitySummary": _build_quality_summary(collection),
+    }
 
 
 def record_lisa_test_asset_intent_tester_case(
@@ -487,39 +571,8 @@ def record_lisa_test_asset_intent_tester_execution(
     if mapping is None:
         raise ValueError(f"测试用例尚未导入 intent-tester: {case_id}")
 
-    execution_id = patch.get("executionId")
-    status = patch.get("status")
-    mode = patch.get("mode")
-    browser = patch.get("browser")
-    for field, value in [
-        ("executionId", execution_id),
-        ("status", status),
-        ("mode", mode),
-        ("browser", browser),
-    ]:
-        if not isinstance(value, str) or not value.strip():
-            raise ValueError(f"{field} 不能为空")
-
-    mapping.latest_execution_id = execution_id.strip()
-    mapping.latest_execution_status = status.strip()
-    mapping.latest_execution_mode = mode.strip()
-    mapping.latest_execution_browser = browser.strip()
-    mapping.latest_execution_start_time = _optional_string(
-        patch.get("startTime"),
-        "startTime",
-    )
-    mapping.latest_execution_end_time = _optional_string(
-        patch.get("endTime"),
-        "endTime",
-    )
-    duration = patch.get("duration")
-    if duration is not None and not isinstance(duration, (int, float)):
-        raise ValueError("duration 必须是数字")
-    mapping.latest_execution_duration = duration
-    mapping.latest_execution_error_message = _optional_string(
-        patch.get("errorMessage"),
-        "errorMessage",
-    )
+    for column, value in _intent_tester_execution_columns(patch).items():
+        setattr(mapping, column, value)
 
     db.session.commit()
     return _serialize_intent_tester_mapping(mapping)
@@ -547,19 +600,230 @@ def record_lisa_test_asset_intent_tester_result(
         raise ValueError(f"测试用例尚未导入 intent-tester: {case_id}")
 
     result_snapshot = _normalize_intent_tester_result_snapshot(patch)
-    mapping.latest_execution_result_json = json.dumps(
-        result_snapshot,
-        ensure_ascii=False,
-    )
-    mapping.latest_execution_id = result_snapshot["executionId"]
-    mapping.latest_execution_status = result_snapshot["status"]
-    mapping.latest_execution_duration = result_snapshot["duration"]
-    mapping.latest_execution_error_message = result_snapshot["errorMessage"]
+    for column, value in _intent_tester_result_columns(result_snapshot).items():
+        setattr(mapping, column, value)
 
     db.session.commit()
     return _serialize_intent_tester_mapping(mapping)
 
 
+def record_lisa_test_asset_intent_tester_executions(
+    collection_id: int,
+    payload: dict,
+) -> dict:
+    """Record many intent-tester execution summaries in one transaction.
+
+    Entries are ``{caseId, execution}`` with the per-case execution fields and
+    follow the same outcome contract as the batched result ingestion.
+    """
+    return _record_intent_tester_batch(
+        collection_id,
+        payload,
+        list_field="executions",
+        entry_field="execution",
+        label="执行",
+        batch_fields=INTENT_TESTER_EXECUTION_BATCH_FIELDS,
+        entry_fields=INTENT_TESTER_EXECUTION_BATCH_ENTRY_FIELDS,
+        value_fields=INTENT_TESTER_EXECUTION_FIELDS,
+        build_columns=_intent_tester_execution_columns,
+        status_key="executionStatus",
+    )
+
+
+def record_lisa_test_asset_intent_tester_results(
+    collection_id: int,
+    payload: dict,
+) -> dict:
+    """Record many intent-tester result snapshots in one transaction.
+
+    Each entry is validated on its own; invalid entries are reported in
+    ``outcomes`` and do not block the valid ones, which are written with a
+    single executemany UPDATE.
+    """
+    return _record_intent_tester_batch(
+        collection_id,
+        payload,
+        list_field="results",
+        entry_field="result",
+        label="结果",
+        batch_fields=INTENT_TESTER_RESULT_BATCH_FIELDS,
+        entry_fields=INTENT_TESTER_RESULT_BATCH_ENTRY_FIELDS,
+        value_fields=INTENT_TESTER_RESULT_FIELDS,
+        build_columns=lambda value: _intent_tester_result_columns(
+            _normalize_intent_tester_result_snapshot(value)
+        ),
+        status_key="resultStatus",
+    )
+
+
+def _record_intent_tester_batch(
+    collection_id: int,
+    payload: dict,
+    *,
+    list_field: str,
+    entry_field: str,
+    label: str,
+    batch_fields: set[str],
+    entry_fields: set[str],
+    value_fields: set[str],
+    build_columns,
+    status_key: str,
+) -> dict:
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是 JSON 对象")
+    unknown_fields = sorted(set(payload) - batch_fields)
+    if unknown_fields:
+        raise ValueError(
+            f"未知 intent-tester 批量{label}字段: {', '.join(unknown_fields)}"
+        )
+    entries = payload.get(list_field)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{list_field} 必须是非空列表")
+    if len(entries) > INTENT_TESTER_BATCH_LIMIT:
+        raise ValueError(f"{list_field} 一次最多 {INTENT_TESTER_BATCH_LIMIT} 条")
+
+    collection = db.session.get(AgentTestAssetCollection, collection_id)
+    if collection is None:
+        raise ValueError(f"未知测试资产集: {collection_id}")
+
+    outcomes = []
+    columns_by_case: dict[str, tuple[int, dict]] = {}
+    for entry in entries:
+        case_id = entry.get("caseId") if isinstance(entry, dict) else None
+        outcome = {"caseId": case_id if isinstance(case_id, str) else None}
+        outcomes.append(outcome)
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError(f"{list_field} 必须是对象列表")
+            entry_unknown = sorted(set(entry) - entry_fields)
+            if entry_unknown:
+                raise ValueError(
+                    f"未知 intent-tester 批量{label}字段: {', '.join(entry_unknown)}"
+                )
+            if not isinstance(case_id, str) or not case_id.strip():
+                raise ValueError("caseId 不能为空")
+            if case_id in columns_by_case:
+                raise ValueError(f"caseId 在本批次中重复: {case_id}")
+            value = entry.get(entry_field)
+            if not isinstance(value, dict):
+                raise ValueError(f"{entry_field} 必须是对象")
+            value_unknown = sorted(set(value) - value_fields)
+            if value_unknown:
+                raise ValueError(
+                    f"未知 intent-tester {label}字段: {', '.join(value_unknown)}"
+                )
+            columns_by_case[case_id] = (len(outcomes) - 1, build_columns(value))
+        except ValueError as e:
+            outcome.update({"status": "rejected", "error": str(e)})
+
+    known_case_ids = set()
+    mapping_ids = {}
+    if columns_by_case:
+        known_case_ids = set(
+            db.session.scalars(
+                db.select(AgentTestCaseAsset.case_id).where(
+                    AgentTestCaseAsset.collection_id == collection_id,
+                    AgentTestCaseAsset.case_id.in_(columns_by_case),
+                )
+            )
+        )
+        mapping_ids = dict(
+            db.session.execute(
+                db.select(
+                    AgentTestAssetIntentTesterMapping.source_case_id,
+                    AgentTestAssetIntentTesterMapping.id,
+                ).where(
+                    AgentTestAssetIntentTesterMapping.collection_id == collection_id,
+                    AgentTestAssetIntentTesterMapping.source_case_id.in_(
+                        columns_by_case
+                    ),
+                )
+            ).all()
+        )
+
+    rows = []
+    for case_id, (index, columns) in columns_by_case.items():
+        outcome = outcomes[index]
+        if case_id not in known_case_ids:
+            outcome.update({"status": "rejected", "error": f"未知测试用例: {case_id}"})
+            continue
+        if case_id not in mapping_ids:
+            outcome.update(
+                {
+                    "status": "rejected",
+                    "error": f"测试用例尚未导入 intent-tester: {case_id}",
+                }
+            )
+            continue
+        rows.append({"id": mapping_ids[case_id], **columns})
+        outcome.update(
+            {
+                "status": "recorded",
+                "executionId": columns["latest_execution_id"],
+                status_key: columns["latest_execution_status"],
+            }
+        )
+
+    if rows:
+        db.session.execute(update(AgentTestAssetIntentTesterMapping), rows)
+        db.session.commit()
+
+    return {
+        "collectionId": collection_id,
+        "recorded": len(rows),
+        "rejected": len(outcomes) - len(rows),
+        "outcomes": outcomes,
+    }
+
+
+def _intent_tester_execution_columns(patch: dict) -> dict:
+    execution_id = patch.get("executionId")
+    status = patch.get("status")
+    mode = patch.get("mode")
+    browser = patch.get("browser")
+    for field, value in [
+        ("executionId", execution_id),
+        ("status", status),
+        ("mode", mode),
+        ("browser", browser),
+    ]:
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{field} 不能为空")
+
+    duration = patch.get("duration")
+    if duration is not None and not isinstance(duration, (int, float)):
+        raise ValueError("duration 必须是数字")
+    return {
+        "latest_execution_id": execution_id.strip(),
+        "latest_execution_status": status.strip(),
+        "latest_execution_mode": mode.strip(),
+        "latest_execution_browser": browser.strip(),
+        "latest_execution_start_time": _optional_string(
+            patch.get("startTime"),
+            "startTime",
+        ),
+        "latest_execution_end_time": _optional_string(
+            patch.get("endTime"),
+            "endTime",
+        ),
+        "latest_execution_duration": duration,
+        "latest_execution_error_message": _optional_string(
+            patch.get("errorMessage"),
+            "errorMessage",
+        ),
+    }
+
+
+def _intent_tester_result_columns(snapshot: dict) -> dict:
+    return {
+        "latest_execution_result_json": json.dumps(snapshot, ensure_ascii=False),
+        "latest_execution_id": snapshot["executionId"],
+        "latest_execution_status": snapshot["status"],
+        "latest_execution_duration": snapshot["duration"],
+        "latest_execution_error_message": snapshot["errorMessage"],
+    }
+
+
 def _normalize_intent_tester_result_snapshot(patch: dict) -> dict:
     execution_id = patch.get("executionId")
     status = patch.get("status")
@@ -689,11 +953,13 @@ def _require_risk_name(value: object) -> str:
 def _apply_risk_lifecycle_patch(
     risk_asset: AgentRiskMatrixAsset,
     patch: dict,
+    deltas: Counter,
 ) -> None:
     if "status" in patch:
         status = patch["status"]
         if status not in RISK_STATUSES:
             raise ValueError(f"未知风险状态: {status}")
+        _count_status_change(deltas, RISK_STATUS_COUNTERS, risk_asset.status, status)
         risk_asset.status = status
 
     for field in ["owner", "note"]:
@@ -710,14 +976,25 @@ def _rename_risk_sources(
     old_risk: str,
     new_risk: str,
 ) -> None:
-    for point_asset in collection.test_points:
-        if point_asset.risk == old_risk:
-            point_asset.risk = new_risk
-
-    for test_case in collection.test_cases:
+    for point_asset in AgentTestPointAsset.query.filter_by(
+        collection_id=collection.id,
+        risk=old_risk,
+    ).all():
+        point_asset.risk = new_risk
+
+    linked_cases = (
+        AgentTestCaseAsset.query.join(
+            AgentTestCaseVersion,
+            AgentTestCaseVersion.id == AgentTestCaseAsset.current_version_id,
+        )
+        .filter(
+            AgentTestCaseAsset.collection_id == collection.id,
+            AgentTestCaseVersion.risk == old_risk,
+        )
+        .all()
+    )
+    for test_case in linked_cases:
         current = _serialize_test_case(test_case)
-        if current["risk"] != old_risk:
-            continue
         next_payload = {
             key: current[key]
             for key in [
@@ -786,7 +1063,7 @@ def _serialize_collection(collection: AgentTestAssetCollection) -> dict:
         "testPoints": test_points,
         "coverageTrace": test_points,
         "coverageSummary": build_coverage_summary(test_cases, test_points),
-        "qualitySummary": _build_quality_summary(issues, test_points, risk_matrix),
+        "qualitySummary": _build_quality_summary(collection),
         "assetIssues": issues,
         "riskMatrix": risk_matrix,
         "intentTesterDrafts": build_intent_tester_drafts(test_cases),
@@ -794,28 +1071,60 @@ def _serialize_collection(collection: AgentTestAssetCollection) -> dict:
     }
 
 
-def _build_quality_summary(
-    issues: list[dict],
-    test_points: list[dict],
-    risk_matrix: list[dict],
-) -> dict:
-    pending_issue_count = sum(1 for issue in issues if issue["status"] == "pending")
-    confirmed_issue_count = sum(1 for issue in issues if issue["status"] == "confirmed")
-    ignored_issue_count = sum(1 for issue in issues if issue["status"] == "ignored")
-    uncovered_test_point_count = sum(
-        1 for test_point in test_points if test_point["status"] == "未覆盖"
-    )
-    partial_test_point_count = sum(
-        1 for test_point in test_points if test_point["status"] == "部分覆盖"
-    )
-    open_risk_count = sum(1 for risk in risk_matrix if risk["status"] == "open")
-    mitigating_risk_count = sum(
-        1 for risk in risk_matrix if risk["status"] == "mitigating"
-    )
-    accepted_risk_count = sum(
-        1 for risk in risk_matrix if risk["status"] == "accepted"
-    )
-    closed_risk_count = sum(1 for risk in risk_matrix if risk["status"] == "closed")
+def _count_status_change(
+    deltas: Counter,
+    counters: dict[str, str],
+    old_status: str | None,
+    new_status: str | None,
+) -> None:
+    if old_status == new_status:
+        return
+    if old_status in counters:
+        deltas[counters[old_status]] -= 1
+    if new_status in counters:
+        deltas[counters[new_status]] += 1
+
+
+def _apply_quality_counter_deltas(
+    collection: AgentTestAssetCollection,
+    deltas: Counter,
+) -> None:
+    # Relative updates keep concurrent edits of one collection from losing counts.
+    for column, delta in deltas.items():
+        if delta:
+            setattr(
+                collection,
+                column,
+                getattr(AgentTestAssetCollection, column) + delta,
+            )
+
+
+def _recount_quality_counters(collection: AgentTestAssetCollection) -> None:
+    for model, counters in [
+        (AgentTestAssetIssue, ISSUE_STATUS_COUNTERS),
+        (AgentTestPointAsset, TEST_POINT_STATUS_COUNTERS),
+        (AgentRiskMatrixAsset, RISK_STATUS_COUNTERS),
+    ]:
+        counts = dict(
+            db.session.query(model.status, func.count(model.id))
+            .filter(model.collection_id == collection.id)
+            .group_by(model.status)
+            .all()
+        )
+        for status, column in counters.items():
+            setattr(collection, column, counts.get(status, 0))
+
+
+def _build_quality_summary(collection: AgentTestAssetCollection) -> dict:
+    pending_issue_count = collection.pending_issue_count
+    confirmed_issue_count = collection.confirmed_issue_count
+    ignored_issue_count = collection.ignored_issue_count
+    uncovered_test_point_count = collection.uncovered_test_point_count
+    partial_test_point_count = collection.partial_test_point_count
+    open_risk_count = collection.open_risk_count
+    mitigating_risk_count = collection.mitigating_risk_count
+    accepted_risk_count = collection.accepted_risk_count
+    closed_risk_count = collection.closed_risk_count
 
     gates = [
         {
@@ -1000,18 +1309,71 @@ def _delete_stale_intent_tester_mappings(
             db.session.delete(mapping)
 
 
-def _rebuild_risk_matrix(collection: AgentTestAssetCollection) -> None:
-    test_cases = [_serialize_test_case(test_case) for test_case in collection.test_cases]
-    test_points = [_serialize_test_point(test_point) for test_point in collection.test_points]
-    _sync_risk_matrix(collection, build_risk_matrix(test_cases, test_points))
+def _rebuild_risk_matrix(
+    collection: AgentTestAssetCollection,
+    risks: set[str],
+    deltas: Counter,
+) -> tuple[list[AgentRiskMatrixAsset], list[int]]:
+    """Rebuild only the risk matrix rows of ``risks`` from their linked assets."""
+    risk_names = {
+        normalized for normalized in (normalize_risk(risk) for risk in risks) if normalized
+    }
+    if not risk_names:
+        return [], []
+
+    case_rows = (
+        db.session.query(AgentTestCaseAsset.case_id, AgentTestCaseVersion)
+        .join(
+            AgentTestCaseVersion,
+            AgentTestCaseVersion.id == AgentTestCaseAsset.current_version_id,
+        )
+        .filter(
+            AgentTestCaseAsset.collection_id == collection.id,
+            func.trim(AgentTestCaseVersion.risk).in_(risk_names),
+        )
+        .order_by(AgentTestCaseAsset.case_id)
+        .all()
+    )
+    test_cases = [
+        {"id": case_id, **_serialize_test_case_version(version)}
+        for case_id, version in case_rows
+    ]
+    test_points = [
+        _serialize_test_point(test_point)
+        for test_point in AgentTestPointAsset.query.filter(
+            AgentTestPointAsset.collection_id == collection.id,
+            func.trim(AgentTestPointAsset.risk).in_(risk_names),
+        ).order_by(AgentTestPointAsset.test_point)
+    ]
+    existing_risks = AgentRiskMatrixAsset.query.filter(
+        AgentRiskMatrixAsset.collection_id == collection.id,
+        AgentRiskMatrixAsset.risk.in_(risk_names),
+    ).all()
+    return _sync_risk_matrix(
+        collection,
+        [
+            risk
+            for risk in build_risk_matrix(test_cases, test_points)
+            if risk["risk"] in risk_names
+        ],
+        deltas,
+        existing_risks=existing_risks,
+    )
 
 
 def _sync_risk_matrix(
     collection: AgentTestAssetCollection,
     derived_risks: list[dict],
-) -> None:
-    existing_by_name = {risk.risk: risk for risk in collection.risk_matrix}
+    deltas: Counter,
+    *,
+    existing_risks: list[AgentRiskMatrixAsset] | None = None,
+) -> tuple[list[AgentRiskMatrixAsset], list[int]]:
+    if existing_risks is None:
+        existing_risks = list(collection.risk_matrix)
+    existing_by_name = {risk.risk: risk for risk in existing_risks}
     derived_names = set()
+    updated_risks = []
+    deleted_risk_ids = []
 
     for risk in derived_risks:
         derived_names.add(risk["risk"])
@@ -1026,12 +1388,15 @@ def _sync_risk_matrix(
                 is_manual=False,
             )
             db.session.add(risk_asset)
+            _count_status_change(deltas, RISK_STATUS_COUNTERS, None, risk_asset.status)
         _apply_risk_matrix_payload(risk_asset, risk)
+        updated_risks.append(risk_asset)
 
-    for risk_asset in list(collection.risk_matrix):
+    for risk_asset in existing_risks:
         if risk_asset.risk in derived_names:
             continue
         if risk_asset.is_manual:
+            updated_risks.append(risk_asset)
             _apply_risk_matrix_payload(
                 risk_asset,
                 {
@@ -1044,8 +1409,25 @@ def _sync_risk_matrix(
                 },
             )
             continue
+        _count_status_change(deltas, RISK_STATUS_COUNTERS, risk_asset.status, None)
+        deleted_risk_ids.append(risk_asset.id)
         db.session.delete(risk_asset)
 
+    return updated_risks, deleted_risk_ids
+
+
+def _serialize_risk_changes(
+    risk_changes: tuple[list[AgentRiskMatrixAsset], list[int]],
+) -> dict:
+    updated_risks, deleted_risk_ids = risk_changes
+    return {
+        "updatedRisks": [
+            _serialize_risk_matrix_item(risk)
+            for risk in sorted(updated_risks, key=lambda risk: risk.risk)
+        ],
+        "deletedRiskIds": deleted_risk_ids,
+    }
+
 
 def _apply_risk_matrix_payload(
     risk_asset: AgentRiskMatrixAsset,
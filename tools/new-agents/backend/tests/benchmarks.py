@@ -0,0 +1,34 @@
+"""Timing helpers shared by the slow benchmark tests.
+
+Benchmarks assert on the numbers they measure instead of printing them; the
+measurements go into the assertion message, so a failing run still shows them.
+"""
+
+from collections.abc import Callable
+import time
+
+
+def average_ms(
+    action: Callable[[], object],
+    rounds: int = 1,
+    *,
+    clock: Callable[[], float] = time.perf_counter,
+) -> float:
+    """Average time of one ``action()`` call over ``rounds`` calls, in ms."""
+    started = clock()
+    for _ in range(rounds):
+        action()
+    return (clock() - started) * 1000 / rounds
+
+
+def assert_faster(
+    fast_ms: float,
+    slow_ms: float,
+    *,
+    factor: float = 1,
+    label: str,
+) -> None:
+    """Assert that ``fast_ms`` beats ``slow_ms`` by more than ``factor``."""
+    assert fast_ms * factor < slow_ms, (
+        f"{label}: {fast_ms:.2f}ms x {factor:g} is not below {slow_ms:.2f}ms"
+    )
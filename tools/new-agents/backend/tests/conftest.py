@@ -9,3 +9,38 @@ sys.path.insert(0, str(REPO_ROOT))
 os.environ["FLASK_TESTING"] = "1"
 os.environ["NEW_AGENTS_CONFIG_ADMIN_ALLOW_UNAUTHENTICATED"] = "true"
 os.environ["AI4SE_ENV"] = "test"
+
+import pytest
+
+from artifact_data_cache import reset_artifact_data_cache
+from mermaid_repair_cache import reset_mermaid_repair_cache
+from history_compaction import reset_history_compactor
+from history_retrieval import reset_history_indexes
+from metrics_sink import reset_metrics_sink
+from provider_admission import reset_provider_admission
+from provider_routing import reset_provider_router
+from sse_replay import reset_sse_stream_registry
+from token_counting import reset_token_counters
+
+
+# Process-wide caches and registries are reset around every test.
+SINGLETON_RESETS = (
+    reset_sse_stream_registry,
+    lambda: reset_metrics_sink(drain=False),
+    reset_artifact_data_cache,
+    reset_mermaid_repair_cache,
+    reset_token_counters,
+    reset_history_indexes,
+    reset_history_compactor,
+    reset_provider_admission,
+    reset_provider_router,
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_singletons():
+    for reset in SINGLETON_RESETS:
+        reset()
+    yield
+    for reset in SINGLETON_RESETS:
+        reset()
@@ -0,0 +1,128 @@
+"""A local OpenAI-compatible chat completion server for provider tests."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+
+class FakeLlmProvider:
+    """Streams a fixed reply after ``latency_seconds``.
+
+    More than ``max_concurrency`` requests in flight are answered with 429, the
+    way a provider rejects a burst. ``status_code`` makes every request fail.
+    """
+
+    def __init__(
+        self,
+        *,
+        reply: str = "ok",
+        latency_seconds: float = 0.0,
+        max_concurrency: int | None = None,
+        status_code: int = 200,
+        usage_tokens: int = 10,
+    ) -> None:
+        self.reply = reply
+        self.latency_seconds = latency_seconds
+        self.max_concurrency = max_concurrency
+        self.status_code = status_code
+        self.usage_tokens = usage_tokens
+        self.requests = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self) -> "FakeLlmProvider":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with provider._lock:
+                    provider.requests += 1
+                    provider.in_flight += 1
+                    provider.peak_in_flight = max(
+                        provider.peak_in_flight,
+                        provider.in_flight,
+                    )
+                    over_limit = (
+                        provider.max_concurrency is not None
+                        and provider.in_flight > provider.max_concurrency
+                    )
+                    if over_limit:
+                        provider.rejected += 1
+                try:
+                    time.sleep(provider.latency_seconds)
+                    if over_limit:
+                        self._send_error(429, "rate limit exceeded")
+                    elif provider.status_code != 200:
+                        self._send_error(provider.status_code, "provider failure")
+                    else:
+                        self._send_stream(body)
+                finally:
+                    with provider._lock:
+                        provider.in_flight -= 1
+
+            def _send_error(self, status: int, message: str) -> None:
+                payload = json.dumps({"error": {"message": message}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, body: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunks = [
+                    {"delta": {"content": provider.reply}, "finish_reason": None},
+                    {"delta": {}, "finish_reason": "stop"},
+                ]
+                for choice in chunks:
+                    self._send_event({"choices": [{"index": 0, **choice}]}, body)
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._send_event(
+                        {
+                            "choices": [],
+                            "usage": {
+                                "prompt_tokens": 0,
+                                "completion_tokens": provider.usage_tokens,
+                                "total_tokens": provider.usage_tokens,
+                            },
+                        },
+                        body,
+                    )
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def _send_event(self, event: dict, body: dict) -> None:
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": body["model"],
+                    **event,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
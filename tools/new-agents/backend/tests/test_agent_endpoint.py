@@ -1,6 +1,7 @@
 import os
 import json
 import tempfile
+import threading
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
@@ -11,6 +12,9 @@ from pydantic_ai.exceptions import UnexpectedModelBehavior
 from agent_contracts import AgentTurnOutput
 from agent_runtime import AgentRuntimeDependencyError
 from app import create_app
+from request_schemas import parse_agent_run_stream_request
+from sse_replay import agent_request_replay_identity
+from sse_schemas import AgentTurnDeltaOutput, RunStartedEvent
 from models import AgentRun, AgentRunTurnRequest, LlmConfig, db
 from run_persistence import (
     append_run_message,
@@ -402,6 +406,218 @@ def test_agent_runs_stream_returns_started_delta_and_final_sse_events(
     ]
 
 
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_agent_runs_stream_compact_delta_protocol_keeps_unbased_deltas_full(
+    mock_build_runtime,
+    client,
+    default_config,
+):
+    mock_build_runtime.return_value = FakeRuntime()
+
+    response = client.post(
+        "/api/agent/runs/stream",
+        json={
+            "prompt": "用户需求: 登录功能",
+            "systemPrompt": "你是 Lisa 测试专家。",
+            "workflowId": "TEST_DESIGN",
+            "stageId": "CLARIFY",
+            "requestId": "endpoint-compact-001",
+            "deltaProtocol": "compact",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Agent-Delta-Protocol"] == "compact"
+    payloads = _parse_sse_event_payloads(response)
+    assert [payload["type"] for payload in payloads] == [
+        "run_started",
+        "agent_delta",
+        "agent_delta",
+        "agent_turn",
+    ]
+    # Final deltas without a streamed baseline carry full state.
+    assert payloads[2]["output"]["artifact_update"]["markdown"] == (
+        VALID_CLARIFY_ARTIFACT
+    )
+    assert payloads[-1]["output"]["artifact_update"]["markdown"] == (
+        VALID_CLARIFY_ARTIFACT
+    )
+
+
+class GatedRuntime(FakeRuntime):
+    """Streams a partial delta, then waits before the final output."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def stream_turn(self, prompt, *, workflow_id, current_stage_id):
+        outputs = super().stream_turn(
+            prompt,
+            workflow_id=workflow_id,
+            current_stage_id=current_stage_id,
+        )
+        yield AgentTurnDeltaOutput(chat="我正在梳理登录需求的边界和异常链路。")
+        yield AgentTurnDeltaOutput(chat="我正在梳理登录需求的边界和异常链路，稍后更新。")
+        self.release.wait(5)
+        yield from outputs
+
+
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_agent_runs_stream_resumes_dropped_connection_without_second_model_call(
+    mock_build_runtime,
+    app,
+    client,
+    default_config,
+):
+    runtime = GatedRuntime()
+    mock_build_runtime.return_value = runtime
+    body = {
+        "prompt": "用户需求: 登录功能",
+        "systemPrompt": "你是 Lisa 测试专家。",
+        "workflowId": "TEST_DESIGN",
+        "stageId": "CLARIFY",
+        "requestId": "endpoint-resume-001",
+    }
+
+    received = []
+    stream_tokens = []
+
+    def drop_connection_mid_turn():
+        # Each connection is served by its own thread, as in the server.
+        with app.app_context():
+            response = client.post("/api/agent/runs/stream", json=body)
+            stream_tokens.append(response.headers["X-Agent-Stream-Token"])
+            chunks = iter(response.response)
+            received.extend([next(chunks), next(chunks)])
+            response.close()
+
+    connection = threading.Thread(target=drop_connection_mid_turn)
+    connection.start()
+    connection.join(5)
+    runtime.release.set()
+
+    assert received[0].startswith(b"id: 1\n")
+    assert received[1].startswith(b"id: 2\n")
+
+    foreign = client.get(
+        "/api/agent/runs/streams/endpoint-resume-001",
+        headers={"Last-Event-ID": "2", "X-Agent-Stream-Token": "sha256-other"},
+    )
+    # The token is random, not derived from the request fields.
+    guessed = client.get(
+        "/api/agent/runs/streams/endpoint-resume-001",
+        headers={
+            "Last-Event-ID": "2",
+            "X-Agent-Stream-Token": agent_request_replay_identity(
+                parse_agent_run_stream_request(body)
+            ),
+        },
+    )
+    resumed = client.get(
+        "/api/agent/runs/streams/endpoint-resume-001",
+        headers={"Last-Event-ID": "2", "X-Agent-Stream-Token": stream_tokens[0]},
+    )
+    resumed_text = resumed.get_data(as_text=True)
+    reposted = client.post(
+        "/api/agent/runs/stream",
+        json=body,
+        headers={"Last-Event-ID": "2"},
+    )
+
+    assert foreign.status_code == 404
+    assert guessed.status_code == 404
+    assert resumed.status_code == 200
+    assert "id: 1\n" not in resumed_text and "id: 2\n" not in resumed_text
+    assert [payload["type"] for payload in _parse_sse_event_payloads(resumed)][
+        -1
+    ] == "agent_turn"
+    assert reposted.get_data(as_text=True) == resumed_text
+    assert reposted.headers["X-Agent-Stream-Token"] == stream_tokens[0]
+    assert len(runtime.calls) == 1
+    assert AgentRunTurnRequest.query.one().status == "completed"
+
+
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_agent_runs_stream_ignores_stale_last_event_id_for_new_stream(
+    mock_build_runtime,
+    client,
+    default_config,
+):
+    mock_build_runtime.return_value = FakeRuntime()
+
+    response = client.post(
+        "/api/agent/runs/stream",
+        json={
+            "prompt": "用户需求: 登录功能",
+            "systemPrompt": "你是 Lisa 测试专家。",
+            "workflowId": "TEST_DESIGN",
+            "stageId": "CLARIFY",
+            "requestId": "endpoint-stale-cursor-001",
+        },
+        headers={"Last-Event-ID": "50"},
+    )
+
+    types = [payload["type"] for payload in _parse_sse_event_payloads(response)]
+    assert response.status_code == 200
+    assert (types[0], types[-1]) == ("run_started", "agent_turn")
+
+
+def test_agent_runs_stream_returns_request_connection_while_streaming(
+    client,
+    default_config,
+):
+    release = threading.Event()
+
+    def gated_events(agent_request, **kwargs):
+        yield RunStartedEvent(run_id="pool-run")
+        release.wait(5)
+
+    with patch("routes.stream_agent_run_events", side_effect=gated_events):
+        response = client.post(
+            "/api/agent/runs/stream",
+            json={
+                "prompt": "用户需求: 登录功能",
+                "systemPrompt": "你是 Lisa 测试专家。",
+                "workflowId": "TEST_DESIGN",
+                "stageId": "CLARIFY",
+                "requestId": "endpoint-pool-001",
+            },
+        )
+        chunks = iter(response.response)
+        first_chunk = next(chunks)
+        checked_out = db.engine.pool.checkedout()
+        release.set()
+        response.close()
+
+    assert first_chunk.startswith(b"id: 1\n")
+    assert checked_out == 0
+
+
+def test_agent_runs_stream_resume_returns_404_for_unknown_request(client):
+    response = client.get(
+        "/api/agent/runs/streams/missing-request",
+        headers={"X-Agent-Stream-Token": "sha256-any"},
+    )
+
+    assert response.status_code == 404
+
+
+def test_agent_runs_stream_resume_requires_stream_token(client):
+    response = client.get("/api/agent/runs/streams/any-request")
+
+    assert response.status_code == 400
+
+
+def test_agent_runs_stream_resume_rejects_invalid_last_event_id(client):
+    response = client.get(
+        "/api/agent/runs/streams/any-request",
+        headers={"Last-Event-ID": "abc"},
+    )
+
+    assert response.status_code == 400
+
+
 @patch("stream_services.build_pydantic_agent_runtime")
 def test_agent_runs_stream_persists_run_messages_and_final_artifact(
     mock_build_runtime,
@@ -1017,6 +1233,7 @@ def test_agent_run_artifact_collaboration_endpoint_replaces_state(
                 "createdAt": 1710000000100,
             }
         ],
+        "collaborationRevision": 1,
     }
 
     snapshot_response = client.get(f"/api/agent/runs/{run_id}")
@@ -1031,7 +1248,7 @@ def test_agent_run_artifact_collaboration_endpoint_replaces_state(
         {
             "stageId": "CLARIFY",
             "eventType": "collaboration_updated",
-            "summary": "更新了 CLARIFY 阶段协作状态：1 条批注，1 个章节锁",
+            "summary": "更新了 CLARIFY 阶段协作状态：新增 1 条批注，新增 1 个章节锁",
             "createdAt": snapshot_response.json["artifactAuditEvents"][0]["createdAt"],
         }
     ]
@@ -1054,6 +1271,7 @@ def test_agent_run_artifact_collaboration_endpoint_replaces_state(
     )
 
     assert replacement_response.status_code == 200
+    assert replacement_response.json["collaborationRevision"] == 2
     assert replacement_response.json["artifactComments"] == []
     assert replacement_response.json["artifactSectionLocks"] == [
         {
@@ -1067,6 +1285,40 @@ def test_agent_run_artifact_collaboration_endpoint_replaces_state(
     ]
 
 
+def test_agent_run_artifact_collaboration_endpoint_rejects_stale_revision(
+    app,
+    client,
+    default_config,
+):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        run_id = run.id
+    lock = {
+        "id": "lock-1",
+        "stageId": "CLARIFY",
+        "heading": "## 业务规则",
+        "content": "## 业务规则\n\n已确认登录规则。",
+        "createdAt": 1710000000100,
+    }
+
+    saved = client.put(
+        f"/api/agent/runs/{run_id}/artifact-collaboration",
+        json={"comments": [], "sectionLocks": [lock], "expectedRevision": 0},
+    )
+    stale = client.put(
+        f"/api/agent/runs/{run_id}/artifact-collaboration",
+        json={"comments": [], "sectionLocks": [], "expectedRevision": 0},
+    )
+
+    assert saved.status_code == 200
+    assert saved.json["collaborationRevision"] == 1
+    assert stale.status_code == 409
+    assert stale.json == {
+        "error": "协作状态已被更新，请刷新后再保存",
+        "collaborationRevision": 1,
+    }
+
+
 def test_agent_run_decision_summary_create_endpoint_persists_decision(
     app,
     client,
@@ -1653,6 +1905,107 @@ def test_agent_test_assets_intent_tester_result_endpoint_persists_snapshot(
     )
 
 
+def test_agent_test_assets_intent_tester_results_endpoint_reports_outcomes(
+    app,
+    client,
+    default_config,
+):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", VALID_CASES_ARTIFACT)
+        run_id = run.id
+
+    collection = client.post(f"/api/agent/runs/{run_id}/test-assets/materialize").json
+    client.patch(
+        f"/api/agent/test-assets/{collection['id']}/intent-tester/cases/TC-001",
+        json={
+            "intentTesterCaseId": 42,
+            "intentTesterCaseName": "TC-001 用户登录成功",
+        },
+    )
+    response = client.post(
+        f"/api/agent/test-assets/{collection['id']}/intent-tester/results",
+        json={
+            "results": [
+                {
+                    "caseId": "TC-001",
+                    "result": {"executionId": "exec-1", "status": "success"},
+                },
+                {
+                    "caseId": "TC-404",
+                    "result": {"executionId": "exec-2", "status": "success"},
+                },
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json["recorded"] == 1
+    assert response.json["rejected"] == 1
+    assert [outcome["status"] for outcome in response.json["outcomes"]] == [
+        "recorded",
+        "rejected",
+    ]
+
+    missing = client.post(
+        "/api/agent/test-assets/999/intent-tester/results",
+        json={"results": [{"caseId": "TC-001", "result": {}}]},
+    )
+    invalid = client.post(
+        f"/api/agent/test-assets/{collection['id']}/intent-tester/results",
+        json={"results": []},
+    )
+
+    assert missing.status_code == 404
+    assert invalid.status_code == 400
+
+
+def test_agent_test_assets_intent_tester_executions_endpoint_reports_outcomes(
+    app,
+    client,
+    default_config,
+):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", VALID_CASES_ARTIFACT)
+        run_id = run.id
+
+    collection = client.post(f"/api/agent/runs/{run_id}/test-assets/materialize").json
+    client.patch(
+        f"/api/agent/test-assets/{collection['id']}/intent-tester/cases/TC-001",
+        json={
+            "intentTesterCaseId": 42,
+            "intentTesterCaseName": "TC-001 用户登录成功",
+        },
+    )
+    execution = {
+        "executionId": "exec-1",
+        "status": "success",
+        "mode": "headless",
+        "browser": "chromium",
+    }
+    response = client.post(
+        f"/api/agent/test-assets/{collection['id']}/intent-tester/executions",
+        json={
+            "executions": [
+                {"caseId": "TC-001", "execution": execution},
+                {"caseId": "TC-404", "execution": execution},
+            ]
+        },
+    )
+    missing = client.post(
+        "/api/agent/test-assets/999/intent-tester/executions",
+        json={"executions": [{"caseId": "TC-001", "execution": execution}]},
+    )
+
+    assert response.status_code == 200
+    assert [outcome["status"] for outcome in response.json["outcomes"]] == [
+        "recorded",
+        "rejected",
+    ]
+    assert missing.status_code == 404
+
+
 def test_agent_test_assets_issue_status_update_endpoint_persists_status(
     app,
     client,
@@ -1706,13 +2059,17 @@ def test_agent_test_assets_test_point_update_endpoint_persists_calibration(
     )
 
     assert response.status_code == 200
-    assert response.json == {
+    assert {
+        key: response.json[key]
+        for key in ("testPoint", "priority", "risk", "testCases", "status")
+    } == {
         "testPoint": "登录主链路",
         "priority": "P1",
         "risk": "R-LOGIN-LOCK",
         "testCases": [],
         "status": "未覆盖",
     }
+    assert response.json["qualitySummary"]["uncoveredTestPointCount"] == 1
 
     detail_response = client.get(f"/api/agent/test-assets/{collection['id']}")
 
@@ -1890,7 +2247,11 @@ def test_risk_library_delete_endpoint_removes_unlinked_risk(
     )
 
     assert response.status_code == 200
-    assert response.json == {"id": created["id"], "deleted": True}
+    assert response.json["id"] == created["id"]
+    assert response.json["deleted"] is True
+    assert response.json["qualitySummary"]["openRiskCount"] == (
+        len(collection["riskMatrix"])
+    )
 
 
 def test_risk_library_delete_endpoint_rejects_linked_risk(
@@ -2294,6 +2655,7 @@ def test_agent_observability_endpoint_returns_runtime_turn_summary(
             "failedTurns": 1,
             "successRate": 50.0,
             "avgDurationMs": response.json["byProvider"][0]["avgDurationMs"],
+            "avgFirstTokenMs": 0.0,
             "estimatedTokens": response.json["byProvider"][0]["estimatedTokens"],
             "errorCodes": {"SCHEMA_VALIDATION_FAILED": 1},
             "providerIssueCount": 0,
@@ -2393,7 +2755,18 @@ def test_agent_observability_endpoint_filters_by_workflow_and_stage(
             "inputChars": 100,
             "outputChars": 200,
             "estimatedTokens": 75,
+            "promptTokens": 0,
+            "promptTokenCounter": None,
+            "llmConfigKey": None,
+            "discardedTokens": 0,
+            "earlyAborts": 0,
+            "earlyAbortSavedMs": 0,
+            "queueWaitMs": 0,
+            "firstTokenMs": 0,
             "contractRetryCount": 0,
+            "dbQueryCount": 0,
+            "dbTimeMs": 0,
+            "poolWaitMs": 0,
             "createdAt": response.json["recentTurns"][0]["createdAt"],
         }
     ]
@@ -2,6 +2,8 @@ import ast
 import copy
 import json
 from pathlib import Path
+import threading
+import time
 
 import pytest
 from pydantic import BaseModel, ConfigDict, ValidationError
@@ -27,12 +29,14 @@ from artifact_data_value_schema import (
     ValueDiscoveryJourneyArtifactData,
     ValueDiscoveryPersonaArtifactData,
 )
+from benchmarks import assert_faster, average_ms
 from agent_runtime import (
     AgentRuntimeModelError,
     RawJsonStreamTerminationError,
     AgentRuntimeSchemaError,
     AgentTurnValidationDeps,
     PydanticAgentRuntime,
+    RawJsonRetryPolicy,
     RawStreamingConfig,
     TEXT_STRUCTURED_OUTPUT_INSTRUCTION,
     build_artifact_data_progress_markdown,
@@ -47,6 +51,7 @@ from agent_runtime import (
     resolve_structured_output_capability,
     supports_artifact_data_rendering,
 )
+from incremental_validation import IncrementalTurnValidator
 from sse_schemas import AgentRetrySignal, AgentTurnDeltaOutput
 from test_artifact_data_renderers import (
     ARTIFACT_DATA_STAGE_FIXTURES,
@@ -4786,6 +4791,367 @@ def test_raw_streaming_runtime_accumulates_usage_across_retry_attempts(monkeypat
     assert runtime.last_token_usage == 100
 
 
+def _clarify_json(artifact_data: dict, chat: str) -> str:
+    return json.dumps(
+        {
+            "artifact_data": artifact_data,
+            "chat": chat,
+            "stage_action": None,
+            "warnings": [],
+        },
+        ensure_ascii=False,
+    )
+
+
+def _raw_runtime(**retry_policy) -> PydanticAgentRuntime:
+    return PydanticAgentRuntime(
+        FakeAgent({}),
+        raw_streaming_config=RawStreamingConfig(
+            api_key="test-api-key",
+            base_url="https://api.test.com/v1",
+            model_name="test-model",
+            system_prompt="system prompt",
+            retry_policy=RawJsonRetryPolicy(**retry_policy),
+        ),
+    )
+
+
+def _invalid_clarify_artifact_data() -> dict:
+    artifact_data = copy.deepcopy(VALID_CLARIFY_ARTIFACT_DATA)
+    del artifact_data["requirement_facts"]
+    return artifact_data
+
+
+def test_raw_json_retry_policy_reads_opt_in_env(monkeypatch):
+    assert RawJsonRetryPolicy.from_env() == RawJsonRetryPolicy()
+
+    monkeypatch.setenv("RAW_JSON_EARLY_ABORT", "true")
+    monkeypatch.setenv("RAW_JSON_HEDGE_AFTER_SECONDS", "2.5")
+    assert RawJsonRetryPolicy.from_env() == RawJsonRetryPolicy(
+        early_abort=True,
+        hedge_after_seconds=2.5,
+    )
+
+    monkeypatch.setenv("RAW_JSON_HEDGE_AFTER_SECONDS", "soon")
+    assert RawJsonRetryPolicy.from_env().hedge_after_seconds is None
+
+
+@pytest.mark.parametrize("early_abort", [False, True])
+def test_raw_json_early_abort_cancels_an_attempt_once_artifact_data_fails(
+    monkeypatch,
+    early_abort,
+):
+    chat = "我已整理登录需求澄清基线，请确认右侧文档。"
+    invalid_json = _clarify_json(_invalid_clarify_artifact_data(), chat * 20)
+    chat_start = invalid_json.index('"chat"')
+    valid_json = _clarify_json(VALID_CLARIFY_ARTIFACT_DATA, chat)
+    attempts = iter(
+        (
+            [invalid_json[:chat_start], *invalid_json[chat_start:]],
+            [valid_json],
+        )
+    )
+    streamed_chunks = []
+    calls = []
+
+    def fake_stream_chat_completion_content(**kwargs):
+        calls.append(kwargs)
+        chunks = next(attempts)
+        streamed_chunks.append(0)
+        for chunk in chunks:
+            streamed_chunks[-1] += 1
+            yield chunk
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(early_abort=early_abort)
+
+    outputs = list(
+        runtime.stream_turn(
+            "用户需求",
+            workflow_id="TEST_DESIGN",
+            current_stage_id="CLARIFY",
+        )
+    )
+
+    assert isinstance(outputs[-1], AgentTurnOutput)
+    assert [
+        output.attempt_index
+        for output in outputs
+        if isinstance(output, AgentRetrySignal)
+    ] == [2]
+    assert "validator=missing" in calls[1]["messages"][1]["content"]
+    assert runtime.last_discarded_tokens > 0
+    if early_abort:
+        assert streamed_chunks[0] == 1
+        assert runtime.last_early_aborts == 1
+        assert runtime.last_token_usage == runtime.last_discarded_tokens
+    else:
+        assert streamed_chunks[0] == len(invalid_json) - chat_start + 1
+        assert runtime.last_early_aborts == 0
+        assert runtime.last_token_usage is None
+
+
+def _blank_clarify_fact_status_json(chat: str) -> str:
+    artifact_data = copy.deepcopy(VALID_CLARIFY_ARTIFACT_DATA)
+    artifact_data["requirement_facts"][0]["status"] = " "
+    return _clarify_json(artifact_data, chat)
+
+
+def _fixed_size_chunks(text: str, size: int) -> list[str]:
+    return [text[index : index + size] for index in range(0, len(text), size)]
+
+
+def test_raw_json_early_abort_stops_at_the_first_invalid_field(monkeypatch):
+    chat = "我已整理登录需求澄清基线，请确认右侧文档。"
+    invalid_json = _blank_clarify_fact_status_json(chat)
+    valid_json = _clarify_json(VALID_CLARIFY_ARTIFACT_DATA, chat)
+    attempts = iter(
+        (_fixed_size_chunks(invalid_json, 16), _fixed_size_chunks(valid_json, 16))
+    )
+    streamed_text = []
+    calls = []
+
+    def fake_stream_chat_completion_content(**kwargs):
+        calls.append(kwargs)
+        streamed_text.append("")
+        for chunk in next(attempts):
+            time.sleep(0.002)
+            streamed_text[-1] += chunk
+            yield chunk
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(early_abort=True)
+
+    outputs = list(
+        runtime.stream_turn(
+            "用户需求",
+            workflow_id="TEST_DESIGN",
+            current_stage_id="CLARIFY",
+        )
+    )
+
+    assert isinstance(outputs[-1], AgentTurnOutput)
+    assert '"requirement_facts"' in streamed_text[0]
+    assert '"system_boundaries"' not in streamed_text[0]
+    assert "validator=blank_string" in calls[1]["messages"][1]["content"]
+    assert runtime.last_early_aborts == 1
+    assert runtime.last_early_abort_saved_ms > 0
+
+
+def test_incremental_validator_fails_markdown_on_the_first_closed_bad_visual():
+    validator = IncrementalTurnValidator(
+        workflow_id="CUSTOM",
+        current_stage_id="DRAFT",
+    )
+    prefix = json.dumps(
+        {"chat": "已更新。", "markdown": "# 草稿\n\n```ai4se-visual\n{not-json}"},
+        ensure_ascii=False,
+    )[:-2]
+
+    assert validator.check(prefix, "}") is None
+    error = validator.check(prefix + "\\n```", "```")
+
+    assert isinstance(error, ContractValidationError)
+    assert error.validator == "ai4se_visual_json"
+
+
+def test_raw_json_hedged_attempt_wins_when_the_first_stalls(monkeypatch):
+    valid_json = _clarify_json(
+        VALID_CLARIFY_ARTIFACT_DATA,
+        "我已整理登录需求澄清基线，请确认右侧文档。",
+    )
+    release_first = threading.Event()
+    first_closed = threading.Event()
+    calls = []
+
+    def fake_stream_chat_completion_content(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            try:
+                yield valid_json[:20]
+                release_first.wait(5)
+                yield valid_json[20:]
+            finally:
+                first_closed.set()
+            return
+        kwargs["on_usage"](50)
+        yield valid_json
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(hedge_after_seconds=0.05)
+
+    outputs = list(
+        runtime.stream_turn(
+            "用户需求",
+            workflow_id="TEST_DESIGN",
+            current_stage_id="CLARIFY",
+        )
+    )
+    release_first.set()
+
+    assert len(calls) == 2
+    assert calls[1]["messages"] == calls[0]["messages"]
+    assert [
+        output.attempt_index
+        for output in outputs
+        if isinstance(output, AgentRetrySignal)
+    ] == [2]
+    assert isinstance(outputs[-2], AgentTurnDeltaOutput)
+    assert isinstance(outputs[-1], AgentTurnOutput)
+    assert first_closed.wait(5)
+    assert runtime.last_hedged_attempts == 1
+    assert runtime.last_discarded_tokens > 0
+    assert runtime.last_token_usage == 50 + runtime.last_discarded_tokens
+
+
+def test_raw_json_hedge_takes_over_when_the_lead_fails(monkeypatch):
+    valid_json = _clarify_json(
+        VALID_CLARIFY_ARTIFACT_DATA,
+        "我已整理登录需求澄清基线，请确认右侧文档。",
+    )
+    hedge_started = threading.Event()
+    calls = []
+
+    def fake_stream_chat_completion_content(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            yield valid_json[:40]
+            hedge_started.wait(5)
+            yield "}"
+            return
+        hedge_started.set()
+        yield valid_json[:40]
+        # Finish after the lead has failed, so the hedge has to take over.
+        time.sleep(0.1)
+        yield valid_json[40:]
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(hedge_after_seconds=0.05)
+
+    outputs = list(
+        runtime.stream_turn(
+            "用户需求",
+            workflow_id="TEST_DESIGN",
+            current_stage_id="CLARIFY",
+        )
+    )
+
+    assert len(calls) == 2
+    assert [
+        output.attempt_index
+        for output in outputs
+        if isinstance(output, AgentRetrySignal)
+    ] == [2]
+    assert isinstance(outputs[-1], AgentTurnOutput)
+    assert runtime.last_hedged_attempts == 1
+
+
+def test_raw_json_hedged_mode_raises_provider_errors_of_the_last_attempt(
+    monkeypatch,
+):
+    def fake_stream_chat_completion_content(**kwargs):
+        raise agent_runtime.LlmClientError("provider down")
+        yield ""
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(hedge_after_seconds=5)
+
+    with pytest.raises(AgentRuntimeModelError):
+        list(
+            runtime.stream_turn(
+                "用户需求",
+                workflow_id="TEST_DESIGN",
+                current_stage_id="CLARIFY",
+            )
+        )
+
+
+@pytest.mark.slow
+def test_benchmark_raw_json_early_abort_saves_failed_attempt_time(monkeypatch):
+    chunk_delay = 0.002
+    chat = "我已整理登录需求澄清基线，请确认右侧文档。"
+    invalid_json = _clarify_json(_invalid_clarify_artifact_data(), chat * 20)
+    chat_start = invalid_json.index('"chat"')
+    valid_json = _clarify_json(VALID_CLARIFY_ARTIFACT_DATA, chat)
+    attempt_chunks = (
+        [invalid_json[:chat_start], *invalid_json[chat_start:]],
+        [valid_json],
+    )
+
+    def measure(early_abort: bool) -> tuple[float, int]:
+        attempts = iter(attempt_chunks)
+
+        def fake_stream_chat_completion_content(**kwargs):
+            for chunk in next(attempts):
+                time.sleep(chunk_delay)
+                yield chunk
+
+        _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+        runtime = _raw_runtime(early_abort=early_abort)
+        started = time.perf_counter()
+        outputs = list(
+            runtime.stream_turn(
+                "用户需求",
+                workflow_id="TEST_DESIGN",
+                current_stage_id="CLARIFY",
+            )
+        )
+        assert isinstance(outputs[-1], AgentTurnOutput)
+        return time.perf_counter() - started, runtime.last_discarded_tokens
+
+    serial_seconds, serial_discarded = measure(False)
+    aborted_seconds, aborted_discarded = measure(True)
+
+    assert_faster(
+        aborted_seconds * 1000,
+        serial_seconds * 1000,
+        factor=2,
+        label="turn with an early-aborted vs a fully streamed failed attempt",
+    )
+    assert aborted_discarded < serial_discarded, (serial_discarded, aborted_discarded)
+
+
+@pytest.mark.slow
+def test_benchmark_raw_json_field_abort_reports_saved_time(monkeypatch):
+    chunk_delay = 0.002
+    chat = "我已整理登录需求澄清基线，请确认右侧文档。"
+    attempt_chunks = iter(
+        (
+            _fixed_size_chunks(_blank_clarify_fact_status_json(chat), 16),
+            _fixed_size_chunks(
+                _clarify_json(VALID_CLARIFY_ARTIFACT_DATA, chat),
+                16,
+            ),
+        )
+    )
+
+    def fake_stream_chat_completion_content(**kwargs):
+        for chunk in next(attempt_chunks):
+            time.sleep(chunk_delay)
+            yield chunk
+
+    _install_raw_stream_fake(monkeypatch, fake_stream_chat_completion_content)
+    runtime = _raw_runtime(early_abort=True)
+    outputs = []
+    turn_ms = average_ms(
+        lambda: outputs.extend(
+            runtime.stream_turn(
+                "用户需求",
+                workflow_id="TEST_DESIGN",
+                current_stage_id="CLARIFY",
+            )
+        )
+    )
+
+    assert isinstance(outputs[-1], AgentTurnOutput)
+    assert_faster(
+        turn_ms,
+        runtime.last_early_abort_saved_ms,
+        factor=1 / 4,
+        label="field-level early abort turn vs time saved on the failed attempt",
+    )
+
+
 def test_runtime_raw_json_stream_turn_fails_final_json_truncation_after_partial_delta(
     monkeypatch,
 ):
@@ -5970,8 +6336,8 @@ def test_runtime_maps_pydantic_ai_schema_errors_to_runtime_schema_error(
         pass
 
     monkeypatch.setattr(
-        "agent_runtime.PYDANTIC_AI_SCHEMA_ERRORS",
-        (FakeSchemaError,),
+        "agent_runtime.pydantic_ai_schema_errors",
+        lambda: (FakeSchemaError,),
     )
     runtime = PydanticAgentRuntime(
         FailingAgent(FakeSchemaError("Exceeded maximum output retries (1)"))
@@ -5995,8 +6361,8 @@ def test_runtime_maps_pydantic_ai_model_errors_to_runtime_model_error(
         pass
 
     monkeypatch.setattr(
-        "agent_runtime.PYDANTIC_AI_MODEL_ERRORS",
-        (FakeModelError,),
+        "agent_runtime.pydantic_ai_model_errors",
+        lambda: (FakeModelError,),
     )
     runtime = PydanticAgentRuntime(FailingAgent(FakeModelError("provider API failed")))
 
@@ -124,6 +124,79 @@ def test_init_db_upgrades_existing_artifact_section_lock_table():
         os.unlink(db_path)
 
 
+def test_init_db_backfills_run_counters_on_existing_tables():
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+
+    try:
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE agent_runs (
+                    id VARCHAR(36) PRIMARY KEY,
+                    workflow_id VARCHAR(64) NOT NULL,
+                    agent_id VARCHAR(64) NOT NULL,
+                    current_stage_id VARCHAR(64) NOT NULL,
+                    status VARCHAR(32) NOT NULL,
+                    model VARCHAR(128),
+                    created_at DATETIME,
+                    updated_at DATETIME
+                )
+            """))
+            db.session.execute(text("""
+                CREATE TABLE agent_artifacts (
+                    id INTEGER PRIMARY KEY,
+                    run_id VARCHAR(36) NOT NULL,
+                    stage_id VARCHAR(64) NOT NULL,
+                    current_version_id INTEGER,
+                    created_at DATETIME,
+                    updated_at DATETIME
+                )
+            """))
+            db.session.execute(text(
+                "INSERT INTO agent_runs (id, workflow_id, agent_id, current_stage_id, status) "
+                "VALUES ('run-1', 'TEST_DESIGN', 'lisa', 'CLARIFY', 'active')"
+            ))
+            db.session.execute(text(
+                "INSERT INTO agent_artifacts (id, run_id, stage_id, current_version_id) "
+                "VALUES (1, 'run-1', 'CLARIFY', 2)"
+            ))
+            db.session.commit()
+            db.create_all()
+            db.session.execute(text(
+                "INSERT INTO agent_messages (run_id, role, content, sequence_index) "
+                "VALUES ('run-1', 'user', '需求', 1), "
+                "('run-1', 'assistant', '回复', 2), "
+                "('run-1', 'user', '补充', 3)"
+            ))
+            db.session.execute(text(
+                "INSERT INTO agent_artifact_versions (artifact_id, version_number, content) "
+                "VALUES (1, 1, '初版'), (1, 2, '二版')"
+            ))
+            db.session.commit()
+
+            init_db(app)
+
+            run_counters = db.session.execute(text(
+                "SELECT last_message_sequence, last_assistant_sequence "
+                "FROM agent_runs WHERE id = 'run-1'"
+            )).one()
+            artifact_version = db.session.execute(text(
+                "SELECT current_version_number FROM agent_artifacts WHERE id = 1"
+            )).scalar_one()
+
+        assert tuple(run_counters) == (3, 2)
+        assert artifact_version == 2
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
 def test_init_db_upgrades_existing_artifact_version_table_with_artifact_data_json():
     db_fd, db_path = tempfile.mkstemp()
     app = create_app(
@@ -203,7 +276,9 @@ def test_init_db_upgrades_existing_turn_metric_table_with_diagnostic_json():
                 )
             }
 
-        assert "diagnostic_json" in columns
+        assert {"diagnostic_json", "db_query_count", "db_time_ms", "pool_wait_ms"}.issubset(
+            columns
+        )
     finally:
         os.close(db_fd)
         os.unlink(db_path)
@@ -296,6 +371,11 @@ def test_get_config_uses_environment_selected_config_key(client, app, monkeypatc
         "baseUrl": "https://staging.test/v1",
         "model": "staging-model",
         "description": "Staging config",
+        "contextBudgetTokens": None,
+        "maxConcurrency": None,
+        "requestsPerMinute": None,
+        "tokensPerMinute": None,
+        "modelClass": None,
         "browserConfigAdminAvailable": True,
     }
 
@@ -308,6 +388,10 @@ def test_post_config_creates_default_config_without_exposing_api_key(client, app
             "baseUrl": "https://api.test.com/v1",
             "model": "test-model",
             "description": "UI managed config",
+            "contextBudgetTokens": 32000,
+            "maxConcurrency": 4,
+            "requestsPerMinute": 60,
+            "modelClass": " chat ",
         },
     )
 
@@ -317,6 +401,11 @@ def test_post_config_creates_default_config_without_exposing_api_key(client, app
         "baseUrl": "https://api.test.com/v1",
         "model": "test-model",
         "description": "UI managed config",
+        "contextBudgetTokens": 32000,
+        "maxConcurrency": 4,
+        "requestsPerMinute": 60,
+        "tokensPerMinute": None,
+        "modelClass": "chat",
     }
     assert "apiKey" not in response.json
     assert "api_key" not in response.json
@@ -324,6 +413,10 @@ def test_post_config_creates_default_config_without_exposing_api_key(client, app
     with app.app_context():
         config = LlmConfig.query.filter_by(config_key="default").one()
         assert config.api_key == "new-secret"
+        assert config.context_budget_tokens == 32000
+        assert config.max_concurrency == 4
+        assert config.requests_per_minute == 60
+        assert config.model_class == "chat"
         assert config.is_active is True
 
 
@@ -355,6 +448,11 @@ def test_post_config_updates_default_config_and_preserves_key_when_omitted(clien
         "baseUrl": "https://new.test/v1",
         "model": "new-model",
         "description": "New config",
+        "contextBudgetTokens": None,
+        "maxConcurrency": None,
+        "requestsPerMinute": None,
+        "tokensPerMinute": None,
+        "modelClass": None,
     }
 
     with app.app_context():
@@ -398,6 +496,121 @@ def test_post_config_requires_api_key_when_creating_default_config(client):
     assert response.json == {"error": "apiKey 不能为空"}
 
 
+def test_post_config_backups_creates_and_lists_backup_configs(client, app):
+    response = client.post(
+        "/api/config/backups",
+        json={
+            "configKey": " backup-1 ",
+            "apiKey": "backup-secret",
+            "baseUrl": "https://backup.test/v1",
+            "model": "backup-model",
+            "requestsPerMinute": 30,
+            "modelClass": "chat",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "configKey": "backup-1",
+        "baseUrl": "https://backup.test/v1",
+        "model": "backup-model",
+        "description": None,
+        "contextBudgetTokens": None,
+        "maxConcurrency": None,
+        "requestsPerMinute": 30,
+        "tokensPerMinute": None,
+        "modelClass": "chat",
+        "isActive": True,
+    }
+
+    deactivated = client.post(
+        "/api/config/backups",
+        json={
+            "configKey": "backup-1",
+            "baseUrl": "https://backup.test/v1",
+            "model": "backup-model",
+            "modelClass": "chat",
+            "isActive": False,
+        },
+    )
+
+    assert deactivated.status_code == 200
+    listed = client.get("/api/config/backups")
+    assert listed.status_code == 200
+    assert [
+        (backup["configKey"], backup["isActive"]) for backup in listed.json["backups"]
+    ] == [("backup-1", False)]
+    assert "apiKey" not in listed.json["backups"][0]
+    with app.app_context():
+        config = LlmConfig.query.filter_by(config_key="backup-1").one()
+        assert config.api_key == "backup-secret"
+        assert config.is_active is False
+
+
+@pytest.mark.parametrize(
+    ("payload", "error"),
+    [
+        ({"configKey": "default", "modelClass": "chat"}, "configKey 不能是默认配置"),
+        ({"configKey": "backup-1"}, "备用配置必须指定 modelClass"),
+        ({"modelClass": "chat"}, "configKey 必须是"),
+        (
+            {"configKey": "backup-1", "modelClass": "chat", "isActive": "no"},
+            "isActive 必须是布尔值",
+        ),
+        ({"configKey": "backup-1", "modelClass": "chat"}, "apiKey 不能为空"),
+    ],
+)
+def test_post_config_backups_rejects_invalid_backup_configs(client, payload, error):
+    response = client.post(
+        "/api/config/backups",
+        json={
+            "baseUrl": "https://backup.test/v1",
+            "model": "backup-model",
+            **payload,
+        },
+    )
+
+    assert response.status_code == 400
+    assert response.json["error"].startswith(error)
+
+
+@pytest.mark.parametrize("context_budget_tokens", [500, "32000", True, 2_000_000])
+def test_post_config_rejects_invalid_context_budget(client, context_budget_tokens):
+    response = client.post(
+        "/api/config",
+        json={
+            "apiKey": "new-secret",
+            "baseUrl": "https://api.test.com/v1",
+            "model": "test-model",
+            "contextBudgetTokens": context_budget_tokens,
+        },
+    )
+
+    assert response.status_code == 400
+    assert response.json == {
+        "error": "contextBudgetTokens 必须是 1000 到 1000000 之间的整数"
+    }
+
+
+@pytest.mark.parametrize(
+    ("limit_key", "value"),
+    [("maxConcurrency", 0), ("requestsPerMinute", "60"), ("tokensPerMinute", True)],
+)
+def test_post_config_rejects_invalid_provider_limits(client, limit_key, value):
+    response = client.post(
+        "/api/config",
+        json={
+            "apiKey": "new-secret",
+            "baseUrl": "https://api.test.com/v1",
+            "model": "test-model",
+            limit_key: value,
+        },
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"error": f"{limit_key} 必须是正整数"}
+
+
 def test_post_config_check_requires_default_config(client):
     response = client.post("/api/config/check")
 
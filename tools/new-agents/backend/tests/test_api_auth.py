@@ -86,7 +86,7 @@ class TestAPIKeyAuth:
 
     @pytest.mark.parametrize(
         "path",
-        ["/api/config", "/api/config/check"],
+        ["/api/config", "/api/config/check", "/api/config/backups"],
     )
     def test_config_admin_endpoints_reject_runtime_proxy_and_gateway_credentials(
         self,
@@ -114,7 +114,7 @@ class TestAPIKeyAuth:
 
     @pytest.mark.parametrize(
         "path",
-        ["/api/config", "/api/config/check"],
+        ["/api/config", "/api/config/check", "/api/config/backups"],
     )
     def test_config_admin_endpoints_accept_only_config_admin_key(
         self,
@@ -138,7 +138,7 @@ class TestAPIKeyAuth:
 
     @pytest.mark.parametrize(
         "path",
-        ["/api/config", "/api/config/check"],
+        ["/api/config", "/api/config/check", "/api/config/backups"],
     )
     def test_production_config_admin_endpoints_fail_closed_without_key(
         self,
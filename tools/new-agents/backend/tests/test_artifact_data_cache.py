@@ -0,0 +1,191 @@
+import copy
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import create_app
+from artifact_data_cache import (
+    DECODED_BYTES_PER_JSON_BYTE,
+    ArtifactDataCache,
+    get_artifact_data_cache,
+    reset_artifact_data_cache,
+)
+from benchmarks import assert_faster, average_ms
+from models import db
+from run_persistence import create_agent_run, get_run_snapshot, record_artifact_version
+from story_handoff_packets import (
+    create_story_handoff_packet,
+    list_story_handoff_candidates,
+)
+from test_artifact_data_renderers import (
+    VALID_CASES_ARTIFACT_DATA,
+    VALID_STORY_BREAKDOWN_ARTIFACT_DATA,
+)
+from test_assets import export_lisa_test_assets
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _version(version_id: int, artifact_data: dict | None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=version_id,
+        artifact_data_json=(
+            json.dumps(artifact_data, ensure_ascii=False)
+            if artifact_data is not None
+            else None
+        ),
+    )
+
+
+def _create_story_breakdown_run():
+    run = create_agent_run("STORY_BREAKDOWN", "alex", "SPRINT_PLAN")
+    record_artifact_version(
+        run.id,
+        "SPRINT_PLAN",
+        "# 用户故事拆解包",
+        artifact_data=copy.deepcopy(VALID_STORY_BREAKDOWN_ARTIFACT_DATA),
+    )
+    return run
+
+
+def test_cache_returns_the_built_value_until_the_json_digest_changes():
+    cache = ArtifactDataCache()
+    builds = []
+
+    def build(raw: str) -> dict:
+        builds.append(raw)
+        return json.loads(raw)
+
+    version = _version(7, {"stories": ["US-001"]})
+    first = cache.get_or_build(version, "json", build)
+    second = cache.get_or_build(version, "json", build)
+    recreated = _version(7, {"stories": ["US-002"]})
+    rebuilt = cache.get_or_build(recreated, "json", build)
+
+    assert second is first
+    assert rebuilt == {"stories": ["US-002"]}
+    assert len(builds) == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_cache_does_not_store_unsaved_or_empty_versions():
+    cache = ArtifactDataCache()
+
+    assert cache.get_or_build(_version(None, {"a": 1}), "json", json.loads) == {"a": 1}
+    assert cache.get_or_build(_version(3, None), "json", lambda raw: raw) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_cache_evicts_least_recently_used_entries_beyond_the_byte_budget():
+    entry_json_bytes = len(json.dumps({"value": "x" * 100}))
+    cache = ArtifactDataCache(max_bytes=entry_json_bytes * DECODED_BYTES_PER_JSON_BYTE * 4)
+    versions = [_version(index, {"value": "x" * 100}) for index in range(5)]
+
+    for version in versions[:4]:
+        cache.get_or_build(version, "json", json.loads)
+    cache.get_or_build(versions[0], "json", json.loads)
+    cache.get_or_build(versions[4], "json", json.loads)
+    cache.get_or_build(versions[1], "json", json.loads)
+
+    stats = cache.stats()
+    assert stats["entries"] == 4
+    assert stats["bytes"] <= stats["maxBytes"]
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 1
+
+
+def test_cache_skips_entries_larger_than_its_share_of_the_budget():
+    cache = ArtifactDataCache(max_bytes=1000)
+
+    cache.get_or_build(_version(1, {"value": "x" * 500}), "json", json.loads)
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_snapshots_and_handoffs_share_decoded_and_validated_artifact_data(app):
+    run = _create_story_breakdown_run()
+
+    first = get_run_snapshot(run.id)["artifacts"][0]["artifactData"]
+    second = get_run_snapshot(run.id)["artifacts"][0]["artifactData"]
+    candidates = list_story_handoff_candidates(run.id)
+    packet = create_story_handoff_packet(
+        run.id,
+        "SPRINT_PLAN",
+        candidates["candidates"][0]["storyId"],
+    )
+
+    assert second is first
+    assert first == VALID_STORY_BREAKDOWN_ARTIFACT_DATA
+    assert packet["storyId"] == candidates["candidates"][0]["storyId"]
+    stats = get_artifact_data_cache().stats()
+    # One decode and one StoryBreakdownArtifactData validation; every other
+    # read was served from the cache.
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+    assert stats["hits"] >= 3
+
+
+def test_lisa_test_asset_export_builds_assets_once_per_artifact_version(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+    record_artifact_version(
+        run.id,
+        "CASES",
+        "# 测试用例集",
+        artifact_data=copy.deepcopy(VALID_CASES_ARTIFACT_DATA),
+    )
+
+    first = export_lisa_test_assets(run.id)
+    second = export_lisa_test_assets(run.id)
+    record_artifact_version(
+        run.id,
+        "CASES",
+        "# 测试用例集 v2",
+        artifact_data=copy.deepcopy(VALID_CASES_ARTIFACT_DATA),
+    )
+    third = export_lisa_test_assets(run.id)
+
+    assert first["sourceFormat"] == "artifact_data"
+    assert second["testCases"] is first["testCases"]
+    assert third["sourceArtifactVersion"] == 2
+    assert third["testCases"] is not first["testCases"]
+    assert third["testCases"] == first["testCases"]
+
+
+@pytest.mark.slow
+def test_benchmark_handoff_candidates_with_warm_artifact_data_cache(app):
+    run = _create_story_breakdown_run()
+
+    def list_with_cold_cache():
+        reset_artifact_data_cache()
+        list_story_handoff_candidates(run.id)
+
+    cold_ms = average_ms(list_with_cold_cache, 50)
+    list_story_handoff_candidates(run.id)
+    warm_ms = average_ms(lambda: list_story_handoff_candidates(run.id), 50)
+
+    assert_faster(
+        warm_ms,
+        cold_ms,
+        label=f"story handoff candidates, warm vs cold cache "
+        f"({get_artifact_data_cache().stats()})",
+    )
@@ -8,12 +8,17 @@ from agent_contracts import validate_artifact_visual_blocks
 from artifact_data_renderer_base import StrictArtifactDataModel, render_compact_metadata
 from artifact_data_renderers import (
     ARTIFACT_DATA_RENDERERS,
+    build_artifact_stream_validator,
     get_artifact_render_plan_business_section_ids,
     get_artifact_render_plan_stage_keys,
     render_available_artifact_data,
     render_complete_artifact_data,
 )
-from artifact_render_plan import ArtifactRenderPlan, ArtifactSectionSpec
+from artifact_render_plan import (
+    ArtifactRenderPlan,
+    ArtifactSectionSpec,
+    ArtifactStreamValidator,
+)
 from agent_contracts import REQUIRED_ARTIFACT_HEADINGS, WORKFLOW_STAGES
 from test_artifact_data_renderers import (
     ARTIFACT_DATA_STAGE_FIXTURES,
@@ -933,6 +938,79 @@ def test_invalid_visual_section_is_withheld_without_blocking_later_section():
     assert "## After" in rendered.markdown
 
 
+def test_stream_validator_rejects_invalid_visual_section_once_its_fields_close():
+    plan = ArtifactRenderPlan(
+        model=_VisualIsolationArtifactData,
+        title=lambda _data: "# Visual isolation probe",
+        title_dependencies=(),
+        sections=(
+            ArtifactSectionSpec(
+                section_id="invalid-visual",
+                dependencies=("invalid_visual",),
+                render=lambda data: (
+                    "## Invalid visual\n\n```ai4se-visual\n"
+                    f"{data.invalid_visual}\n```"
+                ),
+            ),
+        ),
+    )
+    validator = ArtifactStreamValidator(plan)
+
+    validator.check({"before": "stable"})
+    with pytest.raises(ValueError, match="must contain valid JSON"):
+        validator.check({"before": "stable", "invalid_visual": "{not-json}"})
+
+
+@pytest.mark.parametrize(
+    ("workflow_id", "stage_id", "fixture"),
+    [
+        (workflow_id, stage_id, fixture)
+        for (workflow_id, stage_id), fixture in sorted(
+            ARTIFACT_DATA_STAGE_FIXTURES.items()
+        )
+    ],
+)
+def test_stream_validator_accepts_every_stage_fixture_field_by_field(
+    workflow_id: str,
+    stage_id: str,
+    fixture: dict,
+):
+    validator = build_artifact_stream_validator(
+        workflow_id=workflow_id,
+        current_stage_id=stage_id,
+    )
+    partial: dict = {}
+
+    assert validator is not None
+    for field_name, value in fixture.items():
+        partial[field_name] = copy.deepcopy(value)
+        validator.check(partial)
+
+
+def test_stream_validator_fails_a_closed_field_like_the_complete_render():
+    fixture = copy.deepcopy(VALID_REQ_REVIEW_ARTIFACT_DATA)
+    first_field = next(iter(fixture))
+    fixture[first_field] = []
+    validator = build_artifact_stream_validator(
+        workflow_id="REQ_REVIEW",
+        current_stage_id="REVIEW",
+    )
+
+    with pytest.raises(ValidationError) as streamed:
+        validator.check({first_field: fixture[first_field]})
+    with pytest.raises(ValidationError) as complete:
+        render_complete_artifact_data(
+            fixture,
+            workflow_id="REQ_REVIEW",
+            current_stage_id="REVIEW",
+        )
+
+    assert streamed.value.title == complete.value.title
+    assert [error["loc"] for error in streamed.value.errors()] == [
+        error["loc"] for error in complete.value.errors()
+    ]
+
+
 def test_available_projection_reuses_derived_case_statistics_for_rendering():
     fixture = copy.deepcopy(VALID_CASES_ARTIFACT_DATA)
     fixture.pop("case_statistics")
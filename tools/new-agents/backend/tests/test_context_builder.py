@@ -101,7 +101,7 @@ def test_bound_request_exclusion_keeps_prior_stage_supplement_when_truncated(app
         context = build_run_context(
             run.id,
             "BOUND-REQUEST-CANARY-002",
-            max_chars=1350,
+            max_tokens=1250,
             exclude_message_sequence=bound_request.user_message_sequence,
         )
 
@@ -137,7 +137,7 @@ def test_build_run_context_prompt_truncates_oldest_context_when_over_budget(app)
         append_run_message(run.id, "user", "旧消息" * 20)
         append_run_message(run.id, "assistant", "新回复")
 
-        prompt = build_run_context_prompt(run.id, "当前输入", max_chars=80)
+        prompt = build_run_context_prompt(run.id, "当前输入", max_tokens=50)
 
     assert "旧消息" not in prompt
     assert "新回复" in prompt
@@ -151,12 +151,59 @@ def test_build_run_context_reports_context_truncation_warning(app):
         append_run_message(run.id, "user", "旧消息" * 20)
         append_run_message(run.id, "assistant", "新回复")
 
-        context = build_run_context(run.id, "当前输入", max_chars=80)
+        context = build_run_context(run.id, "当前输入", max_tokens=50)
 
     assert context.prompt.endswith("[用户]\n当前输入")
     assert context.warnings == ["context_truncated"]
 
 
+def test_build_run_context_budgets_in_tokens_not_characters(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        append_run_message(run.id, "assistant", "login flow " * 40)
+        append_run_message(run.id, "assistant", "新回复")
+
+        context = build_run_context(run.id, "当前输入", max_tokens=150)
+        truncated = build_run_context(run.id, "当前输入", max_tokens=60)
+
+    assert len(context.prompt) > 400
+    assert context.warnings == []
+    assert "login flow" in context.prompt
+    assert 0 < context.token_count <= 150
+    assert truncated.warnings == ["context_truncated"]
+    assert "login flow" not in truncated.prompt
+    assert truncated.token_count <= 60
+
+
+def test_build_run_context_uses_the_given_token_counter(app):
+    class CharacterCounter:
+        name = "characters"
+
+        def __init__(self):
+            self.texts = []
+
+        def count(self, text):
+            self.texts.append(text)
+            return len(text)
+
+    counter = CharacterCounter()
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        append_run_message(run.id, "assistant", "login flow " * 40)
+        append_run_message(run.id, "assistant", "新回复")
+
+        context = build_run_context(
+            run.id,
+            "当前输入",
+            max_tokens=150,
+            token_counter=counter,
+        )
+
+    assert context.warnings == ["context_truncated"]
+    assert "[助手]\n新回复" in counter.texts
+    assert context.token_count <= 150
+
+
 def test_build_run_context_prompt_includes_current_artifact_summaries(app):
     with app.app_context():
         run = create_agent_run("TEST_DESIGN", "lisa", "STRATEGY")
@@ -233,7 +280,7 @@ def test_build_run_context_reports_warning_when_artifact_summary_exceeds_budget(
         )
         append_run_message(run.id, "assistant", "最新助手回复")
 
-        context = build_run_context(run.id, "当前输入", max_chars=80)
+        context = build_run_context(run.id, "当前输入", max_tokens=50)
 
     assert context.prompt.endswith("[用户]\n当前输入")
     assert context.warnings == ["context_truncated"]
@@ -0,0 +1,331 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import create_app
+from benchmarks import assert_faster, average_ms
+from context_builder import build_run_context
+from context_summary_format import (
+    MESSAGE_RANGE_SUMMARY_TYPE,
+    SUMMARY_SOURCE_MESSAGE_HISTORY,
+)
+from history_compaction import (
+    HistoryCompactionError,
+    HistoryCompactor,
+    compact_run_history,
+    compactable_message_ranges,
+    get_history_compactor,
+)
+from models import AgentContextSummary, db
+from run_persistence import append_run_message, create_agent_run, get_run_snapshot
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+class _RecordingSummarizer:
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, first, last, transcript):
+        with self._lock:
+            self.calls.append((first, last, transcript))
+        if self.error is not None:
+            raise self.error
+        return f"- 消息 {first}-{last} 的摘要"
+
+
+def _create_run(message_count: int) -> str:
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    for sequence in range(1, message_count + 1):
+        role = "user" if sequence % 2 else "assistant"
+        append_run_message(
+            run.id,
+            role,
+            f"第 {sequence} 条消息：登录流程需要覆盖短信验证码异常分支。" * 4,
+            _commit=False,
+            _summarize_user=False,
+        )
+    db.session.commit()
+    return run.id
+
+
+def _range_summaries(run_id):
+    return [
+        (summary.source_stage_id, summary.content)
+        for summary in AgentContextSummary.query.filter_by(
+            run_id=run_id,
+            source_type=SUMMARY_SOURCE_MESSAGE_HISTORY,
+            summary_type=MESSAGE_RANGE_SUMMARY_TYPE,
+        ).order_by(AgentContextSummary.id)
+    ]
+
+
+def test_compactable_ranges_are_aligned_and_skip_the_recent_window():
+    assert compactable_message_ranges(31) == []
+    assert compactable_message_ranges(32) == [(1, 20)]
+    assert compactable_message_ranges(
+        45,
+        keep_recent_messages=12,
+        range_messages=10,
+    ) == [(1, 10), (11, 20), (21, 30)]
+
+
+def test_compaction_stores_each_range_once(app):
+    summarizer = _RecordingSummarizer()
+    run_id = _create_run(45)
+
+    first = compact_run_history(
+        run_id,
+        summarize=summarizer,
+        keep_recent_messages=12,
+        range_messages=10,
+    )
+    second = compact_run_history(
+        run_id,
+        summarize=summarizer,
+        keep_recent_messages=12,
+        range_messages=10,
+    )
+
+    assert (first, second) == (3, 0)
+    assert [call[:2] for call in summarizer.calls] == [(1, 10), (11, 20), (21, 30)]
+    assert "[用户]\n第 1 条消息" in summarizer.calls[0][2]
+    assert "第 11 条消息" not in summarizer.calls[0][2]
+    assert _range_summaries(run_id) == [
+        ("1-10", "- 消息 1-10 的摘要"),
+        ("11-20", "- 消息 11-20 的摘要"),
+        ("21-30", "- 消息 21-30 的摘要"),
+    ]
+
+
+def test_compaction_skips_control_feedback(app):
+    summarizer = _RecordingSummarizer()
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    append_run_message(run.id, "user", "需求一", _summarize_user=False)
+    append_run_message(run.id, "assistant", "**Error:** LLM_ERROR")
+    for index in range(4):
+        append_run_message(run.id, "assistant", f"回复 {index}")
+
+    compact_run_history(
+        run.id,
+        summarize=summarizer,
+        keep_recent_messages=2,
+        range_messages=4,
+    )
+
+    assert len(summarizer.calls) == 1
+    assert "需求一" in summarizer.calls[0][2]
+    assert "LLM_ERROR" not in summarizer.calls[0][2]
+
+
+def test_long_ranges_are_split_into_chunks_that_fit_the_transcript_limit(
+    app, monkeypatch
+):
+    monkeypatch.setattr("history_compaction.MAX_TRANSCRIPT_CHARS", 350)
+    summarizer = _RecordingSummarizer()
+    run_id = _create_run(22)
+
+    compacted = compact_run_history(
+        run_id,
+        summarize=summarizer,
+        keep_recent_messages=12,
+        range_messages=10,
+    )
+
+    ranges = [call[:2] for call in summarizer.calls]
+    assert compacted == len(ranges) > 1
+    assert ranges[0][0] == 1 and ranges[-1][1] == 10
+    assert all(
+        previous[1] + 1 == current[0] for previous, current in zip(ranges, ranges[1:])
+    )
+    assert all(len(call[2]) <= 350 for call in summarizer.calls)
+    for first, last, transcript in summarizer.calls:
+        assert f"第 {first} 条消息" in transcript
+        assert f"第 {last} 条消息" in transcript
+    assert compact_run_history(
+        run_id,
+        summarize=summarizer,
+        keep_recent_messages=12,
+        range_messages=10,
+    ) == 0
+    assert len(summarizer.calls) == compacted
+
+    context = build_run_context(run_id, "当前输入", max_tokens=10**6)
+    assert "第 1 条消息" not in context.prompt
+    for first, last in ranges:
+        assert f"[历史对话摘要: 消息 {first}-{last}]" in context.prompt
+
+
+def test_message_longer_than_the_transcript_limit_stays_raw(app, monkeypatch):
+    monkeypatch.setattr("history_compaction.MAX_TRANSCRIPT_CHARS", 350)
+    summarizer = _RecordingSummarizer()
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    append_run_message(run.id, "user", "需求一", _summarize_user=False)
+    append_run_message(run.id, "assistant", "超长回复" * 200)
+    for index in range(4):
+        append_run_message(run.id, "assistant", f"回复 {index}")
+
+    compact_run_history(
+        run.id,
+        summarize=summarizer,
+        keep_recent_messages=2,
+        range_messages=4,
+    )
+
+    assert [call[:2] for call in summarizer.calls] == [(1, 1), (3, 4)]
+    assert _range_summaries(run.id) == [
+        ("1-1", "- 消息 1-1 的摘要"),
+        ("2-2", ""),
+        ("3-4", "- 消息 3-4 的摘要"),
+    ]
+    context = build_run_context(run.id, "当前输入", max_tokens=10**6)
+    assert "超长回复" in context.prompt
+    assert "需求一" not in context.prompt
+
+
+def test_ranges_with_nothing_to_summarize_are_marked_done(app):
+    summarizer = _RecordingSummarizer()
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    for _ in range(4):
+        append_run_message(run.id, "assistant", "**Error:** LLM_ERROR")
+    append_run_message(run.id, "assistant", "回复")
+
+    for _ in range(2):
+        assert compact_run_history(
+            run.id,
+            summarize=summarizer,
+            keep_recent_messages=1,
+            range_messages=4,
+        ) == 0
+
+    assert summarizer.calls == []
+    assert _range_summaries(run.id) == [("1-4", "")]
+    assert build_run_context(run.id, "当前输入").prompt
+    snapshot = get_run_snapshot(run.id)
+    assert snapshot["contextSummaries"] == []
+
+
+def test_context_prefers_range_summaries_over_raw_messages(app):
+    run_id = _create_run(45)
+    compact_run_history(
+        run_id,
+        summarize=_RecordingSummarizer(),
+        keep_recent_messages=12,
+        range_messages=10,
+    )
+
+    context = build_run_context(run_id, "当前输入", max_tokens=10**6)
+
+    assert "第 1 条消息" not in context.prompt
+    assert "第 30 条消息" not in context.prompt
+    assert "第 31 条消息" in context.prompt
+    assert context.prompt.index("[历史对话摘要: 消息 1-10]\n- 消息 1-10 的摘要") < (
+        context.prompt.index("[历史对话摘要: 消息 21-30]")
+    )
+    assert context.prompt.index("[历史对话摘要: 消息 21-30]") < (
+        context.prompt.index("第 31 条消息")
+    )
+
+
+def test_failed_summaries_are_retried_on_the_next_job(app):
+    run_id = _create_run(32)
+    compactor = HistoryCompactor(
+        summarize=_RecordingSummarizer(HistoryCompactionError("provider down"))
+    )
+    compactor.enqueue(run_id)
+    compactor.flush()
+
+    assert _range_summaries(run_id) == []
+    assert compactor.stats()["failed"] == 1
+
+    compactor.summarize = _RecordingSummarizer()
+    compactor.enqueue(run_id)
+    compactor.flush()
+
+    assert [key for key, _ in _range_summaries(run_id)] == ["1-20"]
+    stats = compactor.stats()
+    assert stats["completed"] == 2
+    assert stats["compactedRanges"] == 1
+    compactor.close()
+
+
+def test_queue_is_bounded_and_holds_one_job_per_run(app):
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_summarizer(first, last, transcript):
+        started.set()
+        release.wait(5)
+        return "摘要"
+
+    run_ids = [_create_run(32) for _ in range(3)]
+    compactor = HistoryCompactor(max_queue=1, summarize=blocking_summarizer)
+
+    assert compactor.enqueue(run_ids[0]) is True
+    assert started.wait(5)
+    assert compactor.enqueue(run_ids[1]) is True
+    assert compactor.enqueue(run_ids[1]) is True
+    assert compactor.enqueue(run_ids[2]) is False
+    release.set()
+    compactor.flush()
+
+    stats = compactor.stats()
+    assert stats["dropped"] == 1
+    assert stats["queued"] == 2
+    assert stats["compactedRanges"] == 2
+    assert _range_summaries(run_ids[2]) == []
+    compactor.close()
+
+
+def test_background_compaction_is_opt_in(monkeypatch):
+    monkeypatch.delenv("HISTORY_COMPACTION_ENABLED", raising=False)
+    assert get_history_compactor() is None
+
+    monkeypatch.setenv("HISTORY_COMPACTION_ENABLED", "true")
+    compactor = get_history_compactor()
+    assert isinstance(compactor, HistoryCompactor)
+    assert get_history_compactor() is compactor
+
+
+@pytest.mark.slow
+def test_benchmark_compaction_shrinks_long_run_context(app):
+    llm_delay = 0.05
+    run_id = _create_run(400)
+
+    def slow_summarizer(first, last, transcript):
+        time.sleep(llm_delay)
+        return f"- 消息 {first}-{last}：登录流程需要覆盖短信验证码异常分支。"
+
+    raw = build_run_context(run_id, "当前输入", max_tokens=10**7)
+    compactor = HistoryCompactor(summarize=slow_summarizer)
+    enqueue_ms = average_ms(lambda: compactor.enqueue(run_id))
+    compactor.flush()
+    compacted = build_run_context(run_id, "当前输入", max_tokens=10**7)
+    compactor.close()
+
+    assert_faster(enqueue_ms, llm_delay * 1000, label="enqueue vs one LLM call")
+    assert compacted.token_count * 4 < raw.token_count, (
+        compactor.stats(),
+        raw.token_count,
+        compacted.token_count,
+    )
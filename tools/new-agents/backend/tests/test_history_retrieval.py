@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import create_app
+from benchmarks import assert_faster, average_ms
+from context_builder import build_run_context
+from history_retrieval import (
+    HistoryIndex,
+    HistoryIndexRegistry,
+    get_history_index,
+    tokenize_for_retrieval,
+)
+from models import db
+from run_persistence import append_run_message, create_agent_run
+
+PLANTED_FACT = "支付回调必须校验签名，并支持每季度一次的密钥轮换。"
+FILLER_TOPICS = [
+    "登录页面需要支持短信验证码和图形验证码两种方式。",
+    "订单列表按创建时间倒序展示，每页二十条记录。",
+    "购物车数量变化时需要实时刷新商品总价。",
+    "个人中心允许用户修改昵称、头像和收货地址。",
+    "搜索结果支持按价格区间和销量排序筛选。",
+]
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _create_long_run(turns: int, *, planted_turn: int = 0) -> str:
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    for turn in range(turns):
+        topic = FILLER_TOPICS[turn % len(FILLER_TOPICS)]
+        assistant_content = f"第 {turn} 轮分析：{topic}" * 3
+        if turn == planted_turn:
+            assistant_content = f"第 {turn} 轮分析：{PLANTED_FACT}"
+        append_run_message(
+            run.id,
+            "assistant",
+            assistant_content,
+            _commit=False,
+        )
+    db.session.commit()
+    return run.id
+
+
+def test_tokenizer_splits_ascii_words_and_cjk_bigrams():
+    assert tokenize_for_retrieval("Login-Flow v2：支付回调") == [
+        "login",
+        "flow",
+        "v2",
+        "支付",
+        "付回",
+        "回调",
+    ]
+    assert tokenize_for_retrieval("改") == ["改"]
+
+
+def test_index_ranks_matching_blocks_first():
+    index = HistoryIndex()
+    blocks = [
+        "[助手]\n" + PLANTED_FACT,
+        "[助手]\n" + FILLER_TOPICS[0],
+        "[助手]\n" + FILLER_TOPICS[1],
+    ]
+    index.sync(blocks)
+
+    scores = index.scores("回调签名的密钥轮换怎么测？", blocks)
+
+    assert scores[0] > 0
+    assert scores[1] == scores[2] == 0
+    assert index.scores("", blocks) == [0.0, 0.0, 0.0]
+
+
+def test_index_sync_only_tokenizes_new_blocks_and_drops_stale_ones():
+    index = HistoryIndex()
+    index.sync(["first", "second"])
+    index.sync(["first", "second", "third"])
+
+    assert index.stats() == {"documents": 3, "tokenizedBlocks": 3}
+
+    index.sync(["second", "third"])
+
+    assert index.stats() == {"documents": 2, "tokenizedBlocks": 3}
+    assert index.scores("first", ["first"]) == [0.0]
+
+
+def test_registry_keeps_the_most_recently_used_runs():
+    registry = HistoryIndexRegistry(max_runs=2)
+    first = registry.get("run-1")
+    registry.get("run-2")
+    registry.get("run-1")
+    registry.get("run-3")
+
+    assert registry.get("run-1") is first
+    assert registry.stats()["runs"] == 2
+
+
+def test_truncated_context_keeps_relevant_older_blocks(app):
+    with app.app_context():
+        run_id = _create_long_run(12)
+
+        context = build_run_context(
+            run_id,
+            "回调签名的密钥轮换要怎么测试？",
+            max_tokens=450,
+        )
+
+    assert context.warnings == ["context_truncated"]
+    assert PLANTED_FACT in context.prompt
+    assert all(f"第 {turn} 轮分析" in context.prompt for turn in range(8, 12))
+    assert "第 7 轮分析" not in context.prompt
+    assert context.token_count <= 450
+    assert context.prompt.index(PLANTED_FACT) < context.prompt.index("第 11 轮分析")
+
+
+@pytest.mark.slow
+def test_benchmark_history_retrieval_on_a_long_run(app):
+    budget = 2000
+    prompt = "回调签名的密钥轮换要怎么测试？"
+    with app.app_context():
+        run_id = _create_long_run(400, planted_turn=7)
+
+        contexts = []
+
+        def build_context():
+            contexts.append(build_run_context(run_id, prompt, max_tokens=budget))
+
+        cold_ms = average_ms(build_context)
+        cold_tokenized = get_history_index(run_id).stats()["tokenizedBlocks"]
+
+        append_run_message(run_id, "assistant", "第 400 轮分析：补充说明。")
+        warm_ms = average_ms(build_context)
+        history_stats = get_history_index(run_id).stats()
+
+        untruncated = build_run_context(run_id, prompt, max_tokens=10**7)
+
+    cold, warm = contexts
+    assert_faster(
+        warm_ms,
+        cold_ms,
+        label=f"warm vs cold retrieval over {history_stats['documents']} blocks",
+    )
+    assert PLANTED_FACT in cold.prompt
+    assert PLANTED_FACT in warm.prompt
+    assert warm.token_count <= budget < untruncated.token_count
+    assert history_stats["tokenizedBlocks"] == cold_tokenized + 1
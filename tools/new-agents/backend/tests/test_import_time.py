@@ -0,0 +1,42 @@
+import pytest
+
+from import_time_report import (
+    DEFERRED_MODULES,
+    IMPORT_TIME_BUDGET_MS,
+    measure_import_time,
+    parse_importtime,
+)
+
+SAMPLE_IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      2000 |       2500 |     openai.types
+import time:       300 |       2800 |   openai
+unrelated warning line
+import time:      1000 |       4000 | routes
+"""
+
+
+def test_parse_importtime_reads_timings_and_nesting():
+    timings = parse_importtime(SAMPLE_IMPORTTIME)
+
+    assert [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings] == [
+        ("_io", 120, 120, 1),
+        ("openai.types", 2000, 2500, 2),
+        ("openai", 300, 2800, 1),
+        ("routes", 1000, 4000, 0),
+    ]
+
+
+def test_import_routes_defers_heavy_sdks_and_renderer_models():
+    report = measure_import_time("routes", env={"FLASK_TESTING": "1"})
+
+    assert "routes" in report.modules
+    assert [package for package in DEFERRED_MODULES if report.loaded(package)] == []
+
+
+@pytest.mark.slow
+def test_benchmark_import_routes_within_budget():
+    report = measure_import_time("routes", env={"FLASK_TESTING": "1"})
+
+    assert report.total_ms < IMPORT_TIME_BUDGET_MS, report.format(10)
@@ -9,6 +9,7 @@ from llm_client import (
     extract_finish_reason,
     stream_chat_completion_content,
 )
+from provider_admission import ProviderLimits
 
 
 class MockDelta:
@@ -50,7 +51,7 @@ class MockUsageChunk:
         self.usage = MockUsage(total_tokens)
 
 
-@patch("llm_client.OpenAI")
+@patch("openai.OpenAI")
 def test_stream_chat_completion_content_calls_openai_and_yields_content(
     mock_openai: MagicMock,
 ) -> None:
@@ -88,7 +89,7 @@ def test_stream_chat_completion_content_calls_openai_and_yields_content(
     )
 
 
-@patch("llm_client.OpenAI")
+@patch("openai.OpenAI")
 def test_stream_chat_completion_content_reports_usage_when_callback_is_supplied(
     mock_openai: MagicMock,
 ) -> None:
@@ -123,7 +124,7 @@ def test_stream_chat_completion_content_reports_usage_when_callback_is_supplied(
     )
 
 
-@patch("llm_client.OpenAI")
+@patch("openai.OpenAI")
 def test_stream_chat_completion_content_reports_safe_finish_reason_and_token_limit(
     mock_openai: MagicMock,
 ) -> None:
@@ -163,7 +164,7 @@ def test_extract_finish_reason_projects_unknown_provider_value() -> None:
     assert extract_finish_reason(MockChunk(None, "provider-secret-reason")) == "unknown"
 
 
-@patch("llm_client.OpenAI")
+@patch("openai.OpenAI")
 def test_stream_chat_completion_content_wraps_base_openai_errors(
     mock_openai: MagicMock,
 ) -> None:
@@ -189,3 +190,103 @@ def test_extract_delta_content_rejects_malformed_stream_chunk() -> None:
         extract_delta_content("not a stream chunk")
 
     assert str(exc_info.value) == "LLM stream chunk missing choices"
+
+
+@patch("openai.OpenAI")
+def test_stream_chat_completion_content_closes_the_response_when_abandoned(
+    mock_openai: MagicMock,
+) -> None:
+    stream = MagicMock()
+    stream.__iter__.return_value = iter([MockChunk("a"), MockChunk("b")])
+    mock_client = MagicMock()
+    mock_openai.return_value = mock_client
+    mock_client.chat.completions.create.return_value = stream
+
+    chunks = stream_chat_completion_content(
+        api_key="test-api-key",
+        base_url="https://api.test.com/v1",
+        model="test-model",
+        messages=[{"role": "user", "content": "Hi"}],
+        temperature=0,
+    )
+    assert next(chunks) == "a"
+    chunks.close()
+
+    stream.close.assert_called_once_with()
+
+
+class RecordingSlot:
+    wait_ms = 0
+
+    def __init__(self) -> None:
+        self.charged = False
+        self.charges: list[int] = []
+        self.released = False
+
+    def charge_tokens(self, tokens: int) -> None:
+        self.charged = True
+        self.charges.append(tokens)
+
+    def release(self) -> None:
+        self.released = True
+
+
+def _admitted_stream(
+    monkeypatch: pytest.MonkeyPatch,
+    mock_openai: MagicMock,
+    chunks: list,
+    slot: RecordingSlot,
+):
+    mock_client = MagicMock()
+    mock_openai.return_value = mock_client
+    mock_client.chat.completions.create.return_value = chunks
+    admission = MagicMock()
+    admission.acquire.return_value = slot
+    monkeypatch.setattr("llm_client.get_provider_admission", lambda: admission)
+    return stream_chat_completion_content(
+        api_key="test-api-key",
+        base_url="https://api.test.com/v1",
+        model="test-model",
+        messages=[{"role": "system", "content": "x" * 40}],
+        temperature=0,
+        limits=ProviderLimits(tokens_per_minute=6000),
+    )
+
+
+@patch("openai.OpenAI")
+def test_stream_chat_completion_content_charges_reported_usage_once(
+    mock_openai: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    slot = RecordingSlot()
+    chunks = _admitted_stream(
+        monkeypatch,
+        mock_openai,
+        [MockChunk("abcd"), MockUsageChunk(42)],
+        slot,
+    )
+
+    assert list(chunks) == ["abcd"]
+    assert slot.charges == [42]
+    assert slot.released
+
+
+@patch("openai.OpenAI")
+def test_stream_chat_completion_content_charges_an_estimate_when_cancelled(
+    mock_openai: MagicMock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    slot = RecordingSlot()
+    chunks = _admitted_stream(
+        monkeypatch,
+        mock_openai,
+        [MockChunk("abcd"), MockChunk("efgh"), MockUsageChunk(42)],
+        slot,
+    )
+
+    assert next(chunks) == "abcd"
+    chunks.close()
+
+    # 40 system characters and 4 streamed ones at four characters a token.
+    assert slot.charges == [11]
+    assert slot.released
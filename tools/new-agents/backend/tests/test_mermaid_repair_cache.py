@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import create_app
+from benchmarks import assert_faster, average_ms
+from mermaid_repair_cache import (
+    MermaidRepairCache,
+    mermaid_repair_cache_key,
+    normalize_mermaid_code,
+)
+from mermaid_repair_service import MermaidRepairError
+from models import AgentMermaidRepairCacheEntry, db
+from request_schemas import MermaidRepairRequest
+from run_persistence import get_runtime_observability_summary
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _request(broken_code="graph TD\n  A-->", error_message="Syntax Error", **extra):
+    return MermaidRepairRequest.model_validate(
+        {"brokenCode": broken_code, "errorMessage": error_message, **extra}
+    )
+
+
+class _CountingRepair:
+    def __init__(self, repaired_code="graph TD\n  A-->B", delay=0.0):
+        self.repaired_code = repaired_code
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self.repaired_code
+
+
+def test_cache_key_ignores_line_endings_and_trailing_whitespace():
+    assert normalize_mermaid_code("\r\ngraph TD  \r\n  A-->\r\n\r\n") == "graph TD\n  A-->"
+    assert mermaid_repair_cache_key(
+        "graph TD\r\n  A--> \n", " Syntax Error\n", "model-a"
+    ) == mermaid_repair_cache_key("graph TD\n  A-->", "Syntax Error", "model-a")
+    assert mermaid_repair_cache_key(
+        "graph TD\n  A-->", "Syntax Error", "model-a"
+    ) != mermaid_repair_cache_key("graph TD\n  A-->", "Syntax Error", "model-b")
+    assert mermaid_repair_cache_key(
+        "graph TD\n  A-->", "Syntax Error", "model-a"
+    ) != mermaid_repair_cache_key("graph TD\n  A-->", "Lexical Error", "model-a")
+    assert mermaid_repair_cache_key(
+        "graph TD\n  A-->", "Syntax Error", "model-a", 0
+    ) != mermaid_repair_cache_key("graph TD\n  A-->", "Syntax Error", "model-a", 1)
+    assert mermaid_repair_cache_key(
+        "graph TD\n  A-->", "Syntax Error", "model-a", 0
+    ) != mermaid_repair_cache_key("graph TD\n  A-->", "Syntax Error", "model-a")
+
+
+def test_repeated_repair_is_served_from_the_database(app):
+    cache = MermaidRepairCache()
+    repair = _CountingRepair()
+
+    first = cache.get_or_repair(_request(blockIndex=0), model_name="m", repair=repair)
+    second = cache.get_or_repair(
+        _request(broken_code="graph TD\r\n  A--> \r\n", blockIndex=0),
+        model_name="m",
+        repair=repair,
+    )
+    other_block = cache.get_or_repair(_request(blockIndex=3), model_name="m", repair=repair)
+    other_model = cache.get_or_repair(
+        _request(blockIndex=0), model_name="other", repair=repair
+    )
+
+    assert first == second == other_block == other_model == "graph TD\n  A-->B"
+    assert repair.calls == 3
+    entries = AgentMermaidRepairCacheEntry.query.order_by(
+        AgentMermaidRepairCacheEntry.id
+    ).all()
+    assert [(entry.model_name, entry.hit_count) for entry in entries] == [
+        ("m", 1),
+        ("m", 0),
+        ("other", 0),
+    ]
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["entries"] == 3
+    assert stats["hitRate"] == pytest.approx(1 / 4, abs=1e-4)
+
+
+def test_expired_entries_are_repaired_again(app):
+    cache = MermaidRepairCache(ttl_seconds=60)
+    repair = _CountingRepair()
+    cache.get_or_repair(_request(), model_name="m", repair=repair)
+
+    entry = AgentMermaidRepairCacheEntry.query.one()
+    entry.expires_at = entry.expires_at - timedelta(seconds=120)
+    db.session.commit()
+    cache.get_or_repair(_request(), model_name="m", repair=repair)
+
+    assert repair.calls == 2
+    assert AgentMermaidRepairCacheEntry.query.count() == 1
+
+
+def test_table_is_trimmed_to_the_most_recently_used_entries(app):
+    cache = MermaidRepairCache(max_entries=2)
+    repair = _CountingRepair()
+
+    cache.get_or_repair(_request(error_message="e1"), model_name="m", repair=repair)
+    cache.get_or_repair(_request(error_message="e2"), model_name="m", repair=repair)
+    time.sleep(0.01)
+    cache.get_or_repair(_request(error_message="e1"), model_name="m", repair=repair)
+    cache.get_or_repair(_request(error_message="e3"), model_name="m", repair=repair)
+
+    assert AgentMermaidRepairCacheEntry.query.count() == 2
+    assert cache.stats()["evictions"] == 1
+    cache.get_or_repair(_request(error_message="e1"), model_name="m", repair=repair)
+    assert repair.calls == 3
+
+
+def test_failed_repairs_are_not_cached(app):
+    cache = MermaidRepairCache()
+
+    def failing_repair():
+        raise MermaidRepairError("Mermaid repair returned empty code")
+
+    with pytest.raises(MermaidRepairError):
+        cache.get_or_repair(_request(), model_name="m", repair=failing_repair)
+
+    assert AgentMermaidRepairCacheEntry.query.count() == 0
+    assert cache.stats()["inFlight"] == 0
+
+
+def test_repairs_failing_validation_are_not_cached(app):
+    cache = MermaidRepairCache()
+    repair = _CountingRepair()
+
+    def reject(code):
+        raise MermaidRepairError("Mermaid repair artifact contract validation failed")
+
+    for _ in range(2):
+        with pytest.raises(MermaidRepairError, match="contract validation failed"):
+            cache.get_or_repair(_request(), model_name="m", repair=repair, validate=reject)
+
+    assert repair.calls == 2
+    assert AgentMermaidRepairCacheEntry.query.count() == 0
+    assert cache.get_or_repair(
+        _request(), model_name="m", repair=repair, validate=lambda code: None
+    ) == "graph TD\n  A-->B"
+    assert AgentMermaidRepairCacheEntry.query.count() == 1
+
+
+def test_cached_repairs_are_validated_against_each_caller(app):
+    cache = MermaidRepairCache()
+    repair = _CountingRepair()
+    cache.get_or_repair(_request(), model_name="m", repair=repair)
+
+    def reject(code):
+        raise MermaidRepairError("Mermaid repair artifact contract validation failed")
+
+    with pytest.raises(MermaidRepairError):
+        cache.get_or_repair(_request(), model_name="m", repair=repair, validate=reject)
+
+    assert repair.calls == 1
+    assert AgentMermaidRepairCacheEntry.query.count() == 1
+
+
+def _concurrent_repairs(app, cache, repair, count, request=None):
+    request = request or _request()
+    results = [None] * count
+    errors = [None] * count
+    barrier = threading.Barrier(count)
+
+    def worker(index):
+        with app.app_context():
+            barrier.wait()
+            try:
+                results[index] = cache.get_or_repair(
+                    request, model_name="m", repair=repair
+                )
+            except MermaidRepairError as e:
+                errors[index] = e
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+
+def test_concurrent_identical_repairs_share_one_llm_call(app):
+    cache = MermaidRepairCache()
+    repair = _CountingRepair(delay=0.2)
+
+    results, errors = _concurrent_repairs(app, cache, repair, 6)
+
+    assert errors == [None] * 6
+    assert results == ["graph TD\n  A-->B"] * 6
+    assert repair.calls == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] + stats["coalesced"] == 5
+
+
+def test_concurrent_requests_share_the_leader_failure(app):
+    cache = MermaidRepairCache()
+    calls = []
+
+    def failing_repair():
+        calls.append(1)
+        time.sleep(0.2)
+        raise MermaidRepairError("OpenAI unavailable")
+
+    results, errors = _concurrent_repairs(app, cache, failing_repair, 4)
+
+    assert results == [None] * 4
+    assert all(str(error) == "OpenAI unavailable" for error in errors)
+    assert len(calls) == 1
+
+
+def test_observability_summary_reports_mermaid_repair_hit_rate(app, monkeypatch):
+    import mermaid_repair_cache
+
+    cache = MermaidRepairCache()
+    monkeypatch.setattr(mermaid_repair_cache, "_cache", cache)
+    repair = _CountingRepair()
+    for _ in range(4):
+        cache.get_or_repair(_request(), model_name="m", repair=repair)
+
+    summary = get_runtime_observability_summary(limit=5)
+
+    assert summary["mermaidRepairCache"]["hits"] == 3
+    assert summary["mermaidRepairCache"]["misses"] == 1
+    assert summary["mermaidRepairCache"]["hitRate"] == 0.75
+    assert summary["mermaidRepairCache"]["entries"] == 1
+
+
+@pytest.mark.slow
+def test_benchmark_repeated_and_concurrent_repairs_against_llm_latency(app):
+    llm_delay = 0.05
+    rounds = 20
+
+    uncached_ms = average_ms(_CountingRepair(delay=llm_delay), rounds)
+    cache = MermaidRepairCache()
+    repair = _CountingRepair(delay=llm_delay)
+    cache.get_or_repair(_request(), model_name="m", repair=repair)
+    cached_ms = average_ms(
+        lambda: cache.get_or_repair(_request(), model_name="m", repair=repair),
+        rounds,
+    )
+
+    coalesced_repair = _CountingRepair(delay=llm_delay * 4)
+    concurrent_ms = average_ms(
+        lambda: _concurrent_repairs(
+            app,
+            MermaidRepairCache(),
+            coalesced_repair,
+            8,
+            request=_request(error_message="Parse error on line 2"),
+        )
+    )
+
+    assert repair.calls == 1
+    assert coalesced_repair.calls == 1
+    assert_faster(cached_ms, uncached_ms, factor=5, label="cached vs uncached repair")
+    # Eight identical concurrent repairs wait for one LLM call, not eight.
+    assert_faster(
+        concurrent_ms,
+        llm_delay * 4 * 1000 * 8,
+        factor=2,
+        label="8 concurrent identical repairs vs 8 LLM calls",
+    )
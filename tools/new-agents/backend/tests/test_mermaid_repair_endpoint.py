@@ -11,6 +11,7 @@ from agent_contracts import (
 )
 from app import create_app
 from models import LlmConfig, db
+from provider_admission import ProviderLimits
 
 
 @pytest.fixture
@@ -147,6 +148,7 @@ def test_mermaid_repair_returns_typed_json_response(
         "api_key": "test-api-key",
         "base_url": "https://api.test.com/v1",
         "model_name": "test-model",
+        "limits": ProviderLimits(),
     }
 
 
@@ -222,19 +224,46 @@ def test_mermaid_repair_rejects_candidate_when_artifact_contract_fails(
 ) -> None:
     mock_repair.return_value = "flowchart TD\n  A-->B"
     current_artifact = _complete_contract_markdown("TEST_DESIGN", "STRATEGY")
+    payload = {
+        "brokenCode": "quadrantChart\n  title broken",
+        "errorMessage": "Syntax Error",
+        "blockIndex": 0,
+        "workflowId": "TEST_DESIGN",
+        "stageId": "STRATEGY",
+        "currentArtifact": current_artifact,
+    }
 
-    response = client.post(
-        "/api/utils/mermaid/repair",
-        json={
-            "brokenCode": "quadrantChart\n  title broken",
-            "errorMessage": "Syntax Error",
-            "blockIndex": 0,
-            "workflowId": "TEST_DESIGN",
-            "stageId": "STRATEGY",
-            "currentArtifact": current_artifact,
-        },
-    )
+    response = client.post("/api/utils/mermaid/repair", json=payload)
 
     assert response.status_code == 502
     assert "artifact contract" in response.json["error"]
     assert "missing required artifact visualizations" in response.json["error"]
+
+    mock_repair.return_value = "quadrantChart\n  title 修复后的风险矩阵"
+    retry = client.post("/api/utils/mermaid/repair", json=payload)
+
+    assert retry.status_code == 200
+    assert mock_repair.call_count == 2
+
+
+@patch("routes.repair_mermaid_code")
+def test_mermaid_repair_serves_repeated_requests_from_cache(
+    mock_repair,
+    client,
+    default_config,
+) -> None:
+    mock_repair.return_value = "graph TD\n  A-->B"
+    payload = {
+        "brokenCode": "graph TD\n  A-->",
+        "errorMessage": "Syntax Error",
+        "blockIndex": 0,
+    }
+
+    first = client.post("/api/utils/mermaid/repair", json=payload)
+    second = client.post(
+        "/api/utils/mermaid/repair",
+        json={**payload, "brokenCode": "graph TD\r\n  A-->\r\n"},
+    )
+
+    assert first.json == second.json == {"repairedCode": "graph TD\n  A-->B"}
+    assert mock_repair.call_count == 1
@@ -0,0 +1,208 @@
+import os
+import time
+
+import pytest
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import create_app
+from benchmarks import assert_faster, average_ms
+from metrics_sink import MetricsSink
+from models import AgentRunTurnMetric, AgentRuntimeConfigIssue, db
+from run_persistence import (
+    AgentRunPersistence,
+    build_turn_metric_row,
+    create_agent_run,
+    enqueue_runtime_config_issue,
+    get_runtime_observability_summary,
+    record_turn_metric,
+)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _metric_kwargs(run_id: str, **overrides) -> dict:
+    return {
+        "run_id": run_id,
+        "workflow_id": "TEST_DESIGN",
+        "stage_id": "CLARIFY",
+        "model_name": "deepseek-chat",
+        "provider": "deepseek",
+        "status": "error",
+        "error_code": "LLM_ERROR",
+        "duration_ms": 1200,
+        "input_chars": 80,
+        "output_chars": 0,
+        "estimated_tokens": 20,
+        "contract_retry_count": 0,
+        **overrides,
+    }
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_sink_buffers_rows_until_flush_and_writes_them_in_order(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    sink = MetricsSink(flush_size=100, flush_interval=60)
+
+    for duration_ms in (10, 20, 30):
+        assert sink.enqueue(
+            AgentRunTurnMetric,
+            build_turn_metric_row(**_metric_kwargs(run.id, duration_ms=duration_ms)),
+        )
+
+    assert AgentRunTurnMetric.query.count() == 0
+    assert sink.flush() == 3
+    assert [
+        metric.duration_ms
+        for metric in AgentRunTurnMetric.query.order_by(AgentRunTurnMetric.id)
+    ] == [10, 20, 30]
+    assert sink.stats() == {"pending": 0, "written": 3, "dropped": 0, "failed": 0}
+    sink.close()
+
+
+def test_sink_worker_flushes_on_size_threshold(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    sink = MetricsSink(flush_size=2, flush_interval=60)
+
+    sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+    sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+
+    assert _wait_until(lambda: sink.stats()["written"] == 2)
+    sink.close()
+
+
+def test_sink_worker_flushes_on_time_threshold(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    sink = MetricsSink(flush_size=100, flush_interval=0.05)
+
+    sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+
+    assert _wait_until(lambda: sink.stats()["written"] == 1)
+    sink.close()
+
+
+def test_sink_drops_rows_beyond_the_buffer_bound_and_drains_on_close(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    sink = MetricsSink(max_buffer=2, flush_size=100, flush_interval=60)
+
+    accepted = [
+        sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+        for _ in range(3)
+    ]
+    sink.close()
+
+    assert accepted == [True, True, False]
+    assert sink.stats() == {"pending": 0, "written": 2, "dropped": 1, "failed": 0}
+    assert AgentRunTurnMetric.query.count() == 2
+    assert sink.enqueue(
+        AgentRunTurnMetric,
+        build_turn_metric_row(**_metric_kwargs(run.id)),
+    ) is False
+
+
+def test_sink_isolates_rows_the_database_rejects(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    sink = MetricsSink(flush_size=100, flush_interval=60)
+    invalid_row = build_turn_metric_row(**_metric_kwargs(run.id))
+    invalid_row["model"] = None
+
+    sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+    sink.enqueue(AgentRunTurnMetric, invalid_row)
+    sink.enqueue(AgentRunTurnMetric, build_turn_metric_row(**_metric_kwargs(run.id)))
+
+    assert sink.flush() == 2
+    assert sink.stats()["failed"] == 1
+    assert AgentRunTurnMetric.query.count() == 2
+    sink.close()
+
+
+def test_failure_metrics_and_config_issues_reach_the_observability_summary(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    persistence = AgentRunPersistence()
+
+    persistence.record_turn_metric(
+        **_metric_kwargs(
+            run.id,
+            error_code="SCHEMA_VALIDATION_FAILED",
+            diagnostic={
+                "phase": "structured_output",
+                "fieldPath": "artifact_data.requirement_facts.0.fact",
+                "validator": "string_too_short",
+                "publicReason": "模型输出的结构化字段未通过校验，右侧产出物已保持不变。",
+                "retryable": True,
+            },
+        )
+    )
+    assert enqueue_runtime_config_issue(
+        workflow_id="TEST_DESIGN",
+        stage_id="CLARIFY",
+        error_code="DEFAULT_LLM_CONFIG_MISSING",
+        issue_scope="default_llm_config",
+        route="/api/agent/runs/stream",
+        request_id="req-1",
+    )
+    with pytest.raises(ValueError, match="未知 workflowId"):
+        enqueue_runtime_config_issue(
+            workflow_id="UNKNOWN",
+            stage_id="CLARIFY",
+            error_code="DEFAULT_LLM_CONFIG_MISSING",
+            issue_scope="default_llm_config",
+            route="/api/agent/runs/stream",
+            request_id="req-2",
+        )
+
+    summary = get_runtime_observability_summary(limit=5)
+
+    assert summary["totals"]["turns"] == 2
+    assert summary["totals"]["failedTurns"] == 2
+    assert summary["recentTurns"][0]["diagnostic"]["validator"] == "string_too_short"
+    assert AgentRuntimeConfigIssue.query.one().request_id == "req-1"
+    assert summary["metricsSink"]["pending"] == 0
+    assert summary["metricsSink"]["written"] == 2
+
+
+@pytest.mark.slow
+def test_benchmark_failure_metric_enqueue_against_synchronous_commit(app):
+    run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+    rounds = 200
+    sink = MetricsSink(flush_size=100, flush_interval=60)
+
+    commit_ms = average_ms(lambda: record_turn_metric(**_metric_kwargs(run.id)), rounds)
+    enqueue_ms = average_ms(
+        lambda: sink.enqueue(
+            AgentRunTurnMetric,
+            build_turn_metric_row(**_metric_kwargs(run.id)),
+        ),
+        rounds,
+    )
+    sink.close()
+
+    assert AgentRunTurnMetric.query.count() == rounds * 2
+    assert_faster(
+        enqueue_ms,
+        commit_ms,
+        factor=5,
+        label="failure-path metric enqueue vs commit per row",
+    )
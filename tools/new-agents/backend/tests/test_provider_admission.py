@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from fake_llm_provider import FakeLlmProvider
+from llm_client import stream_chat_completion_content
+from provider_admission import (
+    ProviderBusyError,
+    ProviderLimits,
+    ProviderScheduler,
+    get_provider_admission,
+    provider_admission_key,
+)
+
+
+def _wait_until(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_scheduler_admits_waiting_callers_in_arrival_order():
+    scheduler = ProviderScheduler("p", ProviderLimits(max_concurrency=1))
+    held = scheduler.acquire()
+    order = []
+
+    def wait_for_slot(name: str) -> None:
+        slot = scheduler.acquire()
+        order.append(name)
+        slot.release()
+
+    threads = []
+    for index, name in enumerate(["first", "second", "third"]):
+        thread = threading.Thread(target=wait_for_slot, args=(name,))
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda: scheduler.stats()["queued"] == index + 1)
+    held.release()
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert order == ["first", "second", "third"]
+    stats = scheduler.stats()
+    assert stats["admitted"] == 4
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
+
+
+def test_scheduler_rejects_callers_when_queue_is_full():
+    scheduler = ProviderScheduler("p", ProviderLimits(max_concurrency=1, queue_size=0))
+    held = scheduler.acquire()
+
+    with pytest.raises(ProviderBusyError) as exc_info:
+        scheduler.acquire()
+
+    assert exc_info.value.reason == "queue_full"
+    assert exc_info.value.provider_key == "p"
+    assert scheduler.stats()["rejected"] == 1
+    held.release()
+    scheduler.acquire().release()
+
+
+def test_scheduler_times_out_callers_that_wait_too_long():
+    scheduler = ProviderScheduler(
+        "p",
+        ProviderLimits(max_concurrency=1, queue_timeout_seconds=0.05),
+    )
+    held = scheduler.acquire()
+
+    with pytest.raises(ProviderBusyError) as exc_info:
+        scheduler.acquire()
+
+    held.release()
+    assert exc_info.value.reason == "queue_timeout"
+    assert exc_info.value.wait_ms >= 50
+    assert scheduler.stats()["timedOut"] == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_scheduler_delays_admission_while_token_bucket_is_in_debt():
+    # 6000 tokens a minute refill 100 tokens every second.
+    scheduler = ProviderScheduler("p", ProviderLimits(tokens_per_minute=6000))
+    slot = scheduler.acquire()
+    slot.charge_tokens(6010)
+    slot.release()
+
+    started_at = time.monotonic()
+    scheduler.acquire().release()
+
+    assert time.monotonic() - started_at >= 0.08
+
+
+def test_scheduler_applies_changed_limits_to_waiting_callers():
+    scheduler = ProviderScheduler("p", ProviderLimits(max_concurrency=1))
+    held = scheduler.acquire()
+    admitted = threading.Event()
+
+    def wait_for_slot() -> None:
+        scheduler.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=wait_for_slot)
+    thread.start()
+    _wait_until(lambda: scheduler.stats()["queued"] == 1)
+    scheduler.configure(ProviderLimits(max_concurrency=2))
+
+    assert admitted.wait(timeout=2)
+    thread.join(timeout=2)
+    assert scheduler.stats()["active"] == 2
+    assert scheduler.stats()["maxConcurrency"] == 2
+    held.release()
+
+
+def test_admission_shares_one_scheduler_per_provider_url():
+    admission = get_provider_admission()
+    limits = ProviderLimits(max_concurrency=1)
+
+    assert admission.scheduler("https://p.example/v1/", limits) is (
+        admission.scheduler("https://p.example/v1", limits)
+    )
+    assert provider_admission_key(None) == "default"
+    assert [stats["provider"] for stats in admission.stats()] == [
+        "https://p.example/v1"
+    ]
+
+
+def test_admission_keeps_one_scheduler_per_provider_credential():
+    admission = get_provider_admission()
+    limits = ProviderLimits(max_concurrency=1)
+
+    first = admission.scheduler("https://p.example/v1", limits, "sk-first")
+    second = admission.scheduler("https://p.example/v1", limits, "sk-second")
+
+    assert first is not second
+    assert first is admission.scheduler("https://p.example/v1/", limits, "sk-first")
+    credentials = [stats["credential"] for stats in admission.stats()]
+    assert len(set(credentials)) == 2
+    assert all(len(credential) == 12 for credential in credentials)
+    assert "sk-first" not in credentials
+
+
+def test_changed_rate_limits_do_not_refill_the_bucket():
+    admission = get_provider_admission()
+    admitted = 0
+    for index in range(20):
+        limits = ProviderLimits(
+            requests_per_minute=2 + index % 2,
+            queue_timeout_seconds=0,
+        )
+        try:
+            admission.acquire("https://p.example/v1", limits, "sk-shared").release()
+        except ProviderBusyError:
+            continue
+        admitted += 1
+
+    assert admitted <= 3
+
+
+def test_admission_keeps_concurrent_completions_within_provider_limit():
+    with FakeLlmProvider(latency_seconds=0.05, max_concurrency=2) as provider:
+        queue_waits = []
+
+        def complete() -> str:
+            return "".join(
+                stream_chat_completion_content(
+                    api_key="sk-test",
+                    base_url=provider.base_url,
+                    model="fake-model",
+                    messages=[{"role": "user", "content": "hi"}],
+                    temperature=0,
+                    limits=ProviderLimits(max_concurrency=2),
+                    on_queue_wait=queue_waits.append,
+                )
+            )
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            replies = list(executor.map(lambda _: complete(), range(6)))
+
+    assert replies == ["ok"] * 6
+    assert provider.rejected == 0
+    assert provider.peak_in_flight <= 2
+    assert len(queue_waits) == 6
+    assert max(queue_waits) >= 50
+    [stats] = get_provider_admission().stats()
+    assert stats["admitted"] == 6
+    assert stats["active"] == 0
+
+
+def test_unlimited_completions_reach_the_provider_unqueued():
+    with FakeLlmProvider(latency_seconds=0.05, max_concurrency=2) as provider:
+
+        def complete() -> str:
+            return "".join(
+                stream_chat_completion_content(
+                    api_key="sk-test",
+                    base_url=provider.base_url,
+                    model="fake-model",
+                    messages=[{"role": "user", "content": "hi"}],
+                    temperature=0,
+                    limits=ProviderLimits(),
+                )
+            )
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(complete) for _ in range(4)]
+            for future in futures:
+                future.exception()
+
+    assert provider.peak_in_flight > 2
+    assert provider.rejected > 0
+    assert get_provider_admission().stats() == []
@@ -0,0 +1,361 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+from app import create_app
+from fake_llm_provider import FakeLlmProvider
+from llm_client import LlmClientError
+from models import AgentRun, AgentRunTurnMetric, LlmConfig, db
+from provider_admission import ProviderBusyError
+from provider_routing import (
+    COOLDOWN_AFTER_FAILURES,
+    ProviderRouter,
+    ProviderTarget,
+    get_provider_router,
+    stream_with_failover,
+)
+from run_persistence import (
+    create_agent_run,
+    get_runtime_observability_summary,
+    load_provider_routing_samples,
+    record_turn_metric,
+)
+from test_artifact_data_renderers import VALID_CLARIFY_ARTIFACT_DATA
+
+CLARIFY_REPLY = json.dumps(
+    {
+        "chat": "我已整理登录需求澄清基线，请确认右侧文档。",
+        "artifact_data": VALID_CLARIFY_ARTIFACT_DATA,
+        "stage_action": None,
+        "warnings": [],
+    },
+    ensure_ascii=False,
+)
+
+
+def _target(config_key: str, base_url: str) -> ProviderTarget:
+    return ProviderTarget(
+        config_key=config_key,
+        api_key="sk-test",
+        base_url=base_url,
+        model_name="fake-model",
+    )
+
+
+PRIMARY = _target("default", "https://primary.example/v1")
+BACKUP = _target("backup", "https://backup.example/v1")
+
+
+def _failing_stream(error: Exception):
+    raise error
+    yield
+
+
+def test_router_keeps_config_order_until_providers_are_observed():
+    assert ProviderRouter().rank([PRIMARY, BACKUP]) == (PRIMARY, BACKUP)
+
+
+def test_router_prefers_faster_first_tokens_weighted_by_error_rate():
+    router = ProviderRouter()
+    router.record_first_token("default", 250)
+    router.record_first_token("backup", 200)
+
+    assert router.rank([PRIMARY, BACKUP]) == (BACKUP, PRIMARY)
+
+    for _ in range(2):
+        router.record_failure("backup")
+        router.record_first_token("backup", 200)
+
+    # The backup's faster first tokens no longer make up for its failures.
+    assert router.rank([PRIMARY, BACKUP]) == (PRIMARY, BACKUP)
+
+
+def test_router_keeps_a_pinned_target_first_until_it_cools_down():
+    router = ProviderRouter()
+    router.record_first_token("default", 800)
+    router.record_first_token("backup", 200)
+
+    assert router.rank([PRIMARY, BACKUP], pinned_key="default") == (PRIMARY, BACKUP)
+
+    for _ in range(COOLDOWN_AFTER_FAILURES):
+        router.record_failure("default")
+
+    assert router.rank([PRIMARY, BACKUP], pinned_key="default") == (BACKUP, PRIMARY)
+    [backup_stats, primary_stats] = router.stats()
+    assert primary_stats["coolingDown"] is True
+    assert primary_stats["failures"] == COOLDOWN_AFTER_FAILURES
+    assert backup_stats["firstTokenMs"] == 200
+
+
+def test_router_seeds_health_once_without_cooling_down():
+    router = ProviderRouter()
+    router.seed([("default", False, None)] * COOLDOWN_AFTER_FAILURES)
+    router.seed([("backup", False, None)])
+
+    assert router.seeded
+    [primary_stats] = router.stats()
+    assert primary_stats["configKey"] == "default"
+    assert primary_stats["coolingDown"] is False
+    # A config that only ever failed ranks behind an unobserved one.
+    assert router.rank([PRIMARY, BACKUP]) == (BACKUP, PRIMARY)
+
+
+def test_router_seeds_unmeasured_successes_without_a_latency():
+    router = ProviderRouter()
+    router.seed([("default", True, None), ("backup", True, 400)])
+
+    stats = {item["configKey"]: item for item in router.stats()}
+    assert stats["default"]["firstTokenMs"] is None
+    assert stats["default"]["successes"] == 1
+    assert stats["backup"]["firstTokenMs"] == 400
+    # The unmeasured config is tried so it gets a real first-token sample.
+    assert router.rank([BACKUP, PRIMARY]) == (PRIMARY, BACKUP)
+
+
+def test_router_judges_configs_on_the_same_host_separately():
+    cheap = _target("cheap", "https://primary.example/v1")
+    router = ProviderRouter()
+    router.record_first_token("cheap", 150)
+    for _ in range(COOLDOWN_AFTER_FAILURES):
+        router.record_failure("default")
+
+    assert router.rank([PRIMARY, cheap, BACKUP]) == (BACKUP, cheap, PRIMARY)
+    assert [item["configKey"] for item in router.stats()] == ["cheap", "default"]
+
+
+def test_failover_moves_to_next_target_before_first_token():
+    router = ProviderRouter()
+    routed = []
+
+    def open_target(target):
+        if target is PRIMARY:
+            return _failing_stream(LlmClientError("primary failed"))
+        return iter(["{", "}"])
+
+    chunks = list(
+        stream_with_failover(
+            [PRIMARY, BACKUP],
+            open_target,
+            router=router,
+            on_route=lambda target, first_token_ms: routed.append(target),
+        )
+    )
+
+    assert chunks == ["{", "}"]
+    assert routed == [BACKUP]
+    assert [
+        (item["configKey"], item["successes"], item["failures"])
+        for item in router.stats()
+    ] == [("backup", 1, 0), ("default", 0, 1)]
+
+
+def test_failover_never_replays_a_stream_that_already_emitted_tokens():
+    router = ProviderRouter()
+    opened = []
+
+    def open_target(target):
+        opened.append(target)
+
+        def stream():
+            yield "{"
+            raise LlmClientError("connection dropped")
+
+        return stream()
+
+    stream = stream_with_failover([PRIMARY, BACKUP], open_target, router=router)
+
+    assert next(stream) == "{"
+    with pytest.raises(LlmClientError):
+        next(stream)
+    assert opened == [PRIMARY]
+
+
+def test_failover_does_not_count_admission_back_pressure_against_provider():
+    router = ProviderRouter()
+
+    def open_target(target):
+        return _failing_stream(ProviderBusyError(target.provider, "queue_full", 0))
+
+    with pytest.raises(ProviderBusyError):
+        list(stream_with_failover([PRIMARY, BACKUP], open_target, router=router))
+
+    assert router.stats() == []
+
+
+@pytest.fixture
+def app():
+    db_fd, db_path = tempfile.mkstemp()
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def _add_configs(app, primary: FakeLlmProvider, backup: FakeLlmProvider) -> None:
+    # Both fakes listen on the loopback interface; distinct host names keep
+    # them apart as providers.
+    with app.app_context():
+        db.session.add_all(
+            [
+                LlmConfig(
+                    config_key="default",
+                    api_key="sk-primary",
+                    base_url=primary.base_url,
+                    model="fake-model",
+                    model_class="chat",
+                ),
+                LlmConfig(
+                    config_key="backup",
+                    api_key="sk-backup",
+                    base_url=backup.base_url.replace("127.0.0.1", "localhost"),
+                    model="fake-model",
+                    model_class="chat",
+                ),
+            ]
+        )
+        db.session.commit()
+
+
+def _run_turn(client, request_id: str, run_id: str | None = None) -> str:
+    body = {
+        "prompt": "用户需求: 登录功能",
+        "systemPrompt": "你是 Lisa 测试专家。",
+        "workflowId": "TEST_DESIGN",
+        "stageId": "CLARIFY",
+        "requestId": request_id,
+    }
+    if run_id is not None:
+        body["runId"] = run_id
+    response = client.post("/api/agent/runs/stream", json=body)
+    payloads = [
+        json.loads(line.removeprefix("data: "))
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith("data: {")
+    ]
+    assert payloads[-1]["type"] == "agent_turn", payloads[-1]
+    return payloads[0]["runId"]
+
+
+def _run_config_key(app, run_id: str) -> str | None:
+    with app.app_context():
+        return db.session.get(AgentRun, run_id).llm_config_key
+
+
+def test_agent_turn_fails_over_to_backup_provider_before_first_token(app):
+    client = app.test_client()
+    with (
+        FakeLlmProvider(status_code=400) as primary,
+        FakeLlmProvider(reply=CLARIFY_REPLY) as backup,
+    ):
+        _add_configs(app, primary, backup)
+        run_id = _run_turn(client, "failover-001")
+
+    assert primary.requests == 1
+    assert backup.requests == 1
+    assert _run_config_key(app, run_id) == "backup"
+    with app.app_context():
+        [metric] = AgentRunTurnMetric.query.all()
+        summary = get_runtime_observability_summary()
+    assert metric.status == "success"
+    assert metric.provider == "localhost"
+    assert metric.first_token_ms > 0
+    assert metric.llm_config_key == "backup"
+    assert [
+        (item["configKey"], item["successes"], item["failures"])
+        for item in summary["providerRouting"]
+    ] == [("backup", 1, 0), ("default", 0, 1)]
+
+
+def test_agent_turn_skips_backup_whose_key_collides_with_a_service_credential(
+    app,
+    monkeypatch,
+):
+    monkeypatch.setenv("NEW_AGENTS_CONFIG_ADMIN_API_KEY", "sk-backup")
+    client = app.test_client()
+    with (
+        FakeLlmProvider(reply=CLARIFY_REPLY) as primary,
+        FakeLlmProvider(reply=CLARIFY_REPLY) as backup,
+    ):
+        _add_configs(app, primary, backup)
+        run_id = _run_turn(client, "collision-001")
+
+    assert primary.requests == 1
+    assert backup.requests == 0
+    assert _run_config_key(app, run_id) == "default"
+
+
+def test_agent_turns_route_to_faster_provider_and_stick_per_run(app):
+    client = app.test_client()
+    with (
+        FakeLlmProvider(reply=CLARIFY_REPLY, latency_seconds=0.3) as slow,
+        FakeLlmProvider(reply=CLARIFY_REPLY, latency_seconds=0.01) as fast,
+    ):
+        _add_configs(app, slow, fast)
+        # The first turn has no observations and keeps the config order.
+        sticky_run_id = _run_turn(client, "route-001")
+        # The next one tries the unobserved provider once.
+        explore_run_id = _run_turn(client, "route-002")
+        # From then on new runs go to the faster provider ...
+        routed_run_id = _run_turn(client, "route-003")
+        # ... while an existing run stays where it started.
+        _run_turn(client, "route-004", run_id=sticky_run_id)
+
+    assert (slow.requests, fast.requests) == (2, 2)
+    assert _run_config_key(app, sticky_run_id) == "default"
+    assert _run_config_key(app, explore_run_id) == "backup"
+    assert _run_config_key(app, routed_run_id) == "backup"
+    with app.app_context():
+        summary = get_runtime_observability_summary()
+    health = {item["configKey"]: item for item in summary["providerRouting"]}
+    assert health["default"]["firstTokenMs"] >= 300
+    assert health["backup"]["firstTokenMs"] < health["default"]["firstTokenMs"]
+    by_provider = {item["provider"]: item for item in summary["byProvider"]}
+    assert by_provider["127.0.0.1"]["turns"] == 2
+    assert by_provider["localhost"]["avgFirstTokenMs"] > 0
+
+
+def test_routing_samples_come_from_recent_turn_metrics(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY", model="m")
+        for config_key, status, error_code, first_token_ms in [
+            ("default", "success", None, 0),
+            ("default", "error", "LLM_ERROR", 0),
+            ("backup", "success", None, 120),
+            ("backup", "error", "SCHEMA_VALIDATION_FAILED", 90),
+            (None, "success", None, 80),
+        ]:
+            record_turn_metric(
+                run_id=run.id,
+                workflow_id="TEST_DESIGN",
+                stage_id="CLARIFY",
+                model_name="m",
+                provider="deepseek",
+                llm_config_key=config_key,
+                status=status,
+                error_code=error_code,
+                duration_ms=500,
+                input_chars=1,
+                output_chars=1,
+                estimated_tokens=1,
+                contract_retry_count=0,
+                first_token_ms=first_token_ms,
+            )
+
+        assert load_provider_routing_samples() == [
+            ("default", True, None),
+            ("default", False, None),
+            ("backup", True, 120),
+        ]
+        assert get_provider_router().stats() == []
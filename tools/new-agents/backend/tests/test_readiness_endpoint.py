@@ -66,6 +66,6 @@ def test_readiness_stream_is_unbuffered_typed_sse(client):
     assert response.headers["Cache-Control"] == "no-cache"
     assert response.headers["X-Accel-Buffering"] == "no"
     assert response.get_data(as_text=True) == (
-        'data: {"type": "run_started", "runId": "readiness"}\n\n'
+        'id: 1\ndata: {"type": "run_started", "runId": "readiness"}\n\n'
         "data: [DONE]\n\n"
     )
@@ -331,3 +331,23 @@ def test_parse_mermaid_repair_request_rejects_non_object_json(payload: object) -
         parse_mermaid_repair_request(payload)  # type: ignore[arg-type]
 
     assert str(exc_info.value) == "请求体必须是 JSON 对象"
+
+
+def test_parse_agent_run_stream_request_negotiates_delta_protocol() -> None:
+    base = {
+        "prompt": "用户需求",
+        "systemPrompt": "你是 Lisa。",
+        "workflowId": "TEST_DESIGN",
+        "stageId": "CLARIFY",
+        "requestId": "req-delta",
+    }
+
+    assert parse_agent_run_stream_request(base).delta_protocol == "full"
+    assert (
+        parse_agent_run_stream_request(
+            {**base, "deltaProtocol": "compact"}
+        ).delta_protocol
+        == "compact"
+    )
+    with pytest.raises(RequestValidationError, match="deltaProtocol"):
+        parse_agent_run_stream_request({**base, "deltaProtocol": "gzip"})
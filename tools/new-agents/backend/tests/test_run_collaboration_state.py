@@ -7,8 +7,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 from run_collaboration_state import (
     audit_event_snapshot,
+    build_collaboration_audit_event,
     build_collaboration_state_models,
     comment_snapshot,
+    diff_collaboration_state,
     section_lock_snapshot,
 )
 
@@ -17,7 +19,6 @@ def test_build_collaboration_state_models_preserves_api_snapshot_shape():
     state = build_collaboration_state_models(
         run_id="run-1",
         workflow_id="TEST_DESIGN",
-        current_stage_id="CLARIFY",
         patch={
             "comments": [
                 {
@@ -49,7 +50,6 @@ def test_build_collaboration_state_models_preserves_api_snapshot_shape():
                 }
             ],
         },
-        created_at_ms=1710000000999,
     )
 
     assert [comment_snapshot(comment) for comment in state.comments] == [
@@ -81,12 +81,7 @@ def test_build_collaboration_state_models_preserves_api_snapshot_shape():
             "createdAt": 1710000000100,
         }
     ]
-    assert audit_event_snapshot(state.audit_event) == {
-        "stageId": "CLARIFY",
-        "eventType": "collaboration_updated",
-        "summary": "更新了 CLARIFY 阶段协作状态：1 条批注，1 个章节锁",
-        "createdAt": 1710000000999,
-    }
+    assert state.expected_revision is None
 
 
 def test_build_collaboration_state_models_rejects_stage_outside_workflow():
@@ -97,7 +92,6 @@ def test_build_collaboration_state_models_rejects_stage_outside_workflow():
         build_collaboration_state_models(
             run_id="run-1",
             workflow_id="TEST_DESIGN",
-            current_stage_id="CLARIFY",
             patch={
                 "comments": [
                     {
@@ -110,5 +104,136 @@ def test_build_collaboration_state_models_rejects_stage_outside_workflow():
                 ],
                 "sectionLocks": [],
             },
+        )
+
+
+def _comment_payload(comment_id: str, content: str = "需要确认登录边界。") -> dict:
+    return {
+        "id": comment_id,
+        "stageId": "CLARIFY",
+        "content": content,
+        "artifactExcerpt": "登录边界",
+        "createdAt": 1710000000000,
+    }
+
+
+def _lock_payload(lock_id: str) -> dict:
+    return {
+        "id": lock_id,
+        "stageId": "CLARIFY",
+        "heading": "## 业务规则",
+        "content": "## 业务规则\n\n已确认登录规则。",
+        "createdAt": 1710000000100,
+    }
+
+
+def _stored_state(patch: dict):
+    state = build_collaboration_state_models(
+        run_id="run-1",
+        workflow_id="TEST_DESIGN",
+        patch=patch,
+    )
+    for row_id, row in enumerate(state.comments + state.section_locks, start=1):
+        row.id = row_id
+    return state
+
+
+def test_diff_collaboration_state_touches_only_changed_rows():
+    stored = _stored_state(
+        {
+            "comments": [
+                _comment_payload("comment-1"),
+                _comment_payload("comment-2"),
+                _comment_payload("comment-3"),
+            ],
+            "sectionLocks": [_lock_payload("lock-1")],
+        }
+    )
+    desired = build_collaboration_state_models(
+        run_id="run-1",
+        workflow_id="TEST_DESIGN",
+        patch={
+            "comments": [
+                _comment_payload("comment-1"),
+                _comment_payload("comment-2", content="已补充异常登录边界。"),
+                _comment_payload("comment-4"),
+            ],
+            "sectionLocks": [_lock_payload("lock-1")],
+            "expectedRevision": 3,
+        },
+    )
+
+    delta = diff_collaboration_state(
+        existing_comments=stored.comments,
+        existing_section_locks=stored.section_locks,
+        desired=desired,
+    )
+
+    assert desired.expected_revision == 3
+    assert [comment.client_id for comment in delta.comments.added] == ["comment-4"]
+    assert delta.comments.updated == [stored.comments[1]]
+    assert stored.comments[1].content == "已补充异常登录边界。"
+    assert delta.comments.deleted_ids == [3]
+    assert not delta.section_locks.has_changes
+    assert audit_event_snapshot(
+        build_collaboration_audit_event(
+            run_id="run-1",
+            current_stage_id="CLARIFY",
+            delta=delta,
             created_at_ms=1710000000999,
         )
+    ) == {
+        "stageId": "CLARIFY",
+        "eventType": "collaboration_updated",
+        "summary": "更新了 CLARIFY 阶段协作状态：新增 1 条批注，修改 1 条批注，删除 1 条批注",
+        "createdAt": 1710000000999,
+    }
+
+
+def test_diff_collaboration_state_reports_no_changes_for_identical_state():
+    patch = {
+        "comments": [_comment_payload("comment-1")],
+        "sectionLocks": [_lock_payload("lock-1")],
+    }
+    stored = _stored_state(patch)
+
+    delta = diff_collaboration_state(
+        existing_comments=stored.comments,
+        existing_section_locks=stored.section_locks,
+        desired=build_collaboration_state_models(
+            run_id="run-1",
+            workflow_id="TEST_DESIGN",
+            patch=patch,
+        ),
+    )
+
+    assert not delta.has_changes
+
+
+@pytest.mark.parametrize(
+    ("patch", "message"),
+    [
+        (
+            {
+                "comments": [_comment_payload("comment-1"), _comment_payload("comment-1")],
+                "sectionLocks": [],
+            },
+            "comments 中 id 重复: comment-1",
+        ),
+        (
+            {"comments": [], "sectionLocks": [], "expectedRevision": -1},
+            "expectedRevision 必须是非负整数",
+        ),
+        (
+            {"comments": [], "sectionLocks": [], "expectedRevision": True},
+            "expectedRevision 必须是非负整数",
+        ),
+    ],
+)
+def test_build_collaboration_state_models_rejects_invalid_diff_inputs(patch, message):
+    with pytest.raises(ValueError, match=message):
+        build_collaboration_state_models(
+            run_id="run-1",
+            workflow_id="TEST_DESIGN",
+            patch=patch,
+        )
@@ -2,12 +2,14 @@ import os
 import sys
 import tempfile
 import threading
+import time
 import traceback
 from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 
 import pytest
 import run_persistence
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 
@@ -15,8 +17,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 os.environ["FLASK_TESTING"] = "1"
 
 from app import create_app
+from benchmarks import assert_faster
 from models import (
     AgentArtifact,
+    AgentArtifactAuditEvent,
+    AgentArtifactComment,
     AgentArtifactVersion,
     AgentContextSummary,
     AgentMessage,
@@ -26,6 +31,7 @@ from models import (
     db,
 )
 from run_persistence import (
+    CollaborationRevisionConflictError,
     TurnPersistenceError,
     TurnPersistenceConflictError,
     TurnRequestIdentityConflictError,
@@ -265,6 +271,103 @@ def test_persistence_adapter_preserves_claim_semantic_errors(
     assert captured.value is semantic_error
 
 
+def test_runtime_context_uses_the_routed_target_budget(app, monkeypatch):
+    import context_builder
+    from provider_routing import ProviderTarget
+
+    budgets = []
+
+    def capture_budget(run_id, current_prompt, *, max_tokens, **kwargs):
+        budgets.append(max_tokens)
+        return SimpleNamespace(prompt=current_prompt, warnings=[])
+
+    monkeypatch.setattr(context_builder, "build_run_context", capture_budget)
+    with app.app_context():
+        persistence = run_persistence.AgentRunPersistence(
+            context_budget_tokens=8000,
+            model_name="default-model",
+        )
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY", model="default-model")
+        persistence.build_runtime_context(run.id, "hi", request_id="req-budget")
+        for budget in (64000, None):
+            persistence.build_runtime_context(
+                run.id,
+                "hi",
+                request_id="req-budget",
+                target=ProviderTarget(
+                    config_key="backup",
+                    api_key="sk-backup",
+                    base_url="https://backup.test/v1",
+                    model_name="backup-model",
+                    context_budget_tokens=budget,
+                ),
+            )
+
+    assert budgets == [
+        8000,
+        64000,
+        context_builder.DEFAULT_CONTEXT_MAX_TOKENS,
+    ]
+
+
+def test_persistence_adapter_records_turn_db_usage_and_releases_connection(app):
+    with app.app_context():
+        persistence = run_persistence.AgentRunPersistence()
+        agent_request = SimpleNamespace(
+            workflow_id="TEST_DESIGN",
+            stage_id="CLARIFY",
+            run_id=None,
+            request_id="req-db-usage",
+            prompt="请分析登录需求",
+            system_prompt="你是 Lisa。",
+        )
+        run_id = persistence.ensure_run(agent_request, model_name="test-model")
+        claim = persistence.claim_turn_request(
+            run_id,
+            agent_request,
+            model_name="test-model",
+        )
+        persistence.build_runtime_context(
+            run_id,
+            agent_request.prompt,
+            request_id=agent_request.request_id,
+        )
+        persistence.release_connection()
+
+        assert db.engine.pool.checkedout() == 0
+        usage_before_completion = persistence.db_usage.query_count
+        assert usage_before_completion > 0
+
+        persistence.complete_agent_run_turn(
+            run_id,
+            stage_id="CLARIFY",
+            assistant_content="已完成澄清",
+            artifact_content=None,
+            artifact_data=None,
+            request_id=agent_request.request_id,
+            owner_token=claim.owner_token,
+            terminal_event={"type": "agent_turn", "output": {}},
+            metric={
+                "workflow_id": "TEST_DESIGN",
+                "stage_id": "CLARIFY",
+                "model_name": "test-model",
+                "provider": "test-provider",
+                "status": "success",
+                "error_code": None,
+                "duration_ms": 1,
+                "input_chars": 8,
+                "output_chars": 5,
+                "estimated_tokens": 4,
+                "contract_retry_count": 0,
+            },
+        )
+
+        metric = AgentRunTurnMetric.query.filter_by(run_id=run_id).one()
+        assert metric.db_query_count > usage_before_completion
+        assert metric.db_time_ms >= 0
+        assert metric.pool_wait_ms >= 0
+
+
 def test_messages_are_appended_with_stable_sequence(app):
     with app.app_context():
         run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
@@ -1284,14 +1387,13 @@ def test_new_request_fails_closed_on_legacy_expired_ledger_without_deleting_hist
 
 def test_different_request_message_sequence_integrity_error_is_typed_and_atomic(
     app,
-    monkeypatch,
 ):
     with app.app_context():
         run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
         append_run_message(run.id, "user", "已由独立 session 占用的序号")
-        monkeypatch.setattr(
-            run_persistence, "_next_message_sequence", lambda _run_id: 1
-        )
+        # Rewind the maintained counter so the next claim collides on slot 1.
+        db.session.get(AgentRun, run.id).last_message_sequence = 0
+        db.session.commit()
 
         with pytest.raises(TurnPersistenceConflictError):
             claim_agent_run_turn_request(
@@ -1921,6 +2023,68 @@ def test_artifact_versions_increment_per_run_stage(app):
         )
 
 
+def test_run_and_artifact_counters_track_appended_messages_and_versions(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        append_run_message(run.id, "user", "请分析登录需求")
+        append_run_message(run.id, "assistant", "已完成澄清")
+        append_run_message(run.id, "user", "补充密码规则")
+        record_artifact_version(run.id, "CLARIFY", "# 需求分析文档\n初版")
+        record_artifact_version(run.id, "CLARIFY", "# 需求分析文档\n二版")
+
+        run = db.session.get(AgentRun, run.id)
+        artifact = AgentArtifact.query.filter_by(run_id=run.id).one()
+        assert (run.last_message_sequence, run.last_assistant_sequence) == (3, 2)
+        assert artifact.current_version_number == 2
+
+        cloned = clone_agent_run(run.id)
+        append_run_message(cloned.id, "assistant", "继续分析")
+
+        cloned = db.session.get(AgentRun, cloned.id)
+        assert (cloned.last_message_sequence, cloned.last_assistant_sequence) == (4, 4)
+
+
+def test_stale_completion_does_not_advance_run_counters(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        claim = claim_agent_run_turn_request(
+            run.id,
+            request_id="req-counter-stale",
+            stage_id="CLARIFY",
+            user_content="请分析登录需求",
+        )
+        append_run_message(run.id, "assistant", "并发写入的回复")
+
+        with pytest.raises(TurnPersistenceConflictError):
+            complete_agent_run_turn(
+                run.id,
+                request_id="req-counter-stale",
+                owner_token=claim.owner_token,
+                stage_id="CLARIFY",
+                assistant_content="陈旧回复",
+                artifact_content=None,
+                artifact_data=None,
+                terminal_event={"type": "agent_turn", "output": {}},
+                metric={
+                    "workflow_id": "TEST_DESIGN",
+                    "stage_id": "CLARIFY",
+                    "model_name": "test-model",
+                    "provider": "test-provider",
+                    "status": "success",
+                    "error_code": None,
+                    "duration_ms": 1,
+                    "input_chars": 8,
+                    "output_chars": 4,
+                    "estimated_tokens": 3,
+                    "contract_retry_count": 0,
+                },
+            )
+
+        run = db.session.get(AgentRun, run.id)
+        assert (run.last_message_sequence, run.last_assistant_sequence) == (2, 2)
+        assert AgentMessage.query.filter_by(run_id=run.id).count() == 2
+
+
 def test_record_artifact_version_persists_artifact_data_in_current_snapshot(app):
     with app.app_context():
         run = create_agent_run("STORY_BREAKDOWN", "alex", "STORY_BACKLOG")
@@ -2100,9 +2264,109 @@ def test_run_snapshot_returns_artifact_collaboration_state(app):
                 "createdAt": 1710000000100,
             }
         ],
+        "collaborationRevision": 1,
     }
     assert snapshot["artifactComments"] == saved["artifactComments"]
     assert snapshot["artifactSectionLocks"] == saved["artifactSectionLocks"]
+    assert snapshot["collaborationRevision"] == 1
+
+
+def _collaboration_comment(comment_id: str, content: str = "需要确认登录边界。") -> dict:
+    return {
+        "id": comment_id,
+        "stageId": "CLARIFY",
+        "content": content,
+        "artifactExcerpt": "登录边界",
+        "anchorText": None,
+        "createdAt": 1710000000000,
+        "status": "open",
+        "resolvedAt": None,
+        "replies": [
+            {"id": f"{comment_id}-reply", "content": "已补充。", "createdAt": 1710000000100}
+        ],
+    }
+
+
+def test_collaboration_state_save_writes_only_the_delta(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        replace_artifact_collaboration_state(
+            run.id,
+            {
+                "comments": [
+                    _collaboration_comment("comment-1"),
+                    _collaboration_comment("comment-2"),
+                ],
+                "sectionLocks": [],
+            },
+        )
+        row_ids = {
+            comment.client_id: comment.id
+            for comment in AgentArtifactComment.query.filter_by(run_id=run.id)
+        }
+
+        unchanged = replace_artifact_collaboration_state(
+            run.id,
+            {
+                "comments": [
+                    _collaboration_comment("comment-1"),
+                    _collaboration_comment("comment-2"),
+                ],
+                "sectionLocks": [],
+                "expectedRevision": 1,
+            },
+        )
+        changed = replace_artifact_collaboration_state(
+            run.id,
+            {
+                "comments": [
+                    _collaboration_comment("comment-2", content="已确认异常登录边界。"),
+                    _collaboration_comment("comment-3"),
+                ],
+                "sectionLocks": [],
+                "expectedRevision": 1,
+            },
+        )
+        comments = {
+            comment.client_id: comment
+            for comment in AgentArtifactComment.query.filter_by(run_id=run.id)
+        }
+        audit_summaries = [
+            audit_event.summary
+            for audit_event in AgentArtifactAuditEvent.query.order_by(
+                AgentArtifactAuditEvent.id
+            )
+        ]
+
+    assert unchanged["collaborationRevision"] == 1
+    assert changed["collaborationRevision"] == 2
+    assert set(comments) == {"comment-2", "comment-3"}
+    assert comments["comment-2"].id == row_ids["comment-2"]
+    assert comments["comment-2"].content == "已确认异常登录边界。"
+    assert audit_summaries == [
+        "更新了 CLARIFY 阶段协作状态：新增 2 条批注",
+        "更新了 CLARIFY 阶段协作状态：新增 1 条批注，修改 1 条批注，删除 1 条批注",
+    ]
+
+
+def test_collaboration_state_save_rejects_a_stale_revision(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        replace_artifact_collaboration_state(
+            run.id,
+            {"comments": [_collaboration_comment("comment-1")], "sectionLocks": []},
+        )
+
+        with pytest.raises(CollaborationRevisionConflictError) as exc_info:
+            replace_artifact_collaboration_state(
+                run.id,
+                {"comments": [], "sectionLocks": [], "expectedRevision": 0},
+            )
+        snapshot = get_run_snapshot(run.id)
+
+    assert exc_info.value.current_revision == 1
+    assert [comment["id"] for comment in snapshot["artifactComments"]] == ["comment-1"]
+    assert snapshot["collaborationRevision"] == 1
 
 
 def test_clone_fails_closed_on_unresolved_turn_history_without_creating_run(app):
@@ -2590,7 +2854,7 @@ def test_run_snapshot_returns_artifact_audit_events(app):
     assert snapshot["artifactAuditEvents"][1] == {
         "stageId": "CLARIFY",
         "eventType": "collaboration_updated",
-        "summary": "更新了 CLARIFY 阶段协作状态：1 条批注，0 个章节锁",
+        "summary": "更新了 CLARIFY 阶段协作状态：新增 1 条批注",
         "createdAt": snapshot["artifactAuditEvents"][1]["createdAt"],
     }
 
@@ -3135,3 +3399,148 @@ def test_append_message_rejects_unknown_role(app):
 
         with pytest.raises(ValueError, match="未知 message role: system"):
             append_run_message(run.id, "system", "hidden")
+
+
+def _seed_run_history(run_id: str, message_count: int) -> None:
+    db.session.add_all(
+        AgentMessage(
+            run_id=run_id,
+            role="user" if index % 2 else "assistant",
+            content=f"历史消息 {index}",
+            sequence_index=index,
+        )
+        for index in range(1, message_count + 1)
+    )
+    run = db.session.get(AgentRun, run_id)
+    run.last_message_sequence = message_count
+    run.last_assistant_sequence = message_count if message_count % 2 == 0 else (
+        message_count - 1
+    )
+    db.session.commit()
+
+
+@pytest.mark.slow
+def test_benchmark_turn_commit_latency_is_flat_in_run_history_length(app):
+    turns = 40
+    metric = {
+        "workflow_id": "TEST_DESIGN",
+        "stage_id": "CLARIFY",
+        "model_name": "test-model",
+        "provider": "test-provider",
+        "status": "success",
+        "error_code": None,
+        "duration_ms": 1,
+        "input_chars": 8,
+        "output_chars": 8,
+        "estimated_tokens": 4,
+        "contract_retry_count": 0,
+    }
+
+    def measure(history_length: int) -> float:
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        _seed_run_history(run.id, history_length)
+        latencies = []
+        for turn in range(turns):
+            started = time.perf_counter()
+            claim = claim_agent_run_turn_request(
+                run.id,
+                request_id=f"req-bench-{history_length}-{turn}",
+                stage_id="CLARIFY",
+                user_content=f"第 {turn} 轮需求",
+            )
+            complete_agent_run_turn(
+                run.id,
+                request_id=f"req-bench-{history_length}-{turn}",
+                owner_token=claim.owner_token,
+                stage_id="CLARIFY",
+                assistant_content=f"第 {turn} 轮回复",
+                artifact_content=f"# 需求分析文档\n\n第 {turn} 版",
+                artifact_data=None,
+                terminal_event={"type": "agent_turn", "output": {}},
+                metric=metric,
+            )
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return latencies[len(latencies) // 2]
+
+    with app.app_context():
+        measure(10)
+        small = measure(10)
+        large = measure(5000)
+
+    assert_faster(
+        large * 1000,
+        small * 1000,
+        factor=0.5,
+        label=f"claim+complete p50 over {turns} turns, 5000 vs 10 messages",
+    )
+
+
+@pytest.mark.slow
+def test_benchmark_collaboration_autosave_write_amplification(app):
+    comment_count = 300
+    comments = [
+        _collaboration_comment(f"comment-{index}") for index in range(comment_count)
+    ]
+
+    def rows_written(save) -> int:
+        # sqlite3 connections count every row changed by INSERT, UPDATE and
+        # DELETE statements in ``total_changes``.
+        changes_before = {}
+
+        def remember(conn, cursor, statement, parameters, context, executemany):
+            changes_before.setdefault(cursor.connection, cursor.connection.total_changes)
+
+        event.listen(db.engine, "before_cursor_execute", remember)
+        try:
+            save()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", remember)
+        return sum(
+            connection.total_changes - before
+            for connection, before in changes_before.items()
+        )
+
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CLARIFY")
+        replace_artifact_collaboration_state(
+            run.id,
+            {"comments": comments, "sectionLocks": []},
+        )
+
+        def delete_and_reinsert():
+            AgentArtifactComment.query.filter_by(run_id=run.id).delete()
+            db.session.add_all(
+                AgentArtifactComment(
+                    run_id=run.id,
+                    client_id=comment["id"],
+                    stage_id=comment["stageId"],
+                    content=comment["content"],
+                    artifact_excerpt=comment["artifactExcerpt"],
+                    created_at_ms=comment["createdAt"],
+                    status=comment["status"],
+                    replies_json="[]",
+                )
+                for comment in comments
+            )
+            db.session.commit()
+
+        baseline_rows = rows_written(delete_and_reinsert)
+        replace_artifact_collaboration_state(
+            run.id,
+            {"comments": comments, "sectionLocks": []},
+        )
+        edited = [*comments[:-1], _collaboration_comment("comment-edited")]
+
+        def save_edited():
+            replace_artifact_collaboration_state(
+                run.id,
+                {"comments": edited, "sectionLocks": []},
+            )
+
+        diff_rows = rows_written(save_edited)
+        noop_rows = rows_written(save_edited)
+
+    assert baseline_rows == comment_count * 2
+    assert diff_rows <= 4, diff_rows
+    assert noop_rows == 0
@@ -0,0 +1,198 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+os.environ["FLASK_TESTING"] = "1"
+
+from app import SCHEMA_MIGRATION_ENV, create_app, init_db
+from benchmarks import assert_faster, average_ms
+from models import db
+from schema_migrations import (
+    LATEST_SCHEMA_VERSION,
+    MIGRATIONS,
+    SchemaVersionError,
+    check_schema_version,
+    get_schema_version,
+    main,
+    upgrade_schema,
+)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+    )
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _columns(table_name: str) -> set[str]:
+    return {
+        row[1] for row in db.session.execute(text(f"PRAGMA table_info({table_name})"))
+    }
+
+
+def test_migration_versions_are_contiguous():
+    assert [migration.version for migration in MIGRATIONS] == list(
+        range(1, LATEST_SCHEMA_VERSION + 1)
+    )
+
+
+def test_upgrade_creates_schema_and_records_latest_version(app):
+    assert get_schema_version() is None
+
+    applied = upgrade_schema()
+
+    assert applied == list(range(1, LATEST_SCHEMA_VERSION + 1))
+    assert get_schema_version() == LATEST_SCHEMA_VERSION
+    assert check_schema_version() == LATEST_SCHEMA_VERSION
+    assert {"last_message_sequence", "last_assistant_sequence"} <= _columns(
+        "agent_runs"
+    )
+
+
+def test_upgrade_is_idempotent(app):
+    upgrade_schema()
+
+    assert upgrade_schema() == []
+    assert db.session.execute(
+        text("SELECT COUNT(*) FROM agent_schema_version")
+    ).scalar_one() == 1
+
+
+def test_upgrade_applies_only_pending_steps_to_legacy_schema(app):
+    db.create_all()
+    db.session.execute(text("DROP TABLE agent_run_turn_metrics"))
+    db.session.execute(text("""
+        CREATE TABLE agent_run_turn_metrics (
+            id INTEGER PRIMARY KEY,
+            run_id VARCHAR(36) NOT NULL,
+            diagnostic_json TEXT
+        )
+    """))
+    db.session.execute(text(
+        "CREATE TABLE agent_schema_version (version INTEGER NOT NULL)"
+    ))
+    db.session.execute(text("INSERT INTO agent_schema_version (version) VALUES (6)"))
+    db.session.commit()
+
+    with pytest.raises(SchemaVersionError, match="schema_migrations upgrade"):
+        check_schema_version()
+
+    assert upgrade_schema() == list(range(7, LATEST_SCHEMA_VERSION + 1))
+    assert {"db_query_count", "db_time_ms", "pool_wait_ms"} <= _columns(
+        "agent_run_turn_metrics"
+    )
+    assert check_schema_version() == LATEST_SCHEMA_VERSION
+
+
+def test_upgrade_backfills_test_asset_quality_counters(app):
+    db.create_all()
+    db.session.execute(text("DROP TABLE agent_test_asset_collections"))
+    db.session.execute(text("""
+        CREATE TABLE agent_test_asset_collections (
+            id INTEGER PRIMARY KEY,
+            run_id VARCHAR(36) NOT NULL,
+            workflow_id VARCHAR(64) NOT NULL,
+            source_stage_id VARCHAR(64) NOT NULL,
+            source_artifact_version INTEGER NOT NULL,
+            created_at DATETIME,
+            updated_at DATETIME
+        )
+    """))
+    db.session.execute(text(
+        "INSERT INTO agent_test_asset_collections "
+        "(id, run_id, workflow_id, source_stage_id, source_artifact_version) "
+        "VALUES (1, 'run-1', 'TEST_DESIGN', 'CASES', 1)"
+    ))
+    db.session.execute(text(
+        "INSERT INTO agent_test_asset_issues (collection_id, issue_type, message, status) "
+        "VALUES (1, 'missing', '缺少预期', 'pending'), "
+        "(1, 'missing', '缺少数据', 'pending'), "
+        "(1, 'duplicate', '重复用例', 'ignored')"
+    ))
+    db.session.execute(text(
+        "INSERT INTO agent_test_point_assets "
+        "(collection_id, test_point, priority, risk, test_cases_json, status) "
+        "VALUES (1, '登录', 'P0', 'R-1', '[]', '未覆盖'), "
+        "(1, '注册', 'P1', 'R-1', '[]', '已覆盖')"
+    ))
+    db.session.execute(text(
+        "CREATE TABLE agent_schema_version (version INTEGER NOT NULL)"
+    ))
+    db.session.execute(text("INSERT INTO agent_schema_version (version) VALUES (7)"))
+    db.session.commit()
+
+    upgrade_schema()
+
+    counters = db.session.execute(text(
+        "SELECT pending_issue_count, ignored_issue_count, "
+        "uncovered_test_point_count, partial_test_point_count, open_risk_count "
+        "FROM agent_test_asset_collections WHERE id = 1"
+    )).one()
+    assert tuple(counters) == (2, 1, 1, 0, 0)
+
+
+def test_check_rejects_unmigrated_database(app):
+    with pytest.raises(SchemaVersionError, match="version 0"):
+        check_schema_version()
+
+
+def test_create_app_refuses_to_boot_before_upgrade(tmp_path, monkeypatch):
+    monkeypatch.delenv("FLASK_TESTING")
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    }
+
+    with pytest.raises(SchemaVersionError):
+        create_app(config)
+
+    assert main(["upgrade", "--database-url", config["SQLALCHEMY_DATABASE_URI"]]) == 0
+    booted = create_app(config)
+    with booted.app_context():
+        assert get_schema_version() == LATEST_SCHEMA_VERSION
+        db.engine.dispose()
+
+
+def test_migration_entry_point_boots_unmigrated_database(tmp_path, monkeypatch):
+    monkeypatch.delenv("FLASK_TESTING")
+    monkeypatch.setenv(SCHEMA_MIGRATION_ENV, "1")
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'agents.db'}",
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    }
+
+    migration_app = create_app(config)
+    init_db(migration_app)
+
+    with migration_app.app_context():
+        assert get_schema_version() == LATEST_SCHEMA_VERSION
+        db.engine.dispose()
+
+
+@pytest.mark.slow
+def test_benchmark_boot_version_check_against_per_boot_schema_upgrade(app):
+    upgrade_schema()
+
+    def reflect_schema():
+        for migration in MIGRATIONS:
+            migration.upgrade()
+        db.session.commit()
+
+    assert_faster(
+        average_ms(check_schema_version, 20),
+        average_ms(reflect_schema, 20),
+        factor=5,
+        label="boot version check vs create_all + column reflection",
+    )
@@ -0,0 +1,388 @@
+import json
+import time
+
+import pytest
+
+from agent_contracts import ArtifactPatch, ArtifactUpdate, StageAction
+from benchmarks import assert_faster, average_ms
+from sse_delta_protocol import (
+    AgentDeltaCompactor,
+    AgentDeltaReassembler,
+    compact_agent_delta_events,
+    split_artifact_sections,
+)
+from sse_encoder import encode_sse_event
+from sse_response import build_sse_replay_response, build_sse_response
+from sse_schemas import (
+    AgentRetryEvent,
+    AgentTurnCompactDeltaEvent,
+    AgentTurnDeltaEvent,
+    AgentTurnDeltaOutput,
+    AgentTurnEvent,
+    ArtifactDelta,
+    RunStartedEvent,
+)
+
+
+def _delta(chat=None, markdown=None, **kwargs) -> AgentTurnDeltaEvent:
+    return AgentTurnDeltaEvent(
+        output=AgentTurnDeltaOutput(
+            chat=chat,
+            artifact_update=(
+                ArtifactUpdate(type="replace", markdown=markdown)
+                if markdown is not None
+                else None
+            ),
+            **kwargs,
+        )
+    )
+
+
+def _payload(encoded: str) -> dict:
+    return json.loads(encoded.removeprefix("data: ").strip())
+
+
+def test_split_artifact_sections_splits_at_headings_outside_fences():
+    markdown = (
+        "# 文档\n\n前言\n"
+        "## 范围\n\n```python\n# 注释不是标题\n```\n"
+        "## 风险\n\n~~~~\n## 仍在围栏内\n~~~~\n尾部"
+    )
+
+    sections = split_artifact_sections(markdown)
+
+    assert sections == [
+        "# 文档\n\n前言\n",
+        "## 范围\n\n```python\n# 注释不是标题\n```\n",
+        "## 风险\n\n~~~~\n## 仍在围栏内\n~~~~\n尾部",
+    ]
+    assert "".join(sections) == markdown
+    assert split_artifact_sections("") == [""]
+
+
+def test_compactor_sends_first_delta_in_full_then_appends():
+    compactor = AgentDeltaCompactor()
+    first = _delta(chat="我已核对需求", markdown="# 文档\n\n第一段").output
+
+    assert compactor.compact(first) is first
+
+    compact = compactor.compact(
+        _delta(chat="我已核对需求边界。", markdown="# 文档\n\n第一段\n\n第二段").output
+    )
+
+    assert compact.model_dump(mode="json", exclude_none=True, by_alias=True) == {
+        "chat_append": "边界。",
+        "artifact_delta": {"baseRevision": 1, "revision": 2, "append": "\n\n第二段"},
+    }
+
+
+def test_compactor_replaces_only_changed_sections():
+    compactor = AgentDeltaCompactor()
+    base = "# 文档\n\n前言\n## 范围\n\n" + "范围内容\n" * 50 + "## 风险\n\n旧风险\n"
+    compactor.compact(_delta(markdown=base).output)
+    compactor.compact(_delta(chat="已完成范围梳理。").output)
+
+    compact = compactor.compact(
+        _delta(
+            chat="已更新风险章节。",
+            markdown=base.replace("旧风险", "新风险"),
+        ).output
+    )
+
+    assert compact.chat == "已更新风险章节。"
+    assert compact.artifact_delta.sections[0].model_dump() == {
+        "index": 2,
+        "markdown": "## 风险\n\n新风险\n",
+    }
+    assert compact.artifact_delta.section_count == 3
+
+
+def test_compactor_falls_back_to_full_markdown_when_sections_are_not_smaller():
+    compactor = AgentDeltaCompactor()
+    compactor.compact(_delta(chat="已生成初稿。", markdown="# A\n\n旧").output)
+
+    compact = compactor.compact(_delta(markdown="# B\n\n新").output)
+
+    assert compact.artifact_delta.markdown == "# B\n\n新"
+    assert compact.artifact_delta.sections is None
+
+
+def test_compact_events_round_trip_through_reassembler():
+    markdown_states = [
+        "# 文档\n\n## 范围\n\n登录",
+        "# 文档\n\n## 范围\n\n登录与注册\n\n## 风险\n\n",
+        "# 文档\n\n## 范围\n\n登录与注册\n\n## 风险\n\n暴力破解",
+        "# 文档\n\n## 范围\n\n登录\n\n## 风险\n\n暴力破解",
+        "# 文档\n\n## 范围\n\n登录\n",
+    ]
+    events = [RunStartedEvent(run_id="run-1")]
+    for index, markdown in enumerate(markdown_states):
+        events.append(_delta(chat="我在整理需求" + "。" * (index + 1), markdown=markdown))
+    events.append(
+        _delta(
+            markdown=markdown_states[-1] + "\n## 开放问题\n\n无",
+            artifact_patch=ArtifactPatch(
+                operation="add_after",
+                section_anchor="h2:开放问题:1",
+                after_section_anchor="h2:范围:1",
+                replacement_markdown="## 开放问题\n\n无",
+            ),
+            stage_action=StageAction(type="request_next_stage", target_stage_id="STRATEGY"),
+            warnings=["提示"],
+        )
+    )
+
+    compacted = list(compact_agent_delta_events(events))
+    reassembler = AgentDeltaReassembler()
+    rebuilt = []
+    for event in compacted:
+        encoded = _payload(encode_sse_event(event))
+        if encoded["type"] == "agent_delta":
+            rebuilt.append(reassembler.apply(AgentTurnDeltaEvent.model_validate(encoded)))
+        elif encoded["type"] == "agent_delta_compact":
+            rebuilt.append(
+                reassembler.apply(AgentTurnCompactDeltaEvent.model_validate(encoded))
+            )
+
+    assert [event.type for event in compacted] == [
+        "run_started",
+        "agent_delta",
+        *["agent_delta_compact"] * 5,
+    ]
+    assert rebuilt == [event.output for event in events[1:]]
+
+
+def test_explicit_none_artifact_update_survives_compaction():
+    cleared = AgentTurnDeltaEvent(
+        output=AgentTurnDeltaOutput(
+            chat="我在整理需求。。",
+            artifact_update=ArtifactUpdate(type="none"),
+        )
+    )
+    events = [
+        RunStartedEvent(run_id="run-1"),
+        _delta(chat="我在整理需求。", markdown="# 文档\n\n初稿"),
+        cleared,
+        _delta(chat="我在整理需求。。。", markdown="# 新文档"),
+    ]
+
+    compacted = list(compact_agent_delta_events(events))
+    reassembler = AgentDeltaReassembler()
+    rebuilt = [reassembler.apply(event) for event in compacted[1:]]
+
+    assert [event.type for event in compacted] == [
+        "run_started",
+        "agent_delta",
+        "agent_delta_compact",
+        "agent_delta_compact",
+    ]
+    assert compacted[2].output.model_dump(mode="json", exclude_none=True) == {
+        "chat_append": "。",
+        "artifact_update": {"type": "none"},
+    }
+    assert compacted[3].output.artifact_delta.markdown == "# 新文档"
+    assert rebuilt == [event.output for event in events[1:]]
+
+
+def test_compact_artifact_update_only_carries_none():
+    with pytest.raises(ValueError, match="explicit none"):
+        AgentTurnCompactDeltaEvent.model_validate(
+            {"output": {"artifact_update": {"type": "replace", "markdown": "# 文档"}}}
+        )
+
+
+def test_retry_and_run_started_reset_baselines():
+    events = [
+        RunStartedEvent(run_id="run-1"),
+        _delta(chat="第一次尝试的说明", markdown="# 文档\n\n初稿"),
+        _delta(chat="第一次尝试的说明，继续", markdown="# 文档\n\n初稿，继续"),
+        AgentRetryEvent(attempt_index=2),
+        _delta(chat="第二次尝试的说明", markdown="# 文档\n\n重新生成"),
+    ]
+
+    assert [event.type for event in compact_agent_delta_events(events)] == [
+        "run_started",
+        "agent_delta",
+        "agent_delta_compact",
+        "agent_retry",
+        "agent_delta",
+    ]
+
+
+def test_reassembler_rejects_mismatched_base_revision():
+    reassembler = AgentDeltaReassembler()
+    reassembler.apply(_delta(markdown="# 文档"))
+
+    with pytest.raises(ValueError, match="base revision"):
+        reassembler.apply(
+            AgentTurnCompactDeltaEvent.model_validate(
+                {
+                    "output": {
+                        "artifact_delta": {
+                            "baseRevision": 3,
+                            "revision": 4,
+                            "append": "x",
+                        }
+                    }
+                }
+            )
+        )
+
+
+def test_artifact_delta_requires_exactly_one_change_kind():
+    with pytest.raises(ValueError, match="exactly one"):
+        ArtifactDelta(base_revision=0, revision=1, append="a", markdown="b")
+    with pytest.raises(ValueError, match="sectionCount"):
+        ArtifactDelta(base_revision=0, revision=1, sections=[])
+
+
+def test_compact_events_close_the_wrapped_stream():
+    closed = []
+
+    def events():
+        try:
+            yield RunStartedEvent(run_id="run-1")
+            yield _delta(chat="说明")
+        finally:
+            closed.append(True)
+
+    stream = compact_agent_delta_events(events())
+    next(stream)
+    stream.close()
+
+    assert closed == [True]
+
+
+def test_build_sse_response_negotiates_compact_protocol():
+    final_output = {
+        "chat": "已完成。",
+        "artifact_update": {"type": "replace", "markdown": "# 文档\n\n完成"},
+        "stage_action": None,
+        "warnings": [],
+    }
+    response = build_sse_response(
+        [
+            RunStartedEvent(run_id="run-1"),
+            _delta(chat="我在整理需求", markdown="# 文档\n\n进行中"),
+            _delta(chat="我在整理需求边界", markdown="# 文档\n\n进行中，补充"),
+            AgentTurnEvent.model_validate({"output": final_output}),
+        ],
+        delta_protocol="compact",
+    )
+
+    payloads = [
+        json.loads(line.removeprefix("data: "))
+        for line in response.get_data(as_text=True).splitlines()
+        if line.startswith("data: {")
+    ]
+
+    assert response.headers["X-Agent-Delta-Protocol"] == "compact"
+    assert [payload["type"] for payload in payloads] == [
+        "run_started",
+        "agent_delta",
+        "agent_delta_compact",
+        "agent_turn",
+    ]
+    assert payloads[-1]["output"]["artifact_update"]["markdown"] == "# 文档\n\n完成"
+
+
+def test_compact_stream_resumed_on_a_new_connection_keeps_the_client_baseline():
+    markdown_states = [
+        "# 文档\n\n## 范围\n\n登录",
+        "# 文档\n\n## 范围\n\n登录与注册",
+        "# 文档\n\n## 范围\n\n登录与注册\n\n## 风险\n\n暴力破解",
+        "# 文档\n\n## 范围\n\n登录\n\n## 风险\n\n暴力破解",
+        "# 文档\n\n## 范围\n\n登录\n\n## 风险\n\n暴力破解与撞库",
+    ]
+    entries = list(
+        enumerate(
+            [RunStartedEvent(run_id="run-1")]
+            + [
+                _delta(chat="我在整理需求" + "。" * index, markdown=markdown)
+                for index, markdown in enumerate(markdown_states)
+            ],
+            start=1,
+        )
+    )
+
+    def receive(replayed):
+        response = build_sse_replay_response(replayed, delta_protocol="compact")
+        return [
+            json.loads(line.removeprefix("data: "))
+            for line in response.get_data(as_text=True).splitlines()
+            if line.startswith("data: {")
+        ]
+
+    first_connection = receive(entries[:4])
+    resumed = receive(entries[4:])
+    reassembler = AgentDeltaReassembler()
+    rebuilt = []
+    for payload in first_connection[1:] + resumed:
+        event_type = (
+            AgentTurnDeltaEvent
+            if payload["type"] == "agent_delta"
+            else AgentTurnCompactDeltaEvent
+        )
+        rebuilt.append(reassembler.apply(event_type.model_validate(payload)))
+
+    assert [payload["type"] for payload in resumed] == [
+        "agent_delta",
+        "agent_delta_compact",
+    ]
+    assert resumed[0]["artifactRevision"] == 1
+    assert resumed[1]["output"]["artifact_delta"]["baseRevision"] == 1
+    assert [output.artifact_update.markdown for output in rebuilt] == markdown_states
+
+
+def test_build_sse_response_defaults_to_full_protocol():
+    response = build_sse_response([_delta(chat="说明"), _delta(chat="说明补充")])
+
+    assert "X-Agent-Delta-Protocol" not in response.headers
+    assert response.get_data(as_text=True).count('"type": "agent_delta"') == 2
+
+
+def _streamed_turn(artifact_bytes: int, delta_count: int) -> list:
+    section = "## 章节 {index}\n\n" + "| 字段 | 内容 |\n|---|---|\n" + "| 测试 | 数据 |\n" * 20
+    markdown = "# 测试设计文档\n\n"
+    index = 0
+    while len(markdown.encode("utf-8")) < artifact_bytes:
+        markdown += section.format(index=index)
+        index += 1
+    chat = "我正在根据需求边界逐段生成右侧测试设计文档，并同步关键结论。" * 4
+
+    events = [RunStartedEvent(run_id="run-bench")]
+    for step in range(1, delta_count + 1):
+        events.append(
+            _delta(
+                chat=chat[: max(1, len(chat) * step // delta_count)],
+                markdown=markdown[: max(1, len(markdown) * step // delta_count)],
+            )
+        )
+    return events
+
+
+@pytest.mark.slow
+def test_benchmark_compact_delta_bytes_and_encode_cpu_per_turn():
+    events = _streamed_turn(artifact_bytes=60 * 1024, delta_count=300)
+
+    def encoded_bytes(encode_events) -> int:
+        return sum(
+            len(encode_sse_event(event).encode("utf-8")) for event in encode_events()
+        )
+
+    def encode_cpu_ms(encode_events) -> float:
+        return average_ms(
+            lambda: [encode_sse_event(event) for event in encode_events()],
+            3,
+            clock=time.process_time,
+        )
+
+    full_bytes = encoded_bytes(lambda: events)
+    compact_bytes = encoded_bytes(lambda: compact_agent_delta_events(events))
+
+    assert compact_bytes * 20 < full_bytes, (full_bytes, compact_bytes)
+    assert_faster(
+        encode_cpu_ms(lambda: compact_agent_delta_events(events)),
+        encode_cpu_ms(lambda: events),
+        label="compact encode CPU incl. diffing vs full encode CPU",
+    )
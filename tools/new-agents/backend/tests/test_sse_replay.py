@@ -0,0 +1,150 @@
+import threading
+
+import pytest
+
+from sse_replay import FileReplayStore, SseReplayBuffer, SseStreamRegistry
+from sse_schemas import (
+    AgentRetryEvent,
+    AgentTurnDeltaEvent,
+    AgentTurnDeltaOutput,
+    ErrorEvent,
+    RunStartedEvent,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _delta(chat: str) -> AgentTurnDeltaEvent:
+    return AgentTurnDeltaEvent(output=AgentTurnDeltaOutput(chat=chat))
+
+
+def _ids(entries) -> list[int]:
+    return [event_id for event_id, _ in entries]
+
+
+def test_buffer_replays_after_last_event_id_and_follows_live_tail():
+    buffer = SseReplayBuffer("req-1")
+    buffer.append(RunStartedEvent(run_id="run-1"))
+    buffer.append(_delta("第一段说明"))
+
+    entries = buffer.entries_after(1)
+    assert next(entries)[1] == _delta("第一段说明")
+
+    def produce():
+        buffer.append(_delta("第二段说明"))
+        buffer.close()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+
+    assert _ids(entries) == [3]
+    producer.join()
+    assert _ids(buffer.entries_after(None)) == [1, 2, 3]
+    assert list(buffer.entries_after(3)) == []
+
+
+def test_buffer_eviction_keeps_non_delta_events_pinned():
+    buffer = SseReplayBuffer("req-1", max_events=2)
+    buffer.append(RunStartedEvent(run_id="run-1"))
+    buffer.append(_delta("旧说明"))
+    buffer.append(AgentRetryEvent(attempt_index=2))
+    buffer.append(_delta("新说明"))
+    buffer.append(ErrorEvent(code="LLM_ERROR", message="失败"))
+    buffer.close()
+
+    entries = list(buffer.entries_after(None))
+
+    assert _ids(entries) == [1, 3, 4, 5]
+    assert [event.type for _, event in entries] == [
+        "run_started",
+        "agent_retry",
+        "agent_delta",
+        "error",
+    ]
+
+
+def test_buffer_rejects_events_after_close():
+    buffer = SseReplayBuffer("req-1")
+    buffer.close()
+
+    with pytest.raises(RuntimeError):
+        buffer.append(_delta("迟到"))
+
+
+def test_registry_produces_in_background_and_joins_live_stream():
+    registry = SseStreamRegistry()
+    release = threading.Event()
+    produced = []
+
+    def events():
+        yield RunStartedEvent(run_id="run-1")
+        release.wait(5)
+        produced.append(True)
+        yield _delta("完成说明")
+
+    stream, created = registry.start("req-1", events(), identity="identity-a")
+    joined, joined_created = registry.start("req-1", iter(()), identity="identity-a")
+    attached = registry.open("req-1", last_event_id=1, identity="identity-a")
+    release.set()
+
+    assert (created, joined_created) == (True, False)
+    assert joined is stream
+    assert _ids(attached) == [2]
+    assert produced == [True]
+    assert registry.open("req-1", identity="identity-b") is None
+    assert registry.open("req-1", token="identity-a") is None
+    assert registry.open("req-1", token=stream.token) is not None
+    assert registry.stream_token("req-1") == stream.token
+    assert registry.get_stats() == {"active": 0, "retained": 1}
+
+
+def test_registry_drops_finished_streams_after_retention():
+    clock = FakeClock()
+    registry = SseStreamRegistry(retention_seconds=10, clock=clock)
+    buffer, _ = registry.start("req-1", iter([RunStartedEvent(run_id="run-1")]))
+    list(buffer.entries_after(None))
+    buffer.closed_at = clock.now
+
+    clock.now = 5
+    assert registry.get("req-1") is buffer
+    clock.now = 11
+    assert registry.get("req-1") is None
+
+
+def test_registry_caps_retained_streams():
+    registry = SseStreamRegistry(max_streams=2)
+    for index in range(4):
+        buffer, _ = registry.start(f"req-{index}", iter(()))
+        list(buffer.entries_after(None))
+
+    registry.get("req-0")
+
+    assert registry.get_stats()["retained"] == 2
+    assert registry.get("req-3") is not None
+
+
+def test_file_store_replays_stream_written_by_another_registry(tmp_path):
+    writer = SseStreamRegistry(store=FileReplayStore(tmp_path))
+    stream, _ = writer.start(
+        "req-1",
+        iter([RunStartedEvent(run_id="run-1"), _delta("说明"), _delta("说明补充")]),
+        identity="identity-a",
+    )
+    list(stream.entries_after(None))
+
+    reader = SseStreamRegistry(store=FileReplayStore(tmp_path, idle_timeout=1))
+    entries = list(reader.open("req-1", last_event_id=1, identity="identity-a"))
+
+    assert _ids(entries) == [2, 3]
+    assert entries[-1][1] == _delta("说明补充")
+    assert reader.open("req-1", identity="identity-b") is None
+    assert reader.open("req-1", token="forged") is None
+    assert _ids(reader.open("req-1", last_event_id=2, token=stream.token)) == [3]
+    assert reader.stream_token("req-1") == stream.token
+    assert reader.open("req-missing") is None
@@ -11,6 +11,6 @@ def test_build_sse_response_encodes_events_and_done_sentinel() -> None:
     assert response.headers["Cache-Control"] == "no-cache"
     assert response.headers["X-Accel-Buffering"] == "no"
     assert response.get_data(as_text=True) == (
-        'data: {"type": "error", "code": "STREAM_ERROR", "message": "failed"}\n\n'
+        'id: 1\ndata: {"type": "error", "code": "STREAM_ERROR", "message": "failed"}\n\n'
         "data: [DONE]\n\n"
     )
@@ -15,6 +15,8 @@ from agent_runtime import (
     AgentRuntimeSchemaError,
     RawJsonStreamTerminationError,
 )
+from provider_admission import ProviderBusyError, ProviderLimits
+from provider_routing import ProviderTarget
 from request_schemas import AgentRunStreamRequest
 from sse_schemas import (
     AgentRetryEvent,
@@ -27,9 +29,11 @@ from sse_schemas import (
     RunStartedEvent,
 )
 from sse_response import build_sse_response
+from token_counting import get_token_counter
 from stream_services import (
     CONTRACT_VALIDATION_PUBLIC_REASON,
     PROVIDER_AUTH_PUBLIC_REASON,
+    PROVIDER_BUSY_PUBLIC_REASON,
     PROVIDER_CONNECTION_PUBLIC_REASON,
     PROVIDER_ERROR_PUBLIC_REASON,
     PROVIDER_RATE_LIMIT_PUBLIC_REASON,
@@ -37,6 +41,7 @@ from stream_services import (
     SCHEMA_RETRY_EXHAUSTED_MESSAGE,
     STRUCTURED_OUTPUT_PUBLIC_REASON,
     VISUAL_VALIDATION_PUBLIC_REASON,
+    build_runtime_system_prompt,
     stream_agent_run_events,
 )
 from run_persistence import (
@@ -200,7 +205,9 @@ class FakePersistence:
         request_id: str | None = None,
         owner_token: str | None = None,
         terminal_event: dict | None = None,
+        llm_config_key: str | None = None,
     ) -> None:
+        self.llm_config_key = llm_config_key
         self.calls.append(
             (
                 "complete_agent_run_turn",
@@ -222,8 +229,10 @@ class FakePersistence:
         current_prompt: str,
         *,
         request_id: str,
+        target=None,
     ):
         self.calls.append(("build_runtime_context", run_id, current_prompt, request_id))
+        self.context_target = target
         return f"服务端上下文\n\n[用户]\n{current_prompt}", self.context_warnings
 
     def record_turn_metric(self, **kwargs) -> None:
@@ -454,6 +463,74 @@ def test_stream_agent_run_events_prefers_observed_retry_over_exhaustion_text(
     assert metric_call[1]["contract_retry_count"] == 1
 
 
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_stream_agent_run_events_records_prompt_tokens_of_the_built_context(
+    mock_build_runtime: MagicMock,
+) -> None:
+    runtime = MagicMock()
+    runtime.stream_turn.side_effect = AgentRuntimeSchemaError("invalid output")
+    mock_build_runtime.return_value = runtime
+    persistence = FakePersistence()
+
+    list(
+        stream_agent_run_events(
+            _request(),
+            api_key="test-api-key",
+            base_url="https://api.test.com/v1",
+            model_name="test-model",
+            persistence=persistence,
+        )
+    )
+
+    counter = get_token_counter("test-model")
+    expected_tokens = counter.count(
+        build_runtime_system_prompt(_request())
+    ) + counter.count(f"服务端上下文\n\n[用户]\n{_request().prompt}")
+    metric_call = next(
+        call for call in persistence.calls if call[0] == "record_turn_metric"
+    )
+    assert metric_call[1]["prompt_tokens"] == expected_tokens > 0
+    assert metric_call[1]["prompt_token_counter"] == "estimate"
+
+
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_stream_agent_run_events_builds_context_for_the_routed_target(
+    mock_build_runtime: MagicMock,
+) -> None:
+    runtime = MagicMock()
+    runtime.stream_turn.side_effect = AgentRuntimeSchemaError("invalid output")
+    mock_build_runtime.return_value = runtime
+    default_target = ProviderTarget(
+        config_key="default",
+        api_key="test-api-key",
+        base_url="https://api.test.com/v1",
+        model_name="test-model",
+        context_budget_tokens=8000,
+    )
+    backup_target = ProviderTarget(
+        config_key="backup",
+        api_key="backup-api-key",
+        base_url="https://backup.test.com/v1",
+        model_name="backup-model",
+        context_budget_tokens=64000,
+    )
+    persistence = FakePersistence()
+    persistence.route_provider_targets = lambda run_id, targets: targets[::-1]
+
+    list(
+        stream_agent_run_events(
+            _request(),
+            api_key="test-api-key",
+            base_url="https://api.test.com/v1",
+            model_name="test-model",
+            persistence=persistence,
+            provider_targets=(default_target, backup_target),
+        )
+    )
+
+    assert persistence.context_target is backup_target
+
+
 @patch("stream_services.build_pydantic_agent_runtime")
 def test_stream_agent_run_events_ignores_forged_untrusted_retry_count(
     mock_build_runtime: MagicMock,
@@ -674,6 +751,62 @@ def test_stream_agent_run_events_records_turn_through_persistence_adapter(
     assert metric["contract_retry_count"] == 0
 
 
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_stream_agent_run_events_releases_connection_before_model_stream(
+    mock_build_runtime: MagicMock,
+) -> None:
+    class ReleasingPersistence(FakePersistence):
+        def release_connection(self) -> None:
+            self.calls.append(("release_connection",))
+
+    persistence = ReleasingPersistence()
+    final = AgentTurnOutput.model_validate(
+        {
+            "chat": "已更新右侧需求分析文档，请确认。",
+            "artifact_update": {"type": "replace", "markdown": VALID_CLARIFY_ARTIFACT},
+            "artifact_data": VALID_ARTIFACT_DATA,
+            "stage_action": None,
+            "warnings": [],
+        }
+    )
+
+    def stream_turn(*args, **kwargs):
+        assert persistence.calls[-1] == ("release_connection",)
+        yield final
+
+    runtime = MagicMock()
+    runtime.stream_turn.side_effect = stream_turn
+    mock_build_runtime.return_value = runtime
+    request = AgentRunStreamRequest.model_validate(
+        {
+            "prompt": "用户需求",
+            "systemPrompt": "你是 Lisa。",
+            "workflowId": "TEST_DESIGN",
+            "stageId": "CLARIFY",
+            "requestId": "stream-release-001",
+        }
+    )
+
+    events = list(
+        stream_agent_run_events(
+            request,
+            api_key="test-api-key",
+            base_url="https://api.test.com/v1",
+            model_name="test-model",
+            persistence=persistence,
+        )
+    )
+
+    assert events[-1] == AgentTurnEvent(output=final)
+    assert [call[0] for call in persistence.calls] == [
+        "ensure_run",
+        "claim_turn_request",
+        "build_runtime_context",
+        "release_connection",
+        "complete_agent_run_turn",
+    ]
+
+
 @patch("stream_services.build_pydantic_agent_runtime")
 def test_stream_agent_run_events_replays_completed_request_without_model_invocation(
     mock_build_runtime: MagicMock,
@@ -1369,6 +1502,9 @@ def test_stream_agent_run_events_records_real_token_usage_when_runtime_exposes_i
     runtime = MagicMock()
     runtime.stream_turn.return_value = iter([final])
     runtime.last_token_usage = 321
+    runtime.last_discarded_tokens = 120
+    runtime.last_early_aborts = 1
+    runtime.last_early_abort_saved_ms = 850
     mock_build_runtime.return_value = runtime
     persistence = FakePersistence()
 
@@ -1386,6 +1522,9 @@ def test_stream_agent_run_events_records_real_token_usage_when_runtime_exposes_i
     assert persistence.calls[-1][0] == "complete_agent_run_turn"
     metric = persistence.calls[-1][8]
     assert metric["estimated_tokens"] == 321
+    assert metric["discarded_tokens"] == 120
+    assert metric["early_abort_count"] == 1
+    assert metric["early_abort_saved_ms"] == 850
 
 
 @patch("stream_services.build_pydantic_agent_runtime")
@@ -1955,9 +2094,8 @@ def test_stream_agent_run_events_maps_raw_pydantic_ai_schema_error_to_error_even
         pass
 
     monkeypatch.setattr(
-        "stream_services.PYDANTIC_AI_SCHEMA_ERRORS",
-        (RawSchemaError,),
-        raising=False,
+        "stream_services.pydantic_ai_schema_errors",
+        lambda: (RawSchemaError,),
     )
     runtime = MagicMock()
     runtime.stream_turn.side_effect = RawSchemaError(
@@ -2268,6 +2406,51 @@ def test_stream_agent_run_events_maps_openai_rate_limit_error_to_llm_error_event
     assert events[1].message == PROVIDER_RATE_LIMIT_PUBLIC_REASON
 
 
+@patch("stream_services.build_pydantic_agent_runtime")
+def test_stream_agent_run_events_reports_provider_busy_with_queue_wait(
+    mock_build_runtime: MagicMock,
+) -> None:
+    runtime = MagicMock()
+    runtime.stream_turn.side_effect = ProviderBusyError(
+        "https://api.test.com/v1",
+        "queue_timeout",
+        3000,
+    )
+    runtime.last_queue_wait_ms = 3000
+    mock_build_runtime.return_value = runtime
+    persistence = FakePersistence()
+    limits = ProviderLimits(max_concurrency=2)
+
+    events = list(
+        stream_agent_run_events(
+            _request(),
+            api_key="test-api-key",
+            base_url="https://api.test.com/v1",
+            model_name="test-model",
+            persistence=persistence,
+            provider_limits=limits,
+        )
+    )
+
+    assert mock_build_runtime.call_args.kwargs["provider_limits"] == limits
+    assert events[-1] == ErrorEvent(
+        code="PROVIDER_BUSY",
+        message=PROVIDER_BUSY_PUBLIC_REASON,
+        diagnostic=_diagnostic(
+            phase="provider",
+            field_path="provider",
+            validator="provider_admission",
+            retryable=True,
+            public_reason=PROVIDER_BUSY_PUBLIC_REASON,
+        ),
+    )
+    metric = next(
+        call[1] for call in persistence.calls if call[0] == "record_turn_metric"
+    )
+    assert metric["error_code"] == "PROVIDER_BUSY"
+    assert metric["queue_wait_ms"] == 3000
+
+
 @patch("stream_services.build_pydantic_agent_runtime")
 def test_stream_agent_run_events_maps_openai_api_error_to_llm_error_event(
     mock_build_runtime: MagicMock,
@@ -1,5 +1,8 @@
 import os
 import sys
+import time
+
+import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -126,3 +129,179 @@ def test_build_lisa_test_assets_from_artifact_data_preserves_case_contract() ->
         "automationSuggestion": "优先自动化",
         "status": "可执行",
     }
+
+
+def _large_cases_markdown(case_count: int) -> str:
+    lines = [
+        "# 测试用例集",
+        "",
+        "| ID | 用例标题 | 优先级 | 测试维度 | 关联测试点 | 关联风险 | 前置条件 | 操作步骤 | 测试数据 | 预期结果 |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    lines.extend(
+        f"| TC-{index:05d} | 用例 {index} | P{index % 3} | 维度 {index % 5} "
+        f"| 测试点 {index // 2} | R-{index % 40:03d} | 用户已登录 "
+        f"| 1. 打开页面 2. 提交表单 | 数据 {index} | 提交成功 |"
+        for index in range(case_count)
+    )
+    lines.extend(
+        [
+            "",
+            "| 测试点 | 优先级 | 关联风险 | 覆盖用例 | 覆盖状态 |",
+            "|---|---|---|---|---|",
+        ]
+    )
+    statuses = ["已覆盖", "部分覆盖", "未覆盖"]
+    lines.extend(
+        f"| 测试点 {index} | P{index % 3} | R-{(2 * index) % 40:03d} "
+        f"| TC-{2 * index:05d}, TC-{2 * index + 1:05d}, TC-99999 | {statuses[index % 3]} |"
+        for index in range(case_count // 2)
+    )
+    return "\n".join(lines)
+
+
+def test_single_pass_views_match_per_view_builders() -> None:
+    parsed = parse_lisa_test_asset_markdown(_large_cases_markdown(60))
+
+    test_cases = parsed["testCases"]
+    coverage_trace = parsed["coverageTrace"]
+    assert parsed["coverageSummary"] == test_asset_parsing.build_coverage_summary(
+        test_cases,
+        coverage_trace,
+    )
+    assert parsed["riskMatrix"] == test_asset_parsing.build_risk_matrix(
+        test_cases,
+        coverage_trace,
+    )
+    assert parsed["intentTesterDrafts"] == test_asset_parsing.build_intent_tester_drafts(
+        test_cases
+    )
+    assert [issue["type"] for issue in parsed["assetIssues"]] == (
+        ["unknown_coverage_case"] * 30
+    )
+    assert parsed["coverageSummary"]["byPriority"][0] == {
+        "priority": "P0",
+        "total": 10,
+        "covered": 10,
+        "partial": 0,
+        "uncovered": 0,
+        "coverageRate": 100.0,
+    }
+
+
+def test_parse_lisa_test_asset_markdown_reads_interleaved_tables() -> None:
+    first_case_table, coverage_table = CASES_MARKDOWN.split("## 3. 测试点覆盖追溯")
+    second_case_table = first_case_table.split("## 2. 用例清单")[1].replace(
+        "TC-001 | 用户使用正确密码登录成功",
+        "TC-002 | 用户登出成功",
+    )
+    markdown = first_case_table + coverage_table + second_case_table
+
+    parsed = parse_lisa_test_asset_markdown(markdown)
+
+    assert [case["id"] for case in parsed["testCases"]] == ["TC-001", "TC-002"]
+    assert [trace["testPoint"] for trace in parsed["coverageTrace"]] == ["登录主链路"]
+
+
+def test_parse_lisa_test_asset_markdown_rejects_table_without_separator() -> None:
+    markdown = CASES_MARKDOWN.replace(
+        "| 测试点 | 优先级 | 关联风险 | 覆盖用例 | 覆盖状态 |\n|---|---|---|---|---|",
+        "| 测试点 | 优先级 | 关联风险 | 覆盖用例 | 覆盖状态 |",
+    )
+
+    with pytest.raises(ValueError, match="Markdown 表格缺少分隔行: 测试点"):
+        parse_lisa_test_asset_markdown(markdown)
+
+
+def _legacy_parse_tables_with_headers(
+    markdown: str,
+    required_headers: list[str],
+) -> list[dict]:
+    # The per-table-kind scan that _parse_recognized_tables replaced.
+    rows = []
+    lines = markdown.splitlines()
+    index = 0
+    while index < len(lines):
+        if not test_asset_parsing._is_table_row(lines[index]):
+            index += 1
+            continue
+
+        headers = test_asset_parsing._split_table_row(lines[index])
+        if not all(header in headers for header in required_headers):
+            index += 1
+            continue
+        if index + 1 >= len(lines) or not test_asset_parsing._is_separator_row(
+            lines[index + 1]
+        ):
+            raise ValueError(f"Markdown 表格缺少分隔行: {', '.join(required_headers)}")
+
+        index += 2
+        while index < len(lines) and test_asset_parsing._is_table_row(lines[index]):
+            values = test_asset_parsing._split_table_row(lines[index])
+            if len(values) != len(headers):
+                raise ValueError("Markdown 表格列数与表头不一致")
+            rows.append(dict(zip(headers, values, strict=True)))
+            index += 1
+    return rows
+
+
+def _legacy_parse_tables(markdown: str) -> dict[str, list[dict]]:
+    return {
+        "cases": _legacy_parse_tables_with_headers(
+            markdown,
+            test_asset_parsing.TEST_CASE_HEADERS,
+        ),
+        "coverage": _legacy_parse_tables_with_headers(
+            markdown,
+            test_asset_parsing.COVERAGE_HEADERS,
+        ),
+    }
+
+
+def _single_pass_parse_tables(markdown: str) -> dict[str, list[dict]]:
+    return test_asset_parsing._parse_recognized_tables(
+        markdown,
+        {
+            "cases": test_asset_parsing.TEST_CASE_HEADERS,
+            "coverage": test_asset_parsing.COVERAGE_HEADERS,
+        },
+    )
+
+
+def test_parse_lisa_test_asset_markdown_reports_case_table_errors_first() -> None:
+    case_table, coverage_table = CASES_MARKDOWN.split("## 3. 测试点覆盖追溯")
+    markdown = coverage_table.replace(
+        "| TC-001 | 已覆盖 |",
+        "| TC-001 |",
+    ) + case_table.replace("|---|---|---|---|---|---|---|---|---|---|\n", "")
+
+    with pytest.raises(ValueError) as legacy_error:
+        _legacy_parse_tables(markdown)
+    with pytest.raises(ValueError, match="Markdown 表格缺少分隔行: ID") as error:
+        parse_lisa_test_asset_markdown(markdown)
+    assert str(error.value) == str(legacy_error.value)
+
+
+def test_single_pass_tables_match_legacy_per_table_scans() -> None:
+    markdown = _large_cases_markdown(200) + "\n\n" + CASES_MARKDOWN
+
+    assert _single_pass_parse_tables(markdown) == _legacy_parse_tables(markdown)
+
+
+def _best_of_ms(fn, rounds: int = 5) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+@pytest.mark.slow
+def test_benchmark_single_pass_parse_at_2k_rows() -> None:
+    markdown = _large_cases_markdown(2000)
+
+    legacy_ms = _best_of_ms(lambda: _legacy_parse_tables(markdown))
+    single_pass_ms = _best_of_ms(lambda: _single_pass_parse_tables(markdown))
+
+    assert single_pass_ms < legacy_ms
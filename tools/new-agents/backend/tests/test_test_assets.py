@@ -9,6 +9,7 @@ os.environ["FLASK_TESTING"] = "1"
 
 from app import create_app
 from artifact_data_renderers import render_agent_turn_from_artifact_data
+from benchmarks import assert_faster, average_ms
 from models import db
 from run_persistence import create_agent_run, record_artifact_version
 from test_artifact_data_renderers import VALID_CASES_ARTIFACT_DATA
@@ -21,6 +22,8 @@ from test_assets import (
     record_lisa_test_asset_intent_tester_case,
     record_lisa_test_asset_intent_tester_execution,
     record_lisa_test_asset_intent_tester_result,
+    record_lisa_test_asset_intent_tester_executions,
+    record_lisa_test_asset_intent_tester_results,
     update_lisa_test_asset_risk_by_id,
     update_lisa_test_asset_issue_status,
     update_lisa_test_asset_risk,
@@ -511,6 +514,190 @@ def test_quality_summary_updates_after_issue_coverage_and_risk_actions(app):
     assert all(gate["status"] == "pass" for gate in ready_collection["qualitySummary"]["gates"])
 
 
+def _recounted_quality_counts(collection: dict) -> dict:
+    def count(items: list[dict], status: str) -> int:
+        return sum(1 for item in items if item["status"] == status)
+
+    return {
+        "pendingIssueCount": count(collection["assetIssues"], "pending"),
+        "confirmedIssueCount": count(collection["assetIssues"], "confirmed"),
+        "ignoredIssueCount": count(collection["assetIssues"], "ignored"),
+        "uncoveredTestPointCount": count(collection["testPoints"], "未覆盖"),
+        "partialTestPointCount": count(collection["testPoints"], "部分覆盖"),
+        "openRiskCount": count(collection["riskMatrix"], "open"),
+        "mitigatingRiskCount": count(collection["riskMatrix"], "mitigating"),
+        "acceptedRiskCount": count(collection["riskMatrix"], "accepted"),
+        "closedRiskCount": count(collection["riskMatrix"], "closed"),
+    }
+
+
+def test_stored_quality_counters_track_risk_matrix_rebuilds(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", CASES_MARKDOWN)
+        collection = materialize_lisa_test_assets(run.id)
+        manual = create_lisa_test_asset_risk(
+            collection["id"],
+            {"risk": "R-MANUAL", "status": "mitigating"},
+        )
+        moved = update_lisa_test_point_asset(
+            collection["id"],
+            "登录错误处理",
+            {"risk": "R-LOGIN-NEW", "status": "未覆盖", "testCases": []},
+        )
+        closed = update_lisa_test_asset_risk_by_id(
+            collection["id"],
+            manual["id"],
+            {"risk": "R-MANUAL-RENAMED", "status": "closed"},
+        )
+        deleted = delete_lisa_test_asset_risk(collection["id"], manual["id"])
+        reloaded = get_lisa_test_asset_collection(collection["id"])
+
+    assert "R-LOGIN-NEW" in [risk["risk"] for risk in moved["updatedRisks"]]
+    assert moved["qualitySummary"]["uncoveredTestPointCount"] == 1
+    assert closed["qualitySummary"]["closedRiskCount"] == 1
+    assert deleted["qualitySummary"] == reloaded["qualitySummary"]
+    summary = reloaded["qualitySummary"]
+    assert {key: summary[key] for key in _recounted_quality_counts(reloaded)} == (
+        _recounted_quality_counts(reloaded)
+    )
+    assert summary["closedRiskCount"] == 0
+    assert summary["status"] == "blocked"
+
+
+def _seed_large_test_asset_collection(case_count: int) -> int:
+    from models import (
+        AgentTestAssetCollection,
+        AgentTestCaseAsset,
+        AgentTestCaseVersion,
+        AgentTestPointAsset,
+    )
+
+    run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+    collection = AgentTestAssetCollection(
+        run_id=run.id,
+        workflow_id="TEST_DESIGN",
+        source_stage_id="CASES",
+        source_artifact_version=1,
+    )
+    db.session.add(collection)
+    db.session.flush()
+    for index in range(case_count):
+        case_asset = AgentTestCaseAsset(
+            collection_id=collection.id,
+            case_id=f"TC-{index:05d}",
+        )
+        db.session.add(case_asset)
+        db.session.flush()
+        version = AgentTestCaseVersion(
+            test_case_id=case_asset.id,
+            version_number=1,
+            title=f"用例 {index}",
+            priority="P1",
+            dimension="正向功能验证",
+            test_point=f"测试点 {index}",
+            risk=f"R-{index:05d}",
+            precondition="无",
+            steps="1. 打开页面",
+            test_data="无",
+            expected_result="成功",
+        )
+        db.session.add(version)
+        db.session.flush()
+        case_asset.current_version_id = version.id
+        db.session.add(
+            AgentTestPointAsset(
+                collection_id=collection.id,
+                test_point=f"测试点 {index}",
+                priority="P1",
+                risk=f"R-{index:05d}",
+                test_cases_json=f'["TC-{index:05d}"]',
+                status="部分覆盖",
+            )
+        )
+    db.session.commit()
+    return collection.id
+
+
+@pytest.mark.slow
+def test_benchmark_test_point_edit_latency_is_flat_in_collection_size(app):
+    with app.app_context():
+        timings = {}
+        for case_count in (20, 1000):
+            collection_id = _seed_large_test_asset_collection(case_count)
+            edits = iter(range(10))
+
+            def edit_next_test_point():
+                index = next(edits)
+                update_lisa_test_point_asset(
+                    collection_id,
+                    f"测试点 {index}",
+                    {"status": "已覆盖" if index % 2 else "未覆盖"},
+                )
+
+            timings[case_count] = average_ms(edit_next_test_point, 10)
+
+    assert_faster(
+        timings[1000],
+        timings[20],
+        factor=1 / 3,
+        label="test point edit, 1000 vs 20 cases",
+    )
+
+
+@pytest.mark.slow
+def test_benchmark_intent_tester_results_batch_against_per_case_calls(app):
+    from models import AgentTestAssetIntentTesterMapping
+
+    case_count = 300
+    with app.app_context():
+        collection_id = _seed_large_test_asset_collection(case_count)
+        db.session.add_all(
+            AgentTestAssetIntentTesterMapping(
+                collection_id=collection_id,
+                source_case_id=f"TC-{index:05d}",
+                intent_tester_case_id=index + 1,
+                intent_tester_case_name=f"用例 {index}",
+            )
+            for index in range(case_count)
+        )
+        db.session.commit()
+        results = [
+            {
+                "caseId": f"TC-{index:05d}",
+                "result": {"executionId": f"exec-{index}", "status": "success"},
+            }
+            for index in range(case_count)
+        ]
+
+        def record_per_case():
+            for entry in results:
+                record_lisa_test_asset_intent_tester_result(
+                    collection_id,
+                    entry["caseId"],
+                    entry["result"],
+                )
+
+        batches = []
+        per_case_ms = average_ms(record_per_case)
+        batch_ms = average_ms(
+            lambda: batches.append(
+                record_lisa_test_asset_intent_tester_results(
+                    collection_id,
+                    {"results": results},
+                )
+            )
+        )
+
+    assert batches[0]["recorded"] == case_count
+    assert_faster(
+        batch_ms,
+        per_case_ms,
+        factor=3,
+        label=f"{case_count} intent-tester results, batch vs per-case",
+    )
+
+
 def test_export_lisa_test_assets_rejects_missing_cases_artifact(app):
     with app.app_context():
         run = create_agent_run("TEST_DESIGN", "lisa", "STRATEGY")
@@ -722,6 +909,154 @@ def test_intent_tester_result_snapshot_persists_failed_steps_and_screenshots(app
     assert reloaded["intentTesterMappings"][0]["latestResult"] == expected_result
 
 
+def test_intent_tester_results_batch_records_valid_entries_and_reports_rejections(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", CASES_MARKDOWN)
+        collection = materialize_lisa_test_assets(run.id)
+        record_lisa_test_asset_intent_tester_case(
+            collection["id"],
+            "TC-001",
+            {"intentTesterCaseId": 42, "intentTesterCaseName": "TC-001"},
+        )
+
+        batch = record_lisa_test_asset_intent_tester_results(
+            collection["id"],
+            {
+                "results": [
+                    {
+                        "caseId": "TC-001",
+                        "result": {
+                            "executionId": "exec-1",
+                            "status": "failed",
+                            "steps": [
+                                {
+                                    "stepIndex": 0,
+                                    "description": "验证预期结果",
+                                    "status": "failed",
+                                }
+                            ],
+                        },
+                    },
+                    {
+                        "caseId": "TC-002",
+                        "result": {"executionId": "exec-2", "status": "success"},
+                    },
+                    {"caseId": "TC-999", "result": {"executionId": "exec-3", "status": "success"}},
+                    {"caseId": "TC-001", "result": {"executionId": "exec-4", "status": "success"}},
+                    {"caseId": "TC-003", "result": {"status": "success"}},
+                ]
+            },
+        )
+        reloaded = get_lisa_test_asset_collection(collection["id"])
+
+    assert batch["recorded"] == 1
+    assert batch["rejected"] == 4
+    assert batch["outcomes"] == [
+        {
+            "caseId": "TC-001",
+            "status": "recorded",
+            "executionId": "exec-1",
+            "resultStatus": "failed",
+        },
+        {
+            "caseId": "TC-002",
+            "status": "rejected",
+            "error": "测试用例尚未导入 intent-tester: TC-002",
+        },
+        {"caseId": "TC-999", "status": "rejected", "error": "未知测试用例: TC-999"},
+        {
+            "caseId": "TC-001",
+            "status": "rejected",
+            "error": "caseId 在本批次中重复: TC-001",
+        },
+        {"caseId": "TC-003", "status": "rejected", "error": "executionId 不能为空"},
+    ]
+    latest_result = reloaded["intentTesterMappings"][0]["latestResult"]
+    assert latest_result["executionId"] == "exec-1"
+    assert latest_result["stepsFailed"] == 1
+    assert reloaded["intentTesterMappings"][0]["latestExecution"]["status"] == "failed"
+
+
+def test_intent_tester_executions_batch_records_summaries_in_one_write(app):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", CASES_MARKDOWN)
+        collection = materialize_lisa_test_assets(run.id)
+        record_lisa_test_asset_intent_tester_case(
+            collection["id"],
+            "TC-001",
+            {"intentTesterCaseId": 42, "intentTesterCaseName": "TC-001"},
+        )
+        execution = {
+            "executionId": "exec-1",
+            "status": "running",
+            "mode": "headless",
+            "browser": "chromium",
+            "duration": 1.5,
+        }
+
+        batch = record_lisa_test_asset_intent_tester_executions(
+            collection["id"],
+            {
+                "executions": [
+                    {"caseId": "TC-001", "execution": execution},
+                    {"caseId": "TC-002", "execution": execution},
+                    {"caseId": "TC-003", "execution": {**execution, "mode": " "}},
+                    {"caseId": "TC-004", "result": execution},
+                ]
+            },
+        )
+        single = record_lisa_test_asset_intent_tester_execution(
+            collection["id"],
+            "TC-001",
+            execution,
+        )
+        reloaded = get_lisa_test_asset_collection(collection["id"])
+
+    assert batch["recorded"] == 1
+    assert batch["outcomes"] == [
+        {
+            "caseId": "TC-001",
+            "status": "recorded",
+            "executionId": "exec-1",
+            "executionStatus": "running",
+        },
+        {
+            "caseId": "TC-002",
+            "status": "rejected",
+            "error": "测试用例尚未导入 intent-tester: TC-002",
+        },
+        {"caseId": "TC-003", "status": "rejected", "error": "mode 不能为空"},
+        {
+            "caseId": "TC-004",
+            "status": "rejected",
+            "error": "未知 intent-tester 批量执行字段: result",
+        },
+    ]
+    assert reloaded["intentTesterMappings"][0]["latestExecution"] == (
+        single["latestExecution"]
+    )
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        ({"results": []}, "results 必须是非空列表"),
+        ({"results": [{}], "extra": True}, "未知 intent-tester 批量结果字段: extra"),
+        ([], "请求体必须是 JSON 对象"),
+    ],
+)
+def test_intent_tester_results_batch_rejects_malformed_payload(app, payload, message):
+    with app.app_context():
+        run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
+        record_artifact_version(run.id, "CASES", CASES_MARKDOWN)
+        collection = materialize_lisa_test_assets(run.id)
+
+        with pytest.raises(ValueError, match=message):
+            record_lisa_test_asset_intent_tester_results(collection["id"], payload)
+
+
 def test_intent_tester_mapping_survives_materialize_for_existing_case(app):
     with app.app_context():
         run = create_agent_run("TEST_DESIGN", "lisa", "CASES")
@@ -891,13 +1226,22 @@ def test_update_lisa_test_point_asset_persists_point_and_rebuilds_risk_matrix(ap
         )
         reloaded = get_lisa_test_asset_collection(collection["id"])
 
-    assert updated == {
+    assert {
+        key: updated[key]
+        for key in ["testPoint", "priority", "risk", "testCases", "status"]
+    } == {
         "testPoint": "登录错误处理",
         "priority": "P0",
         "risk": "R-LOGIN-LOCK",
         "testCases": ["TC-002"],
         "status": "已覆盖",
     }
+    assert updated["qualitySummary"] == reloaded["qualitySummary"]
+    assert [risk["risk"] for risk in updated["updatedRisks"]] == [
+        item["risk"]
+        for item in reloaded["riskMatrix"]
+        if "登录错误处理" in item["testPoints"]
+    ]
     assert reloaded["coverageSummary"]["coveredTestPoints"] == 2
     assert reloaded["coverageSummary"]["partiallyCoveredTestPoints"] == 0
     assert reloaded["coverageSummary"]["coverageRate"] == 100.0
@@ -1095,7 +1439,9 @@ def test_risk_library_delete_lisa_test_asset_risk_removes_unlinked_manual_risk(a
         deleted = delete_lisa_test_asset_risk(collection["id"], created["id"])
         reloaded = get_lisa_test_asset_collection(collection["id"])
 
-    assert deleted == {"id": created["id"], "deleted": True}
+    assert deleted["id"] == created["id"]
+    assert deleted["deleted"] is True
+    assert deleted["qualitySummary"] == reloaded["qualitySummary"]
     assert all(item["id"] != created["id"] for item in reloaded["riskMatrix"])
 
 
@@ -0,0 +1,143 @@
+import base64
+import sys
+
+import pytest
+
+from benchmarks import assert_faster, average_ms
+from token_counting import (
+    CachedTokenCounter,
+    EstimatedTokenCounter,
+    get_token_counter,
+    load_bpe_token_counter,
+    resolve_model_encoding,
+    token_counter_stats,
+)
+
+
+def _write_bpe_file(directory, encoding_name="cl100k_base"):
+    tokens = [bytes([value]) for value in range(256)]
+    tokens += [b"he", b"ll", b"llo", b"hello"]
+    path = directory / f"{encoding_name}.tiktoken"
+    path.write_bytes(
+        b"\n".join(
+            base64.b64encode(token) + b" " + str(rank).encode()
+            for rank, token in enumerate(tokens)
+        )
+    )
+    return path
+
+
+class _CountingCounter:
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text):
+        self.calls += 1
+        return len(text)
+
+
+def test_estimator_counts_cjk_characters_as_one_token_each():
+    counter = EstimatedTokenCounter()
+
+    assert counter.count("") == 0
+    assert counter.count("abcd" * 10) == 10
+    assert counter.count("登录需求澄清") == 6
+    assert counter.count("你好，世界！hello world") == 9
+
+
+def test_cached_counter_counts_each_block_once():
+    inner = _CountingCounter()
+    counter = CachedTokenCounter(inner, max_entries=2)
+
+    assert counter.count("first block") == 11
+    assert counter.count("first block") == 11
+    counter.count("second block")
+    counter.count("third block")
+    counter.count("first block")
+
+    assert inner.calls == 4
+    assert counter.stats() == {
+        "counter": "counting",
+        "entries": 2,
+        "hits": 1,
+        "misses": 4,
+    }
+
+
+def test_resolve_model_encoding_prefers_the_longest_prefix(monkeypatch):
+    monkeypatch.delenv("TOKENIZER_DEFAULT_ENCODING", raising=False)
+
+    assert resolve_model_encoding("gpt-4o-mini") == "o200k_base"
+    assert resolve_model_encoding("openai/GPT-4-turbo") == "cl100k_base"
+    assert resolve_model_encoding("deepseek-v4-flash") is None
+
+    monkeypatch.setenv("TOKENIZER_DEFAULT_ENCODING", "cl100k_base")
+    assert resolve_model_encoding("deepseek-v4-flash") == "cl100k_base"
+
+
+def test_bpe_counter_loads_local_rank_files(tmp_path):
+    _write_bpe_file(tmp_path)
+
+    counter = load_bpe_token_counter("cl100k_base", tmp_path)
+
+    assert counter is not None
+    assert counter.name == "cl100k_base"
+    assert counter.count("hello") == 1
+    assert counter.count("hello world") == 7
+
+
+def test_get_token_counter_falls_back_to_the_estimator(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOKENIZER_BPE_DIR", str(tmp_path))
+
+    counter = get_token_counter("gpt-4o")
+
+    assert counter.name == "estimate"
+    assert get_token_counter("unknown-model") is counter
+    assert [stats["counter"] for stats in token_counter_stats()] == ["estimate"]
+
+
+def test_get_token_counter_estimates_without_tiktoken(tmp_path, monkeypatch):
+    _write_bpe_file(tmp_path)
+    monkeypatch.setenv("TOKENIZER_BPE_DIR", str(tmp_path))
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+
+    assert load_bpe_token_counter("cl100k_base", tmp_path) is None
+    assert get_token_counter("gpt-4-turbo").name == "estimate"
+
+
+def test_get_token_counter_uses_the_model_encoding(tmp_path, monkeypatch):
+    _write_bpe_file(tmp_path)
+    monkeypatch.setenv("TOKENIZER_BPE_DIR", str(tmp_path))
+
+    counter = get_token_counter("gpt-4-turbo")
+
+    assert counter.name == "cl100k_base"
+    assert counter.count("hello") == 1
+    assert get_token_counter("gpt-4o").name == "estimate"
+
+
+@pytest.mark.slow
+def test_benchmark_cached_block_counting_across_turns(tmp_path):
+    _write_bpe_file(tmp_path)
+    bpe_counter = load_bpe_token_counter("cl100k_base", tmp_path)
+    blocks = [
+        f"[助手]\n第 {index} 轮回复：hello world，登录流程需要覆盖异常分支。" * 40
+        for index in range(30)
+    ]
+    counter = CachedTokenCounter(bpe_counter)
+
+    uncached_ms = average_ms(lambda: [bpe_counter.count(block) for block in blocks], 20)
+    cached_ms = average_ms(lambda: [counter.count(block) for block in blocks], 20)
+
+    assert [counter.count(block) for block in blocks] == [
+        bpe_counter.count(block) for block in blocks
+    ]
+    assert counter.stats()["misses"] == len(blocks)
+    assert_faster(
+        cached_ms,
+        uncached_ms,
+        factor=3,
+        label=f"cached vs uncached token counting of {len(blocks)} blocks per turn",
+    )
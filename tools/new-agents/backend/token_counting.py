@@ -0,0 +1,244 @@
+"""Local prompt token counting for context budgets and turn metrics.
+
+Context budgets and prompt-token metrics are measured with the model's own BPE
+vocabulary when one is available offline: point ``TOKENIZER_BPE_DIR`` at a
+directory of tiktoken-format rank files (``cl100k_base.tiktoken``,
+``o200k_base.tiktoken``). ``tiktoken`` is a backend requirement; nothing is
+downloaded at runtime. Models without a known encoding, workers without the
+files and installs that lack the package use ``EstimatedTokenCounter``, which
+counts CJK characters one token each and other text at four characters per
+token; for Chinese-heavy prompts that is far closer than a flat
+characters-per-token ratio.
+
+Neither the rank files nor ``TOKENIZER_BPE_DIR`` ship with the image, so a
+deployment estimates until it provides them. Every turn metric therefore
+records the counter behind its ``prompt_tokens`` in ``prompt_token_counter``.
+
+Counters cache per-block counts, so the history blocks that every turn of a
+run re-sends are only tokenized once per worker process.
+"""
+
+import base64
+from collections import OrderedDict
+from collections.abc import Mapping
+import hashlib
+import logging
+from math import ceil
+import os
+from pathlib import Path
+import re
+import threading
+from typing import Protocol
+
+logger = logging.getLogger(__name__)
+
+ESTIMATED_COUNTER_NAME = "estimate"
+ESTIMATED_CHARS_PER_TOKEN = 4
+DEFAULT_CACHE_ENTRIES = 4096
+
+# Runs of CJK ideographs, kana, hangul and full-width forms; each character is
+# roughly one BPE token, unlike Latin text.
+_WIDE_TEXT_PATTERN = re.compile(
+    "[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef]"
+)
+
+BPE_PATTERNS: Mapping[str, str] = {
+    "cl100k_base": (
+        r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+|"""
+        r""" ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+    ),
+    "o200k_base": "|".join(
+        [
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]
+    ),
+}
+
+# Longest matching prefix wins; models not listed use
+# TOKENIZER_DEFAULT_ENCODING, or the estimator when that is unset.
+MODEL_ENCODING_PREFIXES: tuple[tuple[str, str], ...] = (
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("gpt-4.5", "o200k_base"),
+    ("gpt-5", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+)
+
+
+class TokenCounter(Protocol):
+    name: str
+
+    def count(self, text: str) -> int: ...
+
+
+class EstimatedTokenCounter:
+    """Dependency-free estimate for models without a local vocabulary."""
+
+    name = ESTIMATED_COUNTER_NAME
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        wide_chars = len(_WIDE_TEXT_PATTERN.findall(text))
+        narrow_chars = len(text) - wide_chars
+        return wide_chars + ceil(narrow_chars / ESTIMATED_CHARS_PER_TOKEN)
+
+
+class BpeTokenCounter:
+    """Exact counts from a tiktoken ``Encoding``."""
+
+    def __init__(self, encoding) -> None:
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.encoding.encode_ordinary(text))
+
+
+class CachedTokenCounter:
+    """LRU of per-block counts in front of another counter."""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_entries: int = DEFAULT_CACHE_ENTRIES,
+    ) -> None:
+        self.counter = counter
+        self.name = counter.name
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        tokens = self.counter.count(text)
+        with self._lock:
+            self._counts[key] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "counter": self.name,
+                "entries": len(self._counts),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def load_bpe_ranks(path: str | os.PathLike) -> dict[bytes, int]:
+    """Read a tiktoken-format rank file: one ``<base64 token> <rank>`` per line."""
+    ranks: dict[bytes, int] = {}
+    for line in Path(path).read_bytes().splitlines():
+        if not line.strip():
+            continue
+        token, rank = line.split()
+        ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def load_bpe_token_counter(
+    encoding_name: str,
+    bpe_dir: str | os.PathLike,
+) -> BpeTokenCounter | None:
+    """Build a BPE counter from ``<bpe_dir>/<encoding_name>.tiktoken``, or None."""
+    pattern = BPE_PATTERNS.get(encoding_name)
+    path = Path(bpe_dir) / f"{encoding_name}.tiktoken"
+    if pattern is None or not path.is_file():
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed; estimating prompt tokens")
+        return None
+    try:
+        encoding = tiktoken.Encoding(
+            encoding_name,
+            pat_str=pattern,
+            mergeable_ranks=load_bpe_ranks(path),
+            special_tokens={},
+        )
+    except (OSError, ValueError):
+        logger.exception("Could not load BPE ranks from %s", path)
+        return None
+    return BpeTokenCounter(encoding)
+
+
+def resolve_model_encoding(model_name: str) -> str | None:
+    normalized = model_name.strip().lower().rsplit("/", 1)[-1]
+    matches = [
+        (prefix, encoding)
+        for prefix, encoding in MODEL_ENCODING_PREFIXES
+        if normalized.startswith(prefix)
+    ]
+    if matches:
+        return max(matches, key=lambda match: len(match[0]))[1]
+    return os.environ.get("TOKENIZER_DEFAULT_ENCODING") or None
+
+
+_counters: dict[str, CachedTokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_name: str) -> CachedTokenCounter:
+    """Return the process-wide cached counter for ``model_name``."""
+    encoding_name = resolve_model_encoding(model_name)
+    bpe_dir = os.environ.get("TOKENIZER_BPE_DIR")
+    key = encoding_name if encoding_name and bpe_dir else ESTIMATED_COUNTER_NAME
+    with _counters_lock:
+        counter = _counters.get(key)
+        if counter is None:
+            bpe_counter = None
+            if key != ESTIMATED_COUNTER_NAME:
+                bpe_counter = load_bpe_token_counter(key, bpe_dir)
+            if bpe_counter is not None:
+                counter = CachedTokenCounter(bpe_counter)
+            else:
+                # Encodings that failed to load share the estimator and its
+                # cache instead of retrying the load on every call.
+                counter = _counters.get(ESTIMATED_COUNTER_NAME)
+                if counter is None:
+                    logger.warning(
+                        "Estimating prompt tokens; point TOKENIZER_BPE_DIR at "
+                        "tiktoken rank files for exact counts"
+                    )
+                    counter = CachedTokenCounter(EstimatedTokenCounter())
+                    _counters[ESTIMATED_COUNTER_NAME] = counter
+            _counters[key] = counter
+        return counter
+
+
+def token_counter_stats() -> list[dict]:
+    with _counters_lock:
+        counters = {id(counter): counter for counter in _counters.values()}
+    return [counter.stats() for counter in counters.values()]
+
+
+def reset_token_counters() -> None:
+    with _counters_lock:
+        _counters.clear()